@@ -0,0 +1,307 @@
+"""
+benchmark AdEvaluator(tm) (eval_adv.py) on the sample sales reports
+
+Runs evaluate_advertising(...) headlessly (no figures displayed) in a
+separate Python process for each sales report, number of simulations,
+and detail level.  Reports the wall time of each stage of the
+evaluation, the peak resident set size (RSS) of the process, and the
+simulation throughput as JSON.  Compares with a stored baseline and
+flags regressions.
+
+Usage: python bench_eval_adv.py [-quick]
+           [-files sales_seed_113.csv,sales_pvalue.csv]
+           [-n 100,1000] [-d 0,2]
+           [-o bench_results.json]
+           [-baseline bench_baseline.json] [-tolerance 0.25]
+           [-save_baseline bench_baseline.json]
+
+Exits with status 1 if a benchmark fails or is slower/bigger than the
+baseline by more than the tolerance.
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+import tempfile
+
+BENCH_FORMAT_VERSION = 1
+
+# sample sales reports and the options each one needs
+BENCH_DATASETS = (('sales_seed_113.csv', ()),
+                  ('sales_no_increase.csv', ()),
+                  ('sales_start_90_days.csv', ('-adv_date', '01/01/2018')),
+                  ('sales_renamed_columns.csv', ('-date_tag', 'BOB',
+                                                 '-amount_tag', 'ALICE')),
+                  ('sales_renamed_with_type.csv', ('-date_tag', 'BOB',
+                                                   '-sales_type_tag', 'Type',
+                                                   '-sales_type_value', 'Payment')),
+                  ('sales_decrease.csv', ()),
+                  ('sales_medium_decrease.csv', ()),
+                  ('sales_small_decrease.csv', ()),
+                  ('sales_big_increase.csv', ()),
+                  ('sales_pvalue.csv', ()),
+                  ('sales_pvalue_null.csv', ()))
+
+NSIMS_LIST_DEFAULT = (100, 1000)
+DETAIL_LEVELS_DEFAULT = (0, 2)
+TOLERANCE_DEFAULT = 0.25  # 25 percent slower/bigger is a regression
+# differences below these are noise, not regressions
+MIN_REGRESSION_SECS = 0.1
+MIN_REGRESSION_MB = 10.0
+
+RESULT_TAG = "BENCH_RESULT "  # marks the result line of a benchmark process
+
+PROGRAM_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+def peak_rss_mb():
+    """
+    peak resident set size of this process in megabytes
+    (None if not available, e.g. on Microsoft Windows)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return max_rss/(1024.0*1024.0)  # bytes on Mac OS X
+    return max_rss/1024.0  # kilobytes on Linux
+
+def case_name(case):
+    """
+    unique name of a benchmark case for comparison with the baseline
+    """
+    return "%s/n=%d/d=%d" % (case['file'], case['number_sims'],
+                             case['detail_level'])
+
+def run_case_here(case):
+    """
+    run one benchmark case in this process (see run_case(...))
+
+    RETURNS: dictionary with the results of the case
+    """
+    # headless: figures are made and saved but never displayed
+    os.environ['MPLBACKEND'] = 'Agg'
+    sys.path.insert(0, PROGRAM_FOLDER)
+    import locale
+    import eval_adv
+
+    try:
+        locale.setlocale(locale.LC_ALL, 'en_US.utf-8')
+    except locale.Error:
+        locale.setlocale(locale.LC_ALL, '')
+
+    input_file = os.path.join(PROGRAM_FOLDER, case['file'])
+    with open(input_file, 'rb') as sales_report:
+        rows = sum(1 for line in sales_report) - 1
+
+    with tempfile.TemporaryDirectory() as output_folder:
+        t_start = time.time()
+        result = eval_adv.evaluate_advertising('eval_adv.py',
+                                               '-i', input_file,
+                                               '-no_settings',
+                                               '-o', output_folder,
+                                               '-n', str(case['number_sims']),
+                                               '-d', str(case['detail_level']),
+                                               '-pause', '0.001',
+                                               *case['options'])
+        wall_secs = time.time() - t_start
+
+    stages = dict(result.timings)
+    sims_per_sec = None
+    if stages.get('projection'):
+        sims_per_sec = case['number_sims']/stages['projection']
+    welch_sims_per_sec = None
+    if stages.get('sim_adv_period'):
+        welch_sims_per_sec = eval_adv.NSIMS_DEFAULT/stages['sim_adv_period']
+
+    return {'name' : case_name(case),
+            'file' : case['file'],
+            'rows' : rows,
+            'number_sims' : case['number_sims'],
+            'detail_level' : case['detail_level'],
+            'status' : 'ok',
+            'wall_secs' : wall_secs,
+            'stages' : stages,
+            'peak_rss_mb' : peak_rss_mb(),
+            'sims_per_sec' : sims_per_sec,
+            'welch_sims_per_sec' : welch_sims_per_sec}
+    # end run_case_here(...)
+
+def run_case(case):
+    """
+    run one benchmark case in a new Python process so the peak
+    RSS and the import times belong to that case alone
+
+    RETURNS: dictionary with the results of the case
+    """
+    with tempfile.TemporaryDirectory() as work_folder:
+        # settings shelf files go in the work folder
+        completed = subprocess.run([sys.executable,
+                                    os.path.abspath(__file__),
+                                    '-case', json.dumps(case)],
+                                   cwd=work_folder,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   universal_newlines=True)
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith(RESULT_TAG):
+            return json.loads(line[len(RESULT_TAG):])
+
+    error_lines = completed.stderr.strip().splitlines()
+    return {'name' : case_name(case),
+            'file' : case['file'],
+            'number_sims' : case['number_sims'],
+            'detail_level' : case['detail_level'],
+            'status' : 'error',
+            'error' : "\n".join(error_lines[-5:])}
+
+def compare(results, baseline, tolerance=TOLERANCE_DEFAULT):
+    """
+    compare benchmark results with a baseline
+
+    RETURNS: list of regression messages (empty if none)
+    """
+    baseline_cases = {case['name'] : case for case in baseline['cases']}
+    regressions = []
+    for case in results['cases']:
+        if case['status'] != 'ok':
+            regressions.append(case['name'] + " FAILED: " + case['error'])
+            continue
+        base = baseline_cases.get(case['name'])
+        if base is None or base['status'] != 'ok':
+            continue
+        checks = [('wall_secs', case['wall_secs'], base['wall_secs'],
+                   MIN_REGRESSION_SECS)]
+        for stage, secs in sorted(case['stages'].items()):
+            if stage in base['stages']:
+                checks.append(('stages.' + stage, secs,
+                               base['stages'][stage], MIN_REGRESSION_SECS))
+        if case['peak_rss_mb'] is not None and base['peak_rss_mb'] is not None:
+            checks.append(('peak_rss_mb', case['peak_rss_mb'],
+                           base['peak_rss_mb'], MIN_REGRESSION_MB))
+        for name, value, base_value, min_change in checks:
+            if value > base_value*(1.0 + tolerance) \
+               and value - base_value > min_change:
+                regressions.append("%s %s: %.3f (baseline %.3f, %+.0f%%)"
+                                   % (case['name'], name, value, base_value,
+                                      100.0*(value/base_value - 1.0)))
+    return regressions  # compare(...)
+
+def main(*args):
+    """
+    run the benchmarks (see usage at top of file)
+    """
+    files = [file_name for file_name, options in BENCH_DATASETS]
+    nsims_list = list(NSIMS_LIST_DEFAULT)
+    detail_levels = list(DETAIL_LEVELS_DEFAULT)
+    output_file = 'bench_results.json'
+    baseline_file = None
+    save_baseline_file = None
+    tolerance = TOLERANCE_DEFAULT
+
+    arg_index = 0
+    while arg_index < len(args):
+        option = args[arg_index]
+        if option == '-case':
+            # run one case in this process (used by run_case(...))
+            result = run_case_here(json.loads(args[arg_index+1]))
+            print(RESULT_TAG + json.dumps(result))
+            return 0
+        elif option == '-quick':
+            files = ['sales_seed_113.csv']
+            nsims_list = [100]
+            detail_levels = [0]
+        elif option in ('-h', '-help', '--help'):
+            print(__doc__)
+            return 0
+        elif arg_index + 1 >= len(args):
+            raise ValueError("missing argument for " + option)
+        elif option == '-files':
+            files = args[arg_index+1].split(',')
+            arg_index += 1
+        elif option == '-n':
+            nsims_list = [int(value) for value in args[arg_index+1].split(',')]
+            arg_index += 1
+        elif option == '-d':
+            detail_levels = [int(value) for value in args[arg_index+1].split(',')]
+            arg_index += 1
+        elif option == '-o':
+            output_file = args[arg_index+1]
+            arg_index += 1
+        elif option == '-baseline':
+            baseline_file = args[arg_index+1]
+            arg_index += 1
+        elif option == '-save_baseline':
+            save_baseline_file = args[arg_index+1]
+            arg_index += 1
+        elif option == '-tolerance':
+            tolerance = float(args[arg_index+1])
+            arg_index += 1
+        else:
+            raise ValueError("unknown option " + option)
+        arg_index += 1
+
+    dataset_options = dict(BENCH_DATASETS)
+    cases = [{'file' : file_name,
+              'options' : list(dataset_options.get(file_name, ())),
+              'number_sims' : number_sims,
+              'detail_level' : detail_level}
+             for file_name in files
+             for number_sims in nsims_list
+             for detail_level in detail_levels]
+
+    import numpy as np
+    results = {'format_version' : BENCH_FORMAT_VERSION,
+               'date' : time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'python' : platform.python_version(),
+               'numpy' : np.__version__,
+               'platform' : platform.platform(),
+               'processor' : platform.processor(),
+               'cpu_count' : os.cpu_count(),
+               'cases' : []}
+
+    for case_index, case in enumerate(cases, 1):
+        print("[%d/%d] %s" % (case_index, len(cases), case_name(case)),
+              end=' ', flush=True)
+        case_result = run_case(case)
+        results['cases'].append(case_result)
+        if case_result['status'] == 'ok':
+            print("%.2f secs" % case_result['wall_secs'], end='')
+            if case_result['peak_rss_mb'] is not None:
+                print(", %.1f MB peak RSS" % case_result['peak_rss_mb'], end='')
+            print()
+        else:
+            print("FAILED")
+
+    with open(output_file, 'w') as out_file:
+        json.dump(results, out_file, indent=1, sort_keys=True)
+    print("benchmark results written to", output_file)
+
+    if save_baseline_file is not None:
+        with open(save_baseline_file, 'w') as out_file:
+            json.dump(results, out_file, indent=1, sort_keys=True)
+        print("baseline saved to", save_baseline_file)
+
+    regressions = [case['name'] + " FAILED: " + case['error']
+                   for case in results['cases'] if case['status'] != 'ok']
+    if baseline_file is not None:
+        with open(baseline_file) as in_file:
+            baseline = json.load(in_file)
+        regressions = compare(results, baseline, tolerance)
+        print("compared with baseline", baseline_file,
+              "(tolerance %.0f%%)" % (100.0*tolerance))
+
+    for message in regressions:
+        print("REGRESSION:", message)
+    if regressions:
+        return 1
+    print("no regressions")
+    return 0
+    # end main(...)
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:]))
@@ -53,10 +53,21 @@ import subprocess  # getoutput(cmd_string)
 import locale      # localization
 import platform    # get Python version etc.
 import shelve      # saving AdEvaluatorSettings
+import json        # machine readable results
+import csv         # machine readable results
+import tempfile    # atomic writes of results files
+import glob        # batch of sales reports
+import shlex       # batch manifest files
+import traceback   # batch error reports
+import threading   # -serve caches, GUI evaluation thread
+import queue       # GUI evaluation progress messages
+import tracemalloc # -profile memory allocation peaks
+import warnings    # slow import warning of the tests
 # use greatest common denominator (GCD) function
 from math import gcd
 # use named tuples
 from collections import namedtuple
+from collections import OrderedDict
 
 ANACONDA_DOWNLOAD_URL = 'http://www.anaconda.com/download/'
 
@@ -81,84 +92,49 @@ except Exception as my_X:
     print(my_X)
     print("END EXCEPTION")
 
-# TkInter GUI library
-from tkinter import Tk
-from tkinter import PhotoImage
-from tkinter import Canvas
-from tkinter import Toplevel
-from tkinter import Menu
-from tkinter import Text
-# special Tk variables associated with widgets
-from tkinter import IntVar
-from tkinter import DoubleVar
-from tkinter import StringVar
-from tkinter import mainloop
-# tkinter constants
-from tkinter import END
-from tkinter import RIGHT
-from tkinter import LEFT
-from tkinter import X
-from tkinter import Y
-from tkinter import HORIZONTAL
-from tkinter import VERTICAL
-
-from tkinter import filedialog
-from tkinter import messagebox
-
-# tkinter.ttk widgets
-from tkinter.ttk import Button
-from tkinter.ttk import Entry
-from tkinter.ttk import Label
-from tkinter.ttk import Checkbutton
-from tkinter.ttk import Scrollbar
-# GUI progress bar widget
-from tkinter.ttk import Progressbar
-
 # more Python standard libraries
 import unittest
 import io
-from dateutil.parser import parse
 
 # Scientific/Numerical Python libraries
 import numpy as np
-import pandas as pd
-# SciPy
-import scipy.stats as st
-from scipy.optimize import curve_fit
-from scipy.special import factorial  # elementwise factorial function
-# graphics libraries
-
-# differences between operating systems
-if sys.platform == "win32":
-    # Microsoft Windows
-    pass
-elif sys.platform == "darwin":
-    # Apple Mac OS X
-    import matplotlib
-    matplotlib.use("TkAgg")
-elif sys.platform == "linux":
-    # Linux Unix variants
-    pass
-else:
-    pass
-
-import matplotlib as mpl
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
-from matplotlib.ticker import FuncFormatter
-from matplotlib.font_manager import FontProperties
-# date formatting
-import matplotlib.dates as mdates
-import matplotlib.cbook as cbook
-
-# choose matplotlib graphics style
-plt.style.use('ggplot')
-#pd.options.display.mpl_style = 'default'
-
-mpl.rcParams['font.size'] = 14
-mpl.rcParams['font.weight'] = 'bold'
-mpl.rcParams['axes.labelweight'] = 'bold'
-mpl.rcParams['axes.titleweight'] = 'bold'
+
+# The GUI (tkinter), plotting (matplotlib), SciPy, Pandas, and dateutil
+# libraries are imported in the functions that use them.  Importing them
+# here takes over a second, which every command line invocation (even
+# -version and -help) and every worker process would pay.
+
+_pyplot_ready = False
+
+def import_pyplot():
+    """
+    import matplotlib.pyplot on first use and set up the graphics style
+
+    RETURNS: the matplotlib.pyplot module
+    """
+    global _pyplot_ready
+
+    if not _pyplot_ready:
+        # differences between operating systems
+        if sys.platform == "darwin" and not os.environ.get('MPLBACKEND'):
+            # Apple Mac OS X (unless headless, e.g. MPLBACKEND=Agg)
+            import matplotlib
+            matplotlib.use("TkAgg")
+
+        import matplotlib as mpl
+        import matplotlib.pyplot as plt
+
+        # choose matplotlib graphics style
+        plt.style.use('ggplot')
+
+        mpl.rcParams['font.size'] = 14
+        mpl.rcParams['font.weight'] = 'bold'
+        mpl.rcParams['axes.labelweight'] = 'bold'
+        mpl.rcParams['axes.titleweight'] = 'bold'
+        _pyplot_ready = True
+
+    import matplotlib.pyplot as plt
+    return plt  # import_pyplot()
 
 # constants
 
@@ -171,9 +147,12 @@ PROJECT_GIT_SHA = "$Id: 9fed251bd80ed4b7debf30f95c2e97729504d668 $ \n\n"
 # use git rev-list --count HEAD > eval_adv_version.txt
 # to get commit count for the version number
 PROJECT_VERSION = "1.X"
-VERSION_FILE = "eval_adv_version.txt"
-with open(VERSION_FILE) as version_file:
-    PROJECT_VERSION = "1." + version_file.read()
+# version file is next to this program, not in the current folder
+VERSION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "eval_adv_version.txt")
+if os.path.isfile(VERSION_FILE):
+    with open(VERSION_FILE) as version_file:
+        PROJECT_VERSION = "1." + version_file.read()
 
 NO_ADV_MARKER = 'bo' # blue filled circle
 ADV_MARKER = 'gP'  # green filled plus sign
@@ -211,6 +190,7 @@ and 140,000 from strokes in 2016.
 ALPHA_FISHER = 0.05  # Fisher's p-value cutoff
 DAYS_PER_YEAR = 365.25
 NSIMS_DEFAULT = 1000 # default to one thousand simulations
+MA_PERIOD_DAYS = 30  # moving average period (default 30 day)
 ADV_START_DATE = '03/31/2018'
 MONTHS_PER_YEAR = 12
 ANNUAL_ADV_EXPENSE = 500.0 * MONTHS_PER_YEAR  # annual advertising cost
@@ -230,10 +210,20 @@ GEOMETRY_STRING = "750x422"
 # duration to display the figures
 PLOT_DURATION_SECS = 2.0
 
-years = mdates.YearLocator()   # every year
-months = mdates.MonthLocator()  # every month
-mondays = mdates.WeekdayLocator()
-yearsFmt = mdates.DateFormatter('%b %Y')
+# simulations between progress reports and checks for Cancel
+PROGRESS_BATCH_SIMS = 50
+# interval the GUI checks for progress of the evaluation
+POLL_INTERVAL_MSECS = 100
+# minimum interval between partial results during the projections
+PARTIAL_RESULTS_SECS = 0.5
+# confidence intervals of partial results (95 percent)
+CONFIDENCE_Z = 1.96
+
+# time to import this program (cold start of the command line)
+# above which TestClass.test_import_time warns
+IMPORT_TIME_LIMIT_SECS = 1.0
+# libraries only imported when needed (see import_pyplot())
+LAZY_IMPORTS = ('tkinter', 'matplotlib', 'pandas', 'scipy', 'dateutil')
 
 def debug_prefix():
     """
@@ -261,6 +251,7 @@ class TestClass(unittest.TestCase):
 
     def test_get_date_refs(self):
         """test get_date_refs(...)"""
+        import pandas as pd
         data_frame = pd.DataFrame({'DATE' : ['12/1/2018',
                                              '12/2/2017'],
                                    'Type' : ['Sales Receipt',
@@ -271,6 +262,7 @@ class TestClass(unittest.TestCase):
 
     def test_get_amount_refs(self):
         """test get_amount_refs(...)"""
+        import pandas as pd
         data_frame = pd.DataFrame({'DATE' : ['12/1/2018',
                                              '12/2/2017'],
                                    'Type' : ['Sales Receipt',
@@ -281,6 +273,7 @@ class TestClass(unittest.TestCase):
 
     def test_get_type_refs(self):
         """test get_type_refs(...)"""
+        import pandas as pd
         data_frame = pd.DataFrame({'DATE' : ['12/1/2018',
                                              '12/2/2017'],
                                    'Type' : ['Sales Receipt',
@@ -314,6 +307,721 @@ class TestClass(unittest.TestCase):
         self.assertEqual(get_units(sales_data)[1], 2)
         self.assertEqual(get_units(sales_data)[2], 3)
 
+    def test_histogram_simulations(self):
+        """
+        test histogram_simulations(sim_arrays, bins, ranges)
+        """
+        sim_arrays = {'a' : [1.0, 2.0, 2.0, 3.0],
+                      'b' : np.array([0.5, 1.5])}
+        sim_hists = histogram_simulations(sim_arrays,
+                                          bins=2,
+                                          ranges={'b' : (0.0, 4.0)})
+        self.assertEqual(list(sim_hists['a'][0]), [1, 3])
+        self.assertEqual(list(sim_hists['b'][0]), [2, 0])
+        self.assertEqual(list(sim_hists['b'][1]), [0.0, 2.0, 4.0])
+
+    def test_write_results(self):
+        """
+        test write_results(results, file_path, file_format)
+        """
+        results = {'seed' : 113,
+                   'loss_counts' : {'n_loss_profits' : np.float64(2.5)},
+                   'r2' : np.nan,
+                   'histograms' : {'a' : {'bins' : np.array([1, 2])}}}
+        with tempfile.TemporaryDirectory() as folder:
+            json_file = os.path.join(folder, 'results.json')
+            write_results(results, json_file)
+            with open(json_file) as in_file:
+                self.assertEqual(json.load(in_file),
+                                 {'seed' : 113,
+                                  'loss_counts' : {'n_loss_profits' : 2.5},
+                                  'r2' : None,
+                                  'histograms' : {'a' : {'bins' : [1, 2]}}})
+            self.assertEqual(os.stat(json_file).st_mode & 0o777,
+                             0o666 & ~current_umask())
+            csv_file = os.path.join(folder, 'results.csv')
+            write_results(results, csv_file, 'csv')
+            with open(csv_file) as in_file:
+                rows = list(csv.reader(in_file))
+            self.assertIn(['histograms.a.bins[1]', '2'], rows)
+            self.assertEqual(sorted(os.listdir(folder)),
+                             ['results.csv', 'results.json'])
+
+    def test_project_annual_sales(self):
+        """
+        test project_annual_sales(...) uses only its own
+        random number generator
+        """
+        dist_cumsum = np.array([0.25, 0.75, 1.0])
+        y_err = np.array([0.01, 0.01, 0.01])
+        global_state = np.random.get_state()[1].copy()
+        projections = [project_annual_sales(dist_cumsum, y_err,
+                                            dist_cumsum, y_err,
+                                            10.0, 5,
+                                            rng=np.random.RandomState(113),
+                                            verbose=False)
+                       for trial in range(2)]
+        for first, second in zip(*projections):
+            self.assertEqual(first.shape, (5,))
+            self.assertTrue(np.array_equal(first, second))
+        self.assertTrue(np.array_equal(np.random.get_state()[1],
+                                       global_state))
+
+    def test_make_batch_jobs(self):
+        """
+        test make_batch_jobs(batch_spec, config)
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            manifest = os.path.join(folder, 'jobs.txt')
+            with open(manifest, 'w') as out_file:
+                out_file.write("# comment\n"
+                               "a/sales.csv -e 12000 -price 90\n"
+                               "\n"
+                               "'b c/sales.csv' -adv_date 01/01/2018\n")
+            config = EvaluationConfig(number_sims=10, output_folder='out')
+            jobs = make_batch_jobs(manifest, config)
+            self.assertEqual([input_file for input_file, job in jobs],
+                             [os.path.join(folder, 'a/sales.csv'),
+                              os.path.join(folder, 'b c/sales.csv')])
+            self.assertEqual(jobs[0][1].annual_adv_expense, 12000.0)
+            self.assertEqual(jobs[0][1].unit_price, 90.0)
+            self.assertEqual(jobs[1][1].adv_date, '01/01/2018')
+            self.assertEqual(jobs[1][1].number_sims, 10)
+            self.assertEqual([job.output_folder for input_file, job in jobs],
+                             [os.path.join('out', 'sales'),
+                              os.path.join('out', 'sales_2')])
+
+            # a manifest named .csv is still a manifest
+            csv_manifest = os.path.join(folder, 'jobs.csv')
+            os.rename(manifest, csv_manifest)
+            self.assertEqual(len(make_batch_jobs(csv_manifest, config)), 2)
+            report = os.path.join(folder, 'report.csv')
+            with open(report, 'w') as out_file:
+                out_file.write('"DATE","CUST ID","NAME","AMOUNT"\n')
+            self.assertEqual([input_file for input_file, job
+                              in make_batch_jobs(report, config)], [report])
+
+    def test_lru_cache(self):
+        """
+        test LRUCache(max_items)
+        """
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)  # b is least recently used
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+        self.assertEqual(cache.stats(), {'items' : 2, 'max_items' : 2,
+                                         'hits' : 3, 'misses' : 1})
+
+    def test_serve_make_config(self):
+        """
+        test EvaluationServer.make_config(request) accepts only the
+        settings fields with values of the right type
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            server = EvaluationServer(1, simulation_cache_folder=folder)
+            try:
+                config = server.make_config({'input_file' : 'sales.csv',
+                                             'annual_adv_expense' : 12000,
+                                             'unit_price' : INFER_PRICE_TAG,
+                                             'number_sims' : 500,
+                                             'adv_date' : '03/31/2018'})
+                self.assertEqual(config.annual_adv_expense, 12000.0)
+                self.assertIsNone(config.unit_price)
+                self.assertEqual(config.simulation_cache_folder, folder)
+                for request in ({'output_folder' : '/tmp'},
+                                {'number_sims' : '500'},
+                                {'number_sims' : 0},
+                                {'seed_val' : True},
+                                {'annual_adv_expense' : float('nan')},
+                                {'adv_date' : 'not a date'},
+                                {'scenario_grid' : [[1000.0], ['x']]}):
+                    with self.assertRaises(ValueError):
+                        server.make_config(request)
+            finally:
+                server.shutdown()
+
+    def test_serve_worker_crash(self):
+        """
+        test EvaluationServer runs requests on a new pool after a
+        worker died
+        """
+        from concurrent.futures.process import BrokenProcessPool
+
+        input_file = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  'sales_seed_113.csv')
+        with tempfile.TemporaryDirectory() as folder:
+            server = EvaluationServer(1, simulation_cache_folder=folder)
+            try:
+                with self.assertRaises(BrokenProcessPool):
+                    server.executor.submit(os._exit, 1).result()
+                # the new worker runs the evaluation, which rejects
+                # the configuration
+                with self.assertRaises(ValueError):
+                    server.run_in_worker(report_cache_key(input_file),
+                                         EvaluationConfig(engine_check=-1))
+                self.assertEqual(set(server.status()),
+                                 {'status', 'workers', 'simulation_cache_folder',
+                                  'results', 'reports', 'simulations'})
+            finally:
+                server.shutdown()
+
+    def test_run_evaluation_cancel(self):
+        """
+        test run_evaluation(...) stops when cancel is set
+        """
+        input_file = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  'sales_seed_113.csv')
+        cancel = threading.Event()
+        cancel.set()
+        with self.assertRaises(EvaluationCancelled):
+            run_evaluation(input_file, cancel=cancel)
+
+    def test_summarize_partial_projections(self):
+        """
+        test summarize_partial_projections(...)
+        """
+        ave_sales_no_adv = np.full(4, 100.0)
+        ave_sales_adv = np.array([100.0, 110.0, 120.0, 130.0])
+        summary = summarize_partial_projections(ave_sales_no_adv,
+                                                ave_sales_adv,
+                                                10.0,
+                                                annual_adv_expense=DAYS_PER_YEAR*5.0,
+                                                bins=3,
+                                                number_sims=100)
+        # profit increase is DAYS_PER_YEAR*(-5, 5, 15, 25)
+        self.assertAlmostEqual(summary['expected_profit_increase'],
+                               DAYS_PER_YEAR*10.0)
+        profit_low, profit_high = summary['expected_profit_increase_ci']
+        self.assertLess(profit_low, DAYS_PER_YEAR*10.0)
+        self.assertGreater(profit_high, DAYS_PER_YEAR*10.0)
+        self.assertEqual(summary['loss_probability'], 0.25)
+        loss_low, loss_high = summary['loss_probability_ci']
+        self.assertTrue(0.0 <= loss_low < 0.25 < loss_high <= 1.0)
+        self.assertEqual(summary['profit_bins'].sum(), 4)
+        self.assertEqual((summary['n_sims'], summary['number_sims']), (4, 100))
+
+    def test_line_index(self):
+        """
+        test LineIndex(file_path)
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            file_path = os.path.join(folder, 'sales.csv')
+            with open(file_path, 'w', newline='') as out_file:
+                out_file.write("DATE,CUSTOMER,AMOUNT\r\n"
+                               "1/1/2018,\"Smith, Bob\",90.0\r\n"
+                               "1/5/2018,Sam,180.0\r\n"
+                               "2/1/2018,Sue,90.0\r\n")
+            line_index = LineIndex(file_path)
+            line_index.complete.wait()
+            self.assertEqual(line_index.line_count, 4)
+            self.assertEqual(line_index.line(2), "1/5/2018,Sam,180.0")
+            self.assertEqual(line_index.lines(3, 5), ["2/1/2018,Sue,90.0"])
+            date_tag, date_index = get_date_refs(line_index.header_frame())
+            self.assertEqual((date_tag, date_index), ('DATE', 0))
+            self.assertEqual(line_index.find_date(datetime.datetime(2018, 1, 2),
+                                                  date_index), 2)
+            self.assertIsNone(line_index.find_date(datetime.datetime(2019, 1, 1),
+                                                   date_index))
+            line_index.close()
+
+            # the search skips the lines without a date
+            with open(file_path, 'w', newline='') as out_file:
+                out_file.write("DATE,CUSTOMER,AMOUNT\r\n"
+                               "1/1/2018,Bob,90.0\r\n"
+                               "1/5/2018,Sam,180.0\r\n"
+                               "\r\n"
+                               "TOTAL,,270.0\r\n"
+                               "2/1/2018,Sue,90.0\r\n")
+            line_index = LineIndex(file_path, background=False)
+            self.assertEqual(line_index.find_date(datetime.datetime(2018, 1, 2),
+                                                  date_index), 2)
+            self.assertEqual(line_index.find_date(datetime.datetime(2018, 1, 6),
+                                                  date_index), 5)
+            line_index.close()
+            # a closed index stops a search at once
+            line_index = LineIndex(file_path)
+            line_index.close()
+            self.assertIsNone(line_index.find_date(datetime.datetime(2018, 1, 2),
+                                                   date_index))
+
+    def test_stage_profiler(self):
+        """
+        test StageProfiler(profile=True)
+        """
+        profiler = StageProfiler(profile=True)
+        profiler.start('allocate')
+        big_array = np.ones(2**20)  # 8 MB
+        del big_array
+        profiler.start('sleep')
+        time.sleep(0.05)
+        profiler.start('allocate')
+        profiler.stop_profiling()
+        self.assertEqual(list(profiler.timings), ['allocate', 'sleep'])
+        self.assertGreaterEqual(profiler.stages['allocate']['peak_alloc_mb'],
+                                8.0)
+        self.assertGreaterEqual(profiler.stages['sleep']['wall_secs'], 0.04)
+        self.assertLess(profiler.stages['sleep']['cpu_secs'], 0.04)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_metrics_exporter(self):
+        """
+        test MetricsExporter with a local StatsD listener
+        """
+        import socket
+        listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.settimeout(5.0)
+        with tempfile.TemporaryDirectory() as folder:
+            textfile = os.path.join(folder, 'eval_adv.prom')
+            metrics = MetricsExporter(textfile, '127.0.0.1:%d'
+                                      % listener.getsockname()[1])
+            metrics.record({'input_rows' : 1223,
+                            'days' : 365,
+                            'number_sims' : 1000,
+                            'simulation_cache_hit' : 1,
+                            'elapsed_secs' : 3.0,
+                            'stage_seconds' : {'projection' : 2.5},
+                            'peak_rss_bytes' : None})
+            statsd_lines = listener.recv(65536).decode().splitlines()
+            metrics.record(status='error')
+            metrics.close()
+            with open(textfile) as in_file:
+                prometheus_text = in_file.read()
+        listener.close()
+        self.assertIn('adevaluator.evaluations.ok:1|c', statsd_lines)
+        self.assertIn('adevaluator.input_rows:1223|g', statsd_lines)
+        self.assertIn('adevaluator.stage.projection:2500.000|ms', statsd_lines)
+        self.assertIn('adevaluator.simulation_cache_hit:1|g', statsd_lines)
+        self.assertIn('adevaluator.elapsed:3000.000|ms', statsd_lines)
+        self.assertIn('adevaluator.cache.simulations.hits:1|g', statsd_lines)
+        self.assertIn('adevaluator_evaluations_total{status="error"} 1\n',
+                      prometheus_text)
+        self.assertIn('adevaluator_stage_seconds{stage="projection"} 2.5',
+                      prometheus_text)
+        self.assertIn('adevaluator_cache_hits_total{cache="simulations"} 1\n',
+                      prometheus_text)
+        self.assertIn('adevaluator_elapsed_seconds 3.000000\n', prometheus_text)
+        self.assertNotIn('peak_rss_bytes', prometheus_text)
+
+    def test_simulation_cache(self):
+        """
+        test the simulation cache keys and the cache folder
+        """
+        daily_sales_np = np.array([[datetime.datetime(2018, 1, day), 90.0*day]
+                                   for day in range(1, 11)], dtype=object)
+        mask_adv = np.arange(10) >= 5
+        config = EvaluationConfig(number_sims=100)
+        cache_key = simulation_cache_key(daily_sales_np, mask_adv, config)
+        # the expense and the cost do not change the simulations
+        self.assertEqual(simulation_cache_key(daily_sales_np, mask_adv,
+                                              config._replace(annual_adv_expense=1.0,
+                                                              unit_cost=10.0)),
+                         cache_key)
+        self.assertNotEqual(simulation_cache_key(daily_sales_np, mask_adv,
+                                                 config._replace(seed_val=1)),
+                            cache_key)
+        with tempfile.TemporaryDirectory() as folder:
+            put_cached_simulations(cache_key, {'ave_sales_adv' : np.ones(3)},
+                                   folder)
+            _simulation_cache.items.clear()
+            simulations = get_cached_simulations(cache_key, folder)
+            self.assertEqual(simulations['ave_sales_adv'].tolist(),
+                             [1.0, 1.0, 1.0])
+            simulations['ave_sales_adv'][0] = 2.0  # copies of the cache
+            self.assertEqual(get_cached_simulations(cache_key)['ave_sales_adv'][0],
+                             1.0)
+            self.assertIsNone(get_cached_simulations('0'*64, folder))
+        _simulation_cache.items.clear()
+
+    def test_compute_scenario_grid(self):
+        """
+        test compute_scenario_grid(...) matches annual_profit_increase(...)
+        """
+        rng = np.random.RandomState(SEED_VAL)
+        ave_sales_no_adv = rng.normal(300.0, 20.0, 500)
+        ave_sales_adv = rng.normal(320.0, 20.0, 500)
+        expenses, unit_costs = parse_scenario_grid('0:12000:7,0:160:5')
+        self.assertEqual(unit_costs, (0.0, 40.0, 80.0, 120.0, 160.0))
+        grid = compute_scenario_grid(ave_sales_no_adv, ave_sales_adv, 90.0,
+                                     expenses, unit_costs)
+        for i_cost, unit_cost in enumerate(unit_costs):
+            for i_expense, expense in enumerate(expenses):
+                _sales, profit = annual_profit_increase(ave_sales_no_adv,
+                                                        ave_sales_adv,
+                                                        90.0,
+                                                        unit_cost,
+                                                        expense)
+                self.assertAlmostEqual(grid['expected_profit_increase'][i_cost, i_expense],
+                                       profit.mean(), places=6)
+                self.assertEqual(grid['loss_probability'][i_cost, i_expense],
+                                 (profit < 0.0).mean())
+                np.testing.assert_allclose(grid['profit_quantiles'][:, i_cost, i_expense],
+                                           np.quantile(profit, SCENARIO_QUANTILES),
+                                           atol=1e-6)
+
+    def test_split_statistics(self):
+        """
+        test split_statistics(...) matches scipy.stats.ttest_ind(...)
+        """
+        import scipy.stats as st
+        rng = np.random.RandomState(SEED_VAL)
+        sales = 90.0*rng.poisson(3.0, 100) + 1.0e6  # large offset
+        stats = split_statistics(sales, min_days=5)
+        self.assertEqual(stats['split'][0], 5)
+        self.assertEqual(stats['split'][-1], 95)
+        for split in (5, 37, 95):
+            index = split - 5
+            tstat, pvalue = st.ttest_ind(sales[:split], sales[split:],
+                                         equal_var=False)
+            self.assertAlmostEqual(stats['mean_before'][index],
+                                   sales[:split].mean(), places=6)
+            self.assertAlmostEqual(stats['var_after'][index],
+                                   sales[split:].var(ddof=1), places=4)
+            self.assertAlmostEqual(stats['tstat'][index], tstat, places=6)
+            self.assertAlmostEqual(stats['pvalue'][index], pvalue, places=6)
+
+    def test_sweep_adv_dates(self):
+        """
+        test sweep_adv_dates(...) runs number_sims simulations for each
+        candidate date
+        """
+        input_file = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  'sales_no_increase.csv')
+        sweep = sweep_adv_dates(input_file, EvaluationConfig(),
+                                '03/01/2018', '04/01/2018', 10,
+                                number_sims=50)
+        self.assertEqual(sweep['adv_date'], ['03/01/2018', '03/11/2018',
+                                             '03/21/2018', '03/31/2018'])
+        # two sided p-values of 50 simulations are multiples of 1/25
+        p_values = sweep['empirical_p_value']
+        np.testing.assert_allclose(25.0*p_values, np.rint(25.0*p_values))
+        self.assertTrue(np.all((p_values > 0.0) & (p_values <= 1.0)))
+
+    def test_detect_change_point(self):
+        """
+        test detect_change_point(...) finds a jump in daily sales
+        """
+        rng = np.random.RandomState(SEED_VAL)
+        first_date = datetime.datetime(2018, 1, 1)
+        daily_sales_np = np.array([[first_date + datetime.timedelta(days=day),
+                                    90.0*rng.poisson(2.0 if day < 120 else 4.0)]
+                                   for day in range(240)], dtype=object)
+        change_point = detect_change_point(daily_sales_np, 50, rng=rng)
+        self.assertLessEqual(abs(change_point['split'] - 120), 5)
+        self.assertLessEqual(change_point['adv_date_low'][:5],
+                             change_point['adv_date'][:5])
+        self.assertGreater(change_point['confidence'], 0.95)
+        self.assertGreater(change_point['lift'], 0.0)
+
+    def test_placebo_test(self):
+        """
+        test placebo_test(...) on stationary sales with advertising
+        """
+        rng = np.random.RandomState(SEED_VAL)
+        first_date = datetime.datetime(2018, 1, 1)
+        daily_sales_np = np.array([[first_date + datetime.timedelta(days=day),
+                                    90.0*rng.poisson(2.0 if day < 150 else 4.0)]
+                                   for day in range(240)], dtype=object)
+        mask_no_adv = np.arange(240) < 150
+        dist_h, y_err = get_dist(daily_sales_np[mask_no_adv, 1], 90.0)
+        placebo = placebo_test(daily_sales_np, mask_no_adv, dist_h.cumsum(),
+                               90.0, number_sims=50, rng=rng)
+        self.assertEqual(len(placebo['adv_date']),
+                         150 - 2*PLACEBO_MIN_DAYS + 1)
+        self.assertLess(placebo['expected_false_positive_rate'], 0.15)
+        self.assertEqual(placebo['tstat_p_value'], 0.0)
+        self.assertLess(placebo['real_pvalue'], ALPHA_FISHER)
+        # one row of a 2D split_statistics(...) is the 1D result
+        sales = np.array(daily_sales_np[:, 1], dtype=np.float64)
+        stats_2d = split_statistics(np.vstack((sales, sales[::-1])))
+        np.testing.assert_allclose(stats_2d['tstat'][0],
+                                   split_statistics(sales)['tstat'])
+
+    def test_evaluate_campaigns(self):
+        """
+        test parse_campaigns(...) and evaluate_campaigns(...)
+        """
+        import pandas as pd
+        campaigns = parse_campaigns('02/01/2018:02/28/2018:500,'
+                                    '04/01/2018:04/30/2018')
+        self.assertEqual(campaigns[0].expense, 500.0)
+        self.assertIsNone(campaigns[1].expense)
+        first_date = datetime.datetime(2018, 1, 1)
+        dates = []
+        for day in range(150):
+            date = first_date + datetime.timedelta(days=day)
+            in_campaign = datetime.datetime(2018, 4, 1) <= date \
+                          <= datetime.datetime(2018, 4, 30)
+            dates += [date.strftime('%m/%d/%Y')]*(3 if in_campaign
+                                                  else 1 + day % 2)
+        data_frame = pd.DataFrame({'DATE' : dates,
+                                   'AMOUNT' : [90.0]*len(dates)})
+        campaign_results = evaluate_campaigns(data_frame,
+                                              EvaluationConfig(unit_price=90.0),
+                                              campaigns, number_sims=50)
+        np.testing.assert_array_equal(campaign_results['days'], [28, 30])
+        self.assertLessEqual(campaign_results['baseline_days'], 150 - 58)
+        daily_sales_np = load_daily_sales(data_frame,
+                                          EvaluationConfig(unit_price=90.0))
+        mask_april = np.array([date.month == 4
+                               for date in daily_sales_np[:, 0]])
+        self.assertAlmostEqual(campaign_results['ave_sales'][1],
+                               daily_sales_np[mask_april, 1].mean())
+        self.assertAlmostEqual(campaign_results['lift'][1],
+                               campaign_results['ave_sales'][1]
+                               - campaign_results['baseline_sales'])
+        self.assertAlmostEqual(campaign_results['expense'][1],
+                               ANNUAL_ADV_EXPENSE*30/DAYS_PER_YEAR)
+        self.assertRaises(ValueError, evaluate_campaigns, data_frame,
+                          EvaluationConfig(unit_price=90.0),
+                          parse_campaigns('02/01/2018:03/15/2018,'
+                                          '03/01/2018:04/30/2018'))
+
+    def test_evaluate_segments(self):
+        """
+        test daily_sales_matrix(...), sim_unit_sales_by_row(...),
+        and evaluate_segments(...)
+        """
+        import pandas as pd
+        data_frame = pd.DataFrame({'DATE' : ['01/01/2018', '01/01/2018',
+                                             '01/03/2018', '01/02/2018'],
+                                   'REGION' : ['north', 'south',
+                                               'north', 'north'],
+                                   'AMOUNT' : [90.0, 180.0, 90.0, 270.0]})
+        segments, dates, sales_matrix \
+            = daily_sales_matrix(data_frame, 'REGION', EvaluationConfig())
+        self.assertEqual(list(segments), ['north', 'south'])
+        self.assertEqual(len(dates), 3)
+        np.testing.assert_array_equal(sales_matrix, [[90.0, 270.0, 90.0],
+                                                     [180.0, 0.0, 0.0]])
+
+        dist_cumsum_rows = np.array([[0.5, 1.0, 1.0], [0.1, 0.2, 0.9]])
+        rng = np.random.RandomState(SEED_VAL)
+        units = sim_unit_sales_by_row(dist_cumsum_rows, (4, 5), rng)
+        rng = np.random.RandomState(SEED_VAL)
+        rval = rng.uniform(size=(2, 4, 5))
+        for row in range(2):
+            np.testing.assert_array_equal(
+                units[row],
+                [[np.argmax(dist_cumsum_rows[row] > value) for value in values]
+                 for values in rval[row]])
+
+        rng = np.random.RandomState(SEED_VAL)
+        rows = []
+        for day in range(120):
+            date_str = (datetime.datetime(2018, 1, 1)
+                        + datetime.timedelta(days=day)).strftime('%m/%d/%Y')
+            for customer, rate in (('A', 2.0), ('B', 1.0)):
+                lift = 2.0 if customer == 'A' and day >= 60 else 1.0
+                rows += [(date_str, customer, 90.0)]*rng.poisson(rate*lift)
+        data_frame = pd.DataFrame(rows, columns=['DATE', 'CUST ID', 'AMOUNT'])
+        segment_results = evaluate_segments(data_frame,
+                                            EvaluationConfig(adv_date='03/02/2018'),
+                                            'CUST ID', number_sims=100)
+        self.assertEqual(list(segment_results['segment']), ['A', 'B'])
+        self.assertEqual(segment_results['unit_price'], 90.0)
+        self.assertLess(segment_results['pvalue'][0], ALPHA_FISHER)
+        self.assertLess(segment_results['empirical_p_value'][0], ALPHA_FISHER)
+        self.assertGreater(segment_results['pvalue'][1], ALPHA_FISHER)
+
+    def test_evaluate_panel(self):
+        """
+        test evaluate_panel(...) with a long format panel and with one
+        sales report per store
+        """
+        import pandas as pd
+        rng = np.random.RandomState(SEED_VAL)
+        rows = []
+        for day in range(100):
+            date_str = (datetime.datetime(2018, 1, 1)
+                        + datetime.timedelta(days=day)).strftime('%m/%d/%Y')
+            for store in ('S1', 'S2', 'S3'):
+                rows += [(date_str, store, 90.0)]*rng.poisson(2.0)
+        data_frame = pd.DataFrame(rows, columns=['DATE', 'STORE', 'AMOUNT'])
+        config = EvaluationConfig(adv_date='03/01/2018')
+        with tempfile.TemporaryDirectory() as panel_folder:
+            data_frame.to_csv(os.path.join(panel_folder, 'panel.csv'),
+                              index=False)
+            long_results = evaluate_panel(os.path.join(panel_folder,
+                                                       'panel.csv'),
+                                          config, number_sims=20, workers=1)
+            os.makedirs(os.path.join(panel_folder, 'stores'))
+            for store in ('S1', 'S2', 'S3'):
+                store_file = os.path.join(panel_folder, 'stores',
+                                          store + '.csv')
+                data_frame[data_frame['STORE'] == store].to_csv(store_file,
+                                                                index=False)
+            file_results = evaluate_panel(os.path.join(panel_folder, 'stores'),
+                                          config, number_sims=20, workers=1)
+        self.assertEqual(list(long_results['store']), ['S1', 'S2', 'S3'])
+        self.assertEqual(list(file_results['store']), ['S1', 'S2', 'S3'])
+        np.testing.assert_allclose(long_results['lift'], file_results['lift'])
+        np.testing.assert_allclose(long_results['empirical_p_value'],
+                                   file_results['empirical_p_value'])
+        self.assertEqual(long_results['days_no_adv'], 59)
+
+    def test_panel_statistics_shared(self):
+        """
+        test SharedArrays and panel_statistics(...) with worker processes
+        """
+        shared = SharedArrays()
+        shared.create('sales', np.arange(6.0).reshape(2, 3))
+        attached = SharedArrays.attach(shared.spec())
+        attached['sales'][1, 2] = -1.0
+        attached.close()
+        self.assertEqual(shared['sales'][1, 2], -1.0)
+        shared.close()
+
+        rng = np.random.RandomState(SEED_VAL)
+        sales_matrix = 90.0*rng.poisson(2.0, size=(5, 60)).astype(np.float32)
+        mask_adv = np.arange(60) >= 30
+        in_process = panel_statistics(sales_matrix, mask_adv, 90.0,
+                                      number_sims=20, workers=1,
+                                      batch_rows=2)
+        in_workers = panel_statistics(sales_matrix, mask_adv, 90.0,
+                                      number_sims=20, workers=2,
+                                      batch_rows=2)
+        for field in GROUP_STATISTICS_FIELDS:
+            np.testing.assert_array_equal(in_process[field],
+                                          in_workers[field])
+
+    def test_sim_unit_sales(self):
+        """
+        test the compact unit counts of sim_unit_sales(...) match
+        np.argmax(...) of each random number, also for a varied
+        distribution that decreases
+        """
+        dist_cumsum = np.array([0.2, 0.5, 0.45, 0.9, 0.98])
+        rng = np.random.RandomState(SEED_VAL)
+        unit_sales = sim_unit_sales(dist_cumsum, (30, 7), rng)
+        self.assertEqual(unit_sales.dtype, np.uint8)
+        rng = np.random.RandomState(SEED_VAL)
+        rval = rng.uniform(size=(30, 7))
+        np.testing.assert_array_equal(unit_sales,
+                                      [[np.argmax(dist_cumsum > value)
+                                        for value in values]
+                                       for values in rval])
+        mean, var = sim_sales_mean_var(unit_sales, 90.0)
+        np.testing.assert_allclose(mean, (90.0*unit_sales).mean(axis=1))
+        np.testing.assert_allclose(var, (90.0*unit_sales).var(axis=1, ddof=1))
+
+    def test_streaming_accumulators(self):
+        """
+        test RunningStats, FixedHistogram, and TDigest merged from
+        batches match NumPy on all the values, and the streaming
+        projections do not depend on the number of workers
+        """
+        rng = np.random.RandomState(SEED_VAL)
+        values = rng.standard_normal(100000)
+        edges = np.linspace(-3.0, 3.0, 21)
+        parts = []
+        for batch in np.array_split(values, 4):
+            parts.append((RunningStats(), FixedHistogram(edges), TDigest()))
+            for sub_batch in np.array_split(batch, 10):
+                for accumulator in parts[-1]:
+                    accumulator.update(sub_batch)
+        stats, hist, digest = parts[0]
+        for other_stats, other_hist, other_digest in parts[1:]:
+            stats.merge(other_stats)
+            hist.merge(other_hist)
+            digest.merge(other_digest)
+        self.assertEqual(stats.n, values.size)
+        self.assertAlmostEqual(stats.mean, values.mean())
+        self.assertAlmostEqual(stats.var, values.var(ddof=1))
+        np.testing.assert_array_equal(hist.counts, np.histogram(values, edges)[0])
+        self.assertEqual(hist.underflow, (values < -3.0).sum())
+        self.assertEqual(hist.overflow, (values > 3.0).sum())
+        quantiles = (0.05, 0.5, 0.95)
+        np.testing.assert_allclose(digest.quantile(quantiles),
+                                   np.quantile(values, quantiles), atol=0.03)
+        self.assertAlmostEqual(digest.cdf(0.0), (values < 0.0).mean(), places=2)
+
+        dist_h = np.array([0.3, 0.4, 0.2, 0.1])
+        y_err = np.full(4, 0.01)
+        distributions = (dist_h.cumsum(), y_err, dist_h.cumsum(), y_err)
+        totals = [project_annual_sales_streaming(*distributions, 90.0,
+                                                 number_sims=3000,
+                                                 workers=workers,
+                                                 verbose=False,
+                                                 task_sims=1000)
+                  for workers in (1, 2)]
+        summaries = [total.summary() for total in totals]
+        self.assertEqual(totals[0].n_sims, 3000)
+        self.assertEqual(summaries[0]['expected_profit_increase'],
+                         summaries[1]['expected_profit_increase'])
+        self.assertEqual(summaries[0]['loss_counts'], summaries[1]['loss_counts'])
+        np.testing.assert_array_equal(summaries[0]['histograms']['profit_increase'][0],
+                                      summaries[1]['histograms']['profit_increase'][0])
+
+    def test_exact_projection(self):
+        """
+        test the exact engine matches direct convolutions for a few
+        days and the simulation engine for a year
+        """
+        dist_h = np.array([0.3, 0.4, 0.2, 0.1])
+        dist_cumsum = dist_h.cumsum()
+        y_err = np.zeros(4)
+        exact = exact_projection(dist_cumsum, y_err, dist_cumsum, y_err,
+                                 5.0, number_varied=0, year_days=5)
+        annual_pmf = np.ones(1)
+        for day in range(5):
+            annual_pmf = np.convolve(annual_pmf, dist_h)
+        np.testing.assert_allclose(exact['sales_adv'].values, np.arange(16))
+        np.testing.assert_allclose(exact['sales_adv'].probs, annual_pmf,
+                                   atol=1e-12)
+        increase = exact['sales_increase']
+        np.testing.assert_allclose(increase.values/DAYS_PER_YEAR,
+                                   np.arange(-15, 16))
+        np.testing.assert_allclose(increase.probs,
+                                   np.convolve(annual_pmf, annual_pmf[::-1]),
+                                   atol=1e-12)
+
+        dist_adv = np.array([0.2, 0.4, 0.25, 0.15])
+        y_err = np.full(4, 0.01)
+        exact = exact_projection(dist_adv.cumsum(), y_err, dist_cumsum, y_err,
+                                 90.0, number_varied=2000,
+                                 rng=np.random.RandomState(SEED_VAL + 1))
+        summary = exact_projection_summary(exact, 90.0, number_sims=2000,
+                                           number_varied=2000)
+        ave_sales_no_adv, ave_sales_adv, ave_sales_no_adv_test \
+            = project_annual_sales(dist_adv.cumsum(), y_err, dist_cumsum, y_err,
+                                   90.0, number_sims=2000,
+                                   rng=np.random.RandomState(SEED_VAL),
+                                   verbose=False)
+        agreement = engine_agreement(summary, ave_sales_no_adv, ave_sales_adv,
+                                     90.0)
+        self.assertTrue(agreement['agree'])
+        # the simulation check is only for the exact engine
+        with self.assertRaises(ValueError):
+            evaluate_stages(None, EvaluationConfig(engine_check=100), None,
+                            None, None, None, None)
+
+    def test_import_time(self):
+        """
+        test the cold start import of this program does not import
+        the heavy libraries (LAZY_IMPORTS); an import slower than
+        IMPORT_TIME_LIMIT_SECS only warns since the time depends on
+        the machine and its load
+        """
+        program_folder = os.path.dirname(os.path.abspath(__file__))
+        code = ("import json, sys, time\n"
+                "t_start = time.perf_counter()\n"
+                "import eval_adv\n"
+                "elapsed = time.perf_counter() - t_start\n"
+                "loaded = [name for name in eval_adv.LAZY_IMPORTS "
+                "if name in sys.modules]\n"
+                "print(json.dumps([elapsed, loaded]))\n")
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         cwd=program_folder)
+        elapsed, loaded = json.loads(output.decode().splitlines()[-1])
+        self.assertEqual(loaded, [])
+        if elapsed > IMPORT_TIME_LIMIT_SECS:
+            warnings.warn("import took %.2f seconds (limit %.2f seconds)"
+                          % (elapsed, IMPORT_TIME_LIMIT_SECS))
+
 # module classes
 class SalesStats:
     """
@@ -341,6 +1049,7 @@ class SalesStats:
                  input_file=None,
                  empirical_p_value=None,
                  expected_profit_increase=None):
+        import scipy.stats as st
         self.mask_no_adv = mask_no_adv
         self.mask_adv = ~mask_no_adv
         # compute average daily sales for two periods
@@ -395,6 +1104,26 @@ class SalesStats:
         self.empirical_pvalue = np.min([p_low, p_hi])
         self.expected_profit_increase = expected_profit_increase
         # end SalesStats.__init__(...)
+
+    def to_dict(self):
+        """
+        sales statistics as a dictionary for the results files
+        (masks and Welch's t histogram are reported separately)
+        """
+        return {'input_file' : self.input_file,
+                'ave_daily_sales_no_adv' : self.ave_daily_sales_no_adv,
+                'ave_daily_sales_adv' : self.ave_daily_sales_adv,
+                'std_daily_sales_no_adv' : self.std_daily_sales_no_adv,
+                'std_daily_sales_adv' : self.std_daily_sales_adv,
+                'days_no_adv' : int(self.mask_no_adv.sum()),
+                'days_adv' : int(self.mask_adv.sum()),
+                'tstat' : self.tstat,
+                'pvalue' : self.pvalue,
+                'coeff_of_determination' : self.coeff_of_determination,
+                'empirical_pvalue' : self.empirical_pvalue,
+                'empirical_p_value' : self.empirical_p_value,
+                'expected_profit_increase' : self.expected_profit_increase}
+
     def __str__(self):
         text_str = "Average Daily Sales with Advertising: " \
                     + str(self.ave_daily_sales_adv) + "\n"
@@ -418,9 +1147,12 @@ SALES_TYPE_HEADER_DEFAULT = '<INFER SALES TYPE HEADER>'
 SALES_TYPE_VALUE_DEFAULT = ''
 UNIT_COST_DEFAULT = 0.0
 LAYERS_DEFAULT = False  # no layers by default
+METRICS_TEXTFILE_DEFAULT = ''  # no Prometheus textfile metrics
+STATSD_ADDRESS_DEFAULT = ''  # no StatsD metrics
 
 # named tuple for the GUI Configuration parameters
 # set in Settings Dialog
+# (defaults for fields added later so older settings shelf files load)
 AdEvaluatorSettings = namedtuple('AdEvaluatorSettings',
                                  # single string with spaces between names
                                  'annual_adv_expense '
@@ -435,7 +1167,11 @@ AdEvaluatorSettings = namedtuple('AdEvaluatorSettings',
                                  'unit_cost '
                                  'block '
                                  'layers '
-                                 'bins')
+                                 'bins '
+                                 'metrics_textfile '
+                                 'statsd_address',
+                                 defaults=(METRICS_TEXTFILE_DEFAULT,
+                                           STATSD_ADDRESS_DEFAULT))
 
 def save_settings():
     """
@@ -477,7 +1213,9 @@ def reset():
                                     UNIT_COST_DEFAULT,
                                     BLOCK_DEFAULT,
                                     LAYERS_DEFAULT,
-                                    BINS_DEFAULT)
+                                    BINS_DEFAULT,
+                                    METRICS_TEXTFILE_DEFAULT,
+                                    STATSD_ADDRESS_DEFAULT)
 
     # end reset()
 
@@ -531,6 +1269,8 @@ class SettingsDialog:
     class for program settings and configuration
     """
     def __init__(self, parent):
+        from tkinter import Toplevel, IntVar, END
+        from tkinter.ttk import Button, Entry, Label, Checkbutton
         global _settings
         global _b_load_settings
 
@@ -665,6 +1405,7 @@ class SettingsDialog:
         """
         update the dialog
         """
+        from tkinter import END
         # annual advertising expense
         # insert default value as text
         self.adv_expense_entry_box.delete(0, "end")
@@ -835,10 +1576,16 @@ def plot_sales_data(input_file,
                     plot_duration_secs,
                     output_folder,
                     show_ma=True,
-                    show_period_average=True):
+                    show_period_average=True,
+                    block=False,
+                    detail_level=DETAIL_LEVEL_DEFAULT):
     """
     plot daily sales data with optional moving average and period averages
+
+    RETURNS: the figure
     """
+    import matplotlib.dates as mdates
+    plt = import_pyplot()
 
     if not isinstance(input_file, str):
         raise TypeError(debug_prefix()
@@ -861,16 +1608,9 @@ def plot_sales_data(input_file,
     parts = base_file_name.split('.')
     file_stem = parts[0]
 
-    # compute moving average of daily sales
-    tmp1 = daily_sales_np[:, 1].ravel()
-    #print("tmp1.shape", tmp1.shape)
-    tmp2 = np.ones((ma_period_days, 1)).ravel()/float(ma_period_days)
-    #print("tmp2.shape", tmp2.shape)
-
     # compute moving (aka running) average of daily
     # sales of 30 day period
-    daily_sales_ma = np.convolve(tmp1, tmp2, 'same')
-    #print("daily_sales_ma.shape", daily_sales_ma.shape)
+    daily_sales_ma = compute_moving_average(daily_sales_np, ma_period_days)
 
     # period average daily sales
     ave_daily_sales = np.zeros(daily_sales_ma.shape)
@@ -922,7 +1662,7 @@ def plot_sales_data(input_file,
     # only show Welch's T test in
     # debug mode
     #
-    if _settings.detail_level > 0:
+    if detail_level > 0:
         xlow, xhi = plt.xlim()
         delta_x = xhi - xlow
         ylow, yhi = plt.ylim()
@@ -940,9 +1680,9 @@ def plot_sales_data(input_file,
     ax = ax_list[0]
 
     # format the ticks
-    ax.xaxis.set_major_locator(months)
-    ax.xaxis.set_major_formatter(yearsFmt)
-    ax.xaxis.set_minor_locator(mondays)
+    ax.xaxis.set_major_locator(mdates.MonthLocator())  # every month
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
+    ax.xaxis.set_minor_locator(mdates.WeekdayLocator())
     ax.format_xdata = mdates.DateFormatter('%Y-%m-%d')
 
     ax.grid(True)
@@ -951,7 +1691,7 @@ def plot_sales_data(input_file,
     # axes up to make room for them
     figure_sales.autofmt_xdate()
 
-    if _settings.block:
+    if block:
         plt.show()
     else:
         plt.ion()
@@ -972,21 +1712,29 @@ def plot_sales_data(input_file,
         ave_suffix = ''
 
     image_file = file_stem + ma_suffix + ave_suffix + ".jpg"
-    print("saving figure to", image_file)
-    figure_sales.savefig(output_folder + os.sep + image_file)
+    if not output_folder is None:
+        print("saving figure to", image_file)
+        figure_sales.savefig(output_folder + os.sep + image_file)
 
-    return daily_sales_ma  # return the moving average
+    return figure_sales
     # end plot_sales_data(...)
 
 
-def plot_ave_hist(ave_sales_increase_diff,
+def plot_ave_hist(bin_values,
+                  bin_edges,
                   input_file,
                   output_folder,
                   title_str='AVERAGE DAILY SALES',
-                  plot_duration_secs=2.0):
+                  plot_duration_secs=2.0,
+                  block=False):
     """
     plot histogram of the average sales from the simulations
+
+    ARGUMENTS: bin_values, bin_edges -- histogram of the simulations
+               from histogram_simulations(...)
     """
+    from matplotlib.ticker import FuncFormatter
+    plt = import_pyplot()
 
     if not isinstance(input_file, str):
         raise TypeError(debug_prefix()
@@ -998,7 +1746,7 @@ def plot_ave_hist(ave_sales_increase_diff,
                         + " title_str is type "
                         + str(type(title_str)))
 
-    if not isinstance(output_folder, str):
+    if not isinstance(output_folder, (str, type(None))):
         raise TypeError(debug_prefix()
                         + " output_folder is type "
                         + str(type(output_folder)))
@@ -1009,10 +1757,7 @@ def plot_ave_hist(ave_sales_increase_diff,
     file_stem = parts[0]
 
     fig_ave_hist = plt.figure(figsize=(12, 9))
-    bin_values, \
-        bin_edges, \
-        patches = plt.hist(ave_sales_increase_diff,
-                           bins=_settings.bins)
+    plot_histogram_bins(bin_values, bin_edges)
     plt.title(title_str)
     plt.xlabel('DOLLARS')
     plt.ylabel('NUMBER OF SIMULATIONS')
@@ -1023,7 +1768,7 @@ def plot_ave_hist(ave_sales_increase_diff,
     formatter = FuncFormatter(currency)
     ax.xaxis.set_major_formatter(formatter)
 
-    if _settings.block:
+    if block:
         plt.show()
     else:
         plt.ion()
@@ -1035,11 +1780,12 @@ def plot_ave_hist(ave_sales_increase_diff,
     image_file = file_stem \
                  + "_sales_projection_" \
                  + suffix + ".jpg"
-    print("saving sales projection figure to", image_file)
-    fig_ave_hist.savefig(output_folder
-                            + os.sep
-                            + image_file)
-    return bin_values, bin_edges
+    if not output_folder is None:
+        print("saving sales projection figure to", image_file)
+        fig_ave_hist.savefig(output_folder
+                                + os.sep
+                                + image_file)
+    return fig_ave_hist
     # end plot_ave_hist(...)
 
 def plot_diff_risk(profit_edges_no_adv,
@@ -1058,11 +1804,14 @@ def plot_diff_risk(profit_edges_no_adv,
                    suffix='',
                    show_no_adv=True,
                    show_with_adv=True,
-                   show_ave_with_adv=True):
+                   show_ave_with_adv=True,
+                   block=False):
     """
     plot overlay of profit projections with
     and without advertising
     """
+    from matplotlib.ticker import FuncFormatter
+    plt = import_pyplot()
     if not isinstance(input_file, str):
         raise TypeError(debug_prefix()
                         + " input_file is type "
@@ -1175,7 +1924,7 @@ def plot_diff_risk(profit_edges_no_adv,
     formatter = FuncFormatter(currency)
     ax.xaxis.set_major_formatter(formatter)
 
-    if _settings.block:
+    if block:
         plt.show()
     else:
         plt.ion()
@@ -1186,8 +1935,10 @@ def plot_diff_risk(profit_edges_no_adv,
     image_file = file_stem \
                  + "_sales_projection" \
                  + suffix + ".jpg"
-    print("saving sales projection figure to", image_file)
-    fig_projections.savefig(output_folder + os.sep + image_file)
+    if not output_folder is None:
+        print("saving sales projection figure to", image_file)
+        fig_projections.savefig(output_folder + os.sep + image_file)
+    return fig_projections
     # END plot_diff_risk(...)  MAIN PLOT
 
 
@@ -1204,10 +1955,13 @@ def plot_projections(sales_edges,
                      seed_val,
                      plot_duration_secs,
                      output_folder,
-                     suffix=''):
+                     suffix='',
+                     block=False):
     """
     plot the sales/profit projections
     """
+    from matplotlib.ticker import FuncFormatter
+    plt = import_pyplot()
 
     if not isinstance(input_file, str):
         raise TypeError(debug_prefix()
@@ -1281,7 +2035,7 @@ def plot_projections(sales_edges,
     formatter = FuncFormatter(currency)
     ax.xaxis.set_major_formatter(formatter)
 
-    if _settings.block:
+    if block:
         plt.show()
     else:
         plt.ion()
@@ -1290,8 +2044,10 @@ def plot_projections(sales_edges,
         plt.pause(plot_duration_secs)  # sales and profits projections histograms
 
     image_file = file_stem + "_sales_projection" + suffix + ".jpg"
-    print("saving sales projection figure to", image_file)
-    fig_projections.savefig(output_folder + os.sep + image_file)
+    if not output_folder is None:
+        print("saving sales projection figure to", image_file)
+        fig_projections.savefig(output_folder + os.sep + image_file)
+    return fig_projections
     # end plot_projections(....)
 
 
@@ -1302,6 +2058,7 @@ def new_file():
 
 def open_file(event=None):
     """ open a sales report file """
+    from tkinter import filedialog
     global file_name
     global root
 
@@ -1321,10 +2078,387 @@ def open_file(event=None):
         root.title("AdEvaluator\u2122 (" + file_name_display + ")")
     print(file_name)  # open_file()
 
+# bytes indexed at a time by LineIndex
+INDEX_CHUNK_BYTES = 16*1024*1024
+# rows shown by SalesReportViewer
+VIEW_ROWS = 24
+
+class LineIndex:
+    """
+    line offset index of a memory mapped text (CSV) file
+
+    The index is built in a background thread so the first lines can
+    be shown at once; the lines indexed so far can be read while the
+    index is built.  Only the lines read are decoded, so a large sales
+    report needs little memory.  close() stops the index building and
+    any find_date(...) search.
+    """
+
+    def __init__(self, file_path, background=True):
+        import mmap
+
+        self.file_path = file_path
+        self.file = open(file_path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        if self.size > 0:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.data = b''  # mmap of empty file fails
+        self.lock = threading.Lock()
+        self.complete = threading.Event()
+        self.cancel_event = threading.Event()  # set by close()
+        # line start offsets in chunks (NumPy arrays)
+        self.offsets = [np.zeros(1 if self.size > 0 else 0, dtype=np.int64)]
+        self.counts = [self.offsets[0].size]  # cumulative line counts
+        if background:
+            self.thread = threading.Thread(target=self.build, daemon=True)
+            self.thread.start()
+        else:
+            self.thread = None
+            self.build()
+
+    def build(self):
+        """
+        find the line starts one chunk at a time
+        """
+        position = 0
+        while position < self.size:
+            if self.cancel_event.is_set():
+                return
+            chunk_end = min(position + INDEX_CHUNK_BYTES, self.size)
+            chunk = np.frombuffer(self.data, dtype=np.uint8,
+                                  count=chunk_end - position,
+                                  offset=position)
+            starts = np.flatnonzero(chunk == ord('\n')) + position + 1
+            # no empty line after the final newline
+            starts = starts[starts < self.size]
+            del chunk  # the mmap cannot close while a view exists
+            with self.lock:
+                self.offsets.append(starts)
+                self.counts.append(self.counts[-1] + starts.size)
+            position = chunk_end
+        self.complete.set()
+
+    @property
+    def line_count(self):
+        """
+        number of lines indexed so far
+        """
+        with self.lock:
+            return self.counts[-1]
+
+    def line_offset(self, line_number):
+        """
+        offset of the start of a line (line_number from 0)
+        """
+        with self.lock:
+            chunk_index = int(np.searchsorted(self.counts, line_number, side='right'))
+            offsets = self.offsets[chunk_index]
+            first_line = self.counts[chunk_index - 1] if chunk_index > 0 else 0
+        return int(offsets[line_number - first_line])
+
+    def line(self, line_number):
+        """
+        text of a line without the line ending
+        """
+        if line_number < 0 or line_number >= self.line_count:
+            raise IndexError(debug_prefix() + "line " + str(line_number)
+                             + " not indexed (" + str(self.line_count)
+                             + " lines indexed)")
+        start = self.line_offset(line_number)
+        if line_number + 1 < self.line_count:
+            end = self.line_offset(line_number + 1)
+        else:
+            end = self.data.find(b'\n', start)
+            if end < 0:
+                end = self.size
+        return self.data[start:end].decode('utf-8', errors='replace').rstrip('\r\n')
+
+    def lines(self, first_line, number_lines):
+        """
+        list of the text of number_lines lines starting at first_line
+        (fewer at the end of the lines indexed so far)
+        """
+        last_line = min(first_line + number_lines, self.line_count)
+        return [self.line(line_number)
+                for line_number in range(max(0, first_line), last_line)]
+
+    def header_frame(self, number_rows=100):
+        """
+        Pandas DataFrame with the header row and first rows
+        (for get_date_refs(...) and get_amount_refs(...))
+        """
+        import pandas as pd
+        text = "\n".join(self.lines(0, number_rows + 1))
+        return pd.read_csv(io.StringIO(text))
+
+    def row_date(self, line_number, date_index):
+        """
+        date of the sales report row on a line (None if not a date)
+        """
+        from dateutil.parser import parse
+        try:
+            fields = next(csv.reader([self.line(line_number)]))
+            return parse(fields[date_index])
+        except (IndexError, ValueError, OverflowError, StopIteration):
+            return None
+
+    def find_date(self, target_date, date_index, first_line=1):
+        """
+        first line with a date on or after target_date (rows sorted by
+        date in ascending order) or on or before target_date (descending
+        order); returns None if no such line
+
+        uses a binary search of the index if the dates are in order,
+        otherwise a linear scan; lines without a date (blank lines,
+        totals) are skipped.  Returns None if close() stops the search.
+
+        Searches a large file for a while, so the GUI calls it from a
+        worker thread (see SalesReportViewer.find_date(...)).
+        """
+        while not self.complete.wait(POLL_INTERVAL_MSECS/1000.0):
+            if self.cancel_event.is_set():
+                return None
+        n_lines = self.line_count
+        if n_lines <= first_line:
+            return None
+
+        # check the order of the dates on a sample of lines
+        sample = np.unique(np.linspace(first_line, n_lines - 1, 64).astype(int))
+        dates = [date for date in (self.row_date(line_number, date_index)
+                                   for line_number in sample)
+                 if not date is None]
+        ascending = all(a <= b for a, b in zip(dates[:-1], dates[1:]))
+        descending = all(a >= b for a, b in zip(dates[:-1], dates[1:]))
+
+        def reached(date):
+            if descending and not ascending:
+                return date <= target_date
+            return date >= target_date
+
+        if ascending or descending:
+            low, high = first_line, n_lines
+            while low < high:
+                if self.cancel_event.is_set():
+                    return None
+                middle = (low + high)//2
+                # first line with a date from the middle on
+                probe = middle
+                date = self.row_date(probe, date_index)
+                while date is None and probe + 1 < high:
+                    probe += 1
+                    date = self.row_date(probe, date_index)
+                if date is None or reached(date):
+                    high = middle
+                else:
+                    low = probe + 1
+            # the lines without a date before the line found
+            while low < n_lines and self.row_date(low, date_index) is None:
+                low += 1
+            return low if low < n_lines else None
+
+        for line_number in range(first_line, n_lines):
+            if self.cancel_event.is_set():
+                return None
+            date = self.row_date(line_number, date_index)
+            if not date is None and reached(date):
+                return line_number
+        return None  # find_date(...)
+
+    def close(self):
+        """
+        stop building the index and searching, and close the file
+        """
+        self.cancel_event.set()
+        if not self.thread is None:
+            self.thread.join()  # at most one more chunk
+        if self.size > 0:
+            self.data.close()
+        self.file.close()
+# end class LineIndex
+
+class SalesReportViewer:
+    """
+    paged viewer for large sales reports
+
+    Shows VIEW_ROWS rows of the file at a time from a LineIndex, so
+    opening a large sales report is instant.  The Go To entry jumps to
+    a row number or a date; a date is searched in a worker thread
+    which sends the line found through a queue polled by the Tk main
+    thread (like EvaluationRunner).  The date and amount columns are found
+    with get_date_refs(...) and get_amount_refs(...).
+    """
+
+    def __init__(self, parent, input_file, settings=None):
+        from tkinter import Toplevel, Text, RIGHT, LEFT, TOP, X, Y, BOTH
+        from tkinter.ttk import Button, Entry, Frame, Label, Scrollbar
+
+        self.index = LineIndex(input_file)
+        self.searches = queue.Queue()  # (date text, line) of date searches
+        self.closed = False
+        self.top_line = 1  # first row shown (line 0 is the header)
+        self.date_index = None
+        self.header_text = self.index.line(0) if self.index.line_count else ''
+        header_info = ''
+        try:
+            data_frame = self.index.header_frame()
+            date_tag, self.date_index \
+                = get_date_refs(data_frame,
+                                None if settings is None else settings.date_tag)
+            amount_tag, amount_index \
+                = get_amount_refs(data_frame,
+                                  None if settings is None else settings.amount_tag)
+            header_info = "DATE COLUMN: " + str(date_tag) \
+                          + "  AMOUNT COLUMN: " + str(amount_tag)
+        except Exception as general_exception:
+            header_info = "UNABLE TO INFER COLUMNS: " \
+                          + print_to_string(general_exception)
+
+        self.top = Toplevel(parent)
+        self.top.title(os.path.basename(input_file))
+        self.top.protocol("WM_DELETE_WINDOW", self.close)
+
+        goto_frame = Frame(self.top)
+        goto_frame.pack(side=TOP, fill=X)
+        Label(goto_frame, text="Go to row or date:").pack(side=LEFT)
+        self.goto_entry = Entry(goto_frame, width=20)
+        self.goto_entry.pack(side=LEFT)
+        self.goto_entry.bind('<Return>', self.go_to)
+        Button(goto_frame, text="Go", command=self.go_to).pack(side=LEFT)
+        self.status_label = Label(goto_frame, text='')
+        self.status_label.pack(side=LEFT)
+
+        Label(self.top, text=header_info, anchor='w').pack(side=TOP, fill=X)
+        Label(self.top, text=self.header_text, anchor='w',
+              font=('Courier', 10, 'bold')).pack(side=TOP, fill=X)
+
+        self.scroll_bar = Scrollbar(self.top, command=self.scroll)
+        self.text_widget = Text(self.top, height=VIEW_ROWS, width=80,
+                                wrap='none')
+        self.scroll_bar.pack(side=RIGHT, fill=Y)
+        self.text_widget.pack(side=LEFT, fill=BOTH, expand=1)
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.text_widget.bind(sequence, self.mouse_wheel)
+
+        self.render()
+        self.top.after(POLL_INTERVAL_MSECS, self.poll_index)
+
+    def row_count(self):
+        return max(0, self.index.line_count - 1)  # without the header
+
+    def render(self):
+        """
+        show the rows in the window
+        """
+        from tkinter import END
+        max_top = max(1, self.index.line_count - VIEW_ROWS)
+        self.top_line = min(max(1, self.top_line), max_top)
+        lines = self.index.lines(self.top_line, VIEW_ROWS)
+        self.text_widget.config(state='normal')
+        self.text_widget.delete('1.0', END)
+        self.text_widget.insert(END, "\n".join(
+            "%8d  %s" % (self.top_line + offset, line)
+            for offset, line in enumerate(lines)))
+        self.text_widget.config(state='disabled')
+        n_rows = max(1, self.row_count())
+        self.scroll_bar.set((self.top_line - 1)/n_rows,
+                            min(1.0, (self.top_line - 1 + VIEW_ROWS)/n_rows))
+
+    def scroll(self, *args):
+        """
+        scroll bar command
+        """
+        if args[0] == 'moveto':
+            self.top_line = 1 + int(float(args[1])*self.row_count())
+        elif args[0] == 'scroll':
+            step = VIEW_ROWS if args[2] == 'pages' else 1
+            self.top_line += int(args[1])*step
+        self.render()
+
+    def mouse_wheel(self, event):
+        if event.num == 4 or getattr(event, 'delta', 0) > 0:
+            self.top_line -= 3
+        else:
+            self.top_line += 3
+        self.render()
+        return 'break'
+
+    def go_to(self, event=None):
+        """
+        jump to the row number or date in the Go To entry
+        """
+        from dateutil.parser import parse
+        text = self.goto_entry.get().strip()
+        if text.isdigit():
+            self.top_line = int(text)
+        elif not self.date_index is None:
+            try:
+                target_date = parse(text)
+            except (ValueError, OverflowError):
+                self.status_label.config(text="date " + text + " not found")
+                return
+            self.status_label.config(text="searching for " + text + "...")
+            threading.Thread(target=self.find_date,
+                             args=(text, target_date),
+                             daemon=True).start()
+            self.top.after(POLL_INTERVAL_MSECS, self.poll_search)
+            return
+        self.render()
+
+    def find_date(self, text, target_date):
+        """
+        search for the line of a date (worker thread)
+        """
+        try:
+            line_number = self.index.find_date(target_date, self.date_index)
+        except ValueError:
+            line_number = None  # the file was closed
+        self.searches.put((text, line_number))
+
+    def poll_search(self):
+        """
+        jump to the line found by a date search (main thread)
+        """
+        if self.closed:
+            return
+        try:
+            text, line_number = self.searches.get_nowait()
+        except queue.Empty:
+            self.top.after(POLL_INTERVAL_MSECS, self.poll_search)
+            return
+        if line_number is None:
+            self.status_label.config(text="date " + text + " not found")
+            return
+        self.status_label.config(text='')
+        self.top_line = line_number
+        self.render()
+
+    def poll_index(self):
+        """
+        update the row count while the index is built
+        """
+        if self.closed:
+            return
+        if self.index.complete.is_set():
+            self.status_label.config(text=str(self.row_count()) + " rows")
+            self.render()
+        else:
+            self.status_label.config(text="indexing... "
+                                     + str(self.row_count()) + " rows")
+            self.top.after(POLL_INTERVAL_MSECS, self.poll_index)
+
+    def close(self):
+        self.closed = True
+        self.top.destroy()
+        self.index.close()
+# end class SalesReportViewer
+
 def view_file(event=None):
     """
     show contents of sales report file selected
     """
+    from tkinter import Toplevel, Text, END, RIGHT, LEFT, Y
+    from tkinter.ttk import Scrollbar
     global file_name
     global root
 
@@ -1333,9 +2467,9 @@ def view_file(event=None):
     elif not file_name:
         contents = "No sales report file selected! <file_name is empty string>"
     elif os.path.exists(file_name):
-        # read file
-        with open(file_name) as sales_report:
-            contents = sales_report.read()
+        # paged viewer (the sales report may be very large)
+        SalesReportViewer(root, file_name, _settings)
+        return
     else:
         contents = "FILE " + str(file_name) + " NOT FOUND\n"
 
@@ -1351,6 +2485,8 @@ def view_file(event=None):
 
 def show_help(event=None):
     """ show help message in GUI"""
+    from tkinter import Toplevel, Text, END, RIGHT, LEFT, Y
+    from tkinter.ttk import Scrollbar
     popup_win = Toplevel()
     popup_win.title("Help -- AdEvaluator\u2122")
     scroll_bar = Scrollbar(popup_win)
@@ -1408,6 +2544,8 @@ def show_glossary(event=None):
     """
     show glossary of technical terms
     """
+    from tkinter import Toplevel, Text, END, RIGHT, LEFT, Y
+    from tkinter.ttk import Scrollbar
     popup_win = Toplevel()
     popup_win.title("Glossary -- AdEvaluator\u2122")
     scroll_bar = Scrollbar(popup_win)
@@ -1424,6 +2562,8 @@ def show_disclaimer(event=None):
     """
     show the disclaimer message
     """
+    from tkinter import Toplevel, Text, END, RIGHT, LEFT, Y
+    from tkinter.ttk import Scrollbar
     popup_win = Toplevel()
     popup_win.title("Disclaimer -- AdEvaluator\u2122")
     scroll_bar = Scrollbar(popup_win)
@@ -1439,6 +2579,8 @@ def show_disclaimer(event=None):
 
 def show_usage(event=None):
     """ show usage message in GUI"""
+    from tkinter import Toplevel, Text, END, RIGHT, LEFT, Y
+    from tkinter.ttk import Scrollbar
     popup_win = Toplevel()
     popup_win.title("Usage -- AdEvaluator\u2122")
     scroll_bar = Scrollbar(popup_win)
@@ -1453,6 +2595,8 @@ def show_usage(event=None):
 
 def show_license(event=None):
     """ show license in GUI """
+    from tkinter import Toplevel, Text, END, RIGHT, LEFT, Y
+    from tkinter.ttk import Scrollbar
     popup_win = Toplevel()
     popup_win.title("License -- AdEvaluator\u2122")
     scroll_bar = Scrollbar(popup_win)
@@ -1467,6 +2611,7 @@ def show_license(event=None):
 
 def open_website(event=None):
     """ launch AdEvaluator website """
+    from tkinter import messagebox
     if sys.platform == "win32":
         os.system("rundll32 url.dll,FileProtocolHandler "
                   + ADRATER_URL)
@@ -1486,6 +2631,7 @@ def open_website(event=None):
 
 def about_program(event=None):
     """ about program message """
+    from tkinter import messagebox
     messagebox.showinfo("About AdEvaluator\u2122",
                         "AdEvaluator\u2122 \n"
                         + "Project Version: " + PROJECT_VERSION +
@@ -1495,13 +2641,252 @@ def about_program(event=None):
                         "Copyright (C) 2018 by John F. "
                         "McGowan, Ph.D. (ceo@mathematical-software.com)\n")
 
+def settings_config(settings, **fields):
+    """
+    EvaluationConfig from the AdEvaluatorSettings (GUI settings)
+
+    ARGUMENTS: settings -- AdEvaluatorSettings
+               fields -- other EvaluationConfig fields
+
+    RETURNS: EvaluationConfig
+    """
+    unit_price = None  # infer unit price
+    if settings.unit_price != INFER_PRICE_TAG:
+        unit_price = float(settings.unit_price)
+
+    adv_date = ADV_START_DATE
+    if isinstance(settings.adv_date, str):
+        adv_date = settings.adv_date
+
+    unit_cost = UNIT_COST_DEFAULT
+    if settings.unit_cost:
+        unit_cost = float(settings.unit_cost)
+
+    sales_type_value = SALES_TYPE_VALUE_DEFAULT
+    if settings.sales_type_value:
+        sales_type_value = settings.sales_type_value
+
+    return EvaluationConfig(annual_adv_expense=float(settings.annual_adv_expense),
+                            unit_price=unit_price,
+                            unit_cost=unit_cost,
+                            number_sims=int(settings.number_sims),
+                            adv_date=adv_date,
+                            date_tag=settings.date_tag,
+                            amount_tag=settings.amount_tag,
+                            sales_type_tag=settings.sales_type_tag,
+                            sales_type_value=sales_type_value,
+                            bins=settings.bins,
+                            detail_level=int(settings.detail_level),
+                            block=bool(settings.block),
+                            layers=bool(settings.layers),
+                            **fields)  # settings_config(...)
+
+class EvaluationRunner:
+    """
+    run an evaluation for the GUI in a background thread
+
+    The worker thread never calls Tk.  It sends progress messages
+    through a queue which the Tk main thread polls with root.after(...)
+    every POLL_INTERVAL_MSECS.  The figures are made on the main
+    thread when the evaluation finishes.  The Cancel button stops the
+    simulations at the next batch of PROGRESS_BATCH_SIMS simulations.
+
+    The results panel shows the expected profit change, the chance of
+    a loss, and the histogram of the profit change with confidence
+    intervals from the simulations completed so far, refined in place
+    as more simulations complete.
+    """
+
+    HIST_WIDTH = 600  # results panel histogram size in pixels
+    HIST_HEIGHT = 100
+
+    def __init__(self, parent, input_file, config):
+        from tkinter import Canvas, IntVar, HORIZONTAL, X
+        from tkinter.ttk import Button, Label, Progressbar
+
+        self.parent = parent
+        self.input_file = input_file
+        self.config = config
+        self.metrics = settings_metrics(_settings)
+        self.messages = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.running = True
+
+        self.progress_var = IntVar()
+        self.pbar = Progressbar(parent,
+                                variable=self.progress_var,
+                                maximum=config.number_sims,
+                                orient=HORIZONTAL,
+                                mode='determinate')
+        self.pbar.pack(fill=X, expand=1)
+        self.cancel_button = Button(parent, text="Cancel",
+                                    command=self.cancel)
+        self.cancel_button.pack()
+
+        # results panel
+        self.results_label = Label(parent, justify='left',
+                                   text="simulating sales...")
+        self.results_label.pack()
+        self.hist_canvas = Canvas(parent,
+                                  width=self.HIST_WIDTH,
+                                  height=self.HIST_HEIGHT,
+                                  background='white')
+        self.hist_canvas.pack()
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.parent.after(POLL_INTERVAL_MSECS, self.poll)
+
+    def run(self):
+        """
+        evaluation (worker thread)
+        """
+        try:
+            result = run_evaluation(self.input_file,
+                                    self.config,
+                                    progress=self.report_progress,
+                                    cancel=self.cancel_event,
+                                    partial_results=self.report_partial)
+            if not self.metrics is None:
+                self.metrics.record(evaluation_metrics(result))
+            self.messages.put(('done', result))
+        except EvaluationCancelled:
+            self.messages.put(('cancelled', None))
+        except Exception as general_exception:
+            if not self.metrics is None:
+                self.metrics.record(status='error')
+            self.messages.put(('error', general_exception))
+
+    def report_progress(self, n_done, number_sims):
+        """
+        progress callback for run_evaluation(...) (worker thread)
+        """
+        self.messages.put(('progress', n_done))
+
+    def report_partial(self, summary):
+        """
+        partial results callback for run_evaluation(...) (worker thread)
+        """
+        self.messages.put(('partial', summary))
+
+    def show_partial(self, summary):
+        """
+        refine the results panel with partial results (main thread)
+        """
+        profit_low, profit_high = summary['expected_profit_increase_ci']
+        loss_low, loss_high = summary['loss_probability_ci']
+        self.results_label.config(
+            text="Expected Profit Change: "
+            + locale.currency(summary['expected_profit_increase'], grouping=True)
+            + "  (95% CI " + locale.currency(profit_low, grouping=True)
+            + " to " + locale.currency(profit_high, grouping=True) + ")\n"
+            + "Chance of a Loss: %4.1f%%  (95%% CI %4.1f%% to %4.1f%%)\n"
+            % (100.0*summary['loss_probability'], 100.0*loss_low, 100.0*loss_high)
+            + str(summary['n_sims']) + " / " + str(summary['number_sims'])
+            + " SIMULATIONS")
+
+        # histogram of the profit change with error bars,
+        # losses in red
+        canvas = self.hist_canvas
+        canvas.delete('all')
+        bins = summary['profit_bins']
+        bins_err = summary['profit_bins_err']
+        edges = summary['profit_edges']
+        y_scale = (self.HIST_HEIGHT - 10)/max(1.0, np.max(bins + bins_err))
+        bar_width = self.HIST_WIDTH/bins.size
+        for bin_index in range(bins.size):
+            x_low = bin_index*bar_width
+            x_center = x_low + bar_width/2.0
+            color = 'red' if edges[bin_index + 1] <= 0.0 else 'green'
+            canvas.create_rectangle(x_low + 1, self.HIST_HEIGHT - y_scale*bins[bin_index],
+                                    x_low + bar_width - 1, self.HIST_HEIGHT,
+                                    fill=color, outline='')
+            canvas.create_line(x_center,
+                               self.HIST_HEIGHT - y_scale*(bins[bin_index]
+                                                           + bins_err[bin_index]),
+                               x_center,
+                               self.HIST_HEIGHT - y_scale*max(0.0, bins[bin_index]
+                                                              - bins_err[bin_index]))
+
+    def close(self):
+        """
+        remove the results panel (main thread)
+        """
+        self.results_label.destroy()
+        self.hist_canvas.destroy()
+
+    def cancel(self):
+        """
+        Cancel button (main thread)
+        """
+        from tkinter import DISABLED
+        self.cancel_button.config(state=DISABLED, text="Cancelling...")
+        self.cancel_event.set()
+
+    def poll(self):
+        """
+        handle messages from the worker thread (main thread)
+        """
+        from tkinter import messagebox
+
+        finished = None
+        summary = None
+        while True:
+            try:
+                kind, value = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                self.progress_var.set(value)
+            elif kind == 'partial':
+                summary = value  # only show the latest partial results
+            else:
+                finished = (kind, value)
+
+        if not summary is None:
+            self.show_partial(summary)
+
+        if finished is None:
+            self.parent.after(POLL_INTERVAL_MSECS, self.poll)
+            return
+
+        self.pbar.destroy()
+        self.cancel_button.destroy()
+        kind, value = finished
+        if kind == 'done':
+            print(value.report)
+            try:
+                value.figures = plot_evaluation(value)
+            except Exception as general_exception:
+                messagebox.showerror("AdEvaluator\u2122", debug_prefix()
+                                     + "EXCEPTION: "
+                                     + print_to_string(general_exception))
+            save_settings()
+        elif kind == 'error':
+            messagebox.showerror("AdEvaluator\u2122", debug_prefix()
+                                 + "EXCEPTION: "
+                                 + print_to_string(value))
+        else:
+            print("evaluation of", self.input_file, "cancelled")
+        self.running = False
+
+        self.parent.lift()
+        self.parent.after(1, lambda: self.parent.focus_force())
+        self.parent.geometry(GEOMETRY_STRING)
+# end class EvaluationRunner
+
+# running GUI evaluation (see eval_file(...))
+_evaluation_runner = None
+
 def eval_file(event=None):
     """
     evaluate advertising performance
     """
+    from tkinter import messagebox
     global file_name
     global root
     global _settings
+    global _evaluation_runner
 
     if file_name is None:
         messagebox.showerror("AdEvaluator\u2122",
@@ -1515,73 +2900,19 @@ def eval_file(event=None):
                              "Try File | Open Sales Report...")
         return
 
-    if os.path.exists(file_name):
-        #cmd_str = "python eval_adv.py \"" + file_name + "\""
-        #print("Executing:", cmd_str)
-        #output = subprocess.getoutput(cmd_str)
-        #print(output)
-
-        args = ['-i', file_name,
-                '-e', _settings.annual_adv_expense,
-                '-n', _settings.number_sims,
-                '-d', str(_settings.detail_level)]
-
-        if bool(_settings.block):
-            args.append('-b')
-
-        if bool(_settings.layers):
-            args.append("-l")  # layered plots for animation
-
-        # fix unit price if set in GUI
-        if _settings.unit_price != INFER_PRICE_TAG:
-            args.append("-price")
-            args.append(str(_settings.unit_price))
-
-        if not _settings.adv_date is None:
-            if isinstance(_settings.adv_date, str):
-                args.append("-adv_date")
-                args.append(str(_settings.adv_date))
-
-        if not _settings.unit_cost is None:
-            if _settings.unit_cost:
-                if _settings.unit_cost != UNIT_COST_DEFAULT:
-                    args.append("-unit_cost")
-                    args.append(str(_settings.unit_cost))
-
-        if not _settings.date_tag is None:
-            if _settings.date_tag:
-                if _settings.date_tag != DATE_HEADER_DEFAULT:
-                    args.append("-date_tag")
-                    args.append(str(_settings.date_tag))
-
-        if not _settings.amount_tag is None:
-            if _settings.amount_tag:
-                if _settings.amount_tag != AMOUNT_HEADER_DEFAULT:
-                    args.append("-amount_tag")
-                    args.append(str(_settings.amount_tag))
-
-        if not _settings.sales_type_tag is None:
-            if _settings.sales_type_tag:
-                if _settings.sales_type_tag != SALES_TYPE_HEADER_DEFAULT:
-                    args.append("-sales_type_tag")
-                    args.append(str(_settings.sales_type_tag))
-
-        if not _settings.sales_type_value is None:
-            if _settings.sales_type_value:
-                args.append("-sales_type_value")
-                args.append(str(_settings.sales_type_value))
+    if not _evaluation_runner is None and _evaluation_runner.running:
+        messagebox.showinfo("AdEvaluator\u2122",
+                            "An evaluation is already running.")
+        return
 
-        print(args)
-        try:
-            evaluate_advertising(*args)
-        except Exception as general_exception:
-            messagebox.showerror("AdEvaluator\u2122", debug_prefix()
-                                 + "EXCEPTION: "
-                                 + print_to_string(general_exception))
-        root.lift()
-        #root.force_focus()  # failed
-        root.after(1, lambda: root.focus_force())
-        root.geometry(GEOMETRY_STRING)
+    if os.path.exists(file_name):
+        config = settings_config(_settings,
+                                 output_folder=OUTPUT_FOLDER,
+                                 verbose=True)
+        print(config)
+        if not _evaluation_runner is None:
+            _evaluation_runner.close()  # results panel of previous run
+        _evaluation_runner = EvaluationRunner(root, file_name, config)
     else:
         msg = print_to_string(debug_prefix()
                               + "ERROR: Unable to find "
@@ -1704,6 +3035,47 @@ def usage(cmd_str):
                       "    [-amount_tag <amount_column_name>]\n"
                       "    [-sales_type_tag <sales_type_column_name>]\n"
                       "    [-sales_type_value <sales_sales_type_value_for_evaluation>]\n"
+                      "    [-json] write machine readable results (JSON)\n"
+                      "    [-csv] write machine readable results (CSV)\n"
+                      "    [-profile] report time and memory of each stage\n"
+                      "    [-cprofile] -profile and write cProfile files\n"
+                      "        for each stage\n"
+                      "    [-metrics_textfile <file.prom>] write Prometheus\n"
+                      "        metrics (e.g. for node_exporter textfile collector)\n"
+                      "    [-statsd <host:port>] send metrics to StatsD (UDP)\n"
+                      "    [-sim_cache <folder>] save simulations for reruns\n"
+                      "        with a different -e or -cost\n"
+                      "    [-no_sim_cache] always run the simulations\n"
+                      "    [-detect_adv_date] detect the advertising start date\n"
+                      "        from a change in the daily sales\n"
+                      "    [-float32] float32 sales and profit projections\n"
+                      "    [-streaming] projections in constant memory\n"
+                      "    [-engine simulation|exact] exact annual sales\n"
+                      "        distributions by FFT convolution\n"
+                      "    [-engine_check <number_of_simulated_years>] check\n"
+                      "        -engine exact with simulated years\n"
+                      "    [-placebo] placebo test of the false positive rate\n"
+                      "        with fake start dates before the advertising\n"
+                      "    [-campaigns <schedule_file or start:end[:expense],...>]\n"
+                      "        evaluate several advertising campaigns\n"
+                      "    [-segment_by <column>] evaluate each segment, e.g.\n"
+                      "        each customer (-segment_by \"CUST ID\")\n"
+                      "    [-panel <panel_file, folder, or glob>] evaluate\n"
+                      "        every store of a chain (see -store_column)\n"
+                      "    [-store_column <column>] store key column of\n"
+                      "        a -panel sales report (default STORE)\n"
+                      "    [-adv_date_range <start> <end> <step_days>]\n"
+                      "        sweep the advertising start date\n"
+                      "    [-scenario_grid <expense_range>[,<unit_cost_range>]]\n"
+                      "        profit for a grid of expenses and unit costs,\n"
+                      "        range is start:stop:points (e.g. 0:24000:100,0:60:100)\n"
+                      "    [-batch <folder | glob_pattern | manifest_file>]\n"
+                      "        evaluate many sales reports (no plots)\n"
+                      "    [-workers <number_of_worker_processes>] for -batch/-serve/\n"
+                      "        -panel/-streaming\n"
+                      "    [-serve] run local evaluation server (POST JSON to\n"
+                      "        http://localhost:" + str(SERVE_PORT) + "/evaluate)\n"
+                      "    [-port <port>] port for -serve\n"
                       "    [-license] print full GPL version 3 license\n"
                       "    [-short_notice] print short startup notice\n"
                       "    [-disclaimer] print legal disclaimer\n"
@@ -1731,6 +3103,9 @@ def usage(cmd_str):
                                   + "advertising starts")
     usage_text += print_to_string("\n")
     usage_text += print_to_string("Examples: " + cmd_str + " -i sales.csv \n")
+    usage_text += print_to_string("          "
+                                  + cmd_str
+                                  + " -batch reports -o results -workers 8\n")
     usage_text += print_to_string("          "
                                   + cmd_str
                                   + " -i sales_renamed.csv "
@@ -2439,58 +3814,321 @@ def compute_loss(sales_bins, sales_edges, loss_level=0.0):
             n_loss_sales += fraction*value
     return n_loss_sales  # compute_loss(...)
 
-def currency(x, pos):
-    'Function for formatting currency values on axis of plots'
-    if abs(x) >= 1000000:
-        return '${:1.1f}M'.format(x*1e-6)
-    elif abs(x) < 1000:
-        return '${:,.0f}'.format(x)
-
-    return '${:1.0f}K'.format(x*1e-3)
-
-def poisson_curve(input_data, *p):
+def histogram_simulations(sim_arrays, bins=BINS_DEFAULT, ranges=None):
     """
-    Poisson statistics
+    bin each simulation array once
 
-    ARGUMENTS: input_data -- number of events
-               *p -- parameters (poisson lambda)
+    ARGUMENTS: sim_arrays -- dictionary of name: simulation results
+                             (list or NumPy array)
+               bins -- number of histogram bins
+               ranges -- optional dictionary of name: (low, high)
+                         for arrays that must share bin edges
 
-    RETURNS: probability density function value
+    RETURNS: dictionary of name: (bin_values, bin_edges)
 
+    WHY: the simulation arrays can hold millions of values.
+    They are histogrammed once here and the plots and
+    compute_loss(...) both use the bins.  The raw samples
+    are never passed to matplotlib.
     """
-    if not isinstance(input_data, np.ndarray):
-        raise TypeError(debug_prefix() + "input_data is type " + str(type(input_data)))
-
-    if not isinstance(p, (list, tuple, np.ndarray)):
-        raise TypeError(debug_prefix() + "p is type " + str(type(p)))
+    if not isinstance(sim_arrays, dict):
+        raise TypeError(debug_prefix() + "sim_arrays is type "
+                        + str(type(sim_arrays)))
 
-    if len(p) != 1:
-        raise ValueError(debug_prefix() + "p has " + str(len(p)) + " elements")
+    if ranges is None:
+        ranges = {}
 
-    # lambda is reserved keyword in Python
-    poisson_parameter = p[0]
+    sim_hists = {}
+    for name, values in sim_arrays.items():
+        values = np.asarray(values, dtype=float).ravel()
+        sim_hists[name] = np.histogram(values,
+                                       bins=bins,
+                                       range=ranges.get(name))
+    return sim_hists  # histogram_simulations(...)
 
-    return np.exp(-1.0*poisson_parameter) \
-        * (poisson_parameter)**input_data \
-        / factorial(input_data)
+TDIGEST_COMPRESSION = 200  # about 100 centroids in a TDigest
 
-def bell_curve(input_data, *p):
+class RunningStats:
     """
-    Bell Curve/Normal/Gaussian model
-
-    ARGUMENTS: input_data -- location data
-               *p -- parameters
+    count, mean, variance, minimum, and maximum of a stream of
+    values (Welford's algorithm, one batch at a time)
 
-    RETURNS: probability density function value
-
-    signature compatible with scipy.stats.curve_fit(...)
+    merge(...) combines the statistics of two streams, e.g. the
+    partial results of worker processes (Chan et al.)
     """
 
-    if not isinstance(input_data, np.ndarray):
-        raise TypeError(debug_prefix() + "input_data is type " + str(type(input_data)))
-
-    if not isinstance(p, (list, tuple, np.ndarray)):
-        raise TypeError(debug_prefix() + "p is type " + str(type(p)))
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared differences from the mean
+        self.min = np.inf
+        self.max = -np.inf
+
+    def combine(self, n, mean, m2, min_value, max_value):
+        """
+        add the statistics of n more values
+        """
+        if n == 0:
+            return self
+        n_total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta*n/n_total
+        self.m2 += m2 + delta**2*self.n*n/n_total
+        self.n = n_total
+        self.min = min(self.min, min_value)
+        self.max = max(self.max, max_value)
+        return self
+
+    def update(self, values):
+        """
+        add a batch of values
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return self
+        mean = values.mean()
+        return self.combine(values.size, mean, ((values - mean)**2).sum(),
+                            values.min(), values.max())
+
+    def merge(self, other):
+        """
+        add the values of another RunningStats
+        """
+        return self.combine(other.n, other.mean, other.m2,
+                            other.min, other.max)
+
+    @property
+    def var(self):
+        """
+        variance (ddof=1, NaN for fewer than two values)
+        """
+        if self.n < 2:
+            return np.nan
+        return self.m2/(self.n - 1)
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+    def to_dict(self):
+        return {'n' : self.n, 'mean' : self.mean, 'std' : self.std,
+                'min' : self.min, 'max' : self.max}
+# end class RunningStats
+
+class FixedHistogram:
+    """
+    histogram of a stream of values with fixed bin edges
+
+    Values below the first edge or above the last are counted in
+    underflow and overflow.  merge(...) adds the counts of another
+    FixedHistogram with the same edges.
+    """
+
+    def __init__(self, edges):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        if self.edges.ndim != 1 or self.edges.size < 2 \
+           or np.any(np.diff(self.edges) <= 0.0):
+            raise ValueError(debug_prefix() + "histogram edges "
+                             + str(self.edges) + " are not increasing")
+        self.counts = np.zeros(self.edges.size - 1, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+
+    def update(self, values):
+        """
+        add a batch of values
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        self.counts += np.histogram(values, self.edges)[0]
+        self.underflow += int((values < self.edges[0]).sum())
+        self.overflow += int((values > self.edges[-1]).sum())
+        return self
+
+    def merge(self, other):
+        """
+        add the counts of another FixedHistogram
+        """
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError(debug_prefix() + "histograms have different edges")
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        return self
+# end class FixedHistogram
+
+class TDigest:
+    """
+    mergeable sketch of the distribution of a stream of values for
+    quantiles and the cumulative distribution (a merging t-digest,
+    Dunning and Ertl)
+
+    The values are kept as about compression/2 weighted centroids,
+    small in the tails and large in the middle, so the tail
+    quantiles stay accurate for any number of values.  merge(...)
+    combines the digests of two streams.
+    """
+
+    def __init__(self, compression=TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.means = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def count(self):
+        return self.weights.sum()
+
+    def compress(self, means, weights):
+        """
+        merge neighboring centroids so each spans at most one unit
+        of the scale function k(q) = compression/(2 pi) asin(2q - 1)
+        """
+        order = np.argsort(means, kind='mergesort')
+        means = means[order]
+        weights = weights[order]
+        cum_weights = weights.cumsum()
+        q_left = (cum_weights - weights)/cum_weights[-1]
+        scale = self.compression/(2.0*np.pi)*np.arcsin(2.0*q_left - 1.0)
+        cluster = np.floor(scale + self.compression/4.0).astype(np.int64)
+        new_weights = np.bincount(cluster, weights)
+        new_means = np.bincount(cluster, weights*means)
+        keep = new_weights > 0.0
+        self.weights = new_weights[keep]
+        self.means = new_means[keep]/self.weights
+
+    def update(self, values):
+        """
+        add a batch of values
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.compress(np.concatenate((self.means, values)),
+                      np.concatenate((self.weights, np.ones(values.size))))
+        return self
+
+    def merge(self, other):
+        """
+        add the values of another TDigest
+        """
+        if other.weights.size == 0:
+            return self
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.compress(np.concatenate((self.means, other.means)),
+                      np.concatenate((self.weights, other.weights)))
+        return self
+
+    def interpolation_points(self):
+        """
+        cumulative probability at the middle of each centroid
+        with the minimum and maximum at 0 and 1
+        """
+        cum_weights = self.weights.cumsum()
+        q_mid = (cum_weights - 0.5*self.weights)/cum_weights[-1]
+        return np.concatenate(((self.min,), self.means, (self.max,))), \
+            np.concatenate(((0.0,), q_mid, (1.0,)))
+
+    def quantile(self, q):
+        """
+        estimated quantiles q (0 to 1) of the values
+        """
+        if self.weights.size == 0:
+            raise ValueError(debug_prefix() + "TDigest has no values")
+        values, q_points = self.interpolation_points()
+        return np.interp(q, q_points, values)
+
+    def cdf(self, x):
+        """
+        estimated fraction of the values below x
+        """
+        if self.weights.size == 0:
+            raise ValueError(debug_prefix() + "TDigest has no values")
+        values, q_points = self.interpolation_points()
+        return np.interp(x, values, q_points)
+# end class TDigest
+
+def plot_histogram_bins(bin_values, bin_edges, **kwargs):
+    """
+    draw a histogram from precomputed bins and edges
+
+    ARGUMENTS: bin_values -- counts (or densities) in each bin
+               bin_edges -- edges of the bins (one more than bin_values)
+               **kwargs -- passed to matplotlib bar(...)
+
+    RETURNS: the matplotlib bar container
+    """
+    plt = import_pyplot()
+    if not isinstance(bin_edges, np.ndarray):
+        raise TypeError(debug_prefix() + "bin_edges is type "
+                        + str(type(bin_edges)))
+
+    if len(bin_values) + 1 != bin_edges.size:
+        raise ValueError(debug_prefix() + "bin_values has "
+                         + str(len(bin_values)) + " elements and bin_edges has "
+                         + str(bin_edges.size) + " elements")
+
+    bin_widths = bin_edges[1:] - bin_edges[:-1]
+    return plt.bar(bin_edges[:-1], bin_values, bin_widths,
+                   align='edge', **kwargs)
+
+def currency(x, pos):
+    'Function for formatting currency values on axis of plots'
+    if abs(x) >= 1000000:
+        return '${:1.1f}M'.format(x*1e-6)
+    elif abs(x) < 1000:
+        return '${:,.0f}'.format(x)
+
+    return '${:1.0f}K'.format(x*1e-3)
+
+def poisson_curve(input_data, *p):
+    """
+    Poisson statistics
+
+    ARGUMENTS: input_data -- number of events
+               *p -- parameters (poisson lambda)
+
+    RETURNS: probability density function value
+
+    """
+    from scipy.special import factorial  # elementwise factorial function
+    if not isinstance(input_data, np.ndarray):
+        raise TypeError(debug_prefix() + "input_data is type " + str(type(input_data)))
+
+    if not isinstance(p, (list, tuple, np.ndarray)):
+        raise TypeError(debug_prefix() + "p is type " + str(type(p)))
+
+    if len(p) != 1:
+        raise ValueError(debug_prefix() + "p has " + str(len(p)) + " elements")
+
+    # lambda is reserved keyword in Python
+    poisson_parameter = p[0]
+
+    return np.exp(-1.0*poisson_parameter) \
+        * (poisson_parameter)**input_data \
+        / factorial(input_data)
+
+def bell_curve(input_data, *p):
+    """
+    Bell Curve/Normal/Gaussian model
+
+    ARGUMENTS: input_data -- location data
+               *p -- parameters
+
+    RETURNS: probability density function value
+
+    signature compatible with scipy.stats.curve_fit(...)
+    """
+
+    if not isinstance(input_data, np.ndarray):
+        raise TypeError(debug_prefix() + "input_data is type " + str(type(input_data)))
+
+    if not isinstance(p, (list, tuple, np.ndarray)):
+        raise TypeError(debug_prefix() + "p is type " + str(type(p)))
 
     if not len(p) == 3:
         raise ValueError(debug_prefix() + "p has " + str(len(p)) + " elements (not three)")
@@ -2642,7 +4280,7 @@ def get_dist(sales_data, unit_price=None):
     # return empirical distribution and errors on the same
     return histogram/number_of_days, np.sqrt(histogram)/number_of_days
 
-def vary_distribution(dist_cumsum, dist_error):
+def vary_distribution(dist_cumsum, dist_error, rng=None, size=None):
     """
     vary the distribution estimate for simulations
 
@@ -2650,7 +4288,12 @@ def vary_distribution(dist_cumsum, dist_error):
                               distribution function (cdf)
                dist_error -- error on empirical probability
                              distribution function (pdf)
+               rng -- NumPy RandomState (default np.random)
+               size -- number of varied distributions, one per row
+                       (default one distribution)
     """
+    if rng is None:
+        rng = np.random
 
     if isinstance(dist_cumsum, (list, tuple)):
         dist_cumsum = np.array(dist_cumsum)
@@ -2668,42 +4311,95 @@ def vary_distribution(dist_cumsum, dist_error):
     prefix = np.array((0.0,))
     dist_pdf = (dist_cumsum[1:] - dist_cumsum[:-1])
     dist_pdf = np.concatenate((prefix, dist_pdf))
+    noise_shape = dist_pdf.size if size is None else (size, dist_pdf.size)
     new_dist_pdf = dist_pdf \
                    + dist_error \
-                   * np.random.standard_normal(dist_pdf.size)
+                   * rng.standard_normal(noise_shape)
 
     # normalize the new empirical distribution
-    new_dist_pdf = new_dist_pdf / new_dist_pdf.sum()
-    return new_dist_pdf.cumsum()
+    new_dist_pdf = new_dist_pdf / new_dist_pdf.sum(axis=-1, keepdims=True)
+    return new_dist_pdf.cumsum(axis=-1)
+
 
+SIM_CHUNK_CELLS = 1024*1024  # random numbers drawn at once by the simulations
+
+def unit_count_dtype(max_units):
+    """
+    smallest unsigned integer type for unit counts up to max_units
+    (uint8 for up to 255 units a day)
+    """
+    return np.min_scalar_type(max(0, int(max_units)))
 
-def sim_unit_sales(dist_cumsum, size=None):
+def sim_unit_sales(dist_cumsum, size=None, rng=None):
     """
     simulate unit sales based on empirical distribution
 
     ARGUMENTS: dist_cumsum -- cumulative sum of empirical distribution
                size -- shape of output number of units sold array
+               rng -- NumPy RandomState (default np.random)
 
     RETURNS: number of units sold
-             OR array of number of units sold
+             OR array of number of units sold in the smallest
+             sufficient unsigned integer type (see unit_count_dtype(...))
+
+    WHY: unit counts take one byte a day instead of eight as float64,
+    so batches of simulations can be much larger; the random numbers
+    are drawn SIM_CHUNK_CELLS at a time (the same sequence as one draw)
+    so they never need the full size in float64 either.  Sum the
+    counts in int64 and convert to dollars for the aggregates
+    (see sim_sales_mean_var(...)).
     """
 
     if not isinstance(dist_cumsum, (list, tuple, np.ndarray)):
         raise TypeError(debug_prefix() + "dist_cumsum is type " + str(type(dist_cumsum)))
 
+    if rng is None:
+        rng = np.random
+
     if size is None:
-        rval = np.random.uniform()  # number from 0.0 to 1.0
+        rval = rng.uniform()  # number from 0.0 to 1.0
         nsold = np.argmax(dist_cumsum > rval)
         return nsold
     elif isinstance(size, (tuple, list, np.ndarray)):
-        result = np.zeros(size)
-        rval = np.random.uniform(size=size)
-        for index, value in enumerate(rval.ravel()):
-            result.ravel()[index] = np.argmax(dist_cumsum > value)
+        # a varied distribution (see vary_distribution(...)) may
+        # decrease; the running maximum first exceeds a value at the
+        # same index as dist_cumsum and is sorted for np.searchsorted
+        dist_cumsum = np.maximum.accumulate(np.asarray(dist_cumsum,
+                                                       dtype=np.float64))
+        result = np.zeros(tuple(size), dtype=unit_count_dtype(dist_cumsum.size - 1))
+        result_flat = result.reshape(-1)
+        for chunk_start in range(0, result_flat.size, SIM_CHUNK_CELLS):
+            rval = rng.uniform(size=min(SIM_CHUNK_CELLS,
+                                        result_flat.size - chunk_start))
+            # first unit count with a cumulative probability above rval
+            # (np.argmax(dist_cumsum > value) of each value)
+            nsold = np.searchsorted(dist_cumsum, rval, side='right')
+            # none above rval gives 0 as np.argmax(...) does
+            nsold[nsold >= dist_cumsum.size] = 0
+            result_flat[chunk_start:chunk_start + rval.size] = nsold
         return result  # array of simulated sales
     else:
         raise TypeError(debug_prefix() + "size is type " + str(type(size)))
 
+def sim_sales_mean_var(unit_sales, unit_price):
+    """
+    average and variance (ddof=1) of the daily sales amounts of
+    simulated unit sales over the last axis
+
+    The sums of the unit counts and of their squares are exact int64
+    sums; only the averages and variances are converted to dollars.
+
+    RETURNS: mean, var -- float64 arrays (or scalars)
+    """
+    n_days = unit_sales.shape[-1]
+    sum_1 = unit_sales.sum(axis=-1, dtype=np.int64)
+    # einsum squares in int64 a buffer at a time (no int64 copy)
+    sum_2 = np.einsum('...i,...i->...', unit_sales, unit_sales,
+                      dtype=np.int64)
+    mean_units = sum_1/n_days
+    var_units = np.maximum(sum_2 - sum_1*mean_units, 0.0)/(n_days - 1)
+    return unit_price*mean_units, unit_price**2*var_units
+
 
 def compute_daily_sales(sorted_data_frame,
                         date_tag=None,
@@ -2720,6 +4416,7 @@ def compute_daily_sales(sorted_data_frame,
     RETURNS: array of daily sales with 0.0 entries for zero
              sales days ("zero days")
     """
+    import pandas as pd
 
     if not isinstance(sorted_data_frame, pd.DataFrame):
         raise TypeError(debug_prefix()
@@ -2832,6 +4529,7 @@ def get_date_refs(data_frame, date_tag=None):
 
     RETURNS: date_tag, date_index
     """
+    import pandas as pd
 
     if not isinstance(data_frame, pd.DataFrame):
         raise TypeError(debug_prefix() + 'data_frame is type ' \
@@ -2875,6 +4573,7 @@ def get_type_refs(data_frame, sales_type_tag=None):
     RETURNS: sales_type_tag, type_index -- name and column index
     for sales type
     """
+    import pandas as pd
     if not isinstance(data_frame, pd.DataFrame):
         raise TypeError(debug_prefix() + 'data_frame is type ' \
                         + str(type(data_frame)))
@@ -2905,6 +4604,7 @@ def get_sales_type_value(data_frame, sales_type_tag=None):
     get the best candidate for the sales type value
     e.g. Payment, Invoice, Sales Receipt etc.
     """
+    import pandas as pd
 
     if not isinstance(data_frame, pd.DataFrame):
         raise TypeError(debug_prefix()
@@ -2951,6 +4651,7 @@ def get_amount_refs(data_frame, amount_tag=None):
     for sales amount column in data_frame
 
     """
+    import pandas as pd
     if not isinstance(data_frame, pd.DataFrame):
         raise TypeError(debug_prefix() + 'data_frame is type ' \
                         + str(type(data_frame)))
@@ -2993,14 +4694,16 @@ def sim_adv_period(daily_sales_np,
                    file_stem="sales_data",
                    unit_price=None,
                    number_sims=NSIMS_DEFAULT,
-                   output_folder=OUTPUT_FOLDER,
-                   plot_duration_secs=PLOT_DURATION_SECS):
+                   bins=BINS_DEFAULT,
+                   rng=None,
+                   verbose=True,
+                   cancel=None):
     """
 
-    simulate the advertising period, computes the welch's T
-    statistic for comparing averages of each period, and plots
-    a histogram of the welch's T statistics.  The histogram is
-    an empirical probability distribution for the T statistic.
+    simulate the advertising period and compute the welch's T
+    statistic for comparing averages of each period.  The histogram
+    of the welch's T statistics is an empirical probability
+    distribution for the T statistic (see plot_welch_hists(...)).
 
     ARGUMENTS: daily_sales_np -- daily sales in NumPy array
                dist_cumsum_no_adv -- empirical probability distribution
@@ -3009,9 +4712,16 @@ def sim_adv_period(daily_sales_np,
                mask_adv -- true if advertising active on day
                file_stem -- from <file_stem>.csv with sales report
                number_sims -- number of simulations
+               bins -- number of histogram bins
+               rng -- NumPy RandomState (default np.random)
+               verbose -- print progress messages
+               cancel -- optional threading.Event; raises
+                         EvaluationCancelled when set
 
-    RETURNS: welch_t_edges, welch_t_bins -- histogram of
+    RETURNS: welch_t_bins, welch_t_edges -- histogram of
              Welch's t statistic from simulations
+             welch_pval_bins, welch_pval_edges -- histogram of
+             the p-values from simulations
 
     WHY: simulating the Welch's T statistic using the empirical
     distribution of sales enables us to evaluate how accurate Welch's T
@@ -3020,7 +4730,6 @@ def sim_adv_period(daily_sales_np,
     for sales data.
 
     """
-
     # check arguments
     if not isinstance(daily_sales_np, np.ndarray):
         raise TypeError(debug_prefix() + 'daily_sales_np is type ' \
@@ -3031,7 +4740,7 @@ def sim_adv_period(daily_sales_np,
     if not isinstance(mask_adv, np.ndarray):
         raise TypeError(debug_prefix() + 'mask_adv is type ' \
                         + str(type(mask_adv)))
-    if not isinstance(number_sims, (int, np.int)):
+    if not isinstance(number_sims, (int, np.integer)):
         raise TypeError(debug_prefix() + 'number_sims is type ' \
                         + str(type(number_sims)))
 
@@ -3039,8 +4748,9 @@ def sim_adv_period(daily_sales_np,
     mask_no_adv = ~mask_adv
     # simulate the advertising period
 
-    print("simulating advertising period sales data using " \
-          + "the empirical probability distribution with no adv...")
+    if verbose:
+        print("simulating advertising period sales data using " \
+              + "the empirical probability distribution with no adv...")
     thist = []
     pval_hist = []
     t_start = time.time()
@@ -3048,131 +4758,118 @@ def sim_adv_period(daily_sales_np,
     # infer the unit price
     if unit_price is None:
         unit_prices = get_unit_prices(daily_sales_np)
-        print("inferred unit prices are:", unit_prices)
+        if verbose:
+            print("inferred unit prices are:", unit_prices)
         unit_price = unit_prices[0]
 
-    for sim_index in range(number_sims):
-        sim_sales_adv = sim_unit_sales(dist_cumsum_no_adv, \
-                                       daily_sales_np[mask_adv, 1].shape)
-        sim_sales_adv *= unit_price
-
-    # debug trace messages
-    #    print("average daily sales (NO ADV):", sim_sales_adv.mean())
-    #    print("std daily sales (NO ADV):", \
-        #          sim_sales_adv.std()/np.sqrt(sim_sales_adv.size))
-
-        diff = sim_sales_adv.mean() - daily_sales_np[mask_no_adv, 1].mean()
-
-        scale = np.sqrt(sim_sales_adv.var()/sim_sales_adv.size \
-                         + daily_sales_np[mask_no_adv, 1].var() \
-                         /daily_sales_np[mask_no_adv, 1].size)
-
-        my_zscore = diff
-
-        # degrees of freedom for computing T statistic
-        dof_1 = daily_sales_np[mask_no_adv, 1].size-1
-        dof_2 = sim_sales_adv.size-1
-
-        nu_denom = (sim_sales_adv.var()**2/(sim_sales_adv.size**2*dof_1) \
-                    + daily_sales_np[mask_no_adv, 1].var()**2 \
-                    /((daily_sales_np[mask_no_adv, 1].size)**2*dof_2))
-
-        welch_nu = (sim_sales_adv.var()/sim_sales_adv.size \
-                    + daily_sales_np[mask_no_adv, 1].var() \
-                    /daily_sales_np[mask_no_adv, 1].size)**2 / nu_denom
-
-        #welch_t = st.t.ppf(my_zscore, welch_nu)
+    sales_no_adv = daily_sales_np[mask_no_adv, 1].astype(np.float64)
+    n_adv = int(mask_adv.sum())
+    for sim_index in range(0, number_sims, PROGRESS_BATCH_SIMS):
+        if not cancel is None and cancel.is_set():
+            raise EvaluationCancelled("evaluation cancelled")
+        # a batch of simulated advertising periods as unit counts
+        # (the same random numbers as one period at a time)
+        batch_sims = min(PROGRESS_BATCH_SIMS, number_sims - sim_index)
+        unit_sales_adv = sim_unit_sales(dist_cumsum_no_adv,
+                                        (batch_sims, n_adv),
+                                        rng)
+        mean_adv, var_adv = sim_sales_mean_var(unit_sales_adv, unit_price)
 
         # compute Welch's t-statistic
-        tstat, pvalue = st.ttest_ind(daily_sales_np[mask_no_adv, 1], \
-                                     sim_sales_adv, \
-                                     None, equal_var=False)
+        # (st.ttest_ind(sales_no_adv, sim_sales_adv, equal_var=False))
+        tstat, pvalue, dof = welch_t_test(sales_no_adv.mean(),
+                                          sales_no_adv.var(ddof=1),
+                                          sales_no_adv.size,
+                                          mean_adv, var_adv, n_adv)
         # histogram Welch's t statistic and p-value
         # to get an empirical distribution for these values
         # for comparison to computed value for real data
         #
-        thist.append(tstat)  # was tstat
-        pval_hist.append(pvalue)
+        thist.extend(tstat)  # was tstat
+        pval_hist.extend(pvalue)
         now = time.time()
         # progress message
-        if (now - t_mark) > 1:
+        if verbose and (now - t_mark) > 1:
             print(".", sep='', end='', flush=True)
             t_mark = now
 
-    if _settings.detail_level > 1:
-        # display histogram of Welch t-statistics
-        # from simulations
-        f_tstat = plt.figure(figsize=(12, 9))
-        welch_t_bins, welch_t_edges, patches \
-            = plt.hist(thist, bins=_settings.bins)
-        plt.title("Welch's t statistic is a measure of the difference between the two periods")
-        plt.xlabel("WELCH'S T STATISTIC (0.0 MEANS THE TWO PERIODS ARE VERY SIMILAR)")
-        plt.ylabel('NUMBER OF SIMULATIONS')
-#        x_low, x_hi = plt.xlim()
-#        delta_x = x_hi - x_low
-#        y_low, y_hi = plt.ylim()
-#        delta_y = y_hi - y_low
-#        plt.text(x_low + 0.025*delta_x,
-#                 y_hi - 0.09*delta_y,
-#                 "Welch's t statistic is a measure "
-#                 "  of how similar the two periods are",
-#                 bbox=dict(facecolor='white', alpha=0.5))
-        if bool(_settings.block):
-            plt.show()
-        else:
-            plt.ion()
-            plt.show()
-            # wait to display the figure
-            plt.pause(plot_duration_secs)
+    # bin the simulated t statistics and p-values once
+    sim_hists = histogram_simulations({'welch_t': thist,
+                                       'welch_pval': pval_hist},
+                                      bins=bins)
+    welch_t_bins, welch_t_edges = sim_hists['welch_t']
+    welch_pval_bins, welch_pval_edges = sim_hists['welch_pval']
+
+    return welch_t_bins, welch_t_edges, \
+        welch_pval_bins, welch_pval_edges  # sim_adv_period(...)
+
+def plot_welch_hists(welch_t_bins,
+                     welch_t_edges,
+                     welch_pval_bins,
+                     welch_pval_edges,
+                     file_stem="sales_data",
+                     output_folder=OUTPUT_FOLDER,
+                     plot_duration_secs=PLOT_DURATION_SECS,
+                     block=False):
+    """
+    plot the histograms of the Welch's t statistic and p-value
+    from sim_adv_period(...)
+
+    RETURNS: list of figures
+    """
+    plt = import_pyplot()
+    # display histogram of Welch t-statistics
+    # from simulations
+    f_tstat = plt.figure(figsize=(12, 9))
+    plot_histogram_bins(welch_t_bins, welch_t_edges)
+    plt.title("Welch's t statistic is a measure of the difference between the two periods")
+    plt.xlabel("WELCH'S T STATISTIC (0.0 MEANS THE TWO PERIODS ARE VERY SIMILAR)")
+    plt.ylabel('NUMBER OF SIMULATIONS')
+    if bool(block):
+        plt.show()
+    else:
+        plt.ion()
+        plt.show()
+        # wait to display the figure
+        plt.pause(plot_duration_secs)
 
+    if not output_folder is None:
         f_tstat.savefig(output_folder + os.sep
                         + file_stem + '_welch_t_stat_hist.jpg')
 
+    # display histogram of p-values from Welch t statistic
+    # from simulations
+    f_pval = plt.figure(figsize=(12, 9))
+    plot_histogram_bins(welch_pval_bins, welch_pval_edges)
+    plt.title("HISTOGRAM OF THE P-VALUE DERIVED FROM WELCH'S T STAT")
+    plt.xlabel('P VALUE IS AN *ESTIMATE* OF THE PROBABILITY TWO PERIODS SAME')
+    plt.ylabel('NUMBER OF SIMULATIONS')
+    if bool(block):
+        plt.show()
     else:
-        welch_t_bins, welch_t_edges = np.histogram(thist,
-                                                   bins=_settings.bins)
-
-    if _settings.detail_level > 1:
-        # display histogram of p-values from Welch t statistic
-        # from simulations
-        f_pval = plt.figure(figsize=(12, 9))
-        welch_pval_bins, welch_pval_edges, patches \
-            = plt.hist(pval_hist, bins=_settings.bins)
-        plt.title("HISTOGRAM OF THE P-VALUE DERIVED FROM WELCH'S T STAT")
-        plt.xlabel('P VALUE IS AN *ESTIMATE* OF THE PROBABILITY TWO PERIODS SAME')
-        plt.ylabel('NUMBER OF SIMULATIONS')
-        if bool(_settings.block):
-            plt.show()
-        else:
-            plt.ion()
-            plt.show()
-            # wait to display the figure
-            plt.pause(plot_duration_secs)
+        plt.ion()
+        plt.show()
+        # wait to display the figure
+        plt.pause(plot_duration_secs)
 
+    if not output_folder is None:
         f_pval.savefig(output_folder + os.sep
                        + file_stem + '_welch_p_value_hist.jpg')
 
-    else:
-        welch_pval_bins, \
-        welch_pval_edges = np.histogram(pval_hist,
-                                        bins=_settings.bins)
-
-    return welch_t_bins, welch_t_edges  # sim_adv_period(...)
+    return [f_tstat, f_pval]  # plot_welch_hists(...)
 
-def fit_plot_bell_curve(welch_t_edges,
-                        welch_t_bins,
-                        file_stem='sales_data',
-                        output_folder=OUTPUT_FOLDER,
-                        plot_duration_secs=PLOT_DURATION_SECS):
+def fit_bell_curve(welch_t_edges,
+                   welch_t_bins,
+                   verbose=True):
     """
     fit a Bell Curve to the simulated Welch's T stastistic data
-    and plot the simulated data vs the Bell Curve fit
 
     ARGUMENTS: welch_t_edges -- edges of bins of histogram
                welch_t_bins -- counts in each bin
 
     RETURNS: coeff_of_determination -- the coefficient of determination
                                        for the Bell Curve fit
+             popt -- Bell Curve parameters (see bell_curve(...))
 
     WHY: Welch's T test assumes a Bell Curve distribution for the
     two data sets compared, in our case the no advertising period and the
@@ -3180,6 +4877,7 @@ def fit_plot_bell_curve(welch_t_edges,
     this assumption is.  The assumption is only approximately true for most
     sales data.
     """
+    from scipy.optimize import curve_fit
 
     if not isinstance(welch_t_edges, (list, tuple, np.ndarray)):
         raise TypeError(debug_prefix() + "welch_t_edges is type " + str(type(welch_t_edges)))
@@ -3187,16 +4885,6 @@ def fit_plot_bell_curve(welch_t_edges,
     if not isinstance(welch_t_bins, (list, tuple, np.ndarray)):
         raise TypeError(debug_prefix() + "welch_t_bins is type " + str(type(welch_t_bins)))
 
-    if not isinstance(file_stem, str):
-        raise TypeError(debug_prefix() + "file_stem is type " + str(type(file_stem)))
-
-    if not isinstance(output_folder, str):
-        raise TypeError(debug_prefix() + "output_folder is type " + str(type(output_folder)))
-
-    if not isinstance(plot_duration_secs, (float, np.float)):
-        raise TypeError(debug_prefix() + "plot_duration_secs is type "
-                        + str(type(plot_duration_secs)))
-
     # fit Bell Curve to Welch t stat simulated data
     input_data = (welch_t_edges[:-1] + welch_t_edges[1:])/2.0
 
@@ -3209,10 +4897,10 @@ def fit_plot_bell_curve(welch_t_edges,
                mu_start,
                sigma_start]
 
-    print("fitting Bell Curve to Welch's t statistic empirical distribution")
+    if verbose:
+        print("fitting Bell Curve to Welch's t statistic empirical distribution")
     popt, pcov = curve_fit(bell_curve, input_data, y_data, p_start)
 
-    xline = np.linspace(np.min(input_data), np.max(input_data), 100)
     y_fit = bell_curve(input_data, *popt)
     residuals = y_data - y_fit
 
@@ -3221,34 +4909,66 @@ def fit_plot_bell_curve(welch_t_edges,
     # 1.0 is a perfect model, 0.0 is a very bad model
     coeff_of_determination = 1.0 - residuals.var()/y_data.var()
 
-    if _settings.detail_level > 1:
-        f_fit = plt.figure(figsize=(12, 9))
-        y_line = bell_curve(xline, *popt)
-        plt.plot(input_data, y_data, 'gP', label='TSTAT DATA', \
-                 linewidth=LINEWIDTH, markersize=MARKERSIZE)
-        plt.plot(input_data, y_fit, 'ko', label='PREDICTED VALUES', \
-                 linewidth=LINEWIDTH, markersize=MARKERSIZE)
-        plt.plot(xline, y_line, 'b-', label='BELL CURVE FIT', \
-                 linewidth=LINEWIDTH, markersize=MARKERSIZE)
-        plt.xlabel("WELCH'S T STATISTIC VALUE "
-                   "(A MEASURE OF THE DIFFERENCE BETWEEN THE TWO PERIODS)")
-        plt.ylabel('FRACTION OF SIMULATIONS WITH THE T STAT VALUE')
-        plt.title("FIT BELL CURVE TO THE WELCH'S T STATISTIC DISTRIBUTION (R**2=%3.2f)" \
-                  % coeff_of_determination)
-        plt.grid()
-        plt.legend(loc='upper right')
-        if bool(_settings.block):
-            plt.show()
-        else:
-            plt.ion()
-            plt.show()
-            # wait to display the figure
-            plt.pause(plot_duration_secs)
+    return coeff_of_determination, popt  # fit_bell_curve(x,n)
+
+def plot_bell_curve_fit(welch_t_edges,
+                        welch_t_bins,
+                        popt,
+                        coeff_of_determination,
+                        file_stem='sales_data',
+                        output_folder=OUTPUT_FOLDER,
+                        plot_duration_secs=PLOT_DURATION_SECS,
+                        block=False):
+    """
+    plot the simulated Welch's T statistic data vs the
+    Bell Curve fit from fit_bell_curve(...)
+
+    RETURNS: the figure
+    """
+    if not isinstance(file_stem, str):
+        raise TypeError(debug_prefix() + "file_stem is type " + str(type(file_stem)))
+
+    if not isinstance(output_folder, (str, type(None))):
+        raise TypeError(debug_prefix() + "output_folder is type " + str(type(output_folder)))
+
+    if not isinstance(plot_duration_secs, (float, np.floating)):
+        raise TypeError(debug_prefix() + "plot_duration_secs is type "
+                        + str(type(plot_duration_secs)))
+
+    plt = import_pyplot()
+    input_data = (welch_t_edges[:-1] + welch_t_edges[1:])/2.0
+    y_data = welch_t_bins/welch_t_bins.sum()
+    y_fit = bell_curve(input_data, *popt)
+    xline = np.linspace(np.min(input_data), np.max(input_data), 100)
+
+    f_fit = plt.figure(figsize=(12, 9))
+    y_line = bell_curve(xline, *popt)
+    plt.plot(input_data, y_data, 'gP', label='TSTAT DATA', \
+             linewidth=LINEWIDTH, markersize=MARKERSIZE)
+    plt.plot(input_data, y_fit, 'ko', label='PREDICTED VALUES', \
+             linewidth=LINEWIDTH, markersize=MARKERSIZE)
+    plt.plot(xline, y_line, 'b-', label='BELL CURVE FIT', \
+             linewidth=LINEWIDTH, markersize=MARKERSIZE)
+    plt.xlabel("WELCH'S T STATISTIC VALUE "
+               "(A MEASURE OF THE DIFFERENCE BETWEEN THE TWO PERIODS)")
+    plt.ylabel('FRACTION OF SIMULATIONS WITH THE T STAT VALUE')
+    plt.title("FIT BELL CURVE TO THE WELCH'S T STATISTIC DISTRIBUTION (R**2=%3.2f)" \
+              % coeff_of_determination)
+    plt.grid()
+    plt.legend(loc='upper right')
+    if bool(block):
+        plt.show()
+    else:
+        plt.ion()
+        plt.show()
+        # wait to display the figure
+        plt.pause(plot_duration_secs)
 
+    if not output_folder is None:
         f_fit.savefig(output_folder + os.sep
                       + file_stem + "_bell_curve_fit.jpg")
 
-    return coeff_of_determination  # fit_plot_bell_curve(x,n)
+    return f_fit  # plot_bell_curve_fit(...)
 
 def make_report(daily_sales_np, \
                 daily_sales_ma, \
@@ -3270,6 +4990,7 @@ def make_report(daily_sales_np, \
                    expected_profit_increase -- from simulations
     RETURNS: report -- text block
     """
+    import scipy.stats as st
 
     # check arguments
     if not isinstance(daily_sales_np, np.ndarray):
@@ -3377,319 +5098,161 @@ def make_report(daily_sales_np, \
                   # + "{:,.2f}".format(sales_stats.expected_profit_increase)
     return report  # make_report(...)
 
-def evaluate_advertising(*args):
+def to_serializable(value):
     """
-    wrapper for main functionality of script, evaluation of the
-    effectiveness of the advertising -- which can include PR activities,
-    sales and marketing consultants, social media services, etc.
+    convert NumPy arrays/scalars, tuples, and dates in
+    (nested) results to plain Python types for JSON
     """
-    global _settings
-    global _b_load_settings
+    if isinstance(value, dict):
+        return {str(key) : to_serializable(item)
+                for key, item in value.items()}
+    elif isinstance(value, (list, tuple, np.ndarray)):
+        return [to_serializable(item) for item in value]
+    elif isinstance(value, np.bool_):
+        return bool(value)
+    elif isinstance(value, np.integer):
+        return int(value)
+    elif isinstance(value, np.floating):
+        return float(value)
+    elif isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value  # to_serializable(value)
+
+def nonfinite_to_none(value):
+    """
+    replace NaN and infinite floats in (nested) serializable results
+    with None (null in JSON; NaN and Infinity are not valid JSON)
+    """
+    if isinstance(value, dict):
+        return {key : nonfinite_to_none(item) for key, item in value.items()}
+    elif isinstance(value, list):
+        return [nonfinite_to_none(item) for item in value]
+    elif isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value  # nonfinite_to_none(value)
+
+def flatten_results(results, prefix=''):
+    """
+    flatten nested results into (name, value) rows for CSV
 
-    # default parameters
-    adv_date_str = ADV_START_DATE
-    ma_period_days = 30  # moving average period (default 30 day)
-    number_sims = NSIMS_DEFAULT  # 1000 thousand simulations
-    annual_adv_expense = ANNUAL_ADV_EXPENSE
+    nested dictionaries give names joined with dots and
+    lists give names with [index] (e.g. histograms.welch_t.bins[3])
+    """
+    rows = []
+    if isinstance(results, dict):
+        for key, item in results.items():
+            name = prefix + '.' + str(key) if prefix else str(key)
+            rows += flatten_results(item, name)
+    elif isinstance(results, list):
+        for index, item in enumerate(results):
+            rows += flatten_results(item, prefix + '[' + str(index) + ']')
+    else:
+        rows.append((prefix, results))
+    return rows  # flatten_results(...)
 
-    # process the command line arguments
-    input_file = INPUT_FILE  # default name of quickbooks sales report
-    seed_val = SEED_VAL  # default random number seed for simulations
-    output_folder = OUTPUT_FOLDER
+def write_results(results, file_path, file_format='json'):
+    """
+    write machine readable results atomically
 
-    unit_price = None  # price charged to customer
-    unit_cost = 0.0 # marginal cost of additional unit
+    ARGUMENTS: results -- dictionary of computed quantities
+               file_path -- output file
+               file_format -- 'json' or 'csv'
 
-    plot_duration_secs = PLOT_DURATION_SECS  # default plot duration
+    The results are written atomically (see atomic_write(...)).
+    """
+    if not isinstance(results, dict):
+        raise TypeError(debug_prefix() + "results is type "
+                        + str(type(results)))
 
-    if not ("-no_settings" in args
-            or "-clean_start" in args):
-        # load settings from shelf files
-        load_settings()
-    else:
-        reset()  # default settings for clean start
+    if file_format not in ('json', 'csv'):
+        raise ValueError(debug_prefix() + "unknown results file format "
+                         + str(file_format))
 
-    # initialize argument index
-    arg_index = 0
-    while arg_index < len(args):
-        print("processing", arg_index, '/', len(args), args[arg_index])
-        if args[arg_index] in ('-adv_date', '-adv_start_date', \
-                               '-adv_date_start'):
-            if (arg_index+1) < len(args):
-                adv_date_str = args[arg_index+1]
-                arg_index += 1
-            else:
-                raise ValueError(debug_prefix()
-                                 + 'missing argument for the advertising start date ('
-                                 + args[arg_index] + ')')
-        elif args[arg_index] in ('-i', '-input', '-sales', \
-                                 '-sales_report', \
-                                 '-input_file'):
-            if (arg_index+1) < len(args):
-                input_file = args[arg_index+1]
-                print("input_file->", input_file)
-                arg_index += 1
-            else:
-                raise ValueError(debug_prefix() + 'missing argument for the input file ('
-                                 + args[arg_index] + ')')
-        elif args[arg_index] in ("-no_settings", "-clean_start"):
-            pass  # do nothing
-        elif args[arg_index] in ("-block", "-b"):
-            # show figure and wait for user input
-            if not _settings.block:
-                _settings = _settings._replace(block=True)
-        elif args[arg_index] in ("-layers", "-l"):
-            # layered plots for presentation software slide animation
-            if not _settings.layers:
-                _settings = _settings._replace(layers=True)
-        elif args[arg_index] in ('-d', '-debug',
-                                 '-debug_level',  # backward compatible for tests
-                                 '-detail_level'):
-            if (arg_index + 1) < len(args):
-                detail_level = int(args[arg_index+1])
-                if detail_level < 0:
-                    raise ValueError(debug_prefix() + "detail_level is "
-                                     + str(detail_level)
-                                     + " (LESS THAN ZERO)")
-                _settings = _settings._replace(detail_level=detail_level)
-                arg_index += 1
-            else:
-                raise ValueError(debug_prefix() + 'missing argument for the detail level ('
-                                 + args[arg_index] + ')')
-
-        elif args[arg_index] in ('-o',
-                                 '-output',
-                                 '-folder',
-                                 '-output_folder'):
-            if (arg_index+1) < len(args):
-                output_folder = args[arg_index+1]
-                arg_index += 1
-            else:
-                raise ValueError(debug_prefix() + 'missing argument for the output folder ('
-                                 + args[arg_index] + ')')
-        elif args[arg_index] in ('-price', '-p', '-unit_price'):
-            if (arg_index+1) < len(args):
-                unit_price = float(args[arg_index+1])
-                check_unit_price(unit_price)
-                arg_index += 1
-            else:
-                raise ValueError(debug_prefix() + 'missing argument for the unit price ('
-                                 + args[arg_index] + ')')
-
-        elif args[arg_index] in ('-cost', '-unit_cost', '-c'):
-            if (arg_index+1) < len(args):
-                unit_cost = float(args[arg_index+1])
-                if unit_cost < 0.0:
-                    raise ValueError(debug_prefix() + "ERROR: unit_cost is "
-                                     + "{:,.2f}".format(unit_cost)
-                                     + " (LESS THAN ZERO)")
-                arg_index += 1
-            else:
-                raise ValueError(debug_prefix() + 'missing argument for the unit cost ('
-                                 + args[arg_index] + ')')
-
-        elif args[arg_index] in ('-plot_duration', '-pause'):
-            # duration in seconds that a figure is displayed
-            if (arg_index+1) < len(args):
-                plot_duration_secs = float(args[arg_index+1])
-                if plot_duration_secs < 0.0:
-                    raise ValueError(debug_prefix() + "ERROR: plot_duration is "
-                                     + "{:,.2f}".format(plot_duration_secs)
-                                     + " seconds (LESS THAN ZERO)")
-                arg_index += 1
-            else:
-                raise ValueError(debug_prefix() + 'missing argument for the plot display duration {'
-                                 + args[arg_index] + ')')
-
-        elif args[arg_index] in '-date_tag':
-            if (arg_index+1) < len(args):
-                date_tag_str = args[arg_index+1]
-                _settings = _settings._replace(date_tag=date_tag_str)
-                arg_index += 1
-            else:
-                ValueError(debug_prefix()
-                           + 'missing argument for the date column name in the sales report ('
-                           + args[arg_index] + ')')
-
-        elif args[arg_index] in '-amount_tag':
-            # the sales amount column name in the sales report
-            if (arg_index+1) < len(args):
-                amount_tag_str = args[arg_index+1]
-                _settings = _settings._replace(amount_tag=amount_tag_str)
-                arg_index += 1
-            else:
-                ValueError(debug_prefix() + "missing argument for the "
-                           + "sales amount column name in the sales report ("
-                           + args[arg_index] + ")")
-
-        elif args[arg_index] in '-sales_type_tag':
-            # the sales type column name in the sales report
-            if (arg_index+1) < len(args):
-                sales_type_tag_str = args[arg_index+1]
-                _settings = _settings._replace(sales_type_tag
-                                               =sales_type_tag_str)
-                arg_index += 1
-            else:
-                ValueError(debug_prefix() + "missing argument for the "
-                           + "optional sales type column name "
-                           + "in the sales report {"
-                           + args[arg_index] + ")")
-
-        elif args[arg_index] in '-sales_type_value':
-            # the value such as "Sales Receipt" for the entries of
-            # interest in the optional sales type column in the
-            # sales report
-            if (arg_index+1) < len(args):
-                sales_type_value_str = args[arg_index+1]
-                _settings = _settings._replace(sales_type_value=
-                                               sales_type_value_str)
-                arg_index += 1
-            else:
-                ValueError(debug_prefix() + "missing argument for the optional sales "
-                           + "type value in the sales report ("
-                           + args[arg_index] + ")")
+    results = to_serializable(results)
 
-        elif args[arg_index] in ('-e', '-expenses', \
-                                 '-adv_expenses', '-advertising'):
-            # annual advertising expense
-            if (arg_index+1) < len(args):
-                # make sure convert to float (dollars)
-                annual_adv_expense = float(args[arg_index+1])
-                if annual_adv_expense < 0.0:
-                    raise ValueError(debug_prefix() + "ERROR: annual advertising expense is "
-                                     + "{:,.2f}".format(annual_adv_expense)
-                                     + " (LESS THAN ZERO)")
-                arg_index += 1
-            else:
-                raise ValueError(debug_prefix()
-                                 + 'missing argument for the annual advertising expense {'
-                                 + args[arg_index] + ')')
-        elif args[arg_index] in ('-n', '-nsims', \
-                                 '-nsimulations', '-n_simulations'):
-            # number of simulations for sales and profit/loss
-            # projections
-            if (arg_index+1) < len(args):
-                # make sure convert to float (dollars)
-                number_sims = int(args[arg_index+1])
-                if number_sims < 1:
-                    raise ValueError(debug_prefix()
-                                     + "ERROR: number of simulations is "
-                                     + str(number_sims)
-                                     + " (LESS THAN ONE SIMULATION)")
-                arg_index += 1
-            else:
-                raise ValueError(debug_prefix()
-                                 + 'missing argument for the number of simulations ('
-                                 + args[arg_index] + ')')
-        elif args[arg_index] in ('-s', '-seed', '--seed'):
-            # the random number seed for the simulations
-            if (arg_index+1) < len(args):
-                # convert to integer
-                seed_val = int(args[arg_index+1])
-                if seed_val < 1:
-                    raise ValueError(debug_prefix()
-                                     + "ERROR: random number seed is "
-                                     + str(seed_val)
-                                     + " (LESS THAN ONE)")
-                arg_index += 1
-            else:
-                raise ValueError(debug_prefix()
-                                 + 'missing argument for the random number seed ('
-                                 + args[arg_index] + ')')
-        elif args[arg_index] in ('-reset', '-reset_settings'):
-            reset()  # reset settings
-            save_settings() # save settings to shelf files
+    def write_contents(out_file):
+        if file_format == 'json':
+            json.dump(nonfinite_to_none(results), out_file, allow_nan=False)
+        else:
+            writer = csv.writer(out_file)
+            writer.writerow(['name', 'value'])
+            writer.writerows(flatten_results(results))
 
-        elif args[arg_index] in ('-glossary', '-gloss', '-g'):
-            # print glossary of technical terms
-            glossary_text = glossary()
-            glossary_text += startup_notice(os.path.basename(args[0]))
-            print(glossary_text)
-            sys.exit(0)
+    atomic_write(file_path, write_contents)
+    # end write_results(...)
 
-        elif args[arg_index] in ('-license', '-copyright'):
-            # print license
-            license_text = gpl_v3_license()
-            print(license_text)
-            sys.exit(0)
+def current_umask():
+    """
+    file mode creation mask of this process (os.umask(...) can only
+    be read by setting it)
+    """
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
 
-        elif args[arg_index] in ('-startup_notice',
-                                 '-short_notice',
-                                 '_notice',
-                                 '-short',
-                                 '-notice'):
-            # print short startup notice
-            print(startup_notice(os.path.basename(args[0])))
-            sys.exit(0)
+def atomic_write(file_path, write_contents):
+    """
+    call write_contents(out_file) with a temporary file in the
+    same folder as file_path and rename the temporary file to
+    file_path, so readers never see a partial file
+    """
+    folder = os.path.dirname(os.path.abspath(file_path))
+    file_h, temp_path = tempfile.mkstemp(dir=folder,
+                                         prefix='.' + os.path.basename(file_path),
+                                         suffix='.tmp')
+    try:
+        with os.fdopen(file_h, 'w', newline='') as out_file:
+            write_contents(out_file)
+        # mkstemp(...) makes the file readable by the owner only;
+        # give it the mode of the other output files
+        os.chmod(temp_path, 0o666 & ~current_umask())
+        os.replace(temp_path, file_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    # end atomic_write(...)
+
+def compute_moving_average(daily_sales_np, ma_period_days=MA_PERIOD_DAYS):
+    """
+    compute moving (aka running) average of daily sales
 
-        elif args[arg_index] in ('-disclaimer', '--disclaimer'):
-            # the legal disclaimer
-            disclaimer_text = disclaimer()
-            disclaimer_text += startup_notice(os.path.basename(args[0]))
-            print(disclaimer_text)
-            sys.exit(0)
+    ARGUMENTS: daily_sales_np -- date/time and sales amount
+               ma_period_days -- moving average period in days
 
-        elif args[arg_index] in ('-v', '-version', '--version'):
-            print("Version:", PROJECT_VERSION)
-            sys.exit(0)
-        elif args[arg_index] in ('-h', '-help', '--help', '-?'):
-            # the usage/help message
-            usage_text = usage(os.path.basename(args[0]))
-            help_text = usage_text + ad_help()
-            print(help_text)
-            sys.exit(0)
-        else:
-            if arg_index == 1 and not args[arg_index][0] == "-":
-                # handle eval_adv.py sales.csv
-                if os.path.exists(args[arg_index]):
-                    input_file = args[arg_index]
-                    print("input_file->", input_file)
-                else:
-                    raise ValueError(debug_prefix()
-                                     + "input file "
-                                     + args[arg_index]
-                                     + " does not exist.  \nThis programs "
-                                     "requires a comma separated values (CSV) "
-                                     "format file \nwith sales data with "
-                                     "the date and amount of each sales "
-                                     "transaction.  \nMost spreadsheets, "
-                                     "databases, and accounting programs can "
-                                     "export data \nin the CSV format.\n")
-            else:
-                # raise Exception for unknown command line argument
-                if arg_index > 0:
-                    raise ValueError(debug_prefix()
-                                     + "unknown command line option ", args[arg_index])
+    RETURNS: daily_sales_ma -- moving average (same size as daily sales)
+    """
+    if not isinstance(daily_sales_np, np.ndarray):
+        raise TypeError(debug_prefix() + 'daily_sales_np is type '
+                        + str(type(daily_sales_np)))
 
-        arg_index += 1  # loop over command line arguments
+    if ma_period_days < 1:
+        raise ValueError(debug_prefix() + 'ma_period_days is '
+                         + str(ma_period_days) + ' (LESS THAN ONE)')
 
-    # interactive copyright/license startup notice
-    print(startup_notice(os.path.basename(sys.argv[0])))
+    tmp1 = daily_sales_np[:, 1].ravel()
+    tmp2 = np.ones((ma_period_days, 1)).ravel()/float(ma_period_days)
+    return np.convolve(tmp1, tmp2, 'same')  # compute_moving_average(...)
 
-    # create the output folder if it does not exist already
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
+def read_sales_report(input_file):
+    """
+    read the sales report (CSV file) into a Pandas DataFrame
 
-    # set the random number seed
-    np.random.seed(seed_val)
+    ARGUMENTS: input_file -- path to the sales report
 
-    base_file_name = os.path.basename(input_file)
-    parts = base_file_name.split('.')
-    file_stem = parts[0]
+    RETURNS: data_frame -- sales report
 
-    # get the date the (new) advertising starts
-    start_date = parse(adv_date_str)
-    print("advertising start date:", start_date)
+    raises ValueError if the file cannot be read or is missing
+    the column header row
+    """
+    import pandas as pd
 
-    # read the input file (the sales report)
     if not os.path.exists(input_file):
         # double check file exists just in case
         cwd = os.getcwd()
         raise FileNotFoundError(input_file
                                 + ' does not exist in folder: '
                                 + cwd)
-
-    print("reading the sales report from", input_file)
     try:
         data_frame = pd.read_csv(input_file)
     except Exception as general_exception:
@@ -3725,445 +5288,163 @@ def evaluate_advertising(*args):
                              "Use DATE for dates column name, "
                              "AMOUNT for the sales amount column name, \n"
                              "and 'Type' for sales type column name.")
+    return data_frame  # read_sales_report(...)
 
-    date_tag, date_index = get_date_refs(data_frame,
-                                         _settings.date_tag)
+def fit_poisson(dist_h, y_err):
+    """
+    fit Poisson model to an empirical distribution of unit sales per day
 
-    sorted_data_frame = data_frame.sort_values(by=date_tag)
-    first_date_ts = sorted_data_frame[date_tag][0]
-    first_date = first_date_ts.date()
-    try:
-        day_np, daily_sales_np = compute_daily_sales(sorted_data_frame,
-                                                     _settings.date_tag,
-                                                     _settings.amount_tag,
-                                                     _settings.sales_type_tag,
-                                                     _settings.sales_type_value)
-    except Exception as general_X:
-        msg = debug_prefix() \
-              + "compute_daily_sales(...) failed with EXCEPTION\n" \
-              + str(general_X) \
-              + "\nEND EXCEPTION"
-        raise ValueError(msg)
+    ARGUMENTS: dist_h -- fraction of days with n unit sales
+               y_err -- error on dist_h (no zeros)
 
-    # sanity check
-    if not daily_sales_np.ndim == 2:
-        raise ValueError(debug_prefix()
-                         + " computed daily_sales_np has "
-                         + str(daily_sales_np.ndim)
-                         + " dimensions (should be 2)")
-
-    if daily_sales_np.size <= 0:
-        raise ValueError(debug_prefix()
-                         + " computed daily sales has "
-                         + str(daily_sales_np.size)
-                         + " elements (should be greater than 0)")
-
-    mask_no_adv = daily_sales_np[:, 0] < start_date
-    mask_adv = daily_sales_np[:, 0] >= start_date
-
-    # compute and plot empirical probability distributions
-    #
-    dist_h_no_adv, y_err_no_adv \
-        = get_dist(daily_sales_np[mask_no_adv, 1], unit_price)
-
-    dist_h_adv, y_err_adv \
-        = get_dist(daily_sales_np[mask_adv, 1], unit_price)
-
-    dist_cumsum_no_adv = dist_h_no_adv.cumsum()
-    dist_cumsum_adv = dist_h_adv.cumsum()
-
-    x_no_adv = np.array(range(dist_h_no_adv.size))
-    x_adv = np.array(range(dist_h_adv.size))
-
-    x_no_adv_line = np.linspace(0.0, np.max(x_no_adv), 100)
-    x_adv_line = np.linspace(0.0, np.max(x_adv), 100)
-
-    # avoid divide by zero error
-    zero_mask = y_err_no_adv == 0.0
-    y_err_no_adv[zero_mask] = 0.01
-
-    zero_mask = y_err_adv == 0.0
-    y_err_adv[zero_mask] = 0.01
-
-    #
-    # fit Poisson model to the empirical distributions
-    #
-
-
-    p_start = [np.round(x_no_adv.dot(dist_h_no_adv)/dist_h_no_adv.sum())]
-
-    popt_no_adv, pcov_no_adv = curve_fit(poisson_curve,
-                                         x_no_adv,
-                                         dist_h_no_adv,
-                                         p_start,
-                                         y_err_no_adv)
-
-    y_fit_no_adv = poisson_curve(x_no_adv, *popt_no_adv)
-
-    y_fit_no_adv_line = poisson_curve(x_no_adv_line, *popt_no_adv)
-
-    res_no_adv = y_fit_no_adv - dist_h_no_adv
-    r2_no_adv = 1.0 - res_no_adv.var()/dist_h_no_adv.var()
-
-    p_start = [np.round(x_adv.dot(dist_h_adv)/dist_h_adv.sum())]
-
-    popt_adv, pcov_adv = curve_fit(poisson_curve,
-                                   x_adv,
-                                   dist_h_adv,
-                                   p_start,
-                                   y_err_adv)
-
-    y_fit_adv = poisson_curve(x_adv, *popt_adv)
-    y_fit_adv_line = poisson_curve(x_adv_line, *popt_adv)
-
-    res_adv = y_fit_adv - dist_h_adv
-    r2_adv = 1.0 - res_adv.var()/dist_h_adv.var()
-
-    welch_t_bins, welch_t_edges = sim_adv_period(daily_sales_np,
-                                                 dist_cumsum_no_adv,
-                                                 mask_adv,
-                                                 file_stem,
-                                                 unit_price=unit_price,
-                                                 output_folder=output_folder,
-                                                 plot_duration_secs=plot_duration_secs)
-
-    coeff_of_determination \
-        = fit_plot_bell_curve(welch_t_edges,
-                              welch_t_bins,
-                              file_stem,
-                              output_folder=output_folder,
-                              plot_duration_secs=plot_duration_secs)
-
-
-    # create a SalesStats object
-    sales_stats = SalesStats(daily_sales_np,
-                             mask_no_adv,
-                             welch_t_edges,
-                             welch_t_bins,
-                             coeff_of_determination,
-                             input_file)
-
-    if _settings.layers:
-        # generate layers for animation of plot
-        # in PowerPoint/Impress/presentation software
-
-        # only daily sales
-        daily_sales_ma = plot_sales_data(input_file,
-                                         first_date,
-                                         day_np,
-                                         mask_adv,
-                                         mask_no_adv,
-                                         ma_period_days,
-                                         daily_sales_np,
-                                         sales_stats,
-                                         plot_duration_secs,
-                                         output_folder,
-                                         show_ma=False,
-                                         show_period_average=False)
-
-        # daily sales and moving average
-        daily_sales_ma = plot_sales_data(input_file,
-                                         first_date,
-                                         day_np,
-                                         mask_adv,
-                                         mask_no_adv,
-                                         ma_period_days,
-                                         daily_sales_np,
-                                         sales_stats,
-                                         plot_duration_secs,
-                                         output_folder,
-                                         show_ma=True,
-                                         show_period_average=False)
-
-    # show all three plot elements together (default)
-    daily_sales_ma = plot_sales_data(input_file,
-                                     first_date,
-                                     day_np,
-                                     mask_adv,
-                                     mask_no_adv,
-                                     ma_period_days,
-                                     daily_sales_np,
-                                     sales_stats,
-                                     plot_duration_secs,
-                                     output_folder,
-                                     show_ma=True,
-                                     show_period_average=True)
-
-
-    # side by side pie charts of frequency of daily sales
-    fig_pie = plt.figure(figsize=(12,9))
-    # no advertising pie chart
-    plt.subplot(1,2,1)
-    labels_no_adv = [str(item) for item in x_no_adv]
-    plt.pie(dist_h_no_adv.ravel(), labels=labels_no_adv, autopct='%1.1f%%')
-    plt.title('NO ADVERTISING')
-
-    # advertising pie chart
-    plt.subplot(1,2,2)
-    labels_adv = [str(item) for item in x_adv]
-    plt.pie(dist_h_adv.ravel(), labels=labels_adv, autopct='%1.1f%%')
-    plt.title('ADVERTISING')
-
-    fp = FontProperties(family="sans-serif", size=20, weight="bold")
-    plt.suptitle('UNIT SALES PER DAY', fontproperties=fp)
-
-    if _settings.block:
-        plt.show()
-    else:
-        plt.ion()
-        plt.show()
-        plt.pause(plot_duration_secs)
-
-    fig_pie.savefig(output_folder
-                     + os.sep
-                     + file_stem
-                     + "_pie_charts.jpg")
-
-    fig_bar, ax_bar  = plt.subplots(figsize=(12,9))
-    n_groups = max(len(x_adv), len(x_no_adv))
-
-    index = np.arange(n_groups)
-    bar_width = 0.35
-    opacity = 0.8
-
-    try:
-        index_no_adv = np.arange(len(x_no_adv))
-        rects1 = plt.bar(index_no_adv,
-                         dist_h_no_adv.ravel(),
-                         bar_width,
-                         alpha=opacity,
-                         color='b',
-                         label='NO ADVERTISING')
-    except Exception as bar_X:
-        print(debug_prefix(), "caught exception", bar_X)
-        raise()
-
-    try:
-        index_adv = np.arange(len(x_adv))
-        rects2 = plt.bar(index_adv + bar_width,
-                         dist_h_adv.ravel(),
-                         bar_width,
-                         alpha=opacity,
-                         color='g',
-                         label='ADVERTISING')
-    except Exception as bar_X:
-        print(debug_prefix(), "caught exception", bar_X)
-        raise()
-
-    plt.xlabel('UNIT SALES PER DAY')
-    plt.ylabel('FRACTION OF DAYS')
-    plt.title('UNIT SALES PER DAY BAR CHART')
-    bar_labels = [str(item) for item in range(n_groups+1)]
-    plt.xticks(index + bar_width, bar_labels)
-    plt.legend()
-
-    plt.tight_layout()
-    if _settings.block:
-        plt.show()
-    else:
-        plt.ion()
-        plt.show()
-        plt.pause(plot_duration_secs)
-
-    # save bar charts to jpeg image
-    fig_bar.savefig(output_folder
-                     + os.sep
-                     + file_stem
-                     + "_bar_charts.jpg")
-
-    if _settings.detail_level > 0:
-        # show empirical sales distributions
-        fig_dist = plt.figure(figsize=(12, 9))
-        plt.errorbar(x_no_adv, dist_h_no_adv.ravel(),
-                     yerr=y_err_no_adv.ravel(),
-                     fmt=NO_ADV_MARKER,
-                     label='NO ADVERTISING',
-                     linewidth=LINEWIDTH, markersize=MARKERSIZE)
-        plt.errorbar(x_adv, dist_h_adv.ravel(),
-                     yerr=y_err_adv.ravel(),
-                     fmt=ADV_MARKER,
-                     label='ADVERTISING',
-                     linewidth=LINEWIDTH, markersize=MARKERSIZE)
-
-        if _settings.detail_level > 1:
-            plt.plot(x_no_adv_line, y_fit_no_adv_line,
-                     NO_ADV_LINE,
-                     label='NO ADV FIT', linewidth=LINEWIDTH)
-
-            plt.plot(x_adv_line, y_fit_adv_line,
-                     ADV_LINE,
-                     label='ADV FIT', linewidth=LINEWIDTH)
-
-        plt.title('ESTIMATED PROBABILITY OF A NUMBER OF SALES PER DAY')
-        plt.xlabel('NUMBER OF UNIT SALES PER DAY')
-        plt.ylabel('FRACTION OF DAYS WITH THE NUMBER OF DAILY SALES')
-        plt.legend(loc='upper right')
-        if _settings.detail_level > 1:
-            xlo, xhi = plt.xlim()
-            delta_x = xhi - xlo
-            ylo, yhi = plt.ylim()
-            delta_y = yhi - ylo
-            # add coefficients of determination from fits
-            plt.text(xlo + delta_x*0.025,
-                     yhi - 0.05*delta_y,
-                     'NO ADV R**2: %3.2f' % r2_no_adv)
-            plt.text(xlo + 0.025*delta_x,
-                     yhi - 0.09*delta_y,
-                     'ADV R**2: %3.2f' % r2_adv)
-
-        plt.grid()
-        if _settings.block:
-            plt.show()
-        else:
-            plt.ion()
-            plt.show()
-            plt.pause(plot_duration_secs)
-
-        fig_dist.savefig(output_folder
-                         + os.sep
-                         + file_stem
-                         + "_empirical_distributions.jpg")
-
-    # simulate future year sales with and without adv
-
-    # TO DO: simulate future year sales with and without adv
-    # using the empirical daily sales distributions
-    #
+    RETURNS: popt -- Poisson parameters (see poisson_curve(...))
+             r2 -- coefficient of determination of the fit
+    """
+    from scipy.optimize import curve_fit
+
+    x_values = np.array(range(dist_h.size))
+    p_start = [np.round(x_values.dot(dist_h)/dist_h.sum())]
+
+    popt, pcov = curve_fit(poisson_curve,
+                           x_values,
+                           dist_h,
+                           p_start,
+                           y_err)
+
+    y_fit = poisson_curve(x_values, *popt)
+    residuals = y_fit - dist_h
+    r2 = 1.0 - residuals.var()/dist_h.var()
+    return popt, r2  # fit_poisson(...)
+
+def project_annual_sales(dist_cumsum_adv,
+                         y_err_adv,
+                         dist_cumsum_no_adv,
+                         y_err_no_adv,
+                         unit_price,
+                         number_sims=NSIMS_DEFAULT,
+                         rng=None,
+                         progress=None,
+                         verbose=True,
+                         cancel=None,
+                         partial=None):
+    """
+    simulate future year sales with and without advertising
+    using the empirical daily sales distributions
+
+    ARGUMENTS: dist_cumsum_adv, dist_cumsum_no_adv -- empirical cdfs
+               y_err_adv, y_err_no_adv -- errors on the empirical pdfs
+               unit_price -- price charged to customer
+               number_sims -- number of simulated years
+               rng -- NumPy RandomState (default np.random)
+               progress -- optional callback progress(n_done, number_sims)
+                           called every PROGRESS_BATCH_SIMS simulations
+               verbose -- print progress messages
+               cancel -- optional threading.Event; raises
+                         EvaluationCancelled when set (checked every
+                         PROGRESS_BATCH_SIMS simulations)
+               partial -- optional callback partial(ave_sales_no_adv,
+                          ave_sales_adv, ave_sales_no_adv_test) with the
+                          simulations completed so far, called every
+                          PROGRESS_BATCH_SIMS simulations
+
+    RETURNS: ave_sales_no_adv, ave_sales_adv, ave_sales_no_adv_test --
+             average daily sales for each simulated year
+    """
     year_shape = (365,)
-    if unit_price is None:
-        # infer the unit price from the sales data
-        unit_prices = get_unit_prices(daily_sales_np[mask_no_adv, 1])
-        unit_price = unit_prices[0]
-        check_unit_price(unit_price)
-
-    else:
-        # use unit_price from command line arguments
-        pass
 
     # initialize accumulators for simulated average sales
     ave_sales_no_adv = np.zeros((number_sims,))
     ave_sales_no_adv_test = np.zeros((number_sims,))
     ave_sales_adv = np.zeros((number_sims,))
 
-    if not root is None:
-        print("creating the ttk progres bar...")
-        progress_var = IntVar()
-        pbar = Progressbar(root,
-                           variable=progress_var,
-                           maximum=number_sims,
-                           orient=HORIZONTAL,
-                           mode='determinate')
-        pbar.pack(fill=X, expand=1)
-        root.update_idletasks()
-
-    print("simulating annual sales using empirical distributions")
+    if verbose:
+        print("simulating annual sales using empirical distributions")
     t_mark = time.time()
     for trial_index in range(number_sims):
+        if trial_index % PROGRESS_BATCH_SIMS == 0 \
+           and not cancel is None and cancel.is_set():
+            raise EvaluationCancelled("evaluation cancelled")
+
         # one full year with advertising
         dist_cumsum_adv_varied = vary_distribution(dist_cumsum_adv,
-                                                   y_err_adv)
+                                                   y_err_adv,
+                                                   rng)
 
         unit_sales_adv = sim_unit_sales(dist_cumsum_adv_varied,
-                                        year_shape)
+                                        year_shape,
+                                        rng)
 
         # one full year without advertising
         dist_cumsum_no_adv_varied = vary_distribution(dist_cumsum_no_adv,
-                                                      y_err_no_adv)
+                                                      y_err_no_adv,
+                                                      rng)
 
         unit_sales_no_adv = sim_unit_sales(dist_cumsum_no_adv_varied,
-                                           year_shape)
+                                           year_shape,
+                                           rng)
 
         # simulate no advertising values for the differential risk
         # assessment
         dist_cumsum_no_adv_test_varied = vary_distribution(dist_cumsum_no_adv,
-                                                      y_err_no_adv)
+                                                           y_err_no_adv,
+                                                           rng)
 
         unit_sales_no_adv_test = sim_unit_sales(dist_cumsum_no_adv_varied,
-                                           year_shape)
+                                                year_shape,
+                                                rng)
 
         # compute average daily sales for each simulated period
+        # (unit counts summed in int64, dollars only for the average)
         ave_sales_no_adv[trial_index] \
-            = (unit_price * unit_sales_no_adv).sum() \
+            = unit_price * unit_sales_no_adv.sum(dtype=np.int64) \
             / unit_sales_no_adv.size
 
         # test simulation for differential risk assessment
         ave_sales_no_adv_test[trial_index] \
-            = (unit_price * unit_sales_no_adv_test).sum() \
+            = unit_price * unit_sales_no_adv_test.sum(dtype=np.int64) \
             / unit_sales_no_adv_test.size
 
         ave_sales_adv[trial_index] \
-            = (unit_price * unit_sales_adv).sum() / unit_sales_adv.size
+            = unit_price * unit_sales_adv.sum(dtype=np.int64) \
+            / unit_sales_adv.size
 
         # progress message every second
         t_now = time.time()
-        if (t_now - t_mark) > 1.0:
+        if verbose and (t_now - t_mark) > 1.0:
             print(trial_index, "/", number_sims, flush=True)
             t_mark = t_now
-        if not root is None:
-            progress_var.set(trial_index)
-            root.update_idletasks()
+        n_done = trial_index + 1
+        if n_done % PROGRESS_BATCH_SIMS == 0 or n_done == number_sims:
+            if not progress is None:
+                progress(n_done, number_sims)
+            if not partial is None:
+                partial(ave_sales_no_adv[:n_done],
+                        ave_sales_adv[:n_done],
+                        ave_sales_no_adv_test[:n_done])
         # end simulation loop
 
-    if not root is None:
-        print("destroying ttk progress bar")
-        pbar.destroy()
-
-# compute empirical p-value
-    low_sales = 0.0
-    hi_sales = np.max((np.max(ave_sales_no_adv),
-                       np.max(ave_sales_adv)))
-
-    # use histogram to get estimate of the probability density
-    # function for sales for two periods
-
-    bins_no_adv, edges_no_adv = np.histogram(ave_sales_no_adv,
-                                             bins=_settings.bins,
-                                             range=(low_sales, hi_sales),
-                                             density=True)
-    bins_adv, edges_adv = np.histogram(ave_sales_adv,
-                                       bins=_settings.bins,
-                                       range=(low_sales, hi_sales),
-                                       density=True)
-
-    if _settings.detail_level > 1:
-        xval = (edges_no_adv[:-1] + edges_no_adv[1:])/2.0
-
-        f_pdf = plt.figure(figsize=(12, 9))
-        plt.plot(xval, bins_no_adv,
-                 NO_ADV_MARKER,
-                 label='NO ADV', markersize=MARKERSIZE, linewidth=LINEWIDTH)
-        plt.plot(xval, bins_adv,
-                 ADV_MARKER,
-                 label='ADV', markersize=MARKERSIZE, linewidth=LINEWIDTH)
-        plt.grid()
-        plt.legend(loc='upper right')
-        plt.xlabel('DOLLARS')
-        plt.ylabel('Probability Density')
-        plt.title('Empirical Sales Probability Density '
-                  'from the Sales Projection')
-
-        ax_list = f_pdf.axes
-        ax = ax_list[0]
-        formatter = FuncFormatter(currency)
-        ax.xaxis.set_major_formatter(formatter)
+    return ave_sales_no_adv, ave_sales_adv, ave_sales_no_adv_test
+    # end project_annual_sales(...)
 
-        if _settings.block:
-            plt.show()
-        else:
-            plt.ion()
-            plt.show()
-            plt.pause(plot_duration_secs)
-        f_pdf.savefig(output_folder + os.sep +
-                      file_stem + "_sales_pdf.jpg")
+def annual_profit_increase(ave_sales_no_adv,
+                           ave_sales_adv,
+                           unit_price,
+                           unit_cost=0.0,
+                           annual_adv_expense=ANNUAL_ADV_EXPENSE,
+                           dtype=np.float64):
+    """
+    annual sales and profit increase for each simulated year
 
-    # density result is normalized by bin widths
-    bin_widths = edges_adv[1:] - edges_adv[:-1]
-    pdf_adv = bins_adv*bin_widths
-    pdf_no_adv = bins_no_adv*bin_widths
-    # compute probability of overlap between the
-    # two distributions
-    empirical_p_value = (pdf_adv * pdf_no_adv).sum()
+    ARGUMENTS: ave_sales_no_adv, ave_sales_adv -- simulated average
+                  daily sales (see project_annual_sales(...))
+               unit_price -- price charged to customer
+               unit_cost -- marginal cost of additional unit
+               annual_adv_expense -- annual advertising expense
+               dtype -- type of the returned arrays (np.float32 for
+                        half the memory)
 
+    RETURNS: ave_sales_increase, ave_profit_increase
+    """
     ave_sales_increase \
         = DAYS_PER_YEAR*(ave_sales_adv \
                          - ave_sales_no_adv)
@@ -4172,342 +5453,5835 @@ def evaluate_advertising(*args):
         = unit_cost*DAYS_PER_YEAR*((ave_sales_adv/unit_price) \
                                    - (ave_sales_no_adv/unit_price))
 
+    ave_profit_increase = ave_sales_increase - annual_adv_expense
+    # deduct marginal cost of new units sold
+    ave_profit_increase = ave_profit_increase - ave_cost_increase
+    return np.asarray(ave_sales_increase, dtype=dtype), \
+        np.asarray(ave_profit_increase, dtype=dtype)
+    # end annual_profit_increase(...)
+
+def projection_values(ave_sales_no_adv,
+                      ave_sales_adv,
+                      ave_sales_no_adv_test,
+                      unit_price,
+                      unit_cost=0.0,
+                      annual_adv_expense=ANNUAL_ADV_EXPENSE,
+                      dtype=np.float64):
+    """
+    simulated average daily and annual sales and the sales and profit
+    increases of each simulated year, with (sales_increase,
+    profit_increase) and without (sales_increase_diff,
+    profit_increase_diff) the advertising (see annual_profit_increase(...))
+
+    RETURNS: dictionary of name: array histogrammed by
+             compute_projection_summary(...) and ProjectionAccumulator
+    """
+    ave_sales_increase, ave_profit_increase \
+        = annual_profit_increase(ave_sales_no_adv,
+                                 ave_sales_adv,
+                                 unit_price,
+                                 unit_cost,
+                                 annual_adv_expense,
+                                 dtype)
+
     # differential risk assessement
     #
     # compare simulations with NO ADVERTISING
     #
-    ave_sales_increase_diff \
-        = DAYS_PER_YEAR*(ave_sales_no_adv_test \
-                         - ave_sales_no_adv)
+    ave_sales_increase_diff, ave_profit_increase_diff \
+        = annual_profit_increase(ave_sales_no_adv,
+                                 ave_sales_no_adv_test,
+                                 unit_price,
+                                 unit_cost,
+                                 0.0,  # no advertising expense
+                                 dtype)
+
+    return {'sales_no_adv': ave_sales_no_adv,
+            'sales_adv': ave_sales_adv,
+            'annual_sales_no_adv': (DAYS_PER_YEAR*ave_sales_no_adv).astype(dtype),
+            'annual_sales_adv': (DAYS_PER_YEAR*ave_sales_adv).astype(dtype),
+            'sales_increase': ave_sales_increase,
+            'profit_increase': ave_profit_increase,
+            'sales_increase_diff': ave_sales_increase_diff,
+            'profit_increase_diff': ave_profit_increase_diff}
+    # end projection_values(...)
+
+def wilson_interval(fraction, n_trials, z=CONFIDENCE_Z):
+    """
+    Wilson score confidence interval of a fraction of n_trials
 
-    if _settings.detail_level > 0:
-        plot_ave_hist(ave_sales_increase_diff,
-                      input_file,
-                      output_folder,
-                      'AVERAGE SALES INCREASE DIFF',
-                      plot_duration_secs)
+    RETURNS: (low, high)
+    """
+    z_squared = z**2
+    center = (fraction + z_squared/(2.0*n_trials))/(1.0 + z_squared/n_trials)
+    half_width = z*np.sqrt(fraction*(1.0 - fraction)/n_trials
+                           + z_squared/(4.0*n_trials**2)) \
+                 /(1.0 + z_squared/n_trials)
+    return (max(0.0, center - half_width), min(1.0, center + half_width))
+
+def summarize_partial_projections(ave_sales_no_adv,
+                                  ave_sales_adv,
+                                  unit_price,
+                                  unit_cost=0.0,
+                                  annual_adv_expense=ANNUAL_ADV_EXPENSE,
+                                  bins=BINS_DEFAULT,
+                                  number_sims=None):
+    """
+    summarize the simulations completed so far with
+    confidence intervals (CONFIDENCE_Z, 95 percent)
+
+    ARGUMENTS: ave_sales_no_adv, ave_sales_adv -- simulated average
+                  daily sales completed so far
+               number_sims -- total number of simulations in the run
+
+    RETURNS: dictionary with
+             n_sims, number_sims -- simulations done and in the run
+             expected_profit_increase, expected_profit_increase_ci --
+                mean and (low, high) confidence interval
+             loss_probability, loss_probability_ci -- probability of a
+                loss (Wilson score interval)
+             profit_bins, profit_edges, profit_bins_err -- histogram of
+                the profit increase and the error on each bin count
+
+    WHY: the first batches of simulations give a good enough answer
+    in well under a second; the confidence intervals show how much it
+    will change as more simulations complete.
+    """
+    n_sims = ave_sales_adv.size
+    if n_sims < 1:
+        raise ValueError(debug_prefix() + "no simulations to summarize")
 
+    ave_sales_increase, ave_profit_increase \
+        = annual_profit_increase(ave_sales_no_adv,
+                                 ave_sales_adv,
+                                 unit_price,
+                                 unit_cost,
+                                 annual_adv_expense)
 
-    ave_cost_increase_diff \
-        = unit_cost*DAYS_PER_YEAR*((ave_sales_no_adv_test/unit_price) \
-                                   - (ave_sales_no_adv/unit_price))
+    expected_profit_increase = ave_profit_increase.mean()
+    if n_sims > 1:
+        profit_err = CONFIDENCE_Z*ave_profit_increase.std(ddof=1)/np.sqrt(n_sims)
+    else:
+        profit_err = np.inf
+
+    loss_probability = (ave_profit_increase < 0.0).mean()
+
+    profit_bins, profit_edges = np.histogram(ave_profit_increase, bins)
+    # binomial error on the number of simulations in each bin
+    profit_bins_err = CONFIDENCE_Z*np.sqrt(profit_bins*(1.0 - profit_bins/n_sims))
+
+    return {'n_sims' : n_sims,
+            'number_sims' : n_sims if number_sims is None else number_sims,
+            'expected_profit_increase' : expected_profit_increase,
+            'expected_profit_increase_ci' : (expected_profit_increase - profit_err,
+                                             expected_profit_increase + profit_err),
+            'loss_probability' : loss_probability,
+            # Wilson score interval for the probability of a loss
+            'loss_probability_ci' : wilson_interval(loss_probability, n_sims),
+            'profit_bins' : profit_bins,
+            'profit_edges' : profit_edges,
+            'profit_bins_err' : profit_bins_err}
+    # end summarize_partial_projections(...)
+
+def sales_densities(sim_hists):
+    """
+    probability densities of the average daily sales with and without
+    advertising from their histograms (on the same edges) and the
+    empirical p-value, the probability of overlap of the two
 
-    annual_sales_no_adv_test = DAYS_PER_YEAR*ave_sales_no_adv_test
+    RETURNS: density_no_adv, density_adv, empirical_p_value
+    """
+    # use histogram to get estimate of the probability density
+    # function for sales for two periods
+    counts_no_adv, edges_no_adv = sim_hists['sales_no_adv']
+    counts_adv, edges_adv = sim_hists['sales_adv']
 
-    # show sales/profit projections for year with no advertising
+    # density normalized by bin widths (same as density=True)
+    bin_widths = edges_adv[1:] - edges_adv[:-1]
+    density_no_adv = counts_no_adv/(counts_no_adv.sum()*bin_widths)
+    density_adv = counts_adv/(counts_adv.sum()*bin_widths)
 
-    annual_sales_no_adv = DAYS_PER_YEAR*ave_sales_no_adv
+    # probability in each bin
+    pdf_adv = density_adv*bin_widths
+    pdf_no_adv = density_no_adv*bin_widths
+    # compute probability of overlap between the
+    # two distributions
+    empirical_p_value = (pdf_adv * pdf_no_adv).sum()
+    return density_no_adv, density_adv, empirical_p_value
+
+def compute_projection_summary(ave_sales_no_adv,
+                               ave_sales_adv,
+                               ave_sales_no_adv_test,
+                               unit_price,
+                               unit_cost=0.0,
+                               annual_adv_expense=ANNUAL_ADV_EXPENSE,
+                               bins=BINS_DEFAULT,
+                               dtype=np.float64):
+    """
+    summarize the annual sales projections from project_annual_sales(...)
+    (dtype is the type of the derived sales and profit arrays, see
+    annual_profit_increase(...))
+
+    RETURNS: dictionary with the histograms of the projections
+             ('histograms'), the sales probability densities,
+             the loss counts, the expected profit increases, and the
+             empirical p-value (overlap of the sales densities)
+    """
+    # compute empirical p-value
+    low_sales = 0.0
+    hi_sales = np.max((np.max(ave_sales_no_adv),
+                       np.max(ave_sales_adv)))
 
-    ave_profit_increase_diff = ave_sales_increase_diff
-    # deduct marginal cost of new units sold
-    ave_profit_increase_diff \
-        = ave_profit_increase_diff - ave_cost_increase_diff
+    sim_values = projection_values(ave_sales_no_adv,
+                                   ave_sales_adv,
+                                   ave_sales_no_adv_test,
+                                   unit_price,
+                                   unit_cost,
+                                   annual_adv_expense,
+                                   dtype)
 
+    # the means accumulate in float64 for any dtype
     expected_profit_increase_diff \
-        = ave_profit_increase_diff.mean()
-
-    if _settings.detail_level > 0:
-        fig_no_adv = plt.figure(figsize=(12, 9))
-        sales_bins, sales_edges, patches \
-            = plt.hist(annual_sales_no_adv, bins=_settings.bins)
-        plt.title('ANNUAL SALES WITH NO ADVERTISING')
-        plt.ylabel('NUMBER OF SIMULATIONS')
-        plt.xlabel('DOLLARS')
-        plt.grid()
-
-        ax_list = fig_no_adv.axes
-        ax = ax_list[0]
-        formatter = FuncFormatter(currency)
-        ax.xaxis.set_major_formatter(formatter)
-
+        = sim_values['profit_increase_diff'].mean(dtype=np.float64)
+
+    expected_profit_increase = sim_values['profit_increase'].mean(dtype=np.float64)
+
+    # histogram every simulation array once; the sales
+    # probability densities share the same edges
+    sim_hists = histogram_simulations(sim_values,
+                                      bins=bins,
+                                      ranges={'sales_no_adv': (low_sales, hi_sales),
+                                              'sales_adv': (low_sales, hi_sales)})
+
+    density_no_adv, density_adv, empirical_p_value = sales_densities(sim_hists)
+    edges_adv = sim_hists['sales_adv'][1]
+
+    sales_bins_diff, sales_edges_diff = sim_hists['sales_increase_diff']
+    profit_bins_diff, profit_edges_diff = sim_hists['profit_increase_diff']
+    sales_bins, sales_edges = sim_hists['sales_increase']
+    profit_bins, profit_edges = sim_hists['profit_increase']
+
+    # average daily sales increase uses the same bins
+    # with the edges scaled to daily values
+    loss_counts = {'n_loss_sales' : compute_loss(sales_bins, sales_edges),
+                   'n_loss_daily_sales' : compute_loss(sales_bins,
+                                                       sales_edges/DAYS_PER_YEAR),
+                   'n_loss_profits' : compute_loss(profit_bins, profit_edges),
+                   'n_loss_sales_diff' : compute_loss(sales_bins_diff,
+                                                      sales_edges_diff),
+                   'n_loss_profit_diff' : compute_loss(profit_bins_diff,
+                                                       profit_edges_diff)}
+
+    return {'histograms' : sim_hists,
+            'density_no_adv' : density_no_adv,
+            'density_adv' : density_adv,
+            'density_edges' : edges_adv,
+            'loss_counts' : loss_counts,
+            'expected_profit_increase' : expected_profit_increase,
+            'expected_profit_increase_diff' : expected_profit_increase_diff,
+            'empirical_p_value' : empirical_p_value}
+    # end compute_projection_summary(...)
+
+SCENARIO_QUANTILES = (0.05, 0.5, 0.95)  # profit quantiles of the grid
+
+def parse_scenario_grid(grid_str, unit_cost=UNIT_COST_DEFAULT):
+    """
+    parse -scenario_grid expense_range[,unit_cost_range] where a
+    range is start:stop:number_of_points or a single value, e.g.
+    0:24000:100,0:60:100 (the unit costs default to unit_cost)
 
-        if _settings.block:
-            plt.show()
+    RETURNS: annual advertising expenses, unit costs (tuples of floats)
+    """
+    ranges = grid_str.split(',')
+    if len(ranges) > 2:
+        raise ValueError(debug_prefix() + "scenario grid " + grid_str
+                         + " has more than two ranges")
+    if len(ranges) == 1:
+        ranges.append(str(unit_cost))
+    grid = []
+    for range_str in ranges:
+        values = [float(value) for value in range_str.split(':')]
+        if len(values) == 1:
+            grid.append((values[0],))
+        elif len(values) == 3 and values[2] >= 1:
+            grid.append(tuple(np.linspace(values[0], values[1],
+                                          int(values[2])).tolist()))
         else:
-            plt.ion()
-            plt.show()  # sales projection histogram
-            # wait to display the figure
-            plt.pause(plot_duration_secs)
-
-        image_file = file_stem + "_sales_projection_no_adv.jpg"
-        print("saving sales projection bar chart to", image_file)
-        fig_no_adv.savefig(output_folder + os.sep + image_file)
-    else:
-        sales_bins, sales_edges \
-            = np.histogram(annual_sales_no_adv,
-                           bins=_settings.bins)
+            raise ValueError(debug_prefix() + "scenario grid range "
+                             + range_str + " is not start:stop:points")
+    return grid[0], grid[1]
+
+def compute_scenario_grid(ave_sales_no_adv,
+                          ave_sales_adv,
+                          unit_price,
+                          annual_adv_expenses,
+                          unit_costs,
+                          quantiles=SCENARIO_QUANTILES,
+                          dtype=np.float64):
+    """
+    expected profit increase, probability of a loss, and profit
+    quantiles for every annual advertising expense and unit cost
 
-    # show sales/profit projections for year with advertising
+    The profit increase of a simulated year is
+    sales_increase*(1 - unit_cost/unit_price) - annual_adv_expense
+    (see annual_profit_increase(...)), linear in the expense and the
+    cost, so the grid scales and shifts one sorted copy of the
+    simulated sales increases instead of redoing the simulations.
 
-    annual_sales_adv = DAYS_PER_YEAR*ave_sales_adv
+    RETURNS: see scenario_grid_from_sales_increase(...)
+    """
+    sales_increase = np.sort(DAYS_PER_YEAR*(ave_sales_adv - ave_sales_no_adv))
+    return scenario_grid_from_sales_increase(
+        sales_increase.mean(),
+        sales_increase.size,
+        lambda threshold, side: np.searchsorted(sales_increase, threshold,
+                                                side=side),
+        lambda q: np.quantile(sales_increase, q),
+        unit_price, annual_adv_expenses, unit_costs, quantiles, dtype)
+    # end compute_scenario_grid(...)
+
+def scenario_grid_from_sales_increase(mean_sales_increase,
+                                      n_sims,
+                                      count_below,
+                                      sales_increase_quantile,
+                                      unit_price,
+                                      annual_adv_expenses,
+                                      unit_costs,
+                                      quantiles=SCENARIO_QUANTILES,
+                                      dtype=np.float64):
+    """
+    the scenario grid of compute_scenario_grid(...) from the
+    distribution of the simulated annual sales increases
+
+    ARGUMENTS: mean_sales_increase -- mean annual sales increase
+               n_sims -- number of simulated years
+               count_below -- count_below(thresholds, side) number of
+                              sales increases below ('left') or at or
+                              below ('right') each threshold
+               sales_increase_quantile -- sales_increase_quantile(q)
+                                          quantiles of the sales increase
+               (see compute_scenario_grid(...) for the others)
+
+    RETURNS: dictionary of arrays indexed [unit_cost, expense]
+             (profit_quantiles [quantile, unit_cost, expense]) and the
+             break even expense for each unit cost; dtype is the type
+             of the profit and probability grids
+    """
+    expenses = np.asarray(annual_adv_expenses, dtype=np.float64)
+    costs = np.asarray(unit_costs, dtype=np.float64)
+    quantiles = np.asarray(quantiles, dtype=np.float64)
+
+    # profit = factor*sales_increase - expense
+    factors = 1.0 - costs/unit_price
+
+    break_even_expense = factors*mean_sales_increase
+    expected_profit_increase = break_even_expense[:, None] - expenses[None, :]
+
+    # loss when factor*sales_increase < expense
+    factor_grid = np.broadcast_to(factors[:, None], expected_profit_increase.shape)
+    expense_grid = np.broadcast_to(expenses[None, :], expected_profit_increase.shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        threshold = expense_grid/factor_grid
+    n_loss = np.where(factor_grid > 0.0,
+                      count_below(threshold, 'left'),
+                      n_sims - count_below(threshold, 'right'))
+    # no profit from sales when the unit cost is the unit price
+    n_loss = np.where(factor_grid == 0.0, np.where(expense_grid > 0.0, n_sims, 0),
+                      n_loss)
+    loss_probability = n_loss/n_sims
+
+    # quantile q of factor*sales_increase is factor*quantile(1 - q)
+    # of the sales increase for a negative factor
+    quantiles_up = sales_increase_quantile(quantiles)
+    quantiles_down = sales_increase_quantile(1.0 - quantiles)
+    sales_quantiles = np.where(factors[None, :] >= 0.0,
+                               factors[None, :]*quantiles_up[:, None],
+                               factors[None, :]*quantiles_down[:, None])
+    profit_quantiles = sales_quantiles[:, :, None] - expenses[None, None, :]
+
+    return {'annual_adv_expense' : expenses,
+            'unit_cost' : costs,
+            'quantiles' : quantiles,
+            'expected_profit_increase' : expected_profit_increase.astype(dtype),
+            'loss_probability' : loss_probability.astype(dtype),
+            'profit_quantiles' : profit_quantiles.astype(dtype),
+            'break_even_expense' : break_even_expense}
+    # end scenario_grid_from_sales_increase(...)
+
+def scenario_grid_report(scenario_grid):
+    """
+    text summary of the scenario grid for the report
 
-    if _settings.detail_level > 0:
-        fig_adv = plt.figure(figsize=(12, 9))
-        sales_bins, sales_edges, patches \
-            = plt.hist(annual_sales_adv, bins=_settings.bins)
-        n_loss_sales_adv = compute_loss(sales_bins, sales_edges)
-        plt.title('ANNUAL SALES WITH ADVERTISING')
-        plt.ylabel('NUMBER OF SIMULATIONS')
-        plt.xlabel('DOLLARS')
-        plt.grid()
+    RETURNS: report -- text block
+    """
+    report = "\n\nScenario Grid: %d annual advertising expenses from %s to %s" \
+             % (scenario_grid['annual_adv_expense'].size,
+                locale.currency(scenario_grid['annual_adv_expense'][0],
+                                grouping=True),
+                locale.currency(scenario_grid['annual_adv_expense'][-1],
+                                grouping=True))
+    report += " x %d unit costs\n" % scenario_grid['unit_cost'].size
+    ends = [0, -1] if scenario_grid['unit_cost'].size > 1 else [0]
+    for unit_cost, break_even in zip(scenario_grid['unit_cost'][ends],
+                                     scenario_grid['break_even_expense'][ends]):
+        report += "Break Even Annual Advertising Expense at Unit Cost %s: %s\n" \
+                  % (locale.currency(unit_cost, grouping=True),
+                     locale.currency(break_even, grouping=True))
+    return report
+
+def write_scenario_grid(scenario_grid, file_path):
+    """
+    write the scenario grid as a CSV table with one row per
+    expense and unit cost
+    """
+    quantile_fields = ['profit_q%g' % (100.0*quantile)
+                       for quantile in scenario_grid['quantiles']]
+
+    def write_rows(out_file):
+        writer = csv.writer(out_file)
+        writer.writerow(['annual_adv_expense', 'unit_cost',
+                         'expected_profit_increase', 'loss_probability']
+                        + quantile_fields)
+        for i_cost, unit_cost in enumerate(scenario_grid['unit_cost']):
+            for i_expense, expense in enumerate(scenario_grid['annual_adv_expense']):
+                writer.writerow([expense, unit_cost,
+                                 scenario_grid['expected_profit_increase'][i_cost, i_expense],
+                                 scenario_grid['loss_probability'][i_cost, i_expense]]
+                                + scenario_grid['profit_quantiles'][:, i_cost, i_expense].tolist())
+
+    atomic_write(file_path, write_rows)
+
+def plot_scenario_grid(scenario_grid, file_stem, output_folder=None,
+                       plot_duration_secs=PLOT_DURATION_SECS, block=False):
+    """
+    3D surface of the expected profit increase over the advertising
+    expense and unit cost with the break even curve
 
-        ax_list = fig_adv.axes
-        ax = ax_list[0]
-        formatter = FuncFormatter(currency)
-        ax.xaxis.set_major_formatter(formatter)
+    RETURNS: figure
+    """
+    plt = import_pyplot()
+    from mpl_toolkits.mplot3d import Axes3D  # registers projection='3d'
+
+    expenses = scenario_grid['annual_adv_expense']
+    costs = scenario_grid['unit_cost']
+    expense_grid, cost_grid = np.meshgrid(expenses, costs)
+    expected_profit = scenario_grid['expected_profit_increase']
+
+    fig_grid = plt.figure(figsize=(12, 9))
+    ax = fig_grid.add_subplot(111, projection='3d')
+    ax.plot_surface(expense_grid, cost_grid, expected_profit,
+                    cmap='RdYlGn', alpha=0.8)
+    # break even: expected profit increase of zero
+    ax.plot(scenario_grid['break_even_expense'], costs,
+            np.zeros(costs.size), 'k-', linewidth=LINEWIDTH,
+            label='BREAK EVEN')
+    ax.set_xlabel('ANNUAL ADVERTISING EXPENSE', labelpad=20)
+    ax.set_ylabel('UNIT COST', labelpad=20)
+    ax.set_zlabel('EXPECTED PROFIT INCREASE', labelpad=20)
+    ax.set_title('BREAK EVEN SURFACE (' + file_stem + ')')
+    ax.legend()
+
+    if block:
+        plt.show()
+    else:
+        plt.ion()
+        plt.show()
+        plt.pause(plot_duration_secs)
 
-        if _settings.block:
-            plt.show()
+    if not output_folder is None:
+        fig_grid.savefig(output_folder
+                         + os.sep
+                         + file_stem
+                         + "_scenario_grid.jpg")
+    return fig_grid  # plot_scenario_grid(...)
+
+STREAM_BATCH_SIMS = 1024  # simulated years per batch of a streaming projection
+STREAM_TASK_SIMS = 64*1024  # simulated years per worker process task
+STREAM_EDGE_SIGMAS = 6.0  # histogram half range in standard deviations
+
+def sim_projection_batch(dist_cumsum_adv,
+                         y_err_adv,
+                         dist_cumsum_no_adv,
+                         y_err_no_adv,
+                         unit_price,
+                         number_sims,
+                         rng=None):
+    """
+    simulate number_sims future years with and without advertising
+    at once (project_annual_sales(...) in one batch, see
+    vary_distribution(...) and sim_unit_sales_by_row(...))
+
+    RETURNS: ave_sales_no_adv, ave_sales_adv, ave_sales_no_adv_test --
+             average daily sales for each simulated year
+    """
+    year_shape = (365,)
+    # one full year with advertising for each simulation
+    dist_cumsum_adv_varied = vary_distribution(dist_cumsum_adv, y_err_adv,
+                                               rng, number_sims)
+    unit_sales_adv = sim_unit_sales_by_row(dist_cumsum_adv_varied,
+                                           year_shape, rng)
+    # one full year without advertising
+    dist_cumsum_no_adv_varied = vary_distribution(dist_cumsum_no_adv,
+                                                  y_err_no_adv,
+                                                  rng, number_sims)
+    unit_sales_no_adv = sim_unit_sales_by_row(dist_cumsum_no_adv_varied,
+                                              year_shape, rng)
+    # the test year for the differential risk assessment uses the
+    # same varied distribution as in project_annual_sales(...)
+    unit_sales_no_adv_test = sim_unit_sales_by_row(dist_cumsum_no_adv_varied,
+                                                   year_shape, rng)
+    return tuple(unit_price*unit_sales.sum(axis=1, dtype=np.int64)
+                 /unit_sales.shape[1]
+                 for unit_sales in (unit_sales_no_adv, unit_sales_adv,
+                                    unit_sales_no_adv_test))
+    # end sim_projection_batch(...)
+
+def projection_edges(sim_values, bins=BINS_DEFAULT):
+    """
+    fixed histogram edges for a streaming projection from the
+    projection_values(...) of a first batch of simulations: the
+    mean plus or minus STREAM_EDGE_SIGMAS standard deviations (and
+    at least the range of the batch)
+
+    RETURNS: dictionary of name: edges; the sales probability
+             densities share edges from zero as in
+             compute_projection_summary(...)
+    """
+    ranges = {}
+    for name, values in sim_values.items():
+        values = np.asarray(values, dtype=np.float64)
+        half_range = STREAM_EDGE_SIGMAS*values.std()
+        low = min(values.min(), values.mean() - half_range)
+        high = max(values.max(), values.mean() + half_range)
+        if low == high:
+            # as np.histogram(...) for equal values
+            low, high = low - 0.5, high + 0.5
+        ranges[name] = (low, high)
+    hi_sales = max(ranges['sales_no_adv'][1], ranges['sales_adv'][1])
+    ranges['sales_no_adv'] = ranges['sales_adv'] = (0.0, hi_sales)
+    return {name : np.linspace(low, high, bins + 1)
+            for name, (low, high) in ranges.items()}
+
+class ProjectionAccumulator:
+    """
+    summary statistics of a stream of simulated years in constant
+    memory (see project_annual_sales_streaming(...))
+
+    For each of the projection_values(...) keeps a RunningStats and a
+    FixedHistogram; for the sales and profit increases also a TDigest
+    for the quantiles and exact counts of the losses.  merge(...) adds
+    the partial results of a worker process.  summary(...) has the
+    same keys as compute_projection_summary(...).
+    """
+
+    LOSS_NAMES = ('sales_increase', 'profit_increase',
+                  'sales_increase_diff', 'profit_increase_diff')
+    DIGEST_NAMES = ('sales_increase', 'profit_increase')
+
+    def __init__(self, edges, unit_price, unit_cost=0.0,
+                 annual_adv_expense=ANNUAL_ADV_EXPENSE, dtype=np.float64):
+        self.unit_price = unit_price
+        self.unit_cost = unit_cost
+        self.annual_adv_expense = annual_adv_expense
+        self.dtype = dtype
+        self.n_sims = 0
+        self.stats = {name : RunningStats() for name in edges}
+        self.hists = {name : FixedHistogram(name_edges)
+                      for name, name_edges in edges.items()}
+        self.digests = {name : TDigest() for name in self.DIGEST_NAMES}
+        self.n_loss = {name : 0 for name in self.LOSS_NAMES}
+
+    def update(self, ave_sales_no_adv, ave_sales_adv, ave_sales_no_adv_test):
+        """
+        add a batch of simulated years (see sim_projection_batch(...))
+        """
+        sim_values = projection_values(ave_sales_no_adv,
+                                       ave_sales_adv,
+                                       ave_sales_no_adv_test,
+                                       self.unit_price,
+                                       self.unit_cost,
+                                       self.annual_adv_expense,
+                                       self.dtype)
+        self.n_sims += len(ave_sales_adv)
+        for name, values in sim_values.items():
+            self.stats[name].update(values)
+            self.hists[name].update(values)
+        for name in self.DIGEST_NAMES:
+            self.digests[name].update(sim_values[name])
+        for name in self.LOSS_NAMES:
+            self.n_loss[name] += int((sim_values[name] < 0.0).sum())
+        return self
+
+    def merge(self, other):
+        """
+        add the simulated years of another ProjectionAccumulator
+        """
+        self.n_sims += other.n_sims
+        for name in self.stats:
+            self.stats[name].merge(other.stats[name])
+            self.hists[name].merge(other.hists[name])
+        for name in self.DIGEST_NAMES:
+            self.digests[name].merge(other.digests[name])
+        for name in self.LOSS_NAMES:
+            self.n_loss[name] += other.n_loss[name]
+        return self
+
+    def summary(self, quantiles=SCENARIO_QUANTILES):
+        """
+        summary of the projections as compute_projection_summary(...)
+        with exact loss counts, plus the statistics ('statistics') of
+        each value and the quantiles of the profit increase
+        ('quantiles', 'profit_quantiles')
+        """
+        sim_hists = {name : (hist.counts, hist.edges)
+                     for name, hist in self.hists.items()}
+        density_no_adv, density_adv, empirical_p_value = sales_densities(sim_hists)
+
+        statistics = {}
+        for name, stats in self.stats.items():
+            statistics[name] = stats.to_dict()
+            statistics[name]['underflow'] = self.hists[name].underflow
+            statistics[name]['overflow'] = self.hists[name].overflow
+
+        # a daily sales decline is an annual sales decline (the
+        # annual sales increase is DAYS_PER_YEAR times the daily), so
+        # n_loss_daily_sales is n_loss_sales as in
+        # compute_projection_summary(...)
+        loss_counts = {'n_loss_sales' : self.n_loss['sales_increase'],
+                       'n_loss_daily_sales' : self.n_loss['sales_increase'],
+                       'n_loss_profits' : self.n_loss['profit_increase'],
+                       'n_loss_sales_diff' : self.n_loss['sales_increase_diff'],
+                       'n_loss_profit_diff' : self.n_loss['profit_increase_diff']}
+
+        quantiles = np.asarray(quantiles, dtype=np.float64)
+        return {'histograms' : sim_hists,
+                'density_no_adv' : density_no_adv,
+                'density_adv' : density_adv,
+                'density_edges' : sim_hists['sales_adv'][1],
+                'loss_counts' : loss_counts,
+                'expected_profit_increase' : self.stats['profit_increase'].mean,
+                'expected_profit_increase_diff' :
+                    self.stats['profit_increase_diff'].mean,
+                'empirical_p_value' : empirical_p_value,
+                'n_sims' : self.n_sims,
+                'statistics' : statistics,
+                'quantiles' : quantiles,
+                'profit_quantiles' :
+                    self.digests['profit_increase'].quantile(quantiles)}
+
+    def partial_summary(self, number_sims=None):
+        """
+        the simulations so far as summarize_partial_projections(...)
+        """
+        if self.n_sims < 1:
+            raise ValueError(debug_prefix() + "no simulations to summarize")
+        profit_stats = self.stats['profit_increase']
+        expected_profit_increase = profit_stats.mean
+        if self.n_sims > 1:
+            profit_err = CONFIDENCE_Z*profit_stats.std/np.sqrt(self.n_sims)
         else:
-            plt.ion()
-            plt.show()  # sales projection histogram
-            # wait to display the figure
-            plt.pause(plot_duration_secs)
+            profit_err = np.inf
+        loss_probability = self.n_loss['profit_increase']/self.n_sims
+        profit_bins = self.hists['profit_increase'].counts
+        profit_bins_err = CONFIDENCE_Z*np.sqrt(profit_bins
+                                               *(1.0 - profit_bins/self.n_sims))
+        return {'n_sims' : self.n_sims,
+                'number_sims' : self.n_sims if number_sims is None else number_sims,
+                'expected_profit_increase' : expected_profit_increase,
+                'expected_profit_increase_ci' : (expected_profit_increase - profit_err,
+                                                 expected_profit_increase + profit_err),
+                'loss_probability' : loss_probability,
+                'loss_probability_ci' : wilson_interval(loss_probability,
+                                                        self.n_sims),
+                'profit_bins' : profit_bins,
+                'profit_edges' : self.hists['profit_increase'].edges,
+                'profit_bins_err' : profit_bins_err}
+
+    def scenario_grid(self, annual_adv_expenses, unit_costs,
+                      quantiles=SCENARIO_QUANTILES, dtype=np.float64):
+        """
+        compute_scenario_grid(...) from the TDigest of the sales increase
 
-        image_file = file_stem + "_sales_projection_adv.jpg"
-        print("saving sales projection bar chart to", image_file)
-        fig_adv.savefig(output_folder + os.sep + image_file)
-    else:
-        sales_bins, sales_edges \
-            = np.histogram(annual_sales_adv,
-                           bins=_settings.bins)
+        The loss counts (and probabilities) are approximations: the
+        TDigest interpolates the cumulative distribution between its
+        centroids, so it cannot tell the sales increases below a
+        threshold from those at the threshold, and the counts are
+        the interpolated counts rounded to whole simulated years.
+        """
+        digest = self.digests['sales_increase']
+
+        def count_below(thresholds, side):
+            # side ('left' or 'right') is the same for the TDigest
+            return np.rint(self.n_sims*digest.cdf(thresholds))
+
+        return scenario_grid_from_sales_increase(
+            self.stats['sales_increase'].mean,
+            self.n_sims,
+            count_below,
+            digest.quantile,
+            self.unit_price, annual_adv_expenses, unit_costs, quantiles, dtype)
+# end class ProjectionAccumulator
+
+def projection_task(distributions, unit_price, unit_cost, annual_adv_expense,
+                    edges, seed_val, task_index, task_sims, dtype=np.float64,
+                    progress=None, cancel=None):
+    """
+    simulate task_sims years in batches of STREAM_BATCH_SIMS with the
+    seed [seed_val, task_index] (a worker process task of
+    project_annual_sales_streaming(...))
+
+    ARGUMENTS: distributions -- (dist_cumsum_adv, y_err_adv,
+                                 dist_cumsum_no_adv, y_err_no_adv)
+               edges -- see projection_edges(...)
+               progress -- optional callback progress(n_done) after
+                           each batch
+               cancel -- optional threading.Event
+
+    RETURNS: ProjectionAccumulator of the task
+    """
+    rng = np.random.RandomState([seed_val, task_index])
+    accumulator = ProjectionAccumulator(edges, unit_price, unit_cost,
+                                        annual_adv_expense, dtype)
+    for batch_start in range(0, task_sims, STREAM_BATCH_SIMS):
+        if not cancel is None and cancel.is_set():
+            raise EvaluationCancelled("evaluation cancelled")
+        accumulator.update(*sim_projection_batch(*distributions, unit_price,
+                                                 min(STREAM_BATCH_SIMS,
+                                                     task_sims - batch_start),
+                                                 rng))
+        if not progress is None:
+            progress(accumulator.n_sims)
+    return accumulator
+
+def project_annual_sales_streaming(dist_cumsum_adv,
+                                   y_err_adv,
+                                   dist_cumsum_no_adv,
+                                   y_err_no_adv,
+                                   unit_price,
+                                   unit_cost=0.0,
+                                   annual_adv_expense=ANNUAL_ADV_EXPENSE,
+                                   number_sims=NSIMS_DEFAULT,
+                                   seed_val=SEED_VAL,
+                                   workers=1,
+                                   bins=BINS_DEFAULT,
+                                   progress=None,
+                                   verbose=True,
+                                   cancel=None,
+                                   partial=None,
+                                   dtype=np.float64,
+                                   task_sims=STREAM_TASK_SIMS):
+    """
+    project_annual_sales(...) and compute_projection_summary(...) in
+    constant memory: the simulated years go into a
+    ProjectionAccumulator a batch at a time and are never stored
+
+    ARGUMENTS: workers -- worker processes (tasks of task_sims years)
+               progress -- optional callback progress(n_done, number_sims)
+               partial -- optional callback partial(accumulator) with the
+                          simulations of the tasks completed so far
+               (see project_annual_sales(...) for the others)
+
+    RETURNS: ProjectionAccumulator (see summary(...))
+
+    WHY: the simulated years of a run of 10^8 simulations take
+    gigabytes as arrays.  The histogram edges are fixed from the
+    first batch (see projection_edges(...)), so the worker processes
+    return a few kilobytes of statistics each.  Task t uses the seed
+    [seed_val, t] and the tasks are merged in order, so the results
+    do not depend on the number of workers.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if number_sims < 1:
+        raise ValueError(debug_prefix() + "number_sims is "
+                         + str(number_sims) + " (LESS THAN ONE)")
+    distributions = (dist_cumsum_adv, y_err_adv,
+                     dist_cumsum_no_adv, y_err_no_adv)
+    task_sizes = [min(task_sims, number_sims - task_start)
+                  for task_start in range(0, number_sims, task_sims)]
+
+    # the first batch of the first task (simulated again by the task)
+    first_batch = sim_projection_batch(*distributions, unit_price,
+                                       min(STREAM_BATCH_SIMS, task_sizes[0]),
+                                       np.random.RandomState([seed_val, 0]))
+    edges = projection_edges(projection_values(*first_batch, unit_price,
+                                               unit_cost, annual_adv_expense),
+                             bins)
+    total = ProjectionAccumulator(edges, unit_price, unit_cost,
+                                  annual_adv_expense, dtype)
+    if verbose:
+        print("simulating annual sales using empirical distributions in",
+              len(task_sizes), "tasks with", workers, "workers")
+
+    def task_done(task_accumulator):
+        total.merge(task_accumulator)
+        if verbose:
+            print(total.n_sims, "/", number_sims, flush=True)
+        if not progress is None:
+            progress(total.n_sims, number_sims)
+        if not partial is None:
+            partial(total)
+
+    if workers == 1 or len(task_sizes) == 1:
+        for task_index, task_size in enumerate(task_sizes):
+            task_progress = None
+            if not progress is None:
+                n_before = total.n_sims
+                task_progress = lambda n_done: progress(n_before + n_done,
+                                                        number_sims)
+            task_done(projection_task(distributions, unit_price, unit_cost,
+                                      annual_adv_expense, edges, seed_val,
+                                      task_index, task_size, dtype,
+                                      task_progress, cancel))
+        return total
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(projection_task, distributions,
+                                   unit_price, unit_cost, annual_adv_expense,
+                                   edges, seed_val, task_index, task_size,
+                                   dtype)
+                   for task_index, task_size in enumerate(task_sizes)]
+        try:
+            for future in futures:
+                if not cancel is None and cancel.is_set():
+                    raise EvaluationCancelled("evaluation cancelled")
+                task_done(future.result())
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return total
+    # end project_annual_sales_streaming(...)
+
+def streaming_report(projections):
+    """
+    text summary of a streaming projection for the report
+    (see ProjectionAccumulator.summary(...))
 
-    ave_profit_increase = ave_sales_increase - annual_adv_expense
-    # deduct marginal cost of new units sold
-    ave_profit_increase = ave_profit_increase - ave_cost_increase
+    RETURNS: report -- text block
+    """
+    report = "\n\nStreaming Projections: %d simulated years\n" \
+             % projections['n_sims']
+    report += "Profit increase quantiles: " + ", ".join(
+        "%g%%: %s" % (100.0*q, locale.currency(value, grouping=True))
+        for q, value in zip(projections['quantiles'],
+                            projections['profit_quantiles'])) + "\n"
+    outside = sum(stats['underflow'] + stats['overflow']
+                  for stats in projections['statistics'].values())
+    if outside > 0:
+        report += "%d simulated values outside the histogram ranges\n" \
+                  % outside
+    return report
+
+ENGINES = ('simulation', 'exact')  # -engine (see exact_projection(...))
+EXACT_BATCH_DISTS = 256  # varied distributions transformed at once
+EXACT_TAIL_BOUND = 1e-15  # probability outside the exact engine FFT window
+EXACT_SPECTRUM_FLOOR = 1e-18  # smallest annual transform value computed
+EXACT_TAIL_PROBABILITY = 1e-6  # probability outside the exact histograms
+KS_CRITICAL_95 = 1.358  # Kolmogorov-Smirnov 95 percent critical value*sqrt(n)
+
+class LatticeDistribution:
+    """
+    discrete probability distribution of a set of values, e.g. the
+    annual sales of the exact engine (see exact_projection(...))
+    """
 
-    expected_profit_increase = ave_profit_increase.mean()
+    def __init__(self, values, probs):
+        values = np.asarray(values, dtype=np.float64)
+        order = np.argsort(values, kind='mergesort')
+        self.values = values[order]
+        self.probs = np.asarray(probs, dtype=np.float64)[order]
+        self.cum_probs = np.concatenate(((0.0,), self.probs.cumsum()))
 
-    if _settings.detail_level > 0:
-        figure_2 = plt.figure(figsize=(12, 9))
-        sales_bins, sales_edges, patches \
-            = plt.hist(ave_sales_increase, bins=_settings.bins)
-        n_loss_sales = compute_loss(sales_bins, sales_edges)
-        plt.title('ANNUAL SALES INCREASE FROM ADVERTISING (' \
-                  + str(number_sims) + ' SIMULATIONS)')
-        plt.ylabel('NUMBER OF SIMULATIONS')
-        plt.xlabel('DOLLARS')
-        xlow, xhi = plt.xlim()
-        delta_x = (xhi - xlow)
-        ylow, yhi = plt.ylim()
-        delta_y = (yhi - ylow)
-        plt.text(xlow + 0.025*delta_x, yhi-0.05*delta_y, \
-                 "Number of Simulations with " + \
-                 "Sales Decline: %5.1f / %5.1f" \
-                 % (n_loss_sales, number_sims), \
-                 bbox=dict(facecolor='white', alpha=0.5))
-        plt.grid()
+    @property
+    def mean(self):
+        return (self.values*self.probs).sum()
 
-        ax_list = figure_2.axes
-        ax = ax_list[0]
-        formatter = FuncFormatter(currency)
-        ax.xaxis.set_major_formatter(formatter)
+    def scaled(self, scale, shift=0.0):
+        """
+        distribution of scale*value + shift
+        """
+        return LatticeDistribution(scale*self.values + shift, self.probs)
 
+    def cdf(self, x, side='right'):
+        """
+        probability of a value at or below x ('right') or below x ('left')
+        """
+        return self.cum_probs[np.searchsorted(self.values, x, side=side)]
 
-        if _settings.block:
-            plt.show()
+    def quantile(self, q):
+        """
+        smallest values with a cdf(...) of at least q (0 to 1)
+        """
+        index = np.searchsorted(self.cum_probs[1:], q, side='left')
+        return self.values[np.minimum(index, self.values.size - 1)]
+
+    def support(self, tail=EXACT_TAIL_PROBABILITY):
+        """
+        (low, high) range of the values without tails of probability tail
+        """
+        return self.quantile(tail), self.quantile(1.0 - tail)
+
+    def histogram(self, bins=BINS_DEFAULT, value_range=None, number=1.0):
+        """
+        expected counts in each bin of number draws (the values
+        outside value_range go in the end bins)
+
+        RETURNS: bin_values, bin_edges as np.histogram(...)
+        """
+        low, high = self.support() if value_range is None else value_range
+        if low == high:
+            # as np.histogram(...) for equal values
+            low, high = low - 0.5, high + 0.5
+        bin_values, bin_edges = np.histogram(np.clip(self.values, low, high),
+                                             bins, range=(low, high),
+                                             weights=self.probs)
+        return number*bin_values, bin_edges
+# end class LatticeDistribution
+
+def sampler_pmf(dist_cumsum):
+    """
+    probability of each number of units drawn by sim_unit_sales(...)
+    from a (possibly varied) cumulative distribution, one row for
+    each row of dist_cumsum
+
+    RETURNS: probability mass function (pmf) array
+    """
+    cdf = np.clip(np.maximum.accumulate(np.asarray(dist_cumsum, dtype=np.float64),
+                                        axis=-1), 0.0, 1.0)
+    pmf = np.diff(cdf, axis=-1, prepend=0.0)
+    # no unit count above the random number gives 0 units
+    pmf[..., 0] += 1.0 - cdf[..., -1]
+    return pmf
+
+def fft_size(n_values):
+    """
+    power of two FFT length for n_values values
+    """
+    return 1 << int(np.ceil(np.log2(max(n_values, 2))))
+
+def power_by_squaring(spectrum, exponent):
+    """
+    spectrum**exponent for a positive integer exponent by repeated
+    squaring (faster than ** for complex arrays)
+    """
+    result = None
+    base = spectrum
+    while exponent > 0:
+        if exponent & 1:
+            result = base.copy() if result is None else result*base
+        exponent >>= 1
+        if exponent > 0:
+            base = base*base
+    return result
+
+def window_pmf(spectrum, n_fft, low, high):
+    """
+    probabilities of the values low to high of a count from its
+    Fourier transform (rfft of length n_fft); the transform gives
+    the count modulo n_fft, so high - low must be less than n_fft
+    """
+    pmf = np.fft.irfft(spectrum, n_fft)[np.arange(low, high + 1) % n_fft]
+    # remove the round off, e.g. tiny negative probabilities
+    pmf = np.maximum(pmf, 0.0)
+    return pmf/pmf.sum()
+
+def transform_bound(pmf, cosines):
+    """
+    upper bound on the squared magnitude of the Fourier transform of
+    every row of pmf at each frequency of the table cosines
+    (cos(unit count*frequency), one row for each unit count)
+
+    WHY: the squared magnitude is the sum of the autocorrelations of
+    a pmf times 2*cos(lag*frequency), so the largest or smallest
+    autocorrelation of the rows (by the sign of the cosine) bounds
+    it for all rows at once
+    """
+    n_units = pmf.shape[1]
+    autocorr = np.stack([(pmf[:, :n_units - lag]*pmf[:, lag:]).sum(axis=1)
+                         for lag in range(n_units)], axis=1)
+    lag_cosines = np.where(np.arange(n_units) > 0, 2.0, 1.0)[:, np.newaxis] \
+                  * cosines
+    return np.maximum(autocorr.max(axis=0)[:, np.newaxis]*lag_cosines,
+                      autocorr.min(axis=0)[:, np.newaxis]*lag_cosines).sum(axis=0)
+
+def hoeffding_window(days, unit_range, means, low, high):
+    """
+    range of a sum of days independent daily counts, each within a
+    range of unit_range units, with a probability of less than
+    EXACT_TAIL_BOUND outside for each mean in means (Hoeffding's
+    inequality), within the possible sums low to high
+
+    RETURNS: low, high
+    """
+    half_width = unit_range*np.sqrt(days*np.log(2.0/EXACT_TAIL_BOUND)/2.0)
+    return max(low, int(np.floor(np.min(means) - half_width))), \
+        min(high, int(np.ceil(np.max(means) + half_width)))
+
+def exact_projection(dist_cumsum_adv,
+                     y_err_adv,
+                     dist_cumsum_no_adv,
+                     y_err_no_adv,
+                     unit_price,
+                     number_varied=NSIMS_DEFAULT,
+                     rng=None,
+                     year_days=365):
+    """
+    exact distributions of the simulated years of
+    project_annual_sales(...) for number_varied varied daily
+    distributions (see vary_distribution(...); 0 for the empirical
+    distributions as given, including the probability of no sales
+    that vary_distribution(...) drops)
+
+    The distribution of a sum of year_days daily unit sales is the
+    year_days-fold convolution of the daily distribution, the
+    year_days-th power of its Fourier transform.  The transforms
+    of the varied distributions are averaged (the distribution of a
+    simulated year is their mixture) and the years with and without
+    advertising vary independently, so the sales increase is the
+    product of the averaged transforms.
+
+    RETURNS: dictionary with the LatticeDistribution of
+             sales_no_adv, sales_adv -- average daily sales of a year
+             sales_increase -- annual sales increase with advertising
+             sales_increase_diff -- annual sales increase of a year
+                without advertising over another (differential risk)
+             and sales_increase_mean_err -- standard error of the mean
+                sales increase from the varied distributions
+
+    WHY: only the uncertainty of the daily distributions needs Monte
+    Carlo; the sampling of the days is exact, with no tails missing
+    for lack of simulations.  Without variation it takes milliseconds.
+    """
+    if rng is None:
+        rng = np.random
+
+    # probabilities of the unit counts of each (varied) distribution
+    pmfs = {}
+    for period, dist_cumsum, y_err in (('adv', dist_cumsum_adv, y_err_adv),
+                                       ('no_adv', dist_cumsum_no_adv,
+                                        y_err_no_adv)):
+        if number_varied < 1:
+            pmfs[period] = sampler_pmf(dist_cumsum)[np.newaxis]
         else:
-            plt.ion()
-            plt.show()  # sales projection histogram
-            # wait to display the figure
-            plt.pause(plot_duration_secs)
+            pmfs[period] = sampler_pmf(vary_distribution(dist_cumsum, y_err,
+                                                         rng, number_varied))
+    max_units = {period : pmf.shape[1] - 1 for period, pmf in pmfs.items()}
+    means = {period : year_days*(pmf*np.arange(pmf.shape[1])).sum(axis=1)
+             for period, pmf in pmfs.items()}
+
+    # ranges of the annual units and their differences (the
+    # transforms give the counts modulo n_fft)
+    windows = {period : hoeffding_window(year_days, max_units[period],
+                                         means[period], 0,
+                                         year_days*max_units[period])
+               for period in pmfs}
+    windows['increase'] \
+        = hoeffding_window(year_days, max_units['adv'] + max_units['no_adv'],
+                           (means['adv'].min() - means['no_adv'].max(),
+                            means['adv'].max() - means['no_adv'].min()),
+                           -year_days*max_units['no_adv'],
+                           year_days*max_units['adv'])
+    windows['increase_diff'] \
+        = hoeffding_window(year_days, 2*max_units['no_adv'],
+                           (0.0,), -year_days*max_units['no_adv'],
+                           year_days*max_units['no_adv'])
+    n_fft = fft_size(max(high - low + 1 for low, high in windows.values()))
+
+    n_freqs = n_fft//2 + 1
+    spectra = {'adv' : np.zeros(n_freqs, dtype=np.complex128),
+               'no_adv' : np.zeros(n_freqs, dtype=np.complex128),
+               'no_adv_squared' : np.zeros(n_freqs)}
+    # the daily distributions have few unit counts, so their
+    # transforms are faster as matrix products than zero padded FFTs
+    twiddles = {period : np.exp(-2j*np.pi*np.outer(np.arange(pmf.shape[1]),
+                                                  np.arange(n_freqs))/n_fft)
+                for period, pmf in pmfs.items()}
+    # the annual transform is below EXACT_SPECTRUM_FLOOR at the
+    # frequencies where the daily transform is below this
+    # (most of them), so only the others are raised to the power
+    threshold_squared = EXACT_SPECTRUM_FLOOR**(2.0/year_days)
+    n_rows = pmfs['adv'].shape[0]
+    for batch_start in range(0, n_rows, EXACT_BATCH_DISTS):
+        batch = slice(batch_start, batch_start + EXACT_BATCH_DISTS)
+        for period in ('adv', 'no_adv'):
+            keep = transform_bound(pmfs[period][batch],
+                                   twiddles[period].real) > threshold_squared
+            spectrum = power_by_squaring(pmfs[period][batch]
+                                         @ twiddles[period][:, keep],
+                                         year_days)
+            spectra[period][keep] += spectrum.sum(axis=0)
+            if period == 'no_adv':
+                # the test year uses the same varied distribution as
+                # the year without advertising (see project_annual_sales(...))
+                spectra['no_adv_squared'][keep] \
+                    += (spectrum.real**2 + spectrum.imag**2).sum(axis=0)
+    spectra = {name : spectrum/n_rows for name, spectrum in spectra.items()}
+    # A - B has the transform of A times the conjugate transform of B
+    spectra['increase'] = spectra['adv']*np.conj(spectra['no_adv'])
+    spectra['increase_diff'] = spectra['no_adv_squared']
+
+    daily_scale = unit_price/year_days
+    annual_scale = DAYS_PER_YEAR*daily_scale
+    exact = {}
+    for name, period, scale in (('sales_no_adv', 'no_adv', daily_scale),
+                                ('sales_adv', 'adv', daily_scale),
+                                ('sales_increase', 'increase', annual_scale),
+                                ('sales_increase_diff', 'increase_diff',
+                                 annual_scale)):
+        low, high = windows[period]
+        exact[name] = LatticeDistribution(scale*np.arange(low, high + 1),
+                                          window_pmf(spectra[period], n_fft,
+                                                     low, high))
+    mean_var = sum(period_means.var(ddof=1) if period_means.size > 1 else 0.0
+                   for period_means in means.values())
+    exact['sales_increase_mean_err'] = annual_scale*np.sqrt(mean_var/n_rows)
+    return exact
+    # end exact_projection(...)
+
+def exact_projection_summary(exact,
+                             unit_price,
+                             unit_cost=0.0,
+                             annual_adv_expense=ANNUAL_ADV_EXPENSE,
+                             bins=BINS_DEFAULT,
+                             number_sims=NSIMS_DEFAULT,
+                             number_varied=NSIMS_DEFAULT):
+    """
+    summary of the exact distributions of exact_projection(...) with
+    the keys of compute_projection_summary(...); the histograms and
+    the loss counts are the expected numbers of number_sims simulated
+    years
+
+    RETURNS: dictionary; also the exact loss probabilities
+             ('loss_probabilities') and the LatticeDistribution of each
+             value ('distributions')
+    """
+    # profit increase = factor*sales increase - expense
+    # (see annual_profit_increase(...))
+    factor = 1.0 - unit_cost/unit_price
+    distributions = {'sales_no_adv' : exact['sales_no_adv'],
+                     'sales_adv' : exact['sales_adv'],
+                     'annual_sales_no_adv' : exact['sales_no_adv'].scaled(DAYS_PER_YEAR),
+                     'annual_sales_adv' : exact['sales_adv'].scaled(DAYS_PER_YEAR),
+                     'sales_increase' : exact['sales_increase'],
+                     'profit_increase' : exact['sales_increase'].scaled(factor,
+                                                                        -annual_adv_expense),
+                     'sales_increase_diff' : exact['sales_increase_diff'],
+                     'profit_increase_diff' : exact['sales_increase_diff'].scaled(factor)}
+
+    ranges = {name : distribution.support()
+              for name, distribution in distributions.items()}
+    # the sales probability densities share the same edges
+    hi_sales = max(ranges['sales_no_adv'][1], ranges['sales_adv'][1])
+    ranges['sales_no_adv'] = ranges['sales_adv'] = (0.0, hi_sales)
+    sim_hists = {name : distribution.histogram(bins, ranges[name], number_sims)
+                 for name, distribution in distributions.items()}
+
+    loss_probabilities = {name : distributions[name].cdf(0.0, side='left')
+                          for name in ('sales_increase', 'profit_increase',
+                                       'sales_increase_diff',
+                                       'profit_increase_diff')}
+    loss_counts = {'n_loss_sales' : number_sims*loss_probabilities['sales_increase'],
+                   'n_loss_daily_sales' : number_sims*loss_probabilities['sales_increase'],
+                   'n_loss_profits' : number_sims*loss_probabilities['profit_increase'],
+                   'n_loss_sales_diff' : number_sims*loss_probabilities['sales_increase_diff'],
+                   'n_loss_profit_diff' : number_sims*loss_probabilities['profit_increase_diff']}
+
+    density_no_adv, density_adv, empirical_p_value = sales_densities(sim_hists)
+    return {'histograms' : sim_hists,
+            'density_no_adv' : density_no_adv,
+            'density_adv' : density_adv,
+            'density_edges' : sim_hists['sales_adv'][1],
+            'loss_counts' : loss_counts,
+            'expected_profit_increase' : distributions['profit_increase'].mean,
+            'expected_profit_increase_diff' :
+                distributions['profit_increase_diff'].mean,
+            'empirical_p_value' : empirical_p_value,
+            'number_varied' : number_varied,
+            'expected_profit_increase_err' : factor*exact['sales_increase_mean_err'],
+            'loss_probabilities' : loss_probabilities,
+            'distributions' : distributions}
+    # end exact_projection_summary(...)
+
+def engine_agreement(exact_summary,
+                     ave_sales_no_adv,
+                     ave_sales_adv,
+                     unit_price,
+                     unit_cost=0.0,
+                     annual_adv_expense=ANNUAL_ADV_EXPENSE):
+    """
+    compare the exact engine (exact_projection_summary(...)) with the
+    simulated years of the simulation engine (project_annual_sales(...))
+
+    RETURNS: dictionary with the exact and simulated expected profit
+             increase and probability of a loss with the confidence
+             intervals of the simulations, the Kolmogorov-Smirnov
+             distance of the simulated sales increases from the exact
+             distribution and its 95 percent critical value, and
+             agree (True if all three are consistent within the
+             Monte Carlo errors of both engines)
+    """
+    ave_sales_increase, ave_profit_increase \
+        = annual_profit_increase(ave_sales_no_adv,
+                                 ave_sales_adv,
+                                 unit_price,
+                                 unit_cost,
+                                 annual_adv_expense)
+    n_sims = ave_profit_increase.size
+    distributions = exact_summary['distributions']
+
+    # the exact engine averages over number_varied varied daily
+    # distributions, so both engines have Monte Carlo errors
+    number_varied = exact_summary['number_varied']
+    varied_weight = 1.0/number_varied if number_varied > 0 else 0.0
+
+    exact_profit = distributions['profit_increase'].mean
+    simulated_profit = ave_profit_increase.mean()
+    simulated_profit_err = ave_profit_increase.std(ddof=1)/np.sqrt(n_sims)
+    profit_err = CONFIDENCE_Z*simulated_profit_err
+    profit_tolerance = CONFIDENCE_Z*np.sqrt(simulated_profit_err**2
+                                            + exact_summary['expected_profit_increase_err']**2)
+
+    exact_loss = exact_summary['loss_probabilities']['profit_increase']
+    simulated_loss = (ave_profit_increase < 0.0).mean()
+    loss_ci = wilson_interval(simulated_loss, n_sims)
+    loss_tolerance = CONFIDENCE_Z*np.sqrt(exact_loss*(1.0 - exact_loss)
+                                          *(1.0/n_sims + varied_weight))
+
+    # the simulated sales increases are on the lattice of the exact
+    # distribution up to round off
+    sales_increase = distributions['sales_increase']
+    half_step = 0.5*np.diff(sales_increase.values).min() \
+                if sales_increase.values.size > 1 else 0.0
+    sorted_increase = np.sort(ave_sales_increase)
+    ecdf_index = np.arange(1, n_sims + 1)/n_sims
+    ks_statistic = max((ecdf_index
+                        - sales_increase.cdf(sorted_increase + half_step)).max(),
+                       (sales_increase.cdf(sorted_increase - half_step, side='left')
+                        - (ecdf_index - 1.0/n_sims)).max())
+    # two sample critical value when the exact distribution is a
+    # mixture of number_varied distributions
+    ks_critical = KS_CRITICAL_95*np.sqrt(1.0/n_sims + varied_weight)
+
+    return {'n_sims' : n_sims,
+            'exact_expected_profit_increase' : exact_profit,
+            'simulated_expected_profit_increase' : simulated_profit,
+            'simulated_expected_profit_increase_ci' : (simulated_profit - profit_err,
+                                                       simulated_profit + profit_err),
+            'exact_loss_probability' : exact_loss,
+            'simulated_loss_probability' : simulated_loss,
+            'simulated_loss_probability_ci' : loss_ci,
+            'ks_statistic' : ks_statistic,
+            'ks_critical' : ks_critical,
+            'agree' : bool(abs(simulated_profit - exact_profit) <= profit_tolerance
+                           and abs(simulated_loss - exact_loss) <= loss_tolerance
+                           and ks_statistic <= ks_critical)}
+    # end engine_agreement(...)
+
+def exact_report(projections, agreement=None):
+    """
+    text summary of the exact engine and, with -engine_check, its
+    agreement with the simulation engine for the report
+    (see engine_agreement(...))
+
+    RETURNS: report -- text block
+    """
+    loss_probabilities = projections['loss_probabilities']
+    report = "\n\nExact Engine: annual sales distributions by FFT convolution\n"
+    report += "of the daily sales distributions (%d varied distributions)\n" \
+              % projections['number_varied']
+    report += "Probability of a sales decline: %.2f PERCENT\n" \
+              % (100.0*loss_probabilities['sales_increase'])
+    report += "Probability of a loss: %.2f PERCENT\n" \
+              % (100.0*loss_probabilities['profit_increase'])
+    if agreement is None:
+        return report
+
+    report += "\nAgreement with the simulation engine (%d simulated years):\n" \
+              % agreement['n_sims']
+    low, high = agreement['simulated_expected_profit_increase_ci']
+    report += "Expected Profit Change: exact %s, simulated %s (95%% CI %s to %s)\n" \
+              % tuple(locale.currency(value, grouping=True)
+                      for value in (agreement['exact_expected_profit_increase'],
+                                    agreement['simulated_expected_profit_increase'],
+                                    low, high))
+    low, high = agreement['simulated_loss_probability_ci']
+    report += "Probability of a loss: exact %.2f%%, simulated %.2f%% " \
+              "(95%% CI %.2f%% to %.2f%%)\n" \
+              % (100.0*agreement['exact_loss_probability'],
+                 100.0*agreement['simulated_loss_probability'],
+                 100.0*low, 100.0*high)
+    report += "Kolmogorov-Smirnov distance of the sales increase: %.4f " \
+              "(95%% critical value %.4f)\n" \
+              % (agreement['ks_statistic'], agreement['ks_critical'])
+    if agreement['agree']:
+        report += "The exact and simulation engines agree\n"
     else:
-        sales_bins, sales_edges = np.histogram(ave_sales_increase,
-                                               bins=_settings.bins)
-        n_loss_sales = compute_loss(sales_bins, sales_edges)
+        report += "WARNING: the exact and simulation engines DISAGREE " \
+                  "(more simulations or a problem with the simulations)\n"
+    return report
+
+# configuration for run_evaluation(...); the defaults match
+# the command line defaults
+EvaluationConfig = namedtuple('EvaluationConfig',
+                              'annual_adv_expense '
+                              'unit_price '
+                              'unit_cost '
+                              'number_sims '
+                              'adv_date '
+                              'date_tag '
+                              'amount_tag '
+                              'sales_type_tag '
+                              'sales_type_value '
+                              'bins '
+                              'seed_val '
+                              'ma_period_days '
+                              'detail_level '
+                              'make_plots '
+                              'block '
+                              'layers '
+                              'plot_duration_secs '
+                              'output_folder '
+                              'results_formats '
+                              'verbose '
+                              'profile '
+                              'cprofile '
+                              'simulation_cache '
+                              'simulation_cache_folder '
+                              'scenario_grid '
+                              'detect_adv_date '
+                              'placebo '
+                              'float32 '
+                              'streaming '
+                              'workers '
+                              'engine '
+                              'engine_check',
+                              defaults=(ANNUAL_ADV_EXPENSE,
+                                        None,  # infer unit price
+                                        UNIT_COST_DEFAULT,
+                                        NSIMS_DEFAULT,
+                                        ADV_START_DATE,
+                                        DATE_HEADER_DEFAULT,
+                                        AMOUNT_HEADER_DEFAULT,
+                                        SALES_TYPE_HEADER_DEFAULT,
+                                        SALES_TYPE_VALUE_DEFAULT,
+                                        BINS_DEFAULT,
+                                        SEED_VAL,
+                                        MA_PERIOD_DAYS,
+                                        DETAIL_LEVEL_DEFAULT,
+                                        False,  # no plots
+                                        False,  # do not block
+                                        LAYERS_DEFAULT,
+                                        PLOT_DURATION_SECS,
+                                        None,  # no output files
+                                        (),  # no results files
+                                        False,  # quiet
+                                        False,  # no stage profile
+                                        False,  # no cProfile dumps
+                                        True,  # reuse simulations in memory
+                                        None,  # no simulation cache files
+                                        None,  # no scenario grid
+                                        False,  # use adv_date
+                                        False,  # no placebo test
+                                        False,  # float64 profit arrays
+                                        False,  # store the simulations
+                                        1,  # no worker processes
+                                        'simulation',  # Monte Carlo projections
+                                        0))  # no check of the exact engine
+
+SIMULATION_CACHE_ITEMS = 16  # simulations kept in memory
+SIMULATION_CACHE_VERSION = 2  # change when the simulations change
+
+def simulation_cache_key(daily_sales_np, mask_adv, config):
+    """
+    key for the simulations of run_evaluation(...)
 
+    The simulations depend only on the daily sales, the advertising
+    period, the unit price, the bins, the seed, and the number of
+    simulations -- not on the advertising expense or the unit cost,
+    which only enter the profit calculations afterwards.
 
-    # average daily sales increase
-    if _settings.detail_level > 0:
-        figure_2b = plt.figure(figsize=(12, 9))
-        daily_sales_bins, daily_sales_edges, patches \
-            = plt.hist(ave_sales_increase/DAYS_PER_YEAR, bins=_settings.bins)
-        n_loss_daily_sales = compute_loss(daily_sales_bins, daily_sales_edges)
+    RETURNS: hexadecimal SHA-256 digest
+    """
+    import hashlib
+
+    hash_h = hashlib.sha256()
+    hash_h.update(np.ascontiguousarray(daily_sales_np[:, 1],
+                                       dtype=np.float64).tobytes())
+    hash_h.update(np.ascontiguousarray(mask_adv, dtype=np.bool_).tobytes())
+    hash_h.update(repr((SIMULATION_CACHE_VERSION,
+                        config.unit_price,
+                        config.bins,
+                        config.seed_val,
+                        config.number_sims,
+                        NSIMS_DEFAULT)).encode('utf-8'))
+    return hash_h.hexdigest()
+
+def get_cached_simulations(cache_key, cache_folder=None):
+    """
+    simulations from the memory cache or the cache folder
+    (<cache_folder>/<cache_key>.npz)
 
-        plt.title('DAILY SALES INCREASE FROM ADVERTISING (' \
-                  + str(number_sims) + ' SIMULATIONS)')
-        plt.ylabel('NUMBER OF SIMULATIONS')
-        plt.xlabel('DOLLARS')
-        xlow, xhi = plt.xlim()
-        delta_x = (xhi - xlow)
-        ylow, yhi = plt.ylim()
-        delta_y = (yhi - ylow)
-        plt.text(xlow + 0.025*delta_x, yhi-0.05*delta_y, \
-                 "Number of Simulations with " \
-                 + "Sales Decline: %5.1f / %5.1f" \
-                 % (n_loss_daily_sales, number_sims), \
-                 bbox=dict(facecolor='white', alpha=0.5))
-        plt.grid()
+    RETURNS: dictionary of (copies of the) arrays or None if not cached
+    """
+    simulations = _simulation_cache.get(cache_key)
+    if simulations is None and not cache_folder is None:
+        cache_file = os.path.join(cache_folder, cache_key + '.npz')
+        if os.path.isfile(cache_file):
+            try:
+                with np.load(cache_file) as npz_file:
+                    simulations = {name : npz_file[name]
+                                   for name in npz_file.files}
+                _simulation_cache.put(cache_key, simulations)
+            except (OSError, ValueError) as load_X:
+                print(debug_prefix() + "Unable to read cached simulations",
+                      cache_file, load_X)
+                return None
+    if simulations is None:
+        return None
+    return {name : array.copy() for name, array in simulations.items()}
+
+def put_cached_simulations(cache_key, simulations, cache_folder=None):
+    """
+    save simulations in the memory cache and the cache folder
+    """
+    _simulation_cache.put(cache_key, simulations)
+    if cache_folder is None:
+        return
+    try:
+        if not os.path.exists(cache_folder):
+            os.makedirs(cache_folder)
+        cache_file = os.path.join(cache_folder, cache_key + '.npz')
+        # np.savez appends .npz to names without it
+        file_h, temp_path = tempfile.mkstemp(dir=cache_folder,
+                                             prefix='.' + cache_key,
+                                             suffix='.npz')
+        try:
+            with os.fdopen(file_h, 'wb') as out_file:
+                np.savez(out_file, **simulations)
+            os.replace(temp_path, cache_file)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    except OSError as save_X:
+        print(debug_prefix() + "Unable to save simulations in",
+              cache_folder, save_X)
+
+class EvaluationCancelled(Exception):
+    """
+    raised by run_evaluation(...) when the evaluation is cancelled
+    """
 
-        ax_list = figure_2b.axes
-        ax = ax_list[0]
-        formatter = FuncFormatter(currency)
-        ax.xaxis.set_major_formatter(formatter)
+class EvaluationResult:
+    """
+    results of run_evaluation(...)
+
+    rows -- rows in the sales report
+    sales_stats -- SalesStats for the sales report
+    distributions -- empirical distributions and Poisson fits
+                     ('no_adv' and 'adv')
+    welch -- simulated Welch's t statistic histograms and Bell Curve fit
+    simulations -- simulated average daily sales for each projected year
+                   (empty if config.streaming)
+    simulation_cache_hit -- True if the simulations were reused
+                            (see simulation_cache_key(...))
+    scenario_grid -- see compute_scenario_grid(...) if
+                     config.scenario_grid (expenses, unit costs)
+    change_point -- see detect_change_point(...) if config.detect_adv_date
+    placebo -- see placebo_test(...) if config.placebo
+    engine_agreement -- see engine_agreement(...) if config.engine
+                        is 'exact' and config.engine_check simulated
+                        years check it
+    projections -- summary of the projections
+                   (see compute_projection_summary(...) and
+                   ProjectionAccumulator.summary(...))
+    report -- text report (see make_report(...))
+    figures -- figures if config.make_plots else empty list
+    timings -- wall time of each stage in seconds
+    profile -- wall time, CPU time, and peak memory allocated by each
+               stage if config.profile or config.cprofile
+               (see StageProfiler)
+    """
 
-        if _settings.block:
-            plt.ion()
-            plt.show()
-            # wait to display the figure
-            plt.pause(plot_duration_secs)
-        else:
-            plt.show()
+    def __init__(self, config, input_file):
+        self.config = config
+        self.input_file = input_file
+        base_file_name = os.path.basename(input_file)
+        self.file_stem = base_file_name.split('.')[0]
+        self.adv_start_date = None
+        self.first_date = None
+        self.day_np = None
+        self.daily_sales_np = None
+        self.daily_sales_ma = None
+        self.mask_no_adv = None
+        self.mask_adv = None
+        self.unit_price = config.unit_price
+        self.rows = None
+        self.simulation_cache_hit = False
+        self.scenario_grid = None
+        self.change_point = None
+        self.placebo = None
+        self.engine_agreement = None
+        self.sales_stats = None
+        self.distributions = {}
+        self.welch = {}
+        self.simulations = {}
+        self.projections = {}
+        self.report = None
+        self.timings = {}
+        self.profile = None
+        self.figures = []
+
+    @property
+    def expected_profit_increase(self):
+        return self.projections.get('expected_profit_increase')
+
+    @property
+    def empirical_p_value(self):
+        return self.projections.get('empirical_p_value')
+
+    def to_dict(self):
+        """
+        results as a dictionary for the results files
+        (see write_results(...))
+        """
+        results = {'input_file' : self.input_file,
+                   'project_version' : PROJECT_VERSION.strip(),
+                   'seed' : self.config.seed_val,
+                   'number_sims' : self.config.number_sims,
+                   'adv_start_date' : self.adv_start_date,
+                   'annual_adv_expense' : self.config.annual_adv_expense,
+                   'unit_price' : self.unit_price,
+                   'unit_cost' : self.config.unit_cost,
+                   'sales_stats' : self.sales_stats.to_dict(),
+                   'poisson_fit' : {period : {'poisson_lambda' : dist['popt'][0],
+                                              'r2' : dist['r2']}
+                                    for period, dist
+                                    in self.distributions.items()},
+                   'expected_profit_increase' :
+                       self.projections['expected_profit_increase'],
+                   'expected_profit_increase_diff' :
+                       self.projections['expected_profit_increase_diff'],
+                   'empirical_p_value' : self.projections['empirical_p_value'],
+                   'loss_counts' : self.projections['loss_counts'],
+                   'histograms' : {name : {'bins' : bins, 'edges' : edges}
+                                   for name, (bins, edges)
+                                   in self.projections['histograms'].items()},
+                   'timings' : self.timings}
+        results['histograms']['welch_t'] = {'bins' : self.welch['t_bins'],
+                                            'edges' : self.welch['t_edges']}
+        if not self.profile is None:
+            results['profile'] = self.profile
+        if not self.scenario_grid is None:
+            results['scenario_grid'] = self.scenario_grid
+        if not self.change_point is None:
+            results['change_point'] = self.change_point
+        if not self.placebo is None:
+            results['placebo'] = self.placebo
+        if self.config.engine == 'exact':
+            results['engine'] = self.config.engine
+            results['exact_loss_probabilities'] \
+                = self.projections['loss_probabilities']
+        if not self.engine_agreement is None:
+            results['engine_agreement'] = self.engine_agreement
+        if 'statistics' in self.projections:
+            results['streaming'] = {name : self.projections[name]
+                                    for name in ('n_sims', 'statistics',
+                                                 'quantiles',
+                                                 'profit_quantiles')}
+        return results
+
+    def __str__(self):
+        if self.report is None:
+            return "EvaluationResult for " + str(self.input_file)
+        return self.report
+# end class EvaluationResult
+
+class StageProfiler:
+    """
+    times the named stages of an evaluation
+
+    Always records the wall time of each stage in timings.  With
+    profile, also records the wall time, the CPU time, and the peak
+    memory allocated (tracemalloc) of each stage in stages.  With
+    cprofile, also runs cProfile during each stage (see dump_stats).
+
+    A stage ends when the next stage starts or at stop().  A stage
+    started more than once adds up its times.
+
+    WHY: the dots printed during the simulations do not show where
+    the time of a slow evaluation goes.  tracemalloc and cProfile slow
+    down the evaluation so they are only used when asked for.
+    """
+
+    def __init__(self, profile=False, cprofile=False):
+        self.timings = {}
+        self.stages = {}
+        self.profile = profile
+        self.cprofile = cprofile
+        self.cprofilers = {}
+        self.stage_name = None
+        self.t_wall = None
+        self.t_cpu = None
+        self.started_tracemalloc = False
+        if profile and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+
+    def start(self, stage_name):
+        """
+        start the stage stage_name (ends the current stage)
+        """
+        self.stop()
+        self.stage_name = stage_name
+        if self.profile:
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()  # Python 3.9 and later
+            if self.cprofile:
+                if not stage_name in self.cprofilers:
+                    import cProfile
+                    self.cprofilers[stage_name] = cProfile.Profile()
+                self.cprofilers[stage_name].enable()
+            self.t_cpu = time.process_time()
+        self.t_wall = time.time()
+
+    def stop(self):
+        """
+        end the current stage if any
+        """
+        if self.stage_name is None:
+            return
+        wall_secs = time.time() - self.t_wall
+        stage_name = self.stage_name
+        self.stage_name = None
+        self.timings[stage_name] = self.timings.get(stage_name, 0.0) \
+                                   + wall_secs
+        if not self.profile:
+            return
+
+        cpu_secs = time.process_time() - self.t_cpu
+        if stage_name in self.cprofilers:
+            self.cprofilers[stage_name].disable()
+        # before Python 3.9 the peak is the peak since tracemalloc started
+        peak_mb = tracemalloc.get_traced_memory()[1]/(1024.0*1024.0)
+        stage = self.stages.setdefault(stage_name, {'wall_secs' : 0.0,
+                                                    'cpu_secs' : 0.0,
+                                                    'peak_alloc_mb' : 0.0})
+        stage['wall_secs'] += wall_secs
+        stage['cpu_secs'] += cpu_secs
+        stage['peak_alloc_mb'] = max(stage['peak_alloc_mb'], peak_mb)
+
+    def stop_profiling(self):
+        """
+        end the current stage and stop tracemalloc if started here
+        """
+        self.stop()
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+
+    def dump_stats(self, stage_name, profile_file):
+        """
+        write the cProfile statistics of a stage to profile_file
+        (read with python -m pstats profile_file or snakeviz)
+        """
+        self.cprofilers[stage_name].dump_stats(profile_file)
+        self.stages[stage_name]['cprofile_file'] = profile_file
+# end class StageProfiler
+
+def profile_report(stages):
+    """
+    text table of the stages of a StageProfiler for the report
+
+    RETURNS: report -- text block
+    """
+    report = "\n\nStage Profile\n"
+    report += "%-18s %10s %10s %15s\n" % ("Stage", "Wall (s)", "CPU (s)",
+                                          "Peak Alloc (MB)")
+    for stage_name, stage in stages.items():
+        report += "%-18s %10.3f %10.3f %15.1f\n" % (stage_name,
+                                                    stage['wall_secs'],
+                                                    stage['cpu_secs'],
+                                                    stage['peak_alloc_mb'])
+    return report
+
+def run_evaluation(sales_report, config=None, input_file=None,
+                   progress=None, cancel=None, partial_results=None):
+    """
+    evaluate the effectiveness of the advertising without
+    using or changing the global settings
+
+    ARGUMENTS: sales_report -- path to the sales report (CSV file) or
+                               a Pandas DataFrame with the sales report
+               config -- EvaluationConfig (default EvaluationConfig())
+               input_file -- name used in the report and output file
+                             names for a DataFrame (default sales_data.csv)
+               progress -- optional callback progress(n_done, number_sims)
+                           for the annual sales projections
+               cancel -- optional threading.Event to stop the evaluation
+                         (raises EvaluationCancelled)
+               partial_results -- optional callback partial_results(summary)
+                                  with the projections so far (see
+                                  summarize_partial_projections(...)) after
+                                  the first batch, at most every
+                                  PARTIAL_RESULTS_SECS, and at the end
+
+    RETURNS: EvaluationResult
+
+    WHY: a service can run many evaluations in one process instead of
+    running one Python process per evaluation.  The simulations use
+    their own random number generator seeded with config.seed_val so
+    the results are the same as the command line for the same seed.
+    """
+    if config is None:
+        config = EvaluationConfig()
+
+    if not isinstance(config, EvaluationConfig):
+        raise TypeError(debug_prefix() + 'config is type '
+                        + str(type(config)))
+
+    profiler = StageProfiler(config.profile or config.cprofile,
+                             config.cprofile)
+    try:
+        result = evaluate_stages(sales_report, config, input_file,
+                                 progress, cancel, partial_results,
+                                 profiler)
+    finally:
+        profiler.stop_profiling()
+
+    if profiler.profile:
+        result.profile = profiler.stages
+        result.report += profile_report(profiler.stages)
+
+    output_folder = config.output_folder
+    if not output_folder is None:
+        # write report to file
+        with open(output_folder + os.sep
+                  + result.file_stem + "_report.txt", "w") as out_file:
+            out_file.write(result.report)
+
+        if config.cprofile:
+            for stage_name in profiler.stages:
+                profile_file = output_folder + os.sep + result.file_stem \
+                               + "_profile_" + stage_name + ".prof"
+                profiler.dump_stats(stage_name, profile_file)
+                if config.verbose:
+                    print("wrote cProfile statistics to", profile_file)
+
+        for results_format in config.results_formats:
+            results_file = output_folder + os.sep \
+                           + result.file_stem + "_results." + results_format
+            if config.verbose:
+                print("writing results to", results_file)
+            write_results(result.to_dict(), results_file, results_format)
+
+    return result  # run_evaluation(...)
+
+def evaluate_stages(sales_report, config, input_file,
+                    progress, cancel, partial_results, profiler):
+    """
+    the stages of run_evaluation(...) timed by profiler (a StageProfiler)
+
+    RETURNS: EvaluationResult (without the profile and output files)
+    """
+    import pandas as pd
+    from dateutil.parser import parse
+
+    if not config.engine in ENGINES:
+        raise ValueError(debug_prefix() + "engine " + str(config.engine)
+                         + " is not one of " + ", ".join(ENGINES))
+    if config.engine == 'exact' and config.streaming:
+        raise ValueError(debug_prefix() + "the exact engine and streaming "
+                         "are alternative projections")
+    if config.engine_check < 0 \
+       or config.engine_check > 0 and config.engine != 'exact':
+        raise ValueError(debug_prefix() + "engine_check is "
+                         + str(config.engine_check)
+                         + " (simulated years checking the exact engine)")
+
+    t_evaluation = time.time()
+    profiler.start('read')
+    if isinstance(sales_report, str):
+        input_file = sales_report
+        if config.verbose:
+            print("reading the sales report from", input_file)
+        data_frame = read_sales_report(input_file)
+    elif isinstance(sales_report, pd.DataFrame):
+        # the caller's DataFrame is not modified
+        data_frame = sales_report.copy()
+        if input_file is None:
+            input_file = 'sales_data.csv'
     else:
-        daily_sales_bins, daily_sales_edges \
-            = np.histogram(ave_sales_increase/DAYS_PER_YEAR,
-                           bins=_settings.bins)
-        n_loss_daily_sales = compute_loss(daily_sales_bins, daily_sales_edges)
-
-    if _settings.detail_level > 0:
-        figure_3 = plt.figure(figsize=(12, 9))
-        profit_bins, profit_edges, patches = plt.hist(ave_profit_increase,
-                                                      bins=_settings.bins)
-        n_loss_profits = compute_loss(profit_bins, profit_edges)
-        plt.title('ANNUAL PROFIT INCREASE FROM ADVERTISING (' \
-                  + str(number_sims) + ' SIMULATIONS)')
-        plt.ylabel('NUMBER OF SIMULATIONS')
-        plt.xlabel('DOLLARS')
-        plt.grid()
-        xlow, xhi = plt.xlim()
-        delta_x = (xhi - xlow)
-        ylow, yhi = plt.ylim()
-        delta_y = (yhi - ylow)
-        plt.text(xlow + 0.025*delta_x, yhi-0.05*delta_y, \
-                 "Number of Simulations with Losses: %5.1f / %5.1f" \
-                 % (n_loss_profits, number_sims), \
-                 bbox=dict(facecolor='white', alpha=0.5))
+        raise TypeError(debug_prefix() + 'sales_report is type '
+                        + str(type(sales_report)))
 
-        ax_list = figure_3.axes
-        ax = ax_list[0]
-        formatter = FuncFormatter(currency)
-        ax.xaxis.set_major_formatter(formatter)
+    result = EvaluationResult(config, input_file)
+    result.rows = len(data_frame)
+    result.timings = profiler.timings
+    profiler.stop()
 
-        if _settings.block:
-            plt.show()
-        else:
-            plt.ion()
-            plt.show()
-            # wait to display the figure
-            plt.pause(plot_duration_secs)  # profit projections histogram
+    # get the date the (new) advertising starts
+    start_date = parse(config.adv_date)
+    result.adv_start_date = start_date
+    if config.verbose:
+        print("advertising start date:", start_date)
+
+    profiler.start('header_inference')
+    date_tag, date_index = get_date_refs(data_frame, config.date_tag)
+
+    profiler.start('sort')
+    sorted_data_frame = data_frame.sort_values(by=date_tag)
+    first_date_ts = sorted_data_frame[date_tag][0]
+    result.first_date = first_date_ts.date()
+    profiler.start('daily_sales')
+    try:
+        day_np, daily_sales_np = compute_daily_sales(sorted_data_frame,
+                                                     config.date_tag,
+                                                     config.amount_tag,
+                                                     config.sales_type_tag,
+                                                     config.sales_type_value)
+    except Exception as general_X:
+        msg = debug_prefix() \
+              + "compute_daily_sales(...) failed with EXCEPTION\n" \
+              + str(general_X) \
+              + "\nEND EXCEPTION"
+        raise ValueError(msg)
+
+    # sanity check
+    if not daily_sales_np.ndim == 2:
+        raise ValueError(debug_prefix()
+                         + " computed daily_sales_np has "
+                         + str(daily_sales_np.ndim)
+                         + " dimensions (should be 2)")
+
+    if daily_sales_np.size <= 0:
+        raise ValueError(debug_prefix()
+                         + " computed daily sales has "
+                         + str(daily_sales_np.size)
+                         + " elements (should be greater than 0)")
+
+    result.day_np = day_np
+    result.daily_sales_np = daily_sales_np
+    profiler.stop()
+
+    if config.detect_adv_date:
+        # the most likely change point in the daily sales
+        # replaces config.adv_date
+        profiler.start('change_point')
+        result.change_point \
+            = detect_change_point(daily_sales_np,
+                                  rng=np.random.RandomState(config.seed_val))
+        start_date = parse(result.change_point['adv_date'])
+        result.adv_start_date = start_date
+        profiler.stop()
+        if config.verbose:
+            print("detected advertising start date:", start_date)
+
+    mask_no_adv = daily_sales_np[:, 0] < start_date
+    mask_adv = daily_sales_np[:, 0] >= start_date
+    result.mask_no_adv = mask_no_adv
+    result.mask_adv = mask_adv
+
+    # compute empirical probability distributions and fit Poisson models
+    for period, mask in (('no_adv', mask_no_adv), ('adv', mask_adv)):
+        profiler.start('get_dist')
+        dist_h, y_err = get_dist(daily_sales_np[mask, 1], config.unit_price)
+        # avoid divide by zero error
+        y_err[y_err == 0.0] = 0.01
+        profiler.start('poisson_fits')
+        popt, r2 = fit_poisson(dist_h, y_err)
+        result.distributions[period] = {'dist_h' : dist_h,
+                                        'y_err' : y_err,
+                                        'dist_cumsum' : dist_h.cumsum(),
+                                        'popt' : popt,
+                                        'r2' : r2}
+    profiler.stop()
+
+    # same random numbers as np.random.seed(seed_val)
+    rng = np.random.RandomState(config.seed_val)
+
+    # the simulations do not depend on the advertising expense or
+    # the unit cost, so a change in these reuses the simulations
+    cache_key = None
+    cached_simulations = None
+    # the cache stores the simulations that -streaming never keeps
+    if config.simulation_cache and not config.streaming:
+        profiler.start('simulation_cache')
+        cache_key = simulation_cache_key(daily_sales_np, mask_adv, config)
+        cached_simulations = get_cached_simulations(cache_key,
+                                                    config.simulation_cache_folder)
+        profiler.stop()
+    result.simulation_cache_hit = cached_simulations is not None
+    if result.simulation_cache_hit:
+        if config.verbose:
+            print("reusing the cached simulations", cache_key)
+        if not cancel is None and cancel.is_set():
+            raise EvaluationCancelled()
+        welch_t_bins = cached_simulations['t_bins']
+        welch_t_edges = cached_simulations['t_edges']
+        welch_pval_bins = cached_simulations['pval_bins']
+        welch_pval_edges = cached_simulations['pval_edges']
     else:
-        profit_bins, profit_edges = np.histogram(ave_profit_increase,
-                                                 bins=_settings.bins)
-        n_loss_profits = compute_loss(profit_bins, profit_edges)
-
-    if _settings.detail_level > 0:
-        plot_projections(sales_edges,
-                         sales_bins,
-                         profit_edges,
-                         profit_bins,
-                         number_sims,
-                         input_file,
-                         expected_profit_increase,
-                         annual_adv_expense,
-                         n_loss_sales,
-                         n_loss_profits,
-                         seed_val,
-                         plot_duration_secs,
-                         output_folder,
-                         suffix="_adv")
-
-
-    sales_bins_diff, \
-        sales_edges_diff = np.histogram(ave_sales_increase_diff,
-                                        bins=_settings.bins)
-    n_loss_sales_diff = compute_loss(sales_bins_diff,
-                                     sales_edges_diff)
-
-    profit_bins_diff, \
-        profit_edges_diff = np.histogram(ave_profit_increase_diff,
-                                         bins=_settings.bins)
-    n_loss_profit_diff = compute_loss(profit_bins_diff,
-                                      profit_edges_diff)
-
-    if _settings.detail_level > 0:
-        plot_projections(sales_edges_diff,
-                         sales_bins_diff,
-                         profit_edges_diff,
-                         profit_bins_diff,
-                         number_sims,
-                         input_file,
-                         expected_profit_increase_diff,
-                         0.0,  # no advertising expense
-                         n_loss_sales_diff,
-                         n_loss_profit_diff,
-                         seed_val,
-                         plot_duration_secs,
-                         output_folder,
-                         suffix="_no_adv")
-
-    if _settings.layers:
-        plot_diff_risk(profit_edges_diff,
-                       profit_bins_diff,
-                       profit_edges,
-                       profit_bins,
-                       number_sims,
-                       input_file,
-                       expected_profit_increase,
-                       0.0,  # no advertising expense
-                       n_loss_sales_diff,
-                       n_loss_profit_diff,
-                       seed_val,
-                       plot_duration_secs,
-                       output_folder,
-                       suffix="_diff",
-                       show_no_adv=True,
-                       show_with_adv=False,
-                       show_ave_with_adv=False)
-
-        plot_diff_risk(profit_edges_diff,
-                       profit_bins_diff,
-                       profit_edges,
-                       profit_bins,
-                       number_sims,
-                       input_file,
-                       expected_profit_increase,
-                       0.0,  # no advertising expense
-                       n_loss_sales_diff,
-                       n_loss_profit_diff,
-                       seed_val,
-                       plot_duration_secs,
-                       output_folder,
-                       suffix="_diff",
-                       show_no_adv=True,
-                       show_with_adv=True,
-                       show_ave_with_adv=False)
+        profiler.start('sim_adv_period')
+        welch_t_bins, welch_t_edges, welch_pval_bins, welch_pval_edges \
+            = sim_adv_period(daily_sales_np,
+                             result.distributions['no_adv']['dist_cumsum'],
+                             mask_adv,
+                             result.file_stem,
+                             unit_price=config.unit_price,
+                             bins=config.bins,
+                             rng=rng,
+                             verbose=config.verbose,
+                             cancel=cancel)
+
+    profiler.start('fit_bell_curve')
+    coeff_of_determination, popt_bell \
+        = fit_bell_curve(welch_t_edges, welch_t_bins, config.verbose)
+    result.welch = {'t_bins' : welch_t_bins,
+                    't_edges' : welch_t_edges,
+                    'pval_bins' : welch_pval_bins,
+                    'pval_edges' : welch_pval_edges,
+                    'coeff_of_determination' : coeff_of_determination,
+                    'popt' : popt_bell}
+    profiler.stop()
 
-    # MAIN PLOT
-    # plot profit projections for no advertising vs advertising case
-    plot_diff_risk(profit_edges_diff,
-                   profit_bins_diff,
-                   profit_edges,
-                   profit_bins,
-                   number_sims,
-                   input_file,
-                   expected_profit_increase,
-                   0.0,  # no advertising expense
-                   n_loss_sales_diff,
-                   n_loss_profit_diff,
-                   seed_val,
-                   plot_duration_secs,
-                   output_folder,
-                   suffix="_diff")
+    # create a SalesStats object
+    profiler.start('sales_stats')
+    sales_stats = SalesStats(daily_sales_np,
+                             mask_no_adv,
+                             welch_t_edges,
+                             welch_t_bins,
+                             coeff_of_determination,
+                             input_file)
+    result.sales_stats = sales_stats
+    result.daily_sales_ma = compute_moving_average(daily_sales_np,
+                                                   config.ma_period_days)
 
-    sales_stats.empirical_p_value = empirical_p_value
-    sales_stats.expected_profit_increase = expected_profit_increase
+    unit_price = config.unit_price
+    if unit_price is None:
+        # infer the unit price from the sales data
+        unit_prices = get_unit_prices(daily_sales_np[mask_no_adv, 1])
+        unit_price = unit_prices[0]
+        check_unit_price(unit_price)
+    result.unit_price = unit_price
+    profiler.stop()
+
+    # partial(...) gets the simulations (or the streaming accumulator)
+    # completed so far and reports partial results
+    t_partial = [0.0]  # time of last partial results
+    if partial_results is None:
+        partial = None
+    elif config.streaming:
+        def partial(accumulator):
+            t_now = time.time()
+            if t_now - t_partial[0] >= PARTIAL_RESULTS_SECS \
+               or accumulator.n_sims == config.number_sims:
+                t_partial[0] = t_now
+                partial_results(accumulator.partial_summary(config.number_sims))
+    else:
+        def partial(ave_sales_no_adv, ave_sales_adv, ave_sales_no_adv_test):
+            t_now = time.time()
+            if t_now - t_partial[0] >= PARTIAL_RESULTS_SECS \
+               or ave_sales_adv.size == config.number_sims:
+                t_partial[0] = t_now
+                partial_results(summarize_partial_projections(ave_sales_no_adv,
+                                                              ave_sales_adv,
+                                                              unit_price,
+                                                              config.unit_cost,
+                                                              config.annual_adv_expense,
+                                                              config.bins,
+                                                              config.number_sims))
+
+    # derived sales and profit arrays in float32 with -float32
+    profit_dtype = np.float32 if config.float32 else np.float64
+    accumulator = None
+    if config.streaming:
+        profiler.start('projection')
+        accumulator \
+            = project_annual_sales_streaming(result.distributions['adv']['dist_cumsum'],
+                                             result.distributions['adv']['y_err'],
+                                             result.distributions['no_adv']['dist_cumsum'],
+                                             result.distributions['no_adv']['y_err'],
+                                             unit_price,
+                                             config.unit_cost,
+                                             config.annual_adv_expense,
+                                             config.number_sims,
+                                             config.seed_val,
+                                             config.workers,
+                                             config.bins,
+                                             progress=progress,
+                                             verbose=config.verbose,
+                                             cancel=cancel,
+                                             partial=partial,
+                                             dtype=profit_dtype)
+        profiler.start('histograms')
+        result.projections = accumulator.summary()
+    elif config.engine == 'exact':
+        # exact distributions (the variation of the daily distributions
+        # has its own random numbers, independent of any simulations)
+        profiler.start('exact_projection')
+        exact = exact_projection(result.distributions['adv']['dist_cumsum'],
+                                 result.distributions['adv']['y_err'],
+                                 result.distributions['no_adv']['dist_cumsum'],
+                                 result.distributions['no_adv']['y_err'],
+                                 unit_price,
+                                 config.number_sims,
+                                 np.random.RandomState([config.seed_val, 1]))
+        result.projections = exact_projection_summary(exact,
+                                                      unit_price,
+                                                      config.unit_cost,
+                                                      config.annual_adv_expense,
+                                                      config.bins,
+                                                      config.number_sims,
+                                                      config.number_sims)
+        if config.engine_check > 0:
+            # optional check with simulated years
+            profiler.start('projection')
+            ave_sales_no_adv, ave_sales_adv, ave_sales_no_adv_test \
+                = project_annual_sales(result.distributions['adv']['dist_cumsum'],
+                                       result.distributions['adv']['y_err'],
+                                       result.distributions['no_adv']['dist_cumsum'],
+                                       result.distributions['no_adv']['y_err'],
+                                       unit_price,
+                                       config.engine_check,
+                                       rng=rng,
+                                       progress=progress,
+                                       verbose=config.verbose,
+                                       cancel=cancel)
+            result.simulations = {'ave_sales_no_adv' : ave_sales_no_adv,
+                                  'ave_sales_adv' : ave_sales_adv,
+                                  'ave_sales_no_adv_test' : ave_sales_no_adv_test}
+            result.engine_agreement = engine_agreement(result.projections,
+                                                       ave_sales_no_adv,
+                                                       ave_sales_adv,
+                                                       unit_price,
+                                                       config.unit_cost,
+                                                       config.annual_adv_expense)
+        elif not progress is None:
+            progress(config.number_sims, config.number_sims)
+    else:
+        if result.simulation_cache_hit:
+            ave_sales_no_adv = cached_simulations['ave_sales_no_adv']
+            ave_sales_adv = cached_simulations['ave_sales_adv']
+            ave_sales_no_adv_test = cached_simulations['ave_sales_no_adv_test']
+            if not progress is None:
+                progress(config.number_sims, config.number_sims)
+            if not partial is None:
+                partial(ave_sales_no_adv, ave_sales_adv, ave_sales_no_adv_test)
+        else:
+            profiler.start('projection')
+            ave_sales_no_adv, ave_sales_adv, ave_sales_no_adv_test \
+                = project_annual_sales(result.distributions['adv']['dist_cumsum'],
+                                       result.distributions['adv']['y_err'],
+                                       result.distributions['no_adv']['dist_cumsum'],
+                                       result.distributions['no_adv']['y_err'],
+                                       unit_price,
+                                       config.number_sims,
+                                       rng=rng,
+                                       progress=progress,
+                                       verbose=config.verbose,
+                                       cancel=cancel,
+                                       partial=partial)
+            if not cache_key is None:
+                put_cached_simulations(cache_key,
+                                       {'t_bins' : welch_t_bins,
+                                        't_edges' : welch_t_edges,
+                                        'pval_bins' : welch_pval_bins,
+                                        'pval_edges' : welch_pval_edges,
+                                        'ave_sales_no_adv' : ave_sales_no_adv,
+                                        'ave_sales_adv' : ave_sales_adv,
+                                        'ave_sales_no_adv_test' : ave_sales_no_adv_test},
+                                       config.simulation_cache_folder)
+
+        profiler.start('histograms')
+        result.simulations = {'ave_sales_no_adv' : ave_sales_no_adv,
+                              'ave_sales_adv' : ave_sales_adv,
+                              'ave_sales_no_adv_test' : ave_sales_no_adv_test}
+        result.projections \
+            = compute_projection_summary(ave_sales_no_adv,
+                                         ave_sales_adv,
+                                         ave_sales_no_adv_test,
+                                         unit_price,
+                                         config.unit_cost,
+                                         config.annual_adv_expense,
+                                         config.bins,
+                                         profit_dtype)
+
+    sales_stats.empirical_p_value = result.projections['empirical_p_value']
+    sales_stats.expected_profit_increase \
+        = result.projections['expected_profit_increase']
+
+    if not config.scenario_grid is None:
+        profiler.start('scenario_grid')
+        annual_adv_expenses, unit_costs = config.scenario_grid
+        if config.engine == 'exact':
+            sales_increase = result.projections['distributions']['sales_increase']
+            result.scenario_grid = scenario_grid_from_sales_increase(
+                sales_increase.mean,
+                config.number_sims,
+                lambda threshold, side: config.number_sims
+                                        *sales_increase.cdf(threshold, side),
+                sales_increase.quantile,
+                unit_price, annual_adv_expenses, unit_costs,
+                dtype=profit_dtype)
+        elif accumulator is None:
+            result.scenario_grid = compute_scenario_grid(ave_sales_no_adv,
+                                                         ave_sales_adv,
+                                                         unit_price,
+                                                         annual_adv_expenses,
+                                                         unit_costs,
+                                                         dtype=profit_dtype)
+        else:
+            result.scenario_grid = accumulator.scenario_grid(annual_adv_expenses,
+                                                             unit_costs,
+                                                             dtype=profit_dtype)
+
+    if config.placebo:
+        profiler.start('placebo')
+        result.placebo \
+            = placebo_test(daily_sales_np,
+                           mask_no_adv,
+                           result.distributions['no_adv']['dist_cumsum'],
+                           unit_price,
+                           config.unit_cost,
+                           config.annual_adv_expense,
+                           rng=np.random.RandomState(config.seed_val))
 
     # compute and generate final report
-    report = make_report(daily_sales_np,
-                         daily_sales_ma,
-                         sales_stats)
+    profiler.start('make_report')
+    result.report = make_report(daily_sales_np,
+                                result.daily_sales_ma,
+                                sales_stats)
+    if not accumulator is None:
+        result.report += streaming_report(result.projections)
+    if config.engine == 'exact':
+        result.report += exact_report(result.projections,
+                                      result.engine_agreement)
+    if not result.change_point is None:
+        result.report += change_point_report(result.change_point)
+    if not result.placebo is None:
+        result.report += placebo_report(result.placebo)
+    if not result.scenario_grid is None:
+        result.report += scenario_grid_report(result.scenario_grid)
+    profiler.stop()
+
+    output_folder = config.output_folder
+    if not output_folder is None:
+        # create the output folder if it does not exist already
+        if not os.path.exists(output_folder):
+            os.makedirs(output_folder)
+
+    if not output_folder is None and not result.scenario_grid is None:
+        write_scenario_grid(result.scenario_grid,
+                            output_folder + os.sep
+                            + result.file_stem + "_scenario_grid.csv")
+
+    if config.make_plots:
+        profiler.start('plots')
+        result.figures = plot_evaluation(result)
+        profiler.stop()
+
+    result.timings['total'] = time.time() - t_evaluation
+    return result  # evaluate_stages(...)
+
+def plot_evaluation(result):
+    """
+    plot the results of run_evaluation(...)
+
+    ARGUMENTS: result -- EvaluationResult
+
+    RETURNS: list of figures
+
+    the figures are saved in result.config.output_folder unless None
+    """
+    plt = import_pyplot()
+    from matplotlib.ticker import FuncFormatter
+    from matplotlib.font_manager import FontProperties
+
+    if not isinstance(result, EvaluationResult):
+        raise TypeError(debug_prefix() + 'result is type '
+                        + str(type(result)))
+
+    config = result.config
+    block = config.block
+    detail_level = config.detail_level
+    plot_duration_secs = config.plot_duration_secs
+    output_folder = config.output_folder
+    input_file = result.input_file
+    file_stem = result.file_stem
+    number_sims = config.number_sims
+    seed_val = config.seed_val
+    welch = result.welch
+    projections = result.projections
+    sim_hists = projections['histograms']
+    loss_counts = projections['loss_counts']
+    expected_profit_increase = projections['expected_profit_increase']
+    figures = []
+
+    if detail_level > 1:
+        figures += plot_welch_hists(welch['t_bins'],
+                                    welch['t_edges'],
+                                    welch['pval_bins'],
+                                    welch['pval_edges'],
+                                    file_stem,
+                                    output_folder,
+                                    plot_duration_secs,
+                                    block)
+        figures.append(plot_bell_curve_fit(welch['t_edges'],
+                                           welch['t_bins'],
+                                           welch['popt'],
+                                           welch['coeff_of_determination'],
+                                           file_stem,
+                                           output_folder,
+                                           plot_duration_secs,
+                                           block))
+
+    # daily sales only, daily sales and moving average
+    # (layers for animation of plot in PowerPoint/Impress/presentation
+    # software) and all three plot elements together (default)
+    if config.layers:
+        sales_plot_options = [(False, False), (True, False), (True, True)]
+    else:
+        sales_plot_options = [(True, True)]
+
+    for show_ma, show_period_average in sales_plot_options:
+        figures.append(plot_sales_data(input_file,
+                                       result.first_date,
+                                       result.day_np,
+                                       result.mask_adv,
+                                       result.mask_no_adv,
+                                       config.ma_period_days,
+                                       result.daily_sales_np,
+                                       result.sales_stats,
+                                       plot_duration_secs,
+                                       output_folder,
+                                       show_ma=show_ma,
+                                       show_period_average=show_period_average,
+                                       block=block,
+                                       detail_level=detail_level))
+
+    dist_h_no_adv = result.distributions['no_adv']['dist_h']
+    y_err_no_adv = result.distributions['no_adv']['y_err']
+    dist_h_adv = result.distributions['adv']['dist_h']
+    y_err_adv = result.distributions['adv']['y_err']
+    x_no_adv = np.array(range(dist_h_no_adv.size))
+    x_adv = np.array(range(dist_h_adv.size))
+
+    # side by side pie charts of frequency of daily sales
+    fig_pie = plt.figure(figsize=(12,9))
+    # no advertising pie chart
+    plt.subplot(1,2,1)
+    labels_no_adv = [str(item) for item in x_no_adv]
+    plt.pie(dist_h_no_adv.ravel(), labels=labels_no_adv, autopct='%1.1f%%')
+    plt.title('NO ADVERTISING')
+
+    # advertising pie chart
+    plt.subplot(1,2,2)
+    labels_adv = [str(item) for item in x_adv]
+    plt.pie(dist_h_adv.ravel(), labels=labels_adv, autopct='%1.1f%%')
+    plt.title('ADVERTISING')
 
-    print(report)
+    fp = FontProperties(family="sans-serif", size=20, weight="bold")
+    plt.suptitle('UNIT SALES PER DAY', fontproperties=fp)
+
+    if block:
+        plt.show()
+    else:
+        plt.ion()
+        plt.show()
+        plt.pause(plot_duration_secs)
 
-    # write report to file
-    with open(output_folder + os.sep
-              + file_stem + "_report.txt", "w") as out_file:
-        out_file.write(report)
+    if not output_folder is None:
+        fig_pie.savefig(output_folder
+                        + os.sep
+                        + file_stem
+                        + "_pie_charts.jpg")
+    figures.append(fig_pie)
+
+    fig_bar, ax_bar  = plt.subplots(figsize=(12,9))
+    n_groups = max(len(x_adv), len(x_no_adv))
+
+    index = np.arange(n_groups)
+    bar_width = 0.35
+    opacity = 0.8
+
+    index_no_adv = np.arange(len(x_no_adv))
+    plt.bar(index_no_adv,
+            dist_h_no_adv.ravel(),
+            bar_width,
+            alpha=opacity,
+            color='b',
+            label='NO ADVERTISING')
+
+    index_adv = np.arange(len(x_adv))
+    plt.bar(index_adv + bar_width,
+            dist_h_adv.ravel(),
+            bar_width,
+            alpha=opacity,
+            color='g',
+            label='ADVERTISING')
+
+    plt.xlabel('UNIT SALES PER DAY')
+    plt.ylabel('FRACTION OF DAYS')
+    plt.title('UNIT SALES PER DAY BAR CHART')
+    bar_labels = [str(item) for item in range(n_groups+1)]
+    plt.xticks(index + bar_width, bar_labels)
+    plt.legend()
+
+    plt.tight_layout()
+    if block:
+        plt.show()
+    else:
+        plt.ion()
+        plt.show()
+        plt.pause(plot_duration_secs)
+
+    # save bar charts to jpeg image
+    if not output_folder is None:
+        fig_bar.savefig(output_folder
+                        + os.sep
+                        + file_stem
+                        + "_bar_charts.jpg")
+    figures.append(fig_bar)
+
+    if detail_level > 0:
+        # show empirical sales distributions
+        fig_dist = plt.figure(figsize=(12, 9))
+        plt.errorbar(x_no_adv, dist_h_no_adv.ravel(),
+                     yerr=y_err_no_adv.ravel(),
+                     fmt=NO_ADV_MARKER,
+                     label='NO ADVERTISING',
+                     linewidth=LINEWIDTH, markersize=MARKERSIZE)
+        plt.errorbar(x_adv, dist_h_adv.ravel(),
+                     yerr=y_err_adv.ravel(),
+                     fmt=ADV_MARKER,
+                     label='ADVERTISING',
+                     linewidth=LINEWIDTH, markersize=MARKERSIZE)
+
+        if detail_level > 1:
+            x_no_adv_line = np.linspace(0.0, np.max(x_no_adv), 100)
+            x_adv_line = np.linspace(0.0, np.max(x_adv), 100)
+            y_fit_no_adv_line \
+                = poisson_curve(x_no_adv_line,
+                                *result.distributions['no_adv']['popt'])
+            y_fit_adv_line \
+                = poisson_curve(x_adv_line,
+                                *result.distributions['adv']['popt'])
+
+            plt.plot(x_no_adv_line, y_fit_no_adv_line,
+                     NO_ADV_LINE,
+                     label='NO ADV FIT', linewidth=LINEWIDTH)
+
+            plt.plot(x_adv_line, y_fit_adv_line,
+                     ADV_LINE,
+                     label='ADV FIT', linewidth=LINEWIDTH)
+
+        plt.title('ESTIMATED PROBABILITY OF A NUMBER OF SALES PER DAY')
+        plt.xlabel('NUMBER OF UNIT SALES PER DAY')
+        plt.ylabel('FRACTION OF DAYS WITH THE NUMBER OF DAILY SALES')
+        plt.legend(loc='upper right')
+        if detail_level > 1:
+            xlo, xhi = plt.xlim()
+            delta_x = xhi - xlo
+            ylo, yhi = plt.ylim()
+            delta_y = yhi - ylo
+            # add coefficients of determination from fits
+            plt.text(xlo + delta_x*0.025,
+                     yhi - 0.05*delta_y,
+                     'NO ADV R**2: %3.2f' % result.distributions['no_adv']['r2'])
+            plt.text(xlo + 0.025*delta_x,
+                     yhi - 0.09*delta_y,
+                     'ADV R**2: %3.2f' % result.distributions['adv']['r2'])
+
+        plt.grid()
+        if block:
+            plt.show()
+        else:
+            plt.ion()
+            plt.show()
+            plt.pause(plot_duration_secs)
+
+        if not output_folder is None:
+            fig_dist.savefig(output_folder
+                             + os.sep
+                             + file_stem
+                             + "_empirical_distributions.jpg")
+        figures.append(fig_dist)
+
+    if detail_level > 1:
+        edges = projections['density_edges']
+        xval = (edges[:-1] + edges[1:])/2.0
+
+        f_pdf = plt.figure(figsize=(12, 9))
+        plt.plot(xval, projections['density_no_adv'],
+                 NO_ADV_MARKER,
+                 label='NO ADV', markersize=MARKERSIZE, linewidth=LINEWIDTH)
+        plt.plot(xval, projections['density_adv'],
+                 ADV_MARKER,
+                 label='ADV', markersize=MARKERSIZE, linewidth=LINEWIDTH)
+        plt.grid()
+        plt.legend(loc='upper right')
+        plt.xlabel('DOLLARS')
+        plt.ylabel('Probability Density')
+        plt.title('Empirical Sales Probability Density '
+                  'from the Sales Projection')
+
+        ax_list = f_pdf.axes
+        ax = ax_list[0]
+        formatter = FuncFormatter(currency)
+        ax.xaxis.set_major_formatter(formatter)
+
+        if block:
+            plt.show()
+        else:
+            plt.ion()
+            plt.show()
+            plt.pause(plot_duration_secs)
+        if not output_folder is None:
+            f_pdf.savefig(output_folder + os.sep +
+                          file_stem + "_sales_pdf.jpg")
+        figures.append(f_pdf)
+
+    sales_bins_diff, sales_edges_diff = sim_hists['sales_increase_diff']
+    profit_bins_diff, profit_edges_diff = sim_hists['profit_increase_diff']
+    sales_bins, sales_edges = sim_hists['sales_increase']
+    profit_bins, profit_edges = sim_hists['profit_increase']
+
+    if detail_level > 0:
+        figures.append(plot_ave_hist(sales_bins_diff,
+                                     sales_edges_diff,
+                                     input_file,
+                                     output_folder,
+                                     'AVERAGE SALES INCREASE DIFF',
+                                     plot_duration_secs,
+                                     block))
+
+        # show sales/profit projections for year with no advertising
+        # and with advertising
+        for hist_name, title_str, suffix \
+            in (('annual_sales_no_adv', 'ANNUAL SALES WITH NO ADVERTISING',
+                 '_no_adv'),
+                ('annual_sales_adv', 'ANNUAL SALES WITH ADVERTISING',
+                 '_adv')):
+            annual_bins, annual_edges = sim_hists[hist_name]
+            fig_annual = plt.figure(figsize=(12, 9))
+            plot_histogram_bins(annual_bins, annual_edges)
+            plt.title(title_str)
+            plt.ylabel('NUMBER OF SIMULATIONS')
+            plt.xlabel('DOLLARS')
+            plt.grid()
+
+            ax_list = fig_annual.axes
+            ax = ax_list[0]
+            formatter = FuncFormatter(currency)
+            ax.xaxis.set_major_formatter(formatter)
+
+            if block:
+                plt.show()
+            else:
+                plt.ion()
+                plt.show()  # sales projection histogram
+                # wait to display the figure
+                plt.pause(plot_duration_secs)
+
+            if not output_folder is None:
+                image_file = file_stem + "_sales_projection" + suffix + ".jpg"
+                print("saving sales projection bar chart to", image_file)
+                fig_annual.savefig(output_folder + os.sep + image_file)
+            figures.append(fig_annual)
+
+        # annual and average daily sales increase (same bins with
+        # the edges scaled to daily values), and the profit increase
+        for hist_bins, hist_edges, title_str, loss_str, n_loss \
+            in ((sales_bins, sales_edges,
+                 'ANNUAL SALES INCREASE FROM ADVERTISING (',
+                 "Sales Decline", loss_counts['n_loss_sales']),
+                (sales_bins, sales_edges/DAYS_PER_YEAR,
+                 'DAILY SALES INCREASE FROM ADVERTISING (',
+                 "Sales Decline", loss_counts['n_loss_daily_sales']),
+                (profit_bins, profit_edges,
+                 'ANNUAL PROFIT INCREASE FROM ADVERTISING (',
+                 "Losses", loss_counts['n_loss_profits'])):
+            fig_increase = plt.figure(figsize=(12, 9))
+            plot_histogram_bins(hist_bins, hist_edges)
+            plt.title(title_str + str(number_sims) + ' SIMULATIONS)')
+            plt.ylabel('NUMBER OF SIMULATIONS')
+            plt.xlabel('DOLLARS')
+            xlow, xhi = plt.xlim()
+            delta_x = (xhi - xlow)
+            ylow, yhi = plt.ylim()
+            delta_y = (yhi - ylow)
+            plt.text(xlow + 0.025*delta_x, yhi-0.05*delta_y, \
+                     "Number of Simulations with " + loss_str \
+                     + ": %5.1f / %5.1f" \
+                     % (n_loss, number_sims), \
+                     bbox=dict(facecolor='white', alpha=0.5))
+            plt.grid()
+
+            ax_list = fig_increase.axes
+            ax = ax_list[0]
+            formatter = FuncFormatter(currency)
+            ax.xaxis.set_major_formatter(formatter)
+
+            if block:
+                plt.show()
+            else:
+                plt.ion()
+                plt.show()
+                # wait to display the figure
+                plt.pause(plot_duration_secs)
+            figures.append(fig_increase)
+
+        figures.append(plot_projections(sales_edges,
+                                        sales_bins,
+                                        profit_edges,
+                                        profit_bins,
+                                        number_sims,
+                                        input_file,
+                                        expected_profit_increase,
+                                        config.annual_adv_expense,
+                                        loss_counts['n_loss_sales'],
+                                        loss_counts['n_loss_profits'],
+                                        seed_val,
+                                        plot_duration_secs,
+                                        output_folder,
+                                        suffix="_adv",
+                                        block=block))
+
+        figures.append(plot_projections(sales_edges_diff,
+                                        sales_bins_diff,
+                                        profit_edges_diff,
+                                        profit_bins_diff,
+                                        number_sims,
+                                        input_file,
+                                        projections['expected_profit_increase_diff'],
+                                        0.0,  # no advertising expense
+                                        loss_counts['n_loss_sales_diff'],
+                                        loss_counts['n_loss_profit_diff'],
+                                        seed_val,
+                                        plot_duration_secs,
+                                        output_folder,
+                                        suffix="_no_adv",
+                                        block=block))
+
+    # layers with no advertising, and no advertising and advertising
+    # projections before the MAIN PLOT for presentation software
+    if config.layers:
+        diff_risk_options = [(True, False, False), (True, True, False),
+                             (True, True, True)]
+    else:
+        diff_risk_options = [(True, True, True)]
+
+    # MAIN PLOT
+    # plot profit projections for no advertising vs advertising case
+    for show_no_adv, show_with_adv, show_ave_with_adv in diff_risk_options:
+        figures.append(plot_diff_risk(profit_edges_diff,
+                                      profit_bins_diff,
+                                      profit_edges,
+                                      profit_bins,
+                                      number_sims,
+                                      input_file,
+                                      expected_profit_increase,
+                                      0.0,  # no advertising expense
+                                      loss_counts['n_loss_sales_diff'],
+                                      loss_counts['n_loss_profit_diff'],
+                                      seed_val,
+                                      plot_duration_secs,
+                                      output_folder,
+                                      suffix="_diff",
+                                      show_no_adv=show_no_adv,
+                                      show_with_adv=show_with_adv,
+                                      show_ave_with_adv=show_ave_with_adv,
+                                      block=block))
+
+    if not result.scenario_grid is None:
+        figures.append(plot_scenario_grid(result.scenario_grid,
+                                          file_stem,
+                                          output_folder,
+                                          plot_duration_secs,
+                                          block))
+
+    return figures  # plot_evaluation(...)
+
+SPLIT_MIN_DAYS = 2  # fewest days on each side of a split
+
+def load_daily_sales(sales_report, config):
+    """
+    daily sales of a sales report for the scans over the splits of
+    the daily sales (see sweep_adv_dates(...))
+
+    ARGUMENTS: sales_report -- path to the sales report or DataFrame
+               config -- EvaluationConfig (column names and sales type)
+
+    RETURNS: daily_sales_np -- date/time and sales amount of each day
+    """
+    import pandas as pd
+
+    if isinstance(sales_report, str):
+        data_frame = read_sales_report(sales_report)
+    elif isinstance(sales_report, pd.DataFrame):
+        data_frame = sales_report
+    else:
+        raise TypeError(debug_prefix() + 'sales_report is type '
+                        + str(type(sales_report)))
+
+    date_tag, date_index = get_date_refs(data_frame, config.date_tag)
+    sorted_data_frame = data_frame.sort_values(by=date_tag)
+    day_np, daily_sales_np = compute_daily_sales(sorted_data_frame,
+                                                 config.date_tag,
+                                                 config.amount_tag,
+                                                 config.sales_type_tag,
+                                                 config.sales_type_value)
+    return daily_sales_np
+
+def welch_t_test(mean_1, var_1, n_1, mean_2, var_2, n_2):
+    """
+    Welch's t test from the means, variances (ddof=1), and sizes of
+    two samples (NumPy arrays for many tests at once); the same as
+    scipy.stats.ttest_ind(sample_1, sample_2, equal_var=False)
+
+    RETURNS: tstat, pvalue (two sided), degrees of freedom
+    """
+    import scipy.stats as st
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        se2_1 = var_1/n_1
+        se2_2 = var_2/n_2
+        tstat = (mean_1 - mean_2)/np.sqrt(se2_1 + se2_2)
+        dof = (se2_1 + se2_2)**2 \
+              /(se2_1**2/(n_1 - 1) + se2_2**2/(n_2 - 1))
+    pvalue = 2.0*st.t.sf(np.abs(tstat), dof)
+    return tstat, pvalue, dof
+
+def split_statistics(sales, min_days=SPLIT_MIN_DAYS):
+    """
+    sales statistics and Welch's t test for every split of a daily
+    sales series into the days before the split and the days from
+    the split on
+
+    ARGUMENTS: sales -- daily sales amounts in date order (or a 2D
+                       array with one daily sales series per row,
+                       e.g. simulated sales)
+               min_days -- fewest days on each side of a split
+
+    RETURNS: dictionary of arrays for splits min_days to
+             len(sales) - min_days ('split' is the number of days
+             before the split): n_before, n_after, mean_before,
+             mean_after, var_before, var_after, tstat, pvalue, dof
+             (tstat is negative for higher sales after the split,
+             as in SalesStats; one row per series for 2D sales)
+
+    WHY: cumulative sums give the means and variances of every split
+    in O(n) instead of O(n) per split.
+    """
+    sales = np.asarray(sales, dtype=np.float64)
+    n_days = sales.shape[-1]
+    if n_days < 2*min_days:
+        raise ValueError(debug_prefix() + "only " + str(n_days)
+                         + " days of sales data (need "
+                         + str(2*min_days) + ")")
+
+    # subtract the mean so the sums of squares keep their precision
+    shift = sales.mean(axis=-1, keepdims=True)
+    centered = sales - shift
+    zeros = np.zeros(sales.shape[:-1] + (1,))
+    sum_1 = np.concatenate((zeros, np.cumsum(centered, axis=-1)), axis=-1)
+    sum_2 = np.concatenate((zeros, np.cumsum(centered**2, axis=-1)), axis=-1)
+
+    split = np.arange(min_days, n_days - min_days + 1)
+    n_before = split
+    n_after = n_days - split
+    sum_before = sum_1[..., split]
+    sum_after = sum_1[..., n_days:] - sum_before
+    mean_before = sum_before/n_before
+    mean_after = sum_after/n_after
+    var_before = np.maximum(sum_2[..., split] - sum_before*mean_before, 0.0) \
+                 /(n_before - 1)
+    var_after = np.maximum(sum_2[..., n_days:] - sum_2[..., split]
+                           - sum_after*mean_after, 0.0)/(n_after - 1)
+    mean_before += shift
+    mean_after += shift
+
+    tstat, pvalue, dof = welch_t_test(mean_before, var_before, n_before,
+                                      mean_after, var_after, n_after)
+    return {'split' : split,
+            'n_before' : n_before,
+            'n_after' : n_after,
+            'mean_before' : mean_before,
+            'mean_after' : mean_after,
+            'var_before' : var_before,
+            'var_after' : var_after,
+            'tstat' : tstat,
+            'pvalue' : pvalue,
+            'dof' : dof}
+    # end split_statistics(...)
+
+CHANGE_POINT_MIN_DAYS = 7  # fewest days on each side of a change point
+CHANGE_POINT_PERMUTATIONS = 200  # permutations for the confidence
+CHANGE_POINT_LOG_LIKELIHOOD = 2.0  # log likelihood drop for date range
+
+def detect_change_point(daily_sales_np,
+                        number_permutations=CHANGE_POINT_PERMUTATIONS,
+                        min_days=CHANGE_POINT_MIN_DAYS,
+                        rng=None):
+    """
+    most likely change point in the average daily sales, e.g. the
+    unrecorded start of advertising
+
+    The change point is the split of the daily sales with the least
+    sum of squared differences from the average of each side (the
+    maximum likelihood change in the average).  The confidence is
+    one minus the p-value of a permutation test: the reduction in
+    the sum of squares of the best split of the daily sales in
+    random order is rarely as large as for a real change.
+
+    ARGUMENTS: daily_sales_np -- date/time and sales amount of each day
+               number_permutations -- daily sales orders for the
+                                      permutation test
+               min_days -- fewest days on each side of the change
+               rng -- NumPy RandomState (default np.random)
+
+    RETURNS: dictionary with the adv_date (first day after the
+             change, a string for EvaluationConfig.adv_date), the
+             split (days before the change), the lift, Welch's tstat
+             and pvalue at the change, the permutation_p_value, the
+             confidence, and adv_date_low/adv_date_high (the change
+             dates within CHANGE_POINT_LOG_LIKELIHOOD of the most likely)
+
+    WHY: cumulative sums (see split_statistics(...)) score every split
+    in O(n) so the permutation test costs O(n) per permutation.
+    """
+    if rng is None:
+        rng = np.random
+
+    sales = daily_sales_np[:, 1].astype(np.float64)
+    n_days = sales.size
+    total_sum_squares = ((sales - sales.mean())**2).sum()
+    if total_sum_squares <= 0.0:
+        raise ValueError(debug_prefix() + "the daily sales are constant "
+                         "(no change point)")
+
+    def split_sum_squares(stats):
+        return stats['var_before']*(stats['n_before'] - 1) \
+               + stats['var_after']*(stats['n_after'] - 1)
+
+    stats = split_statistics(sales, min_days)
+    sum_squares = split_sum_squares(stats)
+    best = np.argmin(sum_squares)
+    reduction = 1.0 - sum_squares[best]/total_sum_squares
+
+    n_as_large = 0
+    for permutation_index in range(number_permutations):
+        perm_stats = split_statistics(rng.permutation(sales), min_days)
+        perm_reduction = 1.0 - split_sum_squares(perm_stats).min() \
+                         /total_sum_squares
+        if perm_reduction >= reduction:
+            n_as_large += 1
+    permutation_p_value = (n_as_large + 1.0)/(number_permutations + 1.0)
+
+    # Gaussian log likelihood of each split relative to the best
+    log_likelihood = -0.5*n_days*np.log(sum_squares/sum_squares[best])
+    likely = np.nonzero(log_likelihood >= -CHANGE_POINT_LOG_LIKELIHOOD)[0]
+    dates = daily_sales_np[:, 0]
+    split = int(stats['split'][best])
+
+    def date_str(split_index):
+        return dates[int(stats['split'][split_index])].strftime('%m/%d/%Y')
+
+    return {'adv_date' : date_str(best),
+            'split' : split,
+            'lift' : stats['mean_after'][best] - stats['mean_before'][best],
+            'tstat' : stats['tstat'][best],
+            'pvalue' : stats['pvalue'][best],
+            'permutation_p_value' : permutation_p_value,
+            'confidence' : 1.0 - permutation_p_value,
+            'adv_date_low' : date_str(likely.min()),
+            'adv_date_high' : date_str(likely.max())}
+    # end detect_change_point(...)
+
+def change_point_report(change_point):
+    """
+    text summary of detect_change_point(...) for the report
+
+    RETURNS: report -- text block
+    """
+    report = "\n\nDetected Advertising Start Date: %s (likely from %s to %s)\n" \
+             % (change_point['adv_date'], change_point['adv_date_low'],
+                change_point['adv_date_high'])
+    report += "Change in Average Daily Sales: %.2f\n" % change_point['lift']
+    report += "Change Point Confidence (permutation test): %5.2f PERCENT\n" \
+              % (100.0*change_point['confidence'])
+    return report
+
+PLACEBO_MIN_DAYS = MA_PERIOD_DAYS  # fewest days on each side of a placebo
+PLACEBO_SIMS = 200  # simulated stationary sales series for the placebo test
+
+def placebo_test(daily_sales_np,
+                 mask_no_adv,
+                 dist_cumsum_no_adv,
+                 unit_price,
+                 unit_cost=UNIT_COST_DEFAULT,
+                 annual_adv_expense=ANNUAL_ADV_EXPENSE,
+                 number_sims=PLACEBO_SIMS,
+                 min_days=PLACEBO_MIN_DAYS,
+                 rng=None):
+    """
+    placebo test: fake advertising start dates slid across the period
+    with no advertising, where the advertising can have no effect
+
+    Each placebo split of the period with no advertising gets the same
+    Welch's t test and the same expected profit increase as the real
+    advertising start date.  The fraction of placebo splits with a
+    significant Welch's t test is the empirical false positive rate.
+    The same splits of simulated sales drawn from the empirical
+    distribution with no advertising (stationary sales, as assumed by
+    sim_adv_period(...)) give the false positive rate to expect.
+
+    ARGUMENTS: daily_sales_np -- date/time and sales amount of each day
+               mask_no_adv -- true if advertising not active on day
+               dist_cumsum_no_adv -- empirical cumulative distribution
+                                     of unit sales with no advertising
+               unit_price, unit_cost, annual_adv_expense -- for the
+                                     expected profit increase
+               number_sims -- simulated sales series
+               min_days -- fewest days on each side of a placebo split
+               rng -- NumPy RandomState (default np.random)
+
+    RETURNS: dictionary with the placebo adv_date, tstat, pvalue, and
+             expected_profit_increase arrays, the false_positive_rate,
+             the expected_false_positive_rate, the
+             profit_false_positive_rate (placebo splits with a profit),
+             the real tstat, pvalue and expected_profit_increase, and
+             tstat_p_value/profit_p_value (fraction of placebo splits
+             at least as extreme as the real result)
+
+    WHY: the prefix sums of split_statistics(...) give every placebo
+    split in O(n) and every split of every simulated series in one
+    pass, so hundreds of placebo splits cost about as much as one
+    simulation of the advertising period.
+    """
+    if rng is None:
+        rng = np.random
+
+    sales = daily_sales_np[:, 1].astype(np.float64)
+    sales_no_adv = sales[mask_no_adv]
+    sales_adv = sales[~mask_no_adv]
+    if sales_adv.size < 2:
+        raise ValueError(debug_prefix() + "only " + str(sales_adv.size)
+                         + " days of sales with advertising")
+    dates_no_adv = daily_sales_np[mask_no_adv, 0]
+    margin = 1.0 - unit_cost/unit_price
+
+    stats = split_statistics(sales_no_adv, min_days)
+    lift = stats['mean_after'] - stats['mean_before']
+    profit = DAYS_PER_YEAR*lift*margin - annual_adv_expense
+
+    # Welch's t test is the same for unit counts and dollars
+    sim_stats = split_statistics(sim_unit_sales(dist_cumsum_no_adv,
+                                                (number_sims, sales_no_adv.size),
+                                                rng),
+                                 min_days)
+
+    tstat, pvalue, dof = welch_t_test(sales_no_adv.mean(),
+                                      sales_no_adv.var(ddof=1),
+                                      sales_no_adv.size,
+                                      sales_adv.mean(),
+                                      sales_adv.var(ddof=1),
+                                      sales_adv.size)
+    real_profit = DAYS_PER_YEAR*(sales_adv.mean() - sales_no_adv.mean()) \
+                  *margin - annual_adv_expense
+
+    return {'adv_date' : [date.strftime('%m/%d/%Y')
+                          for date in dates_no_adv[stats['split']]],
+            'tstat' : stats['tstat'],
+            'pvalue' : stats['pvalue'],
+            'expected_profit_increase' : profit,
+            'false_positive_rate' : (stats['pvalue'] < ALPHA_FISHER).mean(),
+            'expected_false_positive_rate' :
+                (sim_stats['pvalue'] < ALPHA_FISHER).mean(),
+            'profit_false_positive_rate' : (profit > 0.0).mean(),
+            'real_tstat' : tstat,
+            'real_pvalue' : pvalue,
+            'real_expected_profit_increase' : real_profit,
+            'tstat_p_value' : (np.abs(stats['tstat']) >= abs(tstat)).mean(),
+            'profit_p_value' : (profit >= real_profit).mean()}
+    # end placebo_test(...)
+
+def placebo_report(placebo):
+    """
+    text summary of placebo_test(...) for the report
+
+    RETURNS: report -- text block
+    """
+    report = "\n\nPlacebo Test (%d fake advertising start dates from %s to %s)\n" \
+             % (len(placebo['adv_date']), placebo['adv_date'][0],
+                placebo['adv_date'][-1])
+    report += "Placebo False Positive Rate (Welch's p-value < %g): %5.2f PERCENT\n" \
+              % (ALPHA_FISHER, 100.0*placebo['false_positive_rate'])
+    report += "Expected False Positive Rate (stationary sales): %5.2f PERCENT\n" \
+              % (100.0*placebo['expected_false_positive_rate'])
+    report += "Placebo Dates with a Profit: %5.2f PERCENT\n" \
+              % (100.0*placebo['profit_false_positive_rate'])
+    report += "Placebo Dates with a Larger Welch's t: %5.2f PERCENT\n" \
+              % (100.0*placebo['tstat_p_value'])
+    report += "Placebo Dates with a Larger Profit Increase (%s): %5.2f PERCENT\n" \
+              % (locale.currency(placebo['real_expected_profit_increase'],
+                                 grouping=True),
+                 100.0*placebo['profit_p_value'])
+    if placebo['false_positive_rate'] > 2.0*max(ALPHA_FISHER,
+                                                placebo['expected_false_positive_rate']):
+        report += "WARNING: the sales with no advertising are not stationary;\n" \
+                  "Welch's p-value overstates the significance of a change\n"
+    return report
+
+def simulate_welch_t(sales_no_adv, dist_cumsum_no_adv, n_adv, unit_price,
+                     number_sims=NSIMS_DEFAULT, rng=None):
+    """
+    Welch's t statistics of the sales with no advertising against
+    number_sims simulated advertising periods of n_adv days drawn
+    from the empirical distribution with no advertising (the null
+    hypothesis of sim_adv_period(...)), all simulations at once
+
+    RETURNS: array of simulated Welch's t statistics
+    """
+    sales_no_adv = np.asarray(sales_no_adv, dtype=np.float64)
+    mean_adv, var_adv = sim_sales_mean_var(sim_unit_sales(dist_cumsum_no_adv,
+                                                          (number_sims, n_adv),
+                                                          rng),
+                                           unit_price)
+    tstat, pvalue, dof = welch_t_test(sales_no_adv.mean(),
+                                      sales_no_adv.var(ddof=1),
+                                      sales_no_adv.size,
+                                      mean_adv, var_adv, n_adv)
+    return tstat
+
+def empirical_two_sided_p(tstat_sims, tstat):
+    """
+    two sided p-value of tstat from simulated t statistics
+    """
+    tstat_sims = np.asarray(tstat_sims)
+    tstat_sims = tstat_sims[np.isfinite(tstat_sims)]
+    if tstat_sims.size == 0 or not np.isfinite(tstat):
+        return np.nan
+    return min(1.0, 2.0*min((tstat_sims <= tstat).mean(),
+                            (tstat_sims >= tstat).mean()))
+
+def sweep_adv_dates(sales_report, config, start_date, end_date, step_days=1,
+                    number_sims=NSIMS_DEFAULT):
+    """
+    evaluate candidate advertising start dates from start_date to
+    end_date every step_days days with one parsed sales report
+
+    ARGUMENTS: sales_report -- path to the sales report or DataFrame
+               config -- EvaluationConfig (unit price and cost,
+                         advertising expense, seed)
+               start_date, end_date -- first and last candidate
+                                       dates (strings)
+               step_days -- days between candidate dates
+               number_sims -- simulated Welch's t statistics for the
+                              empirical p-value of each candidate
+
+    RETURNS: dictionary of arrays with one entry per candidate date:
+             adv_date, days_no_adv, days_adv, lift (average daily
+             sales with minus without advertising), lift_pct, tstat,
+             pvalue (Welch), empirical_p_value, expected_profit_increase
+             (from the average daily sales, no projection simulations)
+
+    WHY: an advertising campaign often ramps up over days so the
+    start date is uncertain.  The split statistics of every
+    candidate come from one set of cumulative sums
+    (see split_statistics(...)) and the empirical distributions from
+    one cumulative count of the days with each number of units.  The
+    simulations run one candidate at a time, all the simulations of
+    a candidate at once (see simulate_welch_t(...)).
+    """
+    import pandas as pd
+    from dateutil.parser import parse
+
+    if step_days < 1:
+        raise ValueError(debug_prefix() + "step_days is "
+                         + str(step_days) + " (LESS THAN ONE)")
+
+    daily_sales_np = load_daily_sales(sales_report, config)
+    sales = daily_sales_np[:, 1].astype(np.float64)
+    n_days = sales.size
+    dates = pd.DatetimeIndex(daily_sales_np[:, 0])
+    candidates = pd.date_range(parse(start_date), parse(end_date),
+                               freq=str(int(step_days)) + 'D')
+    # days before each candidate date (mask_no_adv.sum())
+    splits = dates.searchsorted(candidates)
+    valid = (splits >= SPLIT_MIN_DAYS) & (splits <= n_days - SPLIT_MIN_DAYS)
+    if not valid.any():
+        raise ValueError(debug_prefix() + "no candidate advertising "
+                         "start dates from " + str(start_date) + " to "
+                         + str(end_date) + " inside the sales data")
+    candidates = candidates[valid]
+    splits = splits[valid]
+
+    stats = split_statistics(sales)
+    index = splits - SPLIT_MIN_DAYS
+    mean_before = stats['mean_before'][index]
+    mean_after = stats['mean_after'][index]
+
+    unit_price = config.unit_price
+    if unit_price is None:
+        unit_price = get_unit_prices(sales)[0]
+        check_unit_price(unit_price)
+    unit_price = float(unit_price)
+
+    # empirical distribution of the days before each candidate date
+    # (get_dist(...) of every candidate) from the number of days with
+    # each number of units up to each day
+    units = np.maximum((sales/unit_price).astype(int), 0)
+    day_counts = np.zeros((n_days + 1, int(units.max()) + 1))
+    day_counts[np.arange(1, n_days + 1), units] = 1.0
+    counts_before = day_counts.cumsum(axis=0)[splits]
+    dist_cumsum_rows = counts_before.cumsum(axis=1)/splits[:, np.newaxis]
+
+    # one candidate at a time: a batch of candidates (see
+    # sim_unit_sales_by_row(...)) searches one large table for each
+    # simulated day and simulates the days of the longest advertising
+    # period of the batch for every candidate, which is slower
+    rng = np.random.RandomState(config.seed_val)
+    empirical_p_values = np.zeros(splits.size)
+    for candidate_index, split in enumerate(splits):
+        tstat_sims = simulate_welch_t(sales[:split],
+                                      dist_cumsum_rows[candidate_index],
+                                      n_days - split, unit_price,
+                                      number_sims, rng)
+        empirical_p_values[candidate_index] \
+            = empirical_two_sided_p(tstat_sims, stats['tstat'][index[candidate_index]])
+
+    lift = mean_after - mean_before
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lift_pct = 100.0*lift/mean_before
+    expected_profit_increase = DAYS_PER_YEAR*lift \
+                               *(1.0 - config.unit_cost/unit_price) \
+                               - config.annual_adv_expense
+    return {'adv_date' : [candidate.strftime('%m/%d/%Y')
+                          for candidate in candidates],
+            'days_no_adv' : splits,
+            'days_adv' : n_days - splits,
+            'lift' : lift,
+            'lift_pct' : lift_pct,
+            'tstat' : stats['tstat'][index],
+            'pvalue' : stats['pvalue'][index],
+            'empirical_p_value' : empirical_p_values,
+            'expected_profit_increase' : expected_profit_increase}
+    # end sweep_adv_dates(...)
+
+SWEEP_FIELDS = ('adv_date', 'days_no_adv', 'days_adv', 'lift', 'lift_pct',
+                'tstat', 'pvalue', 'empirical_p_value',
+                'expected_profit_increase')
+
+def sweep_report(sweep):
+    """
+    text table of sweep_adv_dates(...) results
+
+    RETURNS: report -- text block
+    """
+    report = "Advertising Start Date Sweep\n"
+    report += "%-12s %8s %8s %12s %8s %10s %10s %14s\n" \
+              % ("Adv Date", "Days", "Adv Days", "Lift/Day", "Lift %",
+                 "P-Value", "Emp P", "Profit Change")
+    for index, adv_date in enumerate(sweep['adv_date']):
+        report += "%-12s %8d %8d %12.2f %8.1f %10.4f %10.4f %14s\n" \
+                  % (adv_date,
+                     sweep['days_no_adv'][index],
+                     sweep['days_adv'][index],
+                     sweep['lift'][index],
+                     sweep['lift_pct'][index],
+                     sweep['pvalue'][index],
+                     sweep['empirical_p_value'][index],
+                     locale.currency(sweep['expected_profit_increase'][index],
+                                     grouping=True))
+    return report
+
+def write_sweep(sweep, file_path):
+    """
+    write the sweep_adv_dates(...) results as a CSV table
+    """
+    def write_rows(out_file):
+        writer = csv.writer(out_file)
+        writer.writerow(SWEEP_FIELDS)
+        for index in range(len(sweep['adv_date'])):
+            writer.writerow([sweep['adv_date'][index]]
+                            + [to_serializable(sweep[field][index])
+                               for field in SWEEP_FIELDS[1:]])
+
+    atomic_write(file_path, write_rows)
+
+def plot_sweep(sweep, file_stem, output_folder=None,
+               plot_duration_secs=PLOT_DURATION_SECS, block=False):
+    """
+    plot the lift and the p-values against the advertising start date
+
+    RETURNS: figure
+    """
+    plt = import_pyplot()
+    from dateutil.parser import parse
+
+    adv_dates = [parse(adv_date) for adv_date in sweep['adv_date']]
+    fig_sweep, (ax_lift, ax_pval) = plt.subplots(2, 1, sharex=True,
+                                                 figsize=(12, 9))
+    ax_lift.plot(adv_dates, sweep['lift'], ADV_MARKER + '-',
+                 linewidth=LINEWIDTH, markersize=MARKERSIZE)
+    ax_lift.set_ylabel('LIFT IN AVERAGE DAILY SALES')
+    ax_lift.set_title('ADVERTISING START DATE SWEEP (' + file_stem + ')')
+    ax_lift.grid()
+
+    ax_pval.semilogy(adv_dates, sweep['pvalue'], NO_ADV_MARKER + '-',
+                     label="WELCH'S P-VALUE",
+                     linewidth=LINEWIDTH, markersize=MARKERSIZE)
+    ax_pval.semilogy(adv_dates, np.maximum(sweep['empirical_p_value'],
+                                           1e-16), 'r^-',
+                     label='EMPIRICAL P-VALUE',
+                     linewidth=LINEWIDTH, markersize=MARKERSIZE)
+    ax_pval.axhline(ALPHA_FISHER, color='k', linestyle='--',
+                    label='ALPHA %g' % ALPHA_FISHER)
+    ax_pval.set_xlabel('ADVERTISING START DATE')
+    ax_pval.set_ylabel('P-VALUE')
+    ax_pval.legend()
+    ax_pval.grid()
+    fig_sweep.autofmt_xdate()
+
+    if block:
+        plt.show()
+    else:
+        plt.ion()
+        plt.show()
+        plt.pause(plot_duration_secs)
+
+    if not output_folder is None:
+        fig_sweep.savefig(output_folder
+                          + os.sep
+                          + file_stem
+                          + "_adv_date_sweep.jpg")
+    return fig_sweep  # plot_sweep(...)
+
+# one advertising campaign (see parse_campaigns(...)); expense is the
+# total expense of the campaign (None for the annual advertising
+# expense prorated over the days of the campaign)
+Campaign = namedtuple('Campaign', 'name start_date end_date expense')
+
+def parse_campaigns(campaign_spec):
+    """
+    parse a campaign schedule
+
+    ARGUMENTS: campaign_spec -- schedule file or inline schedule
+
+    RETURNS: list of Campaign
+
+    A schedule file has one campaign per line: the first and last
+    dates of the campaign followed by an optional total expense and
+    an optional name, for example:
+
+        03/31/2018 05/31/2018 3000 "spring radio"
+        07/01/2018 08/15/2018
+
+    Blank lines and lines starting with # are ignored.  An inline
+    schedule is start:end[:expense] for each campaign separated by
+    commas, e.g. 03/31/2018:05/31/2018:3000,07/01/2018:08/15/2018
+    """
+    if not isinstance(campaign_spec, str):
+        raise TypeError(debug_prefix() + 'campaign_spec is type '
+                        + str(type(campaign_spec)))
+
+    if os.path.isfile(campaign_spec):
+        campaign_fields = []
+        with open(campaign_spec) as schedule_file:
+            for line_number, line in enumerate(schedule_file, 1):
+                tokens = shlex.split(line, comments=True)
+                if not tokens:
+                    continue
+                if not 2 <= len(tokens) <= 4:
+                    raise ValueError(debug_prefix() + campaign_spec
+                                     + " line " + str(line_number)
+                                     + ": expected start end "
+                                     + "[expense] [name]")
+                campaign_fields.append(tokens)
+    else:
+        campaign_fields = [item.split(':')
+                           for item in campaign_spec.split(',') if item]
+
+    campaigns = []
+    for campaign_index, fields in enumerate(campaign_fields, 1):
+        if not 2 <= len(fields) <= 4:
+            raise ValueError(debug_prefix() + "bad campaign "
+                             + ':'.join(fields)
+                             + " (should be start:end[:expense])")
+        expense = None
+        if len(fields) > 2 and fields[2]:
+            expense = float(fields[2])
+            if expense < 0.0:
+                raise ValueError(debug_prefix() + "campaign expense "
+                                 + fields[2] + " is negative")
+        name = fields[3] if len(fields) > 3 else \
+               "campaign " + str(campaign_index)
+        campaigns.append(Campaign(name, fields[0], fields[1], expense))
+    if not campaigns:
+        raise ValueError(debug_prefix() + "no campaigns in "
+                         + campaign_spec)
+    return campaigns  # parse_campaigns(...)
+
+def evaluate_campaigns(sales_report, config, campaigns,
+                       number_sims=NSIMS_DEFAULT):
+    """
+    evaluate several advertising campaigns against the days with no
+    campaign (the shared baseline) with one parsed sales report
+
+    ARGUMENTS: sales_report -- path to the sales report or DataFrame
+               config -- EvaluationConfig (unit price and cost,
+                         annual advertising expense, seed)
+               campaigns -- list of Campaign (see parse_campaigns(...))
+               number_sims -- simulated campaigns for the empirical
+                              p-value of each campaign
+
+    RETURNS: dictionary with the baseline_days and baseline_sales
+             (average daily sales with no campaign) and arrays with
+             one entry per campaign: name, start_date, end_date,
+             days, expense, ave_sales, lift (average daily sales with
+             the campaign minus the baseline), lift_pct,
+             lift_low/lift_high (CONFIDENCE_Z interval), tstat,
+             pvalue (Welch), empirical_p_value, profit_increase
+             (during the campaign), annual_profit_increase (campaign
+             running all year), and roi (profit increase/expense)
+
+    WHY: each day is labeled with its campaign once and np.bincount
+    gives the sales statistics of every campaign in one pass over
+    the daily sales.  The simulations of all campaigns are drawn at
+    once from the baseline distribution and summed per campaign
+    (see sim_sales_mean_var(...)), instead of one evaluation per
+    campaign.
+    """
+    import pandas as pd
+    from dateutil.parser import parse
+
+    if not campaigns:
+        raise ValueError(debug_prefix() + "no campaigns")
+
+    campaigns = sorted(campaigns, key=lambda campaign:
+                       parse(campaign.start_date))
+    daily_sales_np = load_daily_sales(sales_report, config)
+    sales = daily_sales_np[:, 1].astype(np.float64)
+    n_days = sales.size
+    dates = pd.DatetimeIndex(daily_sales_np[:, 0])
+
+    start_dates = [parse(campaign.start_date) for campaign in campaigns]
+    end_dates = [parse(campaign.end_date) for campaign in campaigns]
+    # index of the first day of each campaign and one past the last day
+    starts = dates.searchsorted(start_dates)
+    ends = dates.searchsorted(end_dates, side='right')
+    for campaign_index, campaign in enumerate(campaigns):
+        if end_dates[campaign_index] < start_dates[campaign_index]:
+            raise ValueError(debug_prefix() + campaign.name + " ends "
+                             + campaign.end_date + " before it starts "
+                             + campaign.start_date)
+        if ends[campaign_index] - starts[campaign_index] < SPLIT_MIN_DAYS:
+            raise ValueError(debug_prefix() + campaign.name + " has "
+                             + str(ends[campaign_index]
+                                   - starts[campaign_index])
+                             + " days of sales data (need "
+                             + str(SPLIT_MIN_DAYS) + ")")
+        if campaign_index > 0 and starts[campaign_index] \
+           < ends[campaign_index-1]:
+            raise ValueError(debug_prefix() + campaign.name
+                             + " overlaps "
+                             + campaigns[campaign_index-1].name)
+
+    # campaign of each day (-1 for the baseline)
+    day_index = np.arange(n_days)
+    labels = np.searchsorted(starts, day_index, side='right') - 1
+    labels[(labels >= 0) & (day_index >= ends[np.maximum(labels, 0)])] = -1
+
+    baseline = sales[labels < 0]
+    if baseline.size < SPLIT_MIN_DAYS:
+        raise ValueError(debug_prefix() + "only " + str(baseline.size)
+                         + " days of sales with no campaign")
+    n_campaigns = len(campaigns)
+    in_campaign = labels >= 0
+    # subtract the baseline average so the sums of squares keep
+    # their precision
+    shift = baseline.mean()
+    days = np.bincount(labels[in_campaign], minlength=n_campaigns)
+    sum_1 = np.bincount(labels[in_campaign],
+                        weights=sales[in_campaign] - shift,
+                        minlength=n_campaigns)
+    sum_2 = np.bincount(labels[in_campaign],
+                        weights=(sales[in_campaign] - shift)**2,
+                        minlength=n_campaigns)
+    lift = sum_1/days
+    ave_sales = lift + shift
+    var_sales = np.maximum(sum_2 - sum_1*lift, 0.0)/(days - 1)
+    var_baseline = baseline.var(ddof=1)
+    tstat, pvalue, dof = welch_t_test(shift, var_baseline, baseline.size,
+                                      ave_sales, var_sales, days)
+    lift_error = CONFIDENCE_Z*np.sqrt(var_baseline/baseline.size
+                                      + var_sales/days)
+
+    unit_price = config.unit_price
+    if unit_price is None:
+        unit_price = get_unit_prices(baseline)[0]
+        check_unit_price(unit_price)
+    unit_price = float(unit_price)
+
+    # simulated sales of every campaign day from the baseline
+    # distribution, days of each campaign together
+    rng = np.random.RandomState(config.seed_val)
+    dist_h, y_err = get_dist(baseline, unit_price)
+    unit_sales = sim_unit_sales(dist_h.cumsum(),
+                                (number_sims, int(days.sum())), rng)
+    offsets = np.concatenate(([0], np.cumsum(days)))
+    sim_sales = [sim_sales_mean_var(unit_sales[:, offsets[index]:offsets[index+1]],
+                                    unit_price)
+                 for index in range(n_campaigns)]
+    sim_tstat, sim_pvalue, sim_dof \
+        = welch_t_test(shift, var_baseline, baseline.size,
+                       np.column_stack([mean for mean, var in sim_sales]),
+                       np.column_stack([var for mean, var in sim_sales]),
+                       days)
+    empirical_p_values = np.array([empirical_two_sided_p(sim_tstat[:, index],
+                                                         tstat[index])
+                                   for index in range(n_campaigns)])
+
+    calendar_days = np.array([(end_date - start_date).days + 1
+                              for start_date, end_date
+                              in zip(start_dates, end_dates)])
+    expenses = np.array([config.annual_adv_expense*calendar_days[index]
+                         /DAYS_PER_YEAR if campaign.expense is None
+                         else campaign.expense
+                         for index, campaign in enumerate(campaigns)])
+    margin = 1.0 - config.unit_cost/unit_price
+    profit_increase = days*lift*margin - expenses
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lift_pct = 100.0*lift/shift
+        roi = profit_increase/expenses
+
+    return {'baseline_days' : baseline.size,
+            'baseline_sales' : shift,
+            'unit_price' : unit_price,
+            'name' : [campaign.name for campaign in campaigns],
+            'start_date' : [start_date.strftime('%m/%d/%Y')
+                            for start_date in start_dates],
+            'end_date' : [end_date.strftime('%m/%d/%Y')
+                          for end_date in end_dates],
+            'days' : days,
+            'expense' : expenses,
+            'ave_sales' : ave_sales,
+            'lift' : lift,
+            'lift_pct' : lift_pct,
+            'lift_low' : lift - lift_error,
+            'lift_high' : lift + lift_error,
+            'tstat' : tstat,
+            'pvalue' : pvalue,
+            'empirical_p_value' : empirical_p_values,
+            'profit_increase' : profit_increase,
+            'annual_profit_increase' : DAYS_PER_YEAR*lift*margin
+                                       - expenses*DAYS_PER_YEAR/calendar_days,
+            'roi' : roi}
+    # end evaluate_campaigns(...)
+
+CAMPAIGN_FIELDS = ('name', 'start_date', 'end_date', 'days', 'expense',
+                   'ave_sales', 'lift', 'lift_pct', 'lift_low', 'lift_high',
+                   'tstat', 'pvalue', 'empirical_p_value', 'profit_increase',
+                   'annual_profit_increase', 'roi')
+
+def campaigns_report(campaign_results):
+    """
+    text table of evaluate_campaigns(...) results
+
+    RETURNS: report -- text block
+    """
+    report = "Advertising Campaigns\n"
+    report += "Baseline (no campaign): %d days, average daily sales %s\n" \
+              % (campaign_results['baseline_days'],
+                 locale.currency(campaign_results['baseline_sales'],
+                                 grouping=True))
+    report += "%-20s %-12s %-12s %6s %12s %8s %10s %10s %14s %8s\n" \
+              % ("Campaign", "Start", "End", "Days", "Lift/Day", "Lift %",
+                 "P-Value", "Emp P", "Profit Change", "ROI %")
+    for index, name in enumerate(campaign_results['name']):
+        report += "%-20s %-12s %-12s %6d %12.2f %8.1f %10.4f %10.4f %14s %8.1f\n" \
+                  % (name[:20],
+                     campaign_results['start_date'][index],
+                     campaign_results['end_date'][index],
+                     campaign_results['days'][index],
+                     campaign_results['lift'][index],
+                     campaign_results['lift_pct'][index],
+                     campaign_results['pvalue'][index],
+                     campaign_results['empirical_p_value'][index],
+                     locale.currency(campaign_results['profit_increase'][index],
+                                     grouping=True),
+                     100.0*campaign_results['roi'][index])
+    report += "Total Expense: %s  Total Profit Change: %s\n" \
+              % (locale.currency(campaign_results['expense'].sum(),
+                                 grouping=True),
+                 locale.currency(campaign_results['profit_increase'].sum(),
+                                 grouping=True))
+    return report
+
+def write_campaigns(campaign_results, file_path):
+    """
+    write the evaluate_campaigns(...) results as a CSV table
+    """
+    def write_rows(out_file):
+        writer = csv.writer(out_file)
+        writer.writerow(CAMPAIGN_FIELDS)
+        for index in range(len(campaign_results['name'])):
+            writer.writerow([campaign_results[field][index]
+                             for field in CAMPAIGN_FIELDS[:3]]
+                            + [to_serializable(campaign_results[field][index])
+                               for field in CAMPAIGN_FIELDS[3:]])
+
+    atomic_write(file_path, write_rows)
+
+def plot_campaigns(campaign_results, file_stem, output_folder=None,
+                   plot_duration_secs=PLOT_DURATION_SECS, block=False):
+    """
+    plot the lift in average daily sales and the profit change of
+    each campaign
+
+    RETURNS: figure
+    """
+    plt = import_pyplot()
+    from matplotlib.ticker import FuncFormatter
+
+    names = campaign_results['name']
+    positions = np.arange(len(names))
+    lift = campaign_results['lift']
+    fig_campaigns, (ax_lift, ax_profit) = plt.subplots(2, 1, sharex=True,
+                                                       figsize=(12, 9))
+    ax_lift.bar(positions, lift, color='g',
+                yerr=[lift - campaign_results['lift_low'],
+                      campaign_results['lift_high'] - lift],
+                capsize=MARKERSIZE)
+    ax_lift.axhline(0.0, color='k')
+    ax_lift.set_ylabel('LIFT IN AVERAGE DAILY SALES')
+    ax_lift.set_title('ADVERTISING CAMPAIGNS (' + file_stem + ')')
+    ax_lift.grid()
+
+    profit = campaign_results['profit_increase']
+    ax_profit.bar(positions, profit,
+                  color=np.where(profit < 0.0, PROFIT_CHANGE_COLOR, 'g'))
+    ax_profit.axhline(0.0, color='k')
+    ax_profit.yaxis.set_major_formatter(FuncFormatter(currency))
+    ax_profit.set_ylabel('PROFIT CHANGE')
+    ax_profit.set_xticks(positions)
+    ax_profit.set_xticklabels(names, rotation=30)
+    ax_profit.grid()
+
+    if block:
+        plt.show()
+    else:
+        plt.ion()
+        plt.show()
+        plt.pause(plot_duration_secs)
+
+    if not output_folder is None:
+        fig_campaigns.savefig(output_folder
+                              + os.sep
+                              + file_stem
+                              + "_campaigns.jpg")
+    return fig_campaigns  # plot_campaigns(...)
+
+SEGMENT_SIM_CELLS = 32*1024*1024  # simulated unit counts per batch of segments
+SEGMENT_PLOT_MAX = 40  # segments with the largest lifts in the figure
+
+def daily_sales_matrix(data_frame, segment_column, config, dtype=np.float64):
+    """
+    daily sales of every segment (e.g. customer, product, or region)
+    of a sales report
+
+    ARGUMENTS: data_frame -- sales report DataFrame
+               segment_column -- name of the column with the segments
+               config -- EvaluationConfig (column names and sales type)
+               dtype -- NumPy type of the daily sales
+
+    RETURNS: segments -- segment values (sorted)
+             dates -- pandas DatetimeIndex with every day from the
+                      first to the last sale
+             sales_matrix -- (segments x days) daily sales with zero
+                             for days with no sales
+
+    WHY: one np.bincount of the segment and day of every sale gives
+    the daily sales of all segments at once, instead of a
+    compute_daily_sales(...) per segment.
+    """
+    import pandas as pd
+
+    if not isinstance(data_frame, pd.DataFrame):
+        raise TypeError(debug_prefix() + 'data_frame is type '
+                        + str(type(data_frame)))
+    if not segment_column in data_frame.columns:
+        raise ValueError(debug_prefix() + "no " + str(segment_column)
+                         + " column in the sales report (columns are "
+                         + ", ".join(str(column) for column
+                                     in data_frame.columns) + ")")
+
+    date_tag, date_index = get_date_refs(data_frame, config.date_tag)
+    amount_tag, amount_index = get_amount_refs(data_frame, config.amount_tag)
+    sales_type_tag, type_index = get_type_refs(data_frame,
+                                               config.sales_type_tag)
+    if isinstance(sales_type_tag, str):
+        # the same sales type as compute_daily_sales(...)
+        sales_type_value = config.sales_type_value
+        if not sales_type_value:
+            sales_type_value = get_sales_type_value(data_frame,
+                                                    sales_type_tag)
+        if sales_type_value is None:
+            sales_type_value = 'Sales Receipt'  # default guess
+        data_frame = data_frame[data_frame[sales_type_tag]
+                                == sales_type_value]
+
+    codes, segments = pd.factorize(data_frame[segment_column], sort=True)
+    sale_dates = pd.to_datetime(data_frame[date_tag]).dt.normalize()
+    keep = (codes >= 0) & sale_dates.notna().values
+    if not keep.any():
+        raise ValueError(debug_prefix() + "no sales with a "
+                         + str(segment_column))
+    codes = codes[keep]
+    sale_dates = sale_dates[keep]
+    amounts = data_frame[amount_tag].values[keep].astype(np.float64)
+
+    first_date = sale_dates.min()
+    day_index = (sale_dates - first_date).dt.days.values
+    n_days = int(day_index.max()) + 1
+    sales_matrix = np.bincount(codes*n_days + day_index, weights=amounts,
+                               minlength=len(segments)*n_days)
+    sales_matrix = sales_matrix.reshape(len(segments), n_days).astype(dtype)
+    dates = pd.date_range(first_date, periods=n_days, freq='D')
+    return np.asarray(segments), dates, sales_matrix
+    # end daily_sales_matrix(...)
+
+def unit_distributions(sales_matrix, unit_price):
+    """
+    empirical cumulative distribution of the daily unit sales of each
+    row of a (rows x days) daily sales matrix (get_dist(...) for
+    every row at once)
+
+    RETURNS: (rows x max units + 1) cumulative distributions
+    """
+    # round, not truncate, so float32 sums of prices give whole units
+    units = np.maximum(np.rint(sales_matrix/unit_price).astype(int), 0)
+    n_rows, n_days = units.shape
+    n_units = int(units.max()) + 1
+    counts = np.bincount((np.arange(n_rows)[:, np.newaxis]*n_units
+                          + units).ravel(),
+                         minlength=n_rows*n_units)
+    return (counts.reshape(n_rows, n_units)/float(n_days)).cumsum(axis=1)
+
+def sim_unit_sales_by_row(dist_cumsum_rows, size, rng=None):
+    """
+    simulate unit sales with a different empirical distribution for
+    each row (sim_unit_sales(...) for many distributions at once)
+
+    ARGUMENTS: dist_cumsum_rows -- (rows x units) cumulative
+                                   distributions
+               size -- shape of the simulated unit sales of each row
+               rng -- NumPy RandomState (default np.random)
+
+    RETURNS: (rows,) + size array of numbers of units sold in the
+             smallest sufficient unsigned integer type
+    """
+    if rng is None:
+        rng = np.random
+
+    n_rows, n_units = dist_cumsum_rows.shape
+    row_cells = int(np.prod(size))
+    # offset each row by twice its row number so all the rows are
+    # searched in one sorted array (see sim_unit_sales(...) for the
+    # running maximum)
+    dist_cumsum_flat = (np.maximum.accumulate(dist_cumsum_rows, axis=1)
+                        + 2.0*np.arange(n_rows)[:, np.newaxis]).ravel()
+    result = np.zeros((n_rows,) + tuple(size),
+                      dtype=unit_count_dtype(n_units - 1))
+    result_flat = result.reshape(-1)
+    for chunk_start in range(0, result_flat.size, SIM_CHUNK_CELLS):
+        rval = rng.uniform(size=min(SIM_CHUNK_CELLS,
+                                    result_flat.size - chunk_start))
+        rows = np.arange(chunk_start, chunk_start + rval.size)//row_cells
+        units = np.searchsorted(dist_cumsum_flat, rval + 2.0*rows,
+                                side='right') - rows*n_units
+        # no unit count above rval gives 0 as in sim_unit_sales(...)
+        units[units >= n_units] = 0
+        result_flat[chunk_start:chunk_start + rval.size] = units
+    return result
+
+def group_statistics(sales_matrix, mask_adv, unit_price,
+                     unit_cost=UNIT_COST_DEFAULT, annual_adv_expense=0.0,
+                     number_sims=NSIMS_DEFAULT, rng=None):
+    """
+    SalesStats, Welch's t test, and the empirical p-value of
+    sim_adv_period(...) for every row of a (rows x days) daily sales
+    matrix (e.g. segments or stores) with array operations
+
+    ARGUMENTS: sales_matrix -- (rows x days) daily sales
+               mask_adv -- true if advertising active on day
+               unit_price, unit_cost -- for the profit increase
+               annual_adv_expense -- advertising expense of each row
+               number_sims -- simulated advertising periods of each row
+               rng -- NumPy RandomState (default np.random)
+
+    RETURNS: dictionary of arrays with one entry per row:
+             ave_sales_no_adv, ave_sales_adv, lift, lift_pct, tstat,
+             pvalue, empirical_p_value, expected_profit_increase
+
+    WHY: the simulated advertising periods of a batch of rows are
+    drawn at once (see sim_unit_sales_by_row(...)); the batches are
+    limited to SEGMENT_SIM_CELLS simulated days to bound the memory.
+    """
+    if rng is None:
+        rng = np.random
+
+    mask_adv = np.asarray(mask_adv, dtype=bool)
+    sales_no_adv = sales_matrix[:, ~mask_adv]
+    sales_adv = sales_matrix[:, mask_adv]
+    n_rows = sales_matrix.shape[0]
+    n_no_adv = sales_no_adv.shape[1]
+    n_adv = sales_adv.shape[1]
+    if n_no_adv < SPLIT_MIN_DAYS or n_adv < SPLIT_MIN_DAYS:
+        raise ValueError(debug_prefix() + str(n_no_adv)
+                         + " days with no advertising and " + str(n_adv)
+                         + " days with advertising (need "
+                         + str(SPLIT_MIN_DAYS) + " of each)")
+
+    ave_no_adv = sales_no_adv.mean(axis=1, dtype=np.float64)
+    ave_adv = sales_adv.mean(axis=1, dtype=np.float64)
+    var_no_adv = sales_no_adv.var(axis=1, ddof=1, dtype=np.float64)
+    var_adv = sales_adv.var(axis=1, ddof=1, dtype=np.float64)
+    tstat, pvalue, dof = welch_t_test(ave_no_adv, var_no_adv, n_no_adv,
+                                      ave_adv, var_adv, n_adv)
+
+    dist_cumsum_rows = unit_distributions(sales_no_adv, unit_price)
+    empirical_p_values = np.full(n_rows, np.nan)
+    batch_rows = max(1, SEGMENT_SIM_CELLS//max(1, number_sims*n_adv))
+    for batch_start in range(0, n_rows, batch_rows):
+        batch = slice(batch_start, batch_start + batch_rows)
+        mean_adv, var_adv \
+            = sim_sales_mean_var(sim_unit_sales_by_row(dist_cumsum_rows[batch],
+                                                       (number_sims, n_adv),
+                                                       rng),
+                                 unit_price)
+        tstat_sims, pvalue_sims, dof_sims \
+            = welch_t_test(ave_no_adv[batch, np.newaxis],
+                           var_no_adv[batch, np.newaxis],
+                           n_no_adv,
+                           mean_adv,
+                           var_adv,
+                           n_adv)
+        # empirical_two_sided_p(...) for every row of the batch
+        finite = np.isfinite(tstat_sims)
+        n_finite = finite.sum(axis=1)
+        tstat_batch = tstat[batch, np.newaxis]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            below = (finite & (tstat_sims <= tstat_batch)).sum(axis=1)/n_finite
+            above = (finite & (tstat_sims >= tstat_batch)).sum(axis=1)/n_finite
+        p_batch = np.minimum(1.0, 2.0*np.minimum(below, above))
+        p_batch[(n_finite == 0) | ~np.isfinite(tstat[batch])] = np.nan
+        empirical_p_values[batch] = p_batch
+
+    lift = ave_adv - ave_no_adv
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lift_pct = 100.0*lift/ave_no_adv
+    return {'ave_sales_no_adv' : ave_no_adv,
+            'ave_sales_adv' : ave_adv,
+            'lift' : lift,
+            'lift_pct' : lift_pct,
+            'tstat' : tstat,
+            'pvalue' : pvalue,
+            'empirical_p_value' : empirical_p_values,
+            'expected_profit_increase' : DAYS_PER_YEAR*lift
+                                         *(1.0 - unit_cost/unit_price)
+                                         - annual_adv_expense}
+    # end group_statistics(...)
+
+def evaluate_segments(sales_report, config, segment_column,
+                      number_sims=NSIMS_DEFAULT):
+    """
+    evaluate the advertising for every segment of a sales report,
+    e.g. every customer, product, or region
+
+    ARGUMENTS: sales_report -- path to the sales report or DataFrame
+               config -- EvaluationConfig (advertising start date,
+                         unit price and cost, advertising expense,
+                         seed, column names and sales type)
+               segment_column -- name of the column with the segments
+               number_sims -- simulated advertising periods of each
+                              segment for the empirical p-values
+
+    RETURNS: dictionary with the segment_column, the unit_price,
+             the annual_adv_expense, and arrays with one entry per
+             segment: segment, sales (total), days_no_adv, days_adv,
+             and the group_statistics(...) (the expected profit
+             increase of a segment is before the advertising expense)
+    """
+    import pandas as pd
+    from dateutil.parser import parse
+
+    if isinstance(sales_report, str):
+        data_frame = read_sales_report(sales_report)
+    elif isinstance(sales_report, pd.DataFrame):
+        data_frame = sales_report.copy()
+    else:
+        raise TypeError(debug_prefix() + 'sales_report is type '
+                        + str(type(sales_report)))
+
+    segments, dates, sales_matrix = daily_sales_matrix(data_frame,
+                                                       segment_column,
+                                                       config)
+    mask_adv = np.asarray(dates >= parse(config.adv_date))
+
+    unit_price = config.unit_price
+    if unit_price is None:
+        unit_price = get_unit_prices(np.unique(sales_matrix[:, ~mask_adv]))[0]
+        check_unit_price(unit_price)
+    unit_price = float(unit_price)
+
+    segment_results = group_statistics(sales_matrix, mask_adv, unit_price,
+                                       config.unit_cost, 0.0, number_sims,
+                                       np.random.RandomState(config.seed_val))
+    segment_results.update({'segment_column' : segment_column,
+                            'unit_price' : unit_price,
+                            'annual_adv_expense' : config.annual_adv_expense,
+                            'segment' : segments,
+                            'sales' : sales_matrix.sum(axis=1),
+                            'days_no_adv' : int((~mask_adv).sum()),
+                            'days_adv' : int(mask_adv.sum())})
+    return segment_results  # evaluate_segments(...)
+
+SEGMENT_FIELDS = ('segment', 'sales', 'ave_sales_no_adv', 'ave_sales_adv',
+                  'lift', 'lift_pct', 'tstat', 'pvalue',
+                  'empirical_p_value', 'expected_profit_increase')
+
+def segments_report(segment_results):
+    """
+    text table of evaluate_segments(...) results
+
+    RETURNS: report -- text block
+    """
+    report = "Advertising by %s (%d segments, %d days with no advertising, " \
+             "%d days with advertising)\n" \
+             % (segment_results['segment_column'],
+                len(segment_results['segment']),
+                segment_results['days_no_adv'],
+                segment_results['days_adv'])
+    report += "%-24s %14s %12s %12s %8s %10s %10s %16s\n" \
+              % ("Segment", "Sales", "Ave No Adv", "Lift/Day", "Lift %",
+                 "P-Value", "Emp P", "Gross Profit/Yr")
+    for index, segment in enumerate(segment_results['segment']):
+        report += "%-24s %14s %12.2f %12.2f %8.1f %10.4f %10.4f %16s\n" \
+                  % (str(segment)[:24],
+                     locale.currency(segment_results['sales'][index],
+                                     grouping=True),
+                     segment_results['ave_sales_no_adv'][index],
+                     segment_results['lift'][index],
+                     segment_results['lift_pct'][index],
+                     segment_results['pvalue'][index],
+                     segment_results['empirical_p_value'][index],
+                     locale.currency(segment_results['expected_profit_increase'][index],
+                                     grouping=True))
+    total_profit = np.nansum(segment_results['expected_profit_increase'])
+    report += "Total Gross Profit Change per Year: %s  Advertising Expense: %s" \
+              "  Net: %s\n" \
+              % (locale.currency(total_profit, grouping=True),
+                 locale.currency(segment_results['annual_adv_expense'],
+                                 grouping=True),
+                 locale.currency(total_profit
+                                 - segment_results['annual_adv_expense'],
+                                 grouping=True))
+    return report
+
+def write_segments(segment_results, file_path):
+    """
+    write the evaluate_segments(...) results as a CSV table
+    """
+    def write_rows(out_file):
+        writer = csv.writer(out_file)
+        writer.writerow(SEGMENT_FIELDS)
+        for index in range(len(segment_results['segment'])):
+            writer.writerow([to_serializable(segment_results[field][index])
+                             for field in SEGMENT_FIELDS])
+
+    atomic_write(file_path, write_rows)
+
+def plot_segments(segment_results, file_stem, output_folder=None,
+                  plot_duration_secs=PLOT_DURATION_SECS, block=False):
+    """
+    plot the lift in average daily sales of the segments with the
+    largest lifts (at most SEGMENT_PLOT_MAX)
+
+    RETURNS: figure
+    """
+    plt = import_pyplot()
+
+    lift = segment_results['lift']
+    order = np.argsort(-np.abs(np.nan_to_num(lift)))[:SEGMENT_PLOT_MAX][::-1]
+    significant = segment_results['pvalue'][order] < ALPHA_FISHER
+    positions = np.arange(order.size)
+    fig_segments = plt.figure(figsize=(12, 9))
+    plt.barh(positions, lift[order],
+             color=np.where(significant, 'g', 'b'))
+    plt.yticks(positions, [str(segment)[:24] for segment
+                           in segment_results['segment'][order]])
+    plt.axvline(0.0, color='k')
+    plt.xlabel('LIFT IN AVERAGE DAILY SALES (GREEN: P-VALUE < %g)'
+               % ALPHA_FISHER)
+    plt.title('ADVERTISING BY ' + str(segment_results['segment_column']).upper()
+              + ' (' + file_stem + ')')
+    plt.grid()
+    plt.tight_layout()
+
+    if block:
+        plt.show()
+    else:
+        plt.ion()
+        plt.show()
+        plt.pause(plot_duration_secs)
+
+    if not output_folder is None:
+        fig_segments.savefig(output_folder
+                             + os.sep
+                             + file_stem
+                             + "_segments.jpg")
+    return fig_segments  # plot_segments(...)
+
+PANEL_STORE_COLUMN = 'STORE'  # store key column of a long format panel
+PANEL_BATCH_STORES = 256  # stores per worker process task
+PANEL_REPORT_STORES = 10  # best and worst stores in the report
+
+def load_store_file(input_file, config):
+    """
+    daily sales of one store of a panel with one sales report per store
+
+    RETURNS: first_date, daily sales (float32 array)
+    """
+    data_frame = read_sales_report(input_file)
+    data_frame[PANEL_STORE_COLUMN] = 0
+    segments, dates, sales_matrix = daily_sales_matrix(data_frame,
+                                                       PANEL_STORE_COLUMN,
+                                                       config,
+                                                       np.float32)
+    return dates[0], sales_matrix[0]
+
+def load_panel(panel_spec, config, store_column=PANEL_STORE_COLUMN,
+               workers=None):
+    """
+    load the daily sales of every store of a panel
+
+    ARGUMENTS: panel_spec -- long format sales report with a store key
+                             column, folder (one *.csv sales report per
+                             store), or glob pattern (e.g. stores/*.csv)
+               config -- EvaluationConfig (column names and sales type)
+               store_column -- store key column of a long format panel
+               workers -- worker processes reading one sales report
+                          per store (default number of CPUs)
+
+    RETURNS: stores -- store keys (file stems for one file per store)
+             dates -- pandas DatetimeIndex with every day of the panel
+             sales_matrix -- (stores x days) float32 daily sales
+    """
+    import pandas as pd
+    from concurrent.futures import ProcessPoolExecutor
+
+    if os.path.isdir(panel_spec):
+        input_files = sorted(glob.glob(os.path.join(panel_spec, '*.csv')))
+    elif glob.has_magic(panel_spec):
+        input_files = sorted(glob.glob(panel_spec))
+    else:
+        return daily_sales_matrix(read_sales_report(panel_spec),
+                                  store_column, config, np.float32)
+    if not input_files:
+        raise ValueError(debug_prefix() + "no sales reports in panel "
+                         + panel_spec)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    configs = [config]*len(input_files)
+    if workers == 1:
+        store_sales = list(map(load_store_file, input_files, configs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            store_sales = list(executor.map(load_store_file, input_files,
+                                            configs,
+                                            chunksize=PANEL_BATCH_STORES//8))
+
+    first_date = min(dates_0 for dates_0, sales in store_sales)
+    n_days = max((dates_0 - first_date).days + sales.size
+                 for dates_0, sales in store_sales)
+    sales_matrix = np.zeros((len(input_files), n_days), dtype=np.float32)
+    for store_index, (dates_0, sales) in enumerate(store_sales):
+        offset = (dates_0 - first_date).days
+        sales_matrix[store_index, offset:offset + sales.size] = sales
+    stores = np.array([os.path.basename(input_file).split('.')[0]
+                       for input_file in input_files])
+    return stores, pd.date_range(first_date, periods=n_days, freq='D'), \
+        sales_matrix  # load_panel(...)
+
+GROUP_STATISTICS_FIELDS = ('ave_sales_no_adv', 'ave_sales_adv', 'lift',
+                           'lift_pct', 'tstat', 'pvalue',
+                           'empirical_p_value', 'expected_profit_increase')
+
+class SharedArrays:
+    """
+    named NumPy arrays in multiprocessing.shared_memory blocks for
+    worker processes (Python 3.8 or later)
+
+    The parent process creates the arrays and passes spec() (the
+    block names, shapes, and types, a few bytes) to the workers,
+    which attach(...) NumPy views of the same memory.  Inputs are
+    never pickled and workers write their results into slices of
+    preallocated arrays, so nothing is pickled on the way back.
+
+    shared = SharedArrays()
+    sales = shared.create('sales', sales_matrix)
+    ...  worker: SharedArrays.attach(spec)['sales'][batch]
+    shared.close(unlink=True)
+    """
+
+    def __init__(self):
+        self.blocks = {}  # name -> SharedMemory
+        self.arrays = {}  # name -> NumPy view of the block
+        self.owner = True
+
+    def create(self, name, array=None, shape=None, dtype=np.float64,
+               fill=None):
+        """
+        new shared array, a copy of array or an array of the
+        given shape and type (filled with fill if not None)
+
+        RETURNS: NumPy view of the shared array
+        """
+        from multiprocessing import shared_memory
+
+        if not array is None:
+            array = np.asarray(array)
+            shape, dtype = array.shape, array.dtype
+        dtype = np.dtype(dtype)
+        size = max(1, int(np.prod(shape))*dtype.itemsize)
+        block = shared_memory.SharedMemory(create=True, size=size)
+        view = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        if not array is None:
+            view[...] = array
+        elif not fill is None:
+            view.fill(fill)
+        self.blocks[name] = block
+        self.arrays[name] = view
+        return view
+
+    def spec(self):
+        """
+        picklable description of the arrays for attach(...)
+        """
+        return {name : (self.blocks[name].name, view.shape, view.dtype.str)
+                for name, view in self.arrays.items()}
+
+    @classmethod
+    def attach(cls, spec):
+        """
+        attach to the shared arrays of another process
+
+        RETURNS: SharedArrays (close(...) but do not unlink)
+        """
+        from multiprocessing import shared_memory
+
+        shared = cls()
+        shared.owner = False
+        for name, (block_name, shape, dtype) in spec.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            shared.blocks[name] = block
+            shared.arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype),
+                                             buffer=block.buf)
+        return shared
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def close(self, unlink=None):
+        """
+        release the arrays; the creating process also frees the
+        shared memory unless unlink is False
+        """
+        if unlink is None:
+            unlink = self.owner
+        # the views must go before the blocks can close
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+            if unlink:
+                block.unlink()
+        self.blocks = {}
+# end class SharedArrays
+
+def shared_group_statistics(spec, batch_index, batch_start, batch_stop,
+                            unit_price, unit_cost, annual_adv_expense,
+                            number_sims, seed_val):
+    """
+    worker process task of panel_statistics(...): group_statistics(...)
+    of rows batch_start to batch_stop of the shared 'sales' matrix,
+    written into the shared result arrays
+
+    RETURNS: batch_index
+    """
+    shared = SharedArrays.attach(spec)
+    try:
+        batch = slice(batch_start, batch_stop)
+        batch_results = group_statistics(shared['sales'][batch],
+                                         shared['mask_adv'],
+                                         unit_price,
+                                         unit_cost,
+                                         annual_adv_expense,
+                                         number_sims,
+                                         np.random.RandomState([seed_val,
+                                                                batch_index]))
+        for field in GROUP_STATISTICS_FIELDS:
+            shared[field][batch] = batch_results[field]
+        del batch_results
+    finally:
+        shared.close()
+    return batch_index
+
+def panel_statistics(sales_matrix, mask_adv, unit_price,
+                     unit_cost=UNIT_COST_DEFAULT, annual_adv_expense=0.0,
+                     number_sims=NSIMS_DEFAULT, seed_val=SEED_VAL,
+                     workers=None, batch_rows=PANEL_BATCH_STORES):
+    """
+    group_statistics(...) of every row of a (rows x days) daily sales
+    matrix in batches of batch_rows rows, fanned out to a pool of
+    worker processes
+
+    RETURNS: dictionary of group_statistics(...) arrays
+
+    WHY: the daily sales matrix, the advertising mask, and the result
+    arrays live in shared memory (see SharedArrays) so the workers
+    read their rows and write their results in place; only the block
+    names and the batch bounds are pickled.  Batch b uses the seed
+    [seed_val, b], so the results do not depend on the number of
+    workers.  Without multiprocessing.shared_memory (Python before
+    3.8) the batches are pickled to the workers instead.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    n_rows = sales_matrix.shape[0]
+    batch_bounds = [(batch_start, min(n_rows, batch_start + batch_rows))
+                    for batch_start in range(0, n_rows, batch_rows)]
+
+    def batch_rng(batch_index):
+        return np.random.RandomState([seed_val, batch_index])
+
+    if workers == 1 or len(batch_bounds) == 1:
+        batch_results = [group_statistics(sales_matrix[batch_start:batch_stop],
+                                          mask_adv, unit_price, unit_cost,
+                                          annual_adv_expense, number_sims,
+                                          batch_rng(batch_index))
+                         for batch_index, (batch_start, batch_stop)
+                         in enumerate(batch_bounds)]
+        return {field : np.concatenate([batch_result[field]
+                                        for batch_result in batch_results])
+                for field in GROUP_STATISTICS_FIELDS}
+
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        shared_memory = None
+    if shared_memory is None:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            batch_results = list(executor.map(
+                group_statistics,
+                [sales_matrix[batch_start:batch_stop]
+                 for batch_start, batch_stop in batch_bounds],
+                [mask_adv]*len(batch_bounds),
+                [unit_price]*len(batch_bounds),
+                [unit_cost]*len(batch_bounds),
+                [annual_adv_expense]*len(batch_bounds),
+                [number_sims]*len(batch_bounds),
+                [batch_rng(batch_index)
+                 for batch_index in range(len(batch_bounds))]))
+        return {field : np.concatenate([batch_result[field]
+                                        for batch_result in batch_results])
+                for field in GROUP_STATISTICS_FIELDS}
+
+    shared = SharedArrays()
+    try:
+        shared.create('sales', sales_matrix)
+        shared.create('mask_adv', np.asarray(mask_adv, dtype=bool))
+        for field in GROUP_STATISTICS_FIELDS:
+            shared.create(field, shape=(n_rows,), fill=np.nan)
+        spec = shared.spec()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(shared_group_statistics, spec,
+                                       batch_index, batch_start, batch_stop,
+                                       unit_price, unit_cost,
+                                       annual_adv_expense, number_sims,
+                                       seed_val)
+                       for batch_index, (batch_start, batch_stop)
+                       in enumerate(batch_bounds)]
+            for future in futures:
+                future.result()  # raises the exception of a failed batch
+        # the results outlive the shared memory
+        return {field : shared[field].copy()
+                for field in GROUP_STATISTICS_FIELDS}
+    finally:
+        shared.close()
+    # end panel_statistics(...)
+
+def evaluate_panel(panel_spec, config, store_column=PANEL_STORE_COLUMN,
+                   number_sims=NSIMS_DEFAULT, workers=None):
+    """
+    evaluate the advertising of every store of a chain in one run
+
+    ARGUMENTS: panel_spec -- see load_panel(...)
+               config -- EvaluationConfig (advertising start date,
+                         unit price and cost, advertising expense of
+                         each store, seed, column names and sales type)
+               store_column -- store key column of a long format panel
+               number_sims -- simulated advertising periods of each
+                              store for the empirical p-values
+               workers -- worker processes (default number of CPUs)
+
+    RETURNS: dictionary with the store_column, unit_price,
+             annual_adv_expense, days_no_adv, days_adv, matrix_bytes,
+             elapsed_secs, and arrays with one entry per store: store,
+             sales (total) and the group_statistics(...)
+
+    WHY: the stores share one (stores x days) float32 daily sales
+    matrix.  group_statistics(...) evaluates PANEL_BATCH_STORES stores
+    per task with array operations and the tasks run in a pool of
+    worker processes (see panel_statistics(...)).
+    """
+    from dateutil.parser import parse
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError(debug_prefix() + "workers is " + str(workers)
+                         + " (LESS THAN ONE)")
+
+    t_start = time.time()
+    stores, dates, sales_matrix = load_panel(panel_spec, config,
+                                             store_column, workers)
+    mask_adv = np.asarray(dates >= parse(config.adv_date))
+
+    unit_price = config.unit_price
+    if unit_price is None:
+        unit_price = get_unit_prices(np.unique(sales_matrix[:, ~mask_adv])
+                                     .astype(np.float64))[0]
+        check_unit_price(unit_price)
+    unit_price = float(unit_price)
+
+    panel_results = panel_statistics(sales_matrix, mask_adv, unit_price,
+                                     config.unit_cost,
+                                     config.annual_adv_expense,
+                                     number_sims, config.seed_val, workers)
+    panel_results.update({'store_column' : store_column,
+                          'unit_price' : unit_price,
+                          'annual_adv_expense' : config.annual_adv_expense,
+                          'store' : stores,
+                          'sales' : sales_matrix.sum(axis=1, dtype=np.float64),
+                          'days_no_adv' : int((~mask_adv).sum()),
+                          'days_adv' : int(mask_adv.sum()),
+                          'matrix_bytes' : sales_matrix.nbytes,
+                          'elapsed_secs' : time.time() - t_start})
+    return panel_results  # evaluate_panel(...)
+
+PANEL_FIELDS = ('store',) + SEGMENT_FIELDS[1:]
+
+def panel_report(panel_results):
+    """
+    text summary of evaluate_panel(...) results with the best and
+    worst stores (all the stores are in the CSV file, see
+    write_panel(...))
+
+    RETURNS: report -- text block
+    """
+    n_stores = len(panel_results['store'])
+    profit = panel_results['expected_profit_increase']
+    report = "Advertising Panel: %d stores, %d days with no advertising, " \
+             "%d days with advertising (%.1f MB, %.1f seconds)\n" \
+             % (n_stores, panel_results['days_no_adv'],
+                panel_results['days_adv'],
+                panel_results['matrix_bytes']/(1024.0*1024.0),
+                panel_results['elapsed_secs'])
+    report += "Stores with Welch's p-value < %g: %d (%5.2f PERCENT)\n" \
+              % (ALPHA_FISHER, (panel_results['pvalue'] < ALPHA_FISHER).sum(),
+                 100.0*(panel_results['pvalue'] < ALPHA_FISHER).mean())
+    report += "Stores with empirical p-value < %g: %d (%5.2f PERCENT)\n" \
+              % (ALPHA_FISHER,
+                 (panel_results['empirical_p_value'] < ALPHA_FISHER).sum(),
+                 100.0*(panel_results['empirical_p_value']
+                        < ALPHA_FISHER).mean())
+    report += "Stores with a profit increase: %d (%5.2f PERCENT)\n" \
+              % ((profit > 0.0).sum(), 100.0*(profit > 0.0).mean())
+    report += "Median Lift in Average Daily Sales: %.2f\n" \
+              % np.nanmedian(panel_results['lift'])
+    report += "Total Expected Profit Increase per Year: %s (advertising " \
+              "expense %s per store)\n" \
+              % (locale.currency(np.nansum(profit), grouping=True),
+                 locale.currency(panel_results['annual_adv_expense'],
+                                 grouping=True))
+
+    order = np.argsort(-np.nan_to_num(profit, nan=-np.inf))
+    for title, indices in (("Best Stores", order[:PANEL_REPORT_STORES]),
+                           ("Worst Stores",
+                            order[::-1][:PANEL_REPORT_STORES])):
+        report += "%s\n%-24s %12s %8s %10s %10s %16s\n" \
+                  % (title, panel_results['store_column'], "Lift/Day",
+                     "Lift %", "P-Value", "Emp P", "Profit Change")
+        for index in indices:
+            report += "%-24s %12.2f %8.1f %10.4f %10.4f %16s\n" \
+                      % (str(panel_results['store'][index])[:24],
+                         panel_results['lift'][index],
+                         panel_results['lift_pct'][index],
+                         panel_results['pvalue'][index],
+                         panel_results['empirical_p_value'][index],
+                         locale.currency(profit[index], grouping=True))
+    return report
+
+def write_panel(panel_results, file_path):
+    """
+    write the evaluate_panel(...) results of every store as a CSV table
+    """
+    def write_rows(out_file):
+        writer = csv.writer(out_file)
+        writer.writerow(PANEL_FIELDS)
+        for index in range(len(panel_results['store'])):
+            writer.writerow([to_serializable(panel_results[field][index])
+                             for field in PANEL_FIELDS])
+
+    atomic_write(file_path, write_rows)
+
+def plot_panel(panel_results, file_stem, output_folder=None,
+               plot_duration_secs=PLOT_DURATION_SECS, block=False):
+    """
+    plot the distributions of the profit changes and the empirical
+    p-values of the stores
+
+    RETURNS: figure
+    """
+    plt = import_pyplot()
+    from matplotlib.ticker import FuncFormatter
+
+    profit = panel_results['expected_profit_increase']
+    fig_panel, (ax_profit, ax_pval) = plt.subplots(2, 1, figsize=(12, 9))
+    ax_profit.hist(profit[np.isfinite(profit)], bins=BINS_DEFAULT, color='g')
+    ax_profit.axvline(0.0, color=PROFIT_CHANGE_COLOR, linewidth=LINEWIDTH)
+    ax_profit.xaxis.set_major_formatter(FuncFormatter(currency))
+    ax_profit.set_xlabel('EXPECTED PROFIT INCREASE PER YEAR')
+    ax_profit.set_ylabel('NUMBER OF STORES')
+    ax_profit.set_title('ADVERTISING PANEL (' + file_stem + ', '
+                        + str(len(panel_results['store'])) + ' STORES)')
+    ax_profit.grid()
+
+    p_values = panel_results['empirical_p_value']
+    ax_pval.hist(p_values[np.isfinite(p_values)], bins=BINS_DEFAULT,
+                 range=(0.0, 1.0), color='b')
+    ax_pval.axvline(ALPHA_FISHER, color='k', linestyle='--')
+    ax_pval.set_xlabel('EMPIRICAL P-VALUE')
+    ax_pval.set_ylabel('NUMBER OF STORES')
+    ax_pval.grid()
+    fig_panel.tight_layout()
+
+    if block:
+        plt.show()
+    else:
+        plt.ion()
+        plt.show()
+        plt.pause(plot_duration_secs)
+
+    if not output_folder is None:
+        fig_panel.savefig(output_folder
+                          + os.sep
+                          + file_stem
+                          + "_panel.jpg")
+    return fig_panel  # plot_panel(...)
+
+# per job options in a batch manifest file (see make_batch_jobs(...))
+# and the EvaluationConfig field and type for each option
+BATCH_JOB_OPTIONS = {'-adv_date' : ('adv_date', str),
+                     '-adv_start_date' : ('adv_date', str),
+                     '-e' : ('annual_adv_expense', float),
+                     '-expenses' : ('annual_adv_expense', float),
+                     '-price' : ('unit_price', float),
+                     '-p' : ('unit_price', float),
+                     '-cost' : ('unit_cost', float),
+                     '-c' : ('unit_cost', float),
+                     '-n' : ('number_sims', int),
+                     '-nsims' : ('number_sims', int),
+                     '-s' : ('seed_val', int),
+                     '-seed' : ('seed_val', int),
+                     '-date_tag' : ('date_tag', str),
+                     '-amount_tag' : ('amount_tag', str),
+                     '-sales_type_tag' : ('sales_type_tag', str),
+                     '-sales_type_value' : ('sales_type_value', str)}
+
+def is_batch_manifest(file_path):
+    """
+    True if file_path is a batch manifest (see make_batch_jobs(...))
+    rather than a sales report, whatever its file name extension
+
+    The first line that is not blank or a comment of a manifest is a
+    sales report followed by per job options; the first line of a
+    sales report is its header ("DATE","CUST ID",...).
+    """
+    manifest_folder = os.path.dirname(file_path)
+    with open(file_path, errors='replace') as in_file:
+        for line in in_file:
+            try:
+                tokens = shlex.split(line, comments=True)
+            except ValueError:
+                return False  # e.g. unbalanced quotes
+            if not tokens:
+                continue
+            options = tokens[1::2]
+            return len(tokens) % 2 == 1 \
+                and all(option in BATCH_JOB_OPTIONS for option in options) \
+                and (tokens[0].lower().endswith('.csv')
+                     or os.path.isfile(os.path.join(manifest_folder,
+                                                    tokens[0])))
+    return False  # is_batch_manifest(...)
+
+# new worker processes for a batch job after its worker process dies
+BATCH_JOB_RETRIES = 1
+
+def make_batch_jobs(batch_spec, config=None):
+    """
+    make the list of evaluations for a batch run
+
+    ARGUMENTS: batch_spec -- folder (all *.csv files in the folder),
+                             glob pattern (e.g. reports/*.csv),
+                             a single CSV file, or a manifest file
+               config -- EvaluationConfig for all jobs; output_folder
+                         is the top folder for the job output folders
+
+    RETURNS: list of (input_file, config) for each job
+
+    A manifest file has one sales report per line followed by
+    optional per job settings (see BATCH_JOB_OPTIONS), for example:
+
+        client_a/sales.csv -adv_date 03/31/2018 -e 12000 -price 90
+        "client b/sales.csv" -date_tag BOB -n 500
+
+    Blank lines and lines starting with # are ignored.  Relative paths
+    are relative to the folder with the manifest file.  A manifest is
+    recognized by its contents (see is_batch_manifest(...)), so it may
+    have any name, even one ending in .csv.  Each job writes
+    to its own subfolder <output_folder>/<file_stem> of the output folder.
+    """
+    if config is None:
+        config = EvaluationConfig()
+
+    if not isinstance(batch_spec, str):
+        raise TypeError(debug_prefix() + 'batch_spec is type '
+                        + str(type(batch_spec)))
+
+    job_specs = []  # (input_file, {field : value})
+    if os.path.isdir(batch_spec):
+        for input_file in sorted(glob.glob(os.path.join(batch_spec, '*.csv'))):
+            job_specs.append((input_file, {}))
+    elif glob.has_magic(batch_spec):
+        for input_file in sorted(glob.glob(batch_spec)):
+            job_specs.append((input_file, {}))
+    elif os.path.isfile(batch_spec) \
+         and (is_batch_manifest(batch_spec)
+              or not batch_spec.lower().endswith('.csv')):
+        manifest_folder = os.path.dirname(batch_spec)
+        with open(batch_spec) as manifest_file:
+            for line_number, line in enumerate(manifest_file, 1):
+                tokens = shlex.split(line, comments=True)
+                if not tokens:
+                    continue
+                input_file = os.path.join(manifest_folder, tokens[0])
+                overrides = {}
+                token_index = 1
+                while token_index < len(tokens):
+                    option = tokens[token_index]
+                    if not option in BATCH_JOB_OPTIONS \
+                       or token_index + 1 >= len(tokens):
+                        raise ValueError(debug_prefix() + batch_spec
+                                         + " line " + str(line_number)
+                                         + ": unknown option or missing "
+                                         + "value for " + option)
+                    field, field_type = BATCH_JOB_OPTIONS[option]
+                    overrides[field] = field_type(tokens[token_index+1])
+                    token_index += 2
+                job_specs.append((input_file, overrides))
+    elif batch_spec.lower().endswith('.csv'):
+        job_specs.append((batch_spec, {}))
+    else:
+        raise ValueError(debug_prefix() + "batch " + batch_spec
+                         + " is not a folder, glob pattern, CSV file "
+                         + "or manifest file")
+
+    output_folder = config.output_folder
+    if output_folder is None:
+        output_folder = OUTPUT_FOLDER
+
+    jobs = []
+    job_folders = set()
+    for input_file, overrides in job_specs:
+        file_stem = os.path.basename(input_file).split('.')[0]
+        # reports with the same name in different folders
+        # get their own output folders
+        job_folder = os.path.join(output_folder, file_stem)
+        copy_index = 2
+        while job_folder in job_folders:
+            job_folder = os.path.join(output_folder,
+                                      file_stem + '_' + str(copy_index))
+            copy_index += 1
+        job_folders.add(job_folder)
+        jobs.append((input_file,
+                     config._replace(output_folder=job_folder, **overrides)))
+    return jobs  # make_batch_jobs(...)
+
+def init_batch_worker(locale_name):
+    """
+    set the locale of a batch worker process to the locale
+    of the main process (used by make_report(...))
+    """
+    try:
+        locale.setlocale(locale.LC_ALL, locale_name)
+    except (locale.Error, TypeError):
+        pass
+
+METRICS_PREFIX = 'adevaluator'
+STATSD_PORT = 8125  # default StatsD port
+
+def peak_rss_bytes():
+    """
+    peak resident set size (RSS) of this process in bytes
+    (None if not available, e.g. on Microsoft Windows)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return max_rss  # bytes on Mac OS X
+    return max_rss*1024  # kilobytes on Linux
+
+def evaluation_metrics(result):
+    """
+    monitoring metrics of an evaluation for MetricsExporter
+
+    RETURNS: dictionary with the input rows, days, number of
+             simulations, whether the simulations came from the
+             simulation cache (1 or 0), stage durations in seconds,
+             and peak memory
+    """
+    metrics = {'input_rows' : result.rows,
+               'days' : len(result.daily_sales_np),
+               'number_sims' : result.config.number_sims,
+               'simulation_cache_hit' : int(result.simulation_cache_hit),
+               'stage_seconds' : dict(result.timings),
+               'peak_rss_bytes' : peak_rss_bytes()}
+    if result.profile:
+        metrics['peak_alloc_bytes'] \
+            = int(1024*1024*max(stage['peak_alloc_mb']
+                                for stage in result.profile.values()))
+    return metrics
+
+class MetricsExporter:
+    """
+    export monitoring metrics of evaluations to a Prometheus
+    textfile (e.g. for the node_exporter textfile collector) and/or
+    a StatsD server over UDP
+
+    ARGUMENTS: textfile -- path of the Prometheus textfile
+                           (rewritten atomically after each evaluation)
+               statsd_address -- StatsD host:port (port default STATSD_PORT)
+
+    Counts the evaluations by status and the hits and misses of the
+    simulation cache, and keeps the metrics of the last evaluation
+    (see evaluation_metrics(...)) and the statistics of the -serve
+    caches.  A failure to export metrics is printed and
+    does not stop the evaluations.
+    """
+
+    def __init__(self, textfile=None, statsd_address=None):
+        self.textfile = textfile or None
+        self.statsd_address = None
+        self.statsd_socket = None
+        if statsd_address:
+            host, _sep, port = statsd_address.rpartition(':')
+            if not host:
+                host, port = port, STATSD_PORT
+            self.statsd_address = (host, int(port))
+            import socket
+            self.statsd_socket = socket.socket(socket.AF_INET,
+                                               socket.SOCK_DGRAM)
+        self.counts = {'ok' : 0, 'error' : 0}
+        self.timestamps = {}
+        self.last_metrics = {}
+        self.caches = {}
+        self.lock = threading.Lock()  # -serve request threads
+
+    def record(self, metrics=None, status='ok'):
+        """
+        record an evaluation with status 'ok' or 'error' and
+        its metrics (see evaluation_metrics(...)) and export them
+        """
+        with self.lock:
+            self.counts[status] = self.counts.get(status, 0) + 1
+            self.timestamps[status] = time.time()
+            lines = self.statsd_lines(metrics, status)
+            if metrics:
+                self.last_metrics = metrics
+                if metrics.get('simulation_cache_hit') is not None:
+                    stats = self.caches.setdefault('simulations',
+                                                   {'hits' : 0, 'misses' : 0})
+                    stats['hits' if metrics['simulation_cache_hit']
+                          else 'misses'] += 1
+                    lines += self.cache_statsd_lines()
+            self.send_statsd(lines)
+            self.write_textfile()
+
+    def record_caches(self, caches):
+        """
+        record the statistics of caches (name -> LRUCache.stats())
+        """
+        with self.lock:
+            self.caches.update(caches)
+            self.send_statsd(self.cache_statsd_lines())
+            self.write_textfile()
+
+    def statsd_lines(self, metrics, status):
+        """
+        StatsD lines for an evaluation
+        """
+        lines = ["%s.evaluations.%s:1|c" % (METRICS_PREFIX, status)]
+        if metrics:
+            for name in ('input_rows', 'days', 'number_sims',
+                         'simulation_cache_hit',
+                         'peak_rss_bytes', 'peak_alloc_bytes'):
+                if metrics.get(name) is not None:
+                    lines.append("%s.%s:%d|g" % (METRICS_PREFIX, name,
+                                                 metrics[name]))
+            if metrics.get('elapsed_secs') is not None:
+                lines.append("%s.elapsed:%.3f|ms" % (METRICS_PREFIX,
+                                                     1000.0*metrics['elapsed_secs']))
+            for stage, secs in metrics.get('stage_seconds', {}).items():
+                lines.append("%s.stage.%s:%.3f|ms" % (METRICS_PREFIX, stage,
+                                                      1000.0*secs))
+        return lines
+
+    def cache_statsd_lines(self):
+        lines = []
+        for name, stats in self.caches.items():
+            for field in ('hits', 'misses', 'items'):
+                if not field in stats:
+                    continue  # no items for the caches of the workers
+                lines.append("%s.cache.%s.%s:%d|g" % (METRICS_PREFIX, name,
+                                                      field, stats[field]))
+        return lines
+
+    def send_statsd(self, lines):
+        if self.statsd_socket is None or not lines:
+            return
+        try:
+            self.statsd_socket.sendto("\n".join(lines).encode('utf-8'),
+                                      self.statsd_address)
+        except OSError as os_X:
+            print(debug_prefix() + "Unable to send StatsD metrics to",
+                  self.statsd_address, os_X)
+
+    def prometheus_text(self):
+        """
+        metrics in the Prometheus text exposition format
+        """
+        prefix = METRICS_PREFIX + '_'
+        lines = ["# HELP " + prefix + "evaluations_total "
+                 "Evaluations by status.",
+                 "# TYPE " + prefix + "evaluations_total counter"]
+        for status, count in sorted(self.counts.items()):
+            lines.append(prefix + 'evaluations_total{status="%s"} %d'
+                         % (status, count))
+        lines += ["# HELP " + prefix + "last_evaluation_timestamp_seconds "
+                  "Time of the last evaluation by status.",
+                  "# TYPE " + prefix + "last_evaluation_timestamp_seconds gauge"]
+        for status, timestamp in sorted(self.timestamps.items()):
+            lines.append(prefix + 'last_evaluation_timestamp_seconds'
+                         '{status="%s"} %.3f' % (status, timestamp))
+
+        metrics = self.last_metrics
+        for name, help_text in (('input_rows', "Rows in the sales report."),
+                                ('days', "Days of sales data."),
+                                ('number_sims', "Number of simulations."),
+                                ('simulation_cache_hit',
+                                 "1 if the simulations were cached."),
+                                ('peak_rss_bytes',
+                                 "Peak resident set size of the process."),
+                                ('peak_alloc_bytes',
+                                 "Peak memory allocated (-profile).")):
+            if metrics.get(name) is not None:
+                lines += ["# HELP " + prefix + name + " " + help_text,
+                          "# TYPE " + prefix + name + " gauge",
+                          prefix + name + " %d" % metrics[name]]
+        if metrics.get('elapsed_secs') is not None:
+            lines += ["# HELP " + prefix + "elapsed_seconds "
+                      "Duration of the last evaluation.",
+                      "# TYPE " + prefix + "elapsed_seconds gauge",
+                      prefix + "elapsed_seconds %.6f" % metrics['elapsed_secs']]
+        if metrics.get('stage_seconds'):
+            lines += ["# HELP " + prefix + "stage_seconds "
+                      "Duration of each stage of the last evaluation.",
+                      "# TYPE " + prefix + "stage_seconds gauge"]
+            for stage, secs in metrics['stage_seconds'].items():
+                lines.append(prefix + 'stage_seconds{stage="%s"} %.6f'
+                             % (stage, secs))
+
+        if self.caches:
+            for field, help_text in (('hits', "Cache hits."),
+                                     ('misses', "Cache misses.")):
+                name = prefix + "cache_" + field + "_total"
+                lines += ["# HELP " + name + " " + help_text,
+                          "# TYPE " + name + " counter"]
+                for cache_name, stats in sorted(self.caches.items()):
+                    lines.append(name + '{cache="%s"} %d'
+                                 % (cache_name, stats[field]))
+            name = prefix + "cache_hit_ratio"
+            lines += ["# HELP " + name + " Cache hits / lookups.",
+                      "# TYPE " + name + " gauge"]
+            for cache_name, stats in sorted(self.caches.items()):
+                lookups = stats['hits'] + stats['misses']
+                lines.append(name + '{cache="%s"} %.6f'
+                             % (cache_name,
+                                stats['hits']/lookups if lookups else 0.0))
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self):
+        if self.textfile is None:
+            return
+        try:
+            text = self.prometheus_text()
+            atomic_write(self.textfile, lambda out_file: out_file.write(text))
+        except OSError as os_X:
+            print(debug_prefix() + "Unable to write metrics to",
+                  self.textfile, os_X)
+
+    def close(self):
+        if not self.statsd_socket is None:
+            self.statsd_socket.close()
+            self.statsd_socket = None
+# end class MetricsExporter
+
+def settings_metrics(settings):
+    """
+    MetricsExporter from the AdEvaluatorSettings
+    (None if no metrics are configured)
+    """
+    if not (settings.metrics_textfile or settings.statsd_address):
+        return None
+    return MetricsExporter(settings.metrics_textfile,
+                           settings.statsd_address)
+
+def run_batch_job(input_file, config):
+    """
+    run one evaluation of a batch
+
+    RETURNS: dictionary with the status and the main results for the
+             batch index (and the metrics if ok, see
+             evaluation_metrics(...)); an error in the evaluation is
+             reported in
+             the index (and <file_stem>_error.txt) and does not stop
+             the batch
+    """
+    t_start = time.time()
+    row = {'input_file' : input_file,
+           'output_folder' : config.output_folder,
+           'status' : 'ok',
+           'expected_profit_increase' : None,
+           'empirical_p_value' : None,
+           'welch_p_value' : None,
+           'elapsed_secs' : None,
+           'error' : ''}
+    try:
+        result = run_evaluation(input_file, config)
+        row['expected_profit_increase'] = result.expected_profit_increase
+        row['empirical_p_value'] = result.empirical_p_value
+        row['welch_p_value'] = result.sales_stats.pvalue
+        # removed from the row by run_batch(...)
+        row['metrics'] = evaluation_metrics(result)
+    except Exception as general_X:
+        row['status'] = 'error'
+        row['error'] = repr(general_X)
+        try:
+            if not os.path.exists(config.output_folder):
+                os.makedirs(config.output_folder)
+            file_stem = os.path.basename(input_file).split('.')[0]
+            with open(os.path.join(config.output_folder,
+                                   file_stem + '_error.txt'), 'w') as out_file:
+                out_file.write(traceback.format_exc())
+        except OSError:
+            pass
+    row['elapsed_secs'] = time.time() - t_start
+    return to_serializable(row)  # run_batch_job(...)
+
+def batch_error_row(input_file, config, error):
+    """
+    batch index row of a job that failed outside run_batch_job(...),
+    e.g. when its worker process died
+    """
+    return {'input_file' : input_file,
+            'output_folder' : config.output_folder,
+            'status' : 'error',
+            'expected_profit_increase' : None,
+            'empirical_p_value' : None,
+            'welch_p_value' : None,
+            'elapsed_secs' : None,
+            'error' : repr(error)}
+
+def run_isolated_batch_job(input_file, config, locale_name,
+                           retries=BATCH_JOB_RETRIES):
+    """
+    run one evaluation of a batch in a new worker process of its own,
+    in another new process up to retries more times if the process
+    dies, so a crash only fails the job that crashes
+
+    RETURNS: batch index row (see run_batch_job(...))
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+
+    for attempt in range(retries + 1):
+        with ProcessPoolExecutor(max_workers=1,
+                                 initializer=init_batch_worker,
+                                 initargs=(locale_name,)) as executor:
+            try:
+                return executor.submit(run_batch_job, input_file,
+                                       config).result()
+            except BrokenProcessPool as broken_X:
+                error = broken_X
+            except Exception as general_X:
+                return batch_error_row(input_file, config, general_X)
+    return batch_error_row(input_file, config, error)
+    # end run_isolated_batch_job(...)
+
+def write_batch_index(rows, file_path):
+    """
+    write the batch index as a CSV table with one row per job
+    """
+    fields = list(rows[0].keys()) if rows else ['input_file', 'status']
+
+    def write_rows(out_file):
+        writer = csv.DictWriter(out_file, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    atomic_write(file_path, write_rows)
+    # end write_batch_index(...)
+
+def run_batch(batch_spec, config=None, workers=None, metrics=None):
+    """
+    evaluate many sales reports with a pool of worker processes
+
+    ARGUMENTS: batch_spec -- see make_batch_jobs(...)
+               config -- EvaluationConfig for all jobs
+               workers -- number of worker processes
+                          (default number of CPUs)
+               metrics -- optional MetricsExporter for each job
+
+    RETURNS: list of batch index rows (see run_batch_job(...))
+             in the order of the jobs
+
+    writes <output_folder>/batch_index.json and batch_index.csv
+
+    A worker process that dies (e.g. killed out of memory) breaks
+    the pool; the unfinished jobs then run in their own processes
+    (see run_isolated_batch_job(...)), so only the job that crashes
+    fails.
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, \
+        as_completed
+    from concurrent.futures.process import BrokenProcessPool
+
+    if config is None:
+        config = EvaluationConfig()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError(debug_prefix() + "workers is " + str(workers)
+                         + " (LESS THAN ONE)")
+
+    # no plots or progress messages from the workers
+    config = config._replace(make_plots=False, verbose=False)
+    output_folder = config.output_folder
+    if output_folder is None:
+        output_folder = OUTPUT_FOLDER
+        config = config._replace(output_folder=output_folder)
+
+    jobs = make_batch_jobs(batch_spec, config)
+    print("batch of", len(jobs), "sales reports with", workers, "workers")
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    t_start = time.time()
+    rows = [None] * len(jobs)
+    locale_name = locale.setlocale(locale.LC_ALL)
+    n_done = [0]
+
+    def record(job_index, row):
+        rows[job_index] = row
+        job_metrics = row.pop('metrics', None)
+        if not metrics is None:
+            metrics.record(job_metrics, row['status'])
+        n_done[0] += 1
+        print("[" + str(n_done[0]) + "/" + str(len(jobs)) + "]",
+              jobs[job_index][0], row['status'], flush=True)
+
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=init_batch_worker,
+                             initargs=(locale_name,)) as executor:
+        futures = {executor.submit(run_batch_job, input_file, job_config) :
+                   job_index
+                   for job_index, (input_file, job_config) in enumerate(jobs)}
+        for future in as_completed(futures):
+            job_index = futures[future]
+            input_file, job_config = jobs[job_index]
+            try:
+                record(job_index, future.result())
+            except BrokenProcessPool:
+                # a worker process died (e.g. out of memory), which
+                # stops all the unfinished jobs of the pool
+                pass
+            except Exception as general_X:
+                record(job_index, batch_error_row(input_file, job_config,
+                                                  general_X))
+
+    unfinished = [job_index for job_index, row in enumerate(rows)
+                  if row is None]
+    if unfinished:
+        print("a worker process died; running the", len(unfinished),
+              "unfinished sales reports in their own processes", flush=True)
+        with ThreadPoolExecutor(max_workers=workers) as threads:
+            futures = {threads.submit(run_isolated_batch_job,
+                                      *jobs[job_index], locale_name) :
+                       job_index
+                       for job_index in unfinished}
+            for future in as_completed(futures):
+                record(futures[future], future.result())
+
+    elapsed_secs = time.time() - t_start
+    n_failed = sum(1 for row in rows if row['status'] != 'ok')
+    print("batch finished in %.1f seconds: %d ok, %d failed"
+          % (elapsed_secs, len(rows) - n_failed, n_failed))
+
+    index_stem = os.path.join(output_folder, 'batch_index')
+    write_results({'batch' : batch_spec,
+                   'workers' : workers,
+                   'n_jobs' : len(rows),
+                   'n_failed' : n_failed,
+                   'elapsed_secs' : elapsed_secs,
+                   'jobs' : rows}, index_stem + '.json')
+    write_batch_index(rows, index_stem + '.csv')
+    return rows  # run_batch(...)
+
+SERVE_HOST = 'localhost'  # -serve only accepts local connections
+SERVE_PORT = 8765
+CACHE_MAX_ITEMS = 64  # parsed reports and results kept by -serve
+
+class LRUCache:
+    """
+    thread safe least recently used (LRU) cache
+
+    keeps at most max_items items; the least recently used
+    item is removed to make room for a new item
+    """
+
+    def __init__(self, max_items=CACHE_MAX_ITEMS):
+        if max_items < 1:
+            raise ValueError(debug_prefix() + "max_items is "
+                             + str(max_items) + " (LESS THAN ONE)")
+        self.max_items = max_items
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return self.items[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+
+    def __len__(self):
+        return len(self.items)
+
+    def stats(self):
+        return {'items' : len(self.items),
+                'max_items' : self.max_items,
+                'hits' : self.hits,
+                'misses' : self.misses}
+# end class LRUCache
+
+# simulations reused by run_evaluation(...) (see simulation_cache_key(...))
+_simulation_cache = LRUCache(SIMULATION_CACHE_ITEMS)
+
+def init_serve_worker(locale_name):
+    """
+    set the locale and import the libraries once in each
+    -serve worker process
+    """
+    import signal
+    # Ctrl-C stops the server, which shuts down the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    init_batch_worker(locale_name)
+    import pandas
+    import scipy.stats
+    import scipy.optimize
+    import dateutil.parser
+
+# parsed sales reports kept by each -serve worker process
+# (see serve_evaluation(...))
+_serve_reports = LRUCache(CACHE_MAX_ITEMS)
+
+def serve_evaluation(report_key, config):
+    """
+    run one -serve evaluation in a worker process; the worker keeps
+    the parsed sales reports, so a request only sends the report key
+    (see report_cache_key(...)) and the configuration
+
+    RETURNS: dictionary with the results (see EvaluationResult.to_dict()),
+             the text report, the metrics (see evaluation_metrics(...)),
+             and the caches -- whether the worker reused the parsed
+             report and the simulations
+    """
+    input_file = report_key[0]
+    data_frame = _serve_reports.get(report_key)
+    report_cached = data_frame is not None
+    if not report_cached:
+        data_frame = read_sales_report(input_file)
+        _serve_reports.put(report_key, data_frame)
+    result = run_evaluation(data_frame, config, input_file=input_file)
+    return {'result' : to_serializable(result.to_dict()),
+            'report' : result.report,
+            'metrics' : to_serializable(evaluation_metrics(result)),
+            'caches' : {'reports' : report_cached,
+                        'simulations' : result.simulation_cache_hit}}
+
+def report_cache_key(input_file):
+    """
+    cache key of a sales report, which changes when the file changes
+
+    RETURNS: (absolute path, modification time in ns, size)
+    """
+    file_stat = os.stat(input_file)
+    return (os.path.abspath(input_file),
+            file_stat.st_mtime_ns,
+            file_stat.st_size)
+
+# retries of a -serve request when a worker process dies
+SERVE_REQUEST_RETRIES = 1
+
+# -serve request fields (AdEvaluatorSettings fields, the seed, and the
+# scenario grid) and their types
+SERVE_REQUEST_FIELDS = {'annual_adv_expense' : float,
+                        'unit_price' : float,
+                        'unit_cost' : float,
+                        'number_sims' : int,
+                        'bins' : int,
+                        'seed_val' : int,
+                        'adv_date' : str,
+                        'date_tag' : str,
+                        'amount_tag' : str,
+                        'sales_type_tag' : str,
+                        'sales_type_value' : str,
+                        'scenario_grid' : list}
+
+class EvaluationServer:
+    """
+    evaluations for the -serve local HTTP server
+
+    The server process keeps the results in an LRU cache; evaluations
+    not in the cache run on a pool of worker processes with the
+    libraries already imported.  Each worker keeps the sales reports
+    it parsed (see serve_evaluation(...)) and the workers share the
+    simulations through the simulation cache folder (a temporary
+    folder unless simulation_cache_folder is given).  If a worker
+    process dies, the server starts a new pool and retries the request
+    (see SERVE_REQUEST_RETRIES).
+
+    POST /evaluate with a JSON object with the input_file (path to
+    the sales report) and optional AdEvaluatorSettings fields
+    (see SERVE_REQUEST_FIELDS, e.g. annual_adv_expense, adv_date,
+    number_sims, seed_val) returns the results as JSON.  GET /status
+    returns the statistics of the results cache and of the reports
+    and simulations the workers reused.
+    """
+
+    # request fields that are not evaluation settings
+    IGNORED_FIELDS = ('input_file', 'block', 'layers', 'detail_level')
+
+    def __init__(self, workers=None, max_items=CACHE_MAX_ITEMS,
+                 metrics=None, simulation_cache_folder=None):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.workers = workers
+        self.metrics = metrics  # optional MetricsExporter
+        self.results = LRUCache(max_items)
+        self.temporary_folder = None
+        if simulation_cache_folder is None:
+            self.temporary_folder = tempfile.mkdtemp(prefix='eval_adv_serve_')
+            simulation_cache_folder = self.temporary_folder
+        self.simulation_cache_folder = simulation_cache_folder
+        # hits and misses of the caches of the workers
+        self.worker_caches = {'reports' : {'hits' : 0, 'misses' : 0},
+                              'simulations' : {'hits' : 0, 'misses' : 0}}
+        self.lock = threading.Lock()  # request threads
+        self.executor = self.make_executor()
+
+    def make_executor(self):
+        """
+        pool of worker processes with the libraries imported
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        return ProcessPoolExecutor(max_workers=self.workers,
+                                   initializer=init_serve_worker,
+                                   initargs=(locale.setlocale(locale.LC_ALL),))
+
+    def run_in_worker(self, report_key, config,
+                      retries=SERVE_REQUEST_RETRIES):
+        """
+        run serve_evaluation(...) in a worker process, in a new pool
+        of worker processes up to retries more times if a worker dies
+        (which breaks the pool for every request)
+
+        RETURNS: see serve_evaluation(...)
+        """
+        from concurrent.futures.process import BrokenProcessPool
+
+        for attempt in range(retries + 1):
+            executor = self.executor
+            try:
+                return executor.submit(serve_evaluation,
+                                       report_key,
+                                       config).result()
+            except BrokenProcessPool:
+                if attempt == retries:
+                    raise
+                with self.lock:
+                    # another request may have replaced the pool
+                    if self.executor is executor:
+                        print("restarting the worker processes")
+                        executor.shutdown(wait=False)
+                        self.executor = self.make_executor()
+
+    def cache_stats(self):
+        """
+        statistics of the results cache and of the caches of the workers
+        (name -> LRUCache.stats() or hits and misses)
+        """
+        with self.lock:
+            caches = {name : dict(stats)
+                      for name, stats in self.worker_caches.items()}
+        caches['results'] = self.results.stats()
+        return caches
+
+    def make_config(self, request):
+        """
+        EvaluationConfig from the fields of a request
+
+        raises ValueError for an unknown field or a bad value
+        """
+        fields = {}
+        for name, value in request.items():
+            if name in self.IGNORED_FIELDS:
+                continue
+            if not name in SERVE_REQUEST_FIELDS:
+                raise ValueError("unknown field " + str(name))
+            field_type = SERVE_REQUEST_FIELDS[name]
+            if name == 'unit_price' and value in (INFER_PRICE_TAG, None):
+                fields[name] = None
+                continue
+            if field_type is float:
+                valid = isinstance(value, (int, float)) \
+                        and not isinstance(value, bool) and np.isfinite(value)
+            elif field_type is int:
+                valid = isinstance(value, int) and not isinstance(value, bool)
+            else:
+                valid = isinstance(value, field_type)
+            if not valid:
+                raise ValueError(name + " must be " + field_type.__name__
+                                 + " (not " + repr(value) + ")")
+            fields[name] = value if field_type is list else field_type(value)
+
+        for name in ('number_sims', 'bins'):
+            if name in fields and fields[name] < 1:
+                raise ValueError(name + " must be at least one")
+        if not fields.get('unit_price') is None and fields['unit_price'] <= 0:
+            raise ValueError("unit_price must be positive")
+        if 'adv_date' in fields:
+            from dateutil.parser import parse
+            try:
+                parse(fields['adv_date'])
+            except (ValueError, OverflowError):
+                raise ValueError("adv_date " + fields['adv_date']
+                                 + " is not a date")
+        if fields.get('scenario_grid') is not None:
+            # [[expenses], [unit costs]] as a hashable cache key
+            try:
+                fields['scenario_grid'] = tuple(tuple(float(value)
+                                                      for value in values)
+                                                for values in fields['scenario_grid'])
+            except (TypeError, ValueError):
+                raise ValueError("scenario_grid must be [[expenses], [unit costs]]")
+            if len(fields['scenario_grid']) != 2:
+                raise ValueError("scenario_grid must be [[expenses], [unit costs]]")
+        return EvaluationConfig(simulation_cache_folder=self.simulation_cache_folder,
+                                **fields)
+
+    def evaluate(self, request):
+        """
+        evaluate a request (dictionary from the request JSON)
+
+        RETURNS: response dictionary
+        """
+        t_start = time.time()
+        if not isinstance(request, dict) or not 'input_file' in request:
+            raise ValueError("request must be a JSON object with an input_file")
+        input_file = str(request['input_file'])
+        config = self.make_config(request)
+        try:
+            report_key = report_cache_key(input_file)
+
+            result_key = (report_key, config)
+            response = self.results.get(result_key)
+            cached = response is not None
+            if not cached:
+                response = self.run_in_worker(report_key, config)
+                with self.lock:
+                    for name, hit in response.pop('caches').items():
+                        self.worker_caches[name]['hits' if hit
+                                                 else 'misses'] += 1
+                self.results.put(result_key, response)
+                if not self.metrics is None:
+                    self.metrics.record(response['metrics'])
+        except Exception:
+            if not self.metrics is None:
+                self.metrics.record(status='error')
+            raise
+        finally:
+            if not self.metrics is None:
+                caches = self.cache_stats()
+                # MetricsExporter.record(...) counts the simulations
+                del caches['simulations']
+                self.metrics.record_caches(caches)
+        return dict(response,
+                    status='ok',
+                    cached=cached,
+                    elapsed_secs=time.time() - t_start)
+
+    def status(self):
+        return {'status' : 'ok',
+                'workers' : self.workers,
+                'simulation_cache_folder' : self.simulation_cache_folder,
+                **self.cache_stats()}
+
+    def shutdown(self):
+        self.executor.shutdown()
+        if not self.temporary_folder is None:
+            import shutil
+            shutil.rmtree(self.temporary_folder, ignore_errors=True)
+# end class EvaluationServer
+
+def serve(host=SERVE_HOST, port=SERVE_PORT, workers=None, metrics=None,
+          simulation_cache_folder=None):
+    """
+    run the -serve local HTTP evaluation server until interrupted
+    (see EvaluationServer; metrics is an optional MetricsExporter and
+    simulation_cache_folder the folder of simulations shared by the
+    workers, a temporary folder by default)
+
+    Example:
+
+    curl -d '{"input_file": "sales_seed_113.csv", "number_sims": 500}' \\
+         http://localhost:8765/evaluate
+    """
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    evaluation_server = EvaluationServer(workers, metrics=metrics,
+                                         simulation_cache_folder=simulation_cache_folder)
+
+    class EvaluationRequestHandler(BaseHTTPRequestHandler):
+        """
+        JSON requests and responses for EvaluationServer
+        """
+
+        def send_json(self, code, response):
+            body = json.dumps(to_serializable(response)).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path in ('/', '/status'):
+                self.send_json(200, evaluation_server.status())
+            else:
+                self.send_json(404, {'status' : 'error',
+                                     'error' : 'unknown path ' + self.path})
+
+        def do_POST(self):
+            if self.path != '/evaluate':
+                self.send_json(404, {'status' : 'error',
+                                     'error' : 'unknown path ' + self.path})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length).decode('utf-8'))
+                response = evaluation_server.evaluate(request)
+                self.send_json(200, response)
+            except FileNotFoundError as not_found_X:
+                self.send_json(404, {'status' : 'error',
+                                     'error' : str(not_found_X)})
+            except (ValueError, TypeError) as value_X:
+                self.send_json(400, {'status' : 'error',
+                                     'error' : str(value_X)})
+            except Exception as general_X:
+                self.send_json(500, {'status' : 'error',
+                                     'error' : repr(general_X)})
+
+    http_server = ThreadingHTTPServer((host, port), EvaluationRequestHandler)
+    print("serving evaluations on http://" + host + ":" + str(port),
+          "with", evaluation_server.workers, "workers (Ctrl-C to stop)")
+    try:
+        http_server.serve_forever()
+    except KeyboardInterrupt:
+        print("stopping the evaluation server")
+    finally:
+        http_server.server_close()
+        evaluation_server.shutdown()
+    # end serve(...)
+
+def evaluate_advertising(*args):
+    """
+    wrapper for main functionality of script, evaluation of the
+    effectiveness of the advertising -- which can include PR activities,
+    sales and marketing consultants, social media services, etc.
+    """
+    global _settings
+    global _b_load_settings
+
+    # default parameters
+    adv_date_str = ADV_START_DATE
+    ma_period_days = MA_PERIOD_DAYS  # moving average period (default 30 day)
+    number_sims = NSIMS_DEFAULT  # 1000 thousand simulations
+    annual_adv_expense = ANNUAL_ADV_EXPENSE
+
+    # process the command line arguments
+    input_file = INPUT_FILE  # default name of quickbooks sales report
+    seed_val = SEED_VAL  # default random number seed for simulations
+    output_folder = OUTPUT_FOLDER
+
+    unit_price = None  # price charged to customer
+    unit_cost = 0.0 # marginal cost of additional unit
+
+    plot_duration_secs = PLOT_DURATION_SECS  # default plot duration
+
+    # machine readable results files
+    results_formats = []
+    # -profile/-cprofile stage timing (see StageProfiler)
+    profile = False
+    cprofile = False
+    # reuse simulations (see simulation_cache_key(...))
+    simulation_cache = True
+    simulation_cache_folder = None
+    # expense/unit cost grid (see parse_scenario_grid(...))
+    scenario_grid_str = None
+    # advertising start date sweep (see sweep_adv_dates(...))
+    adv_date_range = None
+    # campaign schedule (see parse_campaigns(...))
+    campaign_spec = None
+    # segment column (see evaluate_segments(...))
+    segment_column = None
+    # panel of stores (see evaluate_panel(...))
+    panel_spec = None
+    store_column = PANEL_STORE_COLUMN
+    # detect the advertising start date (see detect_change_point(...))
+    detect_adv_date = False
+    # placebo test (see placebo_test(...))
+    placebo = False
+    # float32 derived sales and profit arrays
+    float32 = False
+    # projections in constant memory (see project_annual_sales_streaming(...))
+    streaming = False
+    # simulation or exact projections (see exact_projection(...))
+    engine = 'simulation'
+    # simulated years checking the exact engine (see engine_agreement(...))
+    engine_check = 0
+
+    # batch of sales reports (see run_batch(...))
+    batch_spec = None
+    workers = None
+
+    # local evaluation server (see serve(...))
+    serve_mode = False
+    serve_port = SERVE_PORT
+
+    if not ("-no_settings" in args
+            or "-clean_start" in args):
+        # load settings from shelf files
+        load_settings()
+    else:
+        reset()  # default settings for clean start
+
+    # initialize argument index
+    arg_index = 0
+    while arg_index < len(args):
+        print("processing", arg_index, '/', len(args), args[arg_index])
+        if args[arg_index] in ('-adv_date', '-adv_start_date', \
+                               '-adv_date_start'):
+            if (arg_index+1) < len(args):
+                adv_date_str = args[arg_index+1]
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix()
+                                 + 'missing argument for the advertising start date ('
+                                 + args[arg_index] + ')')
+        elif args[arg_index] in ('-i', '-input', '-sales', \
+                                 '-sales_report', \
+                                 '-input_file'):
+            if (arg_index+1) < len(args):
+                input_file = args[arg_index+1]
+                print("input_file->", input_file)
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix() + 'missing argument for the input file ('
+                                 + args[arg_index] + ')')
+        elif args[arg_index] in ("-no_settings", "-clean_start"):
+            pass  # do nothing
+        elif args[arg_index] in ("-block", "-b"):
+            # show figure and wait for user input
+            if not _settings.block:
+                _settings = _settings._replace(block=True)
+        elif args[arg_index] in ("-layers", "-l"):
+            # layered plots for presentation software slide animation
+            if not _settings.layers:
+                _settings = _settings._replace(layers=True)
+        elif args[arg_index] in ('-d', '-debug',
+                                 '-debug_level',  # backward compatible for tests
+                                 '-detail_level'):
+            if (arg_index + 1) < len(args):
+                detail_level = int(args[arg_index+1])
+                if detail_level < 0:
+                    raise ValueError(debug_prefix() + "detail_level is "
+                                     + str(detail_level)
+                                     + " (LESS THAN ZERO)")
+                _settings = _settings._replace(detail_level=detail_level)
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix() + 'missing argument for the detail level ('
+                                 + args[arg_index] + ')')
+
+        elif args[arg_index] in ('-o',
+                                 '-output',
+                                 '-folder',
+                                 '-output_folder'):
+            if (arg_index+1) < len(args):
+                output_folder = args[arg_index+1]
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix() + 'missing argument for the output folder ('
+                                 + args[arg_index] + ')')
+        elif args[arg_index] in ('-price', '-p', '-unit_price'):
+            if (arg_index+1) < len(args):
+                unit_price = float(args[arg_index+1])
+                check_unit_price(unit_price)
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix() + 'missing argument for the unit price ('
+                                 + args[arg_index] + ')')
+
+        elif args[arg_index] in ('-cost', '-unit_cost', '-c'):
+            if (arg_index+1) < len(args):
+                unit_cost = float(args[arg_index+1])
+                if unit_cost < 0.0:
+                    raise ValueError(debug_prefix() + "ERROR: unit_cost is "
+                                     + "{:,.2f}".format(unit_cost)
+                                     + " (LESS THAN ZERO)")
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix() + 'missing argument for the unit cost ('
+                                 + args[arg_index] + ')')
+
+        elif args[arg_index] in ('-plot_duration', '-pause'):
+            # duration in seconds that a figure is displayed
+            if (arg_index+1) < len(args):
+                plot_duration_secs = float(args[arg_index+1])
+                if plot_duration_secs < 0.0:
+                    raise ValueError(debug_prefix() + "ERROR: plot_duration is "
+                                     + "{:,.2f}".format(plot_duration_secs)
+                                     + " seconds (LESS THAN ZERO)")
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix() + 'missing argument for the plot display duration {'
+                                 + args[arg_index] + ')')
+
+        elif args[arg_index] in '-date_tag':
+            if (arg_index+1) < len(args):
+                date_tag_str = args[arg_index+1]
+                _settings = _settings._replace(date_tag=date_tag_str)
+                arg_index += 1
+            else:
+                ValueError(debug_prefix()
+                           + 'missing argument for the date column name in the sales report ('
+                           + args[arg_index] + ')')
+
+        elif args[arg_index] in '-amount_tag':
+            # the sales amount column name in the sales report
+            if (arg_index+1) < len(args):
+                amount_tag_str = args[arg_index+1]
+                _settings = _settings._replace(amount_tag=amount_tag_str)
+                arg_index += 1
+            else:
+                ValueError(debug_prefix() + "missing argument for the "
+                           + "sales amount column name in the sales report ("
+                           + args[arg_index] + ")")
+
+        elif args[arg_index] in '-sales_type_tag':
+            # the sales type column name in the sales report
+            if (arg_index+1) < len(args):
+                sales_type_tag_str = args[arg_index+1]
+                _settings = _settings._replace(sales_type_tag
+                                               =sales_type_tag_str)
+                arg_index += 1
+            else:
+                ValueError(debug_prefix() + "missing argument for the "
+                           + "optional sales type column name "
+                           + "in the sales report {"
+                           + args[arg_index] + ")")
+
+        elif args[arg_index] in '-sales_type_value':
+            # the value such as "Sales Receipt" for the entries of
+            # interest in the optional sales type column in the
+            # sales report
+            if (arg_index+1) < len(args):
+                sales_type_value_str = args[arg_index+1]
+                _settings = _settings._replace(sales_type_value=
+                                               sales_type_value_str)
+                arg_index += 1
+            else:
+                ValueError(debug_prefix() + "missing argument for the optional sales "
+                           + "type value in the sales report ("
+                           + args[arg_index] + ")")
+
+        elif args[arg_index] in ('-e', '-expenses', \
+                                 '-adv_expenses', '-advertising'):
+            # annual advertising expense
+            if (arg_index+1) < len(args):
+                # make sure convert to float (dollars)
+                annual_adv_expense = float(args[arg_index+1])
+                if annual_adv_expense < 0.0:
+                    raise ValueError(debug_prefix() + "ERROR: annual advertising expense is "
+                                     + "{:,.2f}".format(annual_adv_expense)
+                                     + " (LESS THAN ZERO)")
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix()
+                                 + 'missing argument for the annual advertising expense {'
+                                 + args[arg_index] + ')')
+        elif args[arg_index] in ('-n', '-nsims', \
+                                 '-nsimulations', '-n_simulations'):
+            # number of simulations for sales and profit/loss
+            # projections
+            if (arg_index+1) < len(args):
+                # make sure convert to float (dollars)
+                number_sims = int(args[arg_index+1])
+                if number_sims < 1:
+                    raise ValueError(debug_prefix()
+                                     + "ERROR: number of simulations is "
+                                     + str(number_sims)
+                                     + " (LESS THAN ONE SIMULATION)")
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix()
+                                 + 'missing argument for the number of simulations ('
+                                 + args[arg_index] + ')')
+        elif args[arg_index] in ('-s', '-seed', '--seed'):
+            # the random number seed for the simulations
+            if (arg_index+1) < len(args):
+                # convert to integer
+                seed_val = int(args[arg_index+1])
+                if seed_val < 1:
+                    raise ValueError(debug_prefix()
+                                     + "ERROR: random number seed is "
+                                     + str(seed_val)
+                                     + " (LESS THAN ONE)")
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix()
+                                 + 'missing argument for the random number seed ('
+                                 + args[arg_index] + ')')
+        elif args[arg_index] in ('-batch',):
+            # folder, glob pattern, or manifest file with sales reports
+            if (arg_index+1) < len(args):
+                batch_spec = args[arg_index+1]
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix()
+                                 + 'missing argument for the batch ('
+                                 + args[arg_index] + ')')
+        elif args[arg_index] in ('-workers', '-j'):
+            # number of worker processes for -batch/-serve/-panel/-streaming
+            if (arg_index+1) < len(args):
+                workers = int(args[arg_index+1])
+                if workers < 1:
+                    raise ValueError(debug_prefix()
+                                     + "ERROR: number of workers is "
+                                     + str(workers)
+                                     + " (LESS THAN ONE)")
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix()
+                                 + 'missing argument for the number of workers ('
+                                 + args[arg_index] + ')')
+        elif args[arg_index] in ('-serve',):
+            # run the local evaluation server
+            serve_mode = True
+        elif args[arg_index] in ('-port',):
+            # port for -serve
+            if (arg_index+1) < len(args):
+                serve_port = int(args[arg_index+1])
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix()
+                                 + 'missing argument for the server port ('
+                                 + args[arg_index] + ')')
+        elif args[arg_index] in ('-json', '-csv'):
+            # write <file_stem>_results.json/.csv to the output folder
+            results_formats.append(args[arg_index][1:])
+        elif args[arg_index] in ('-metrics_textfile', '-statsd'):
+            # export metrics (see MetricsExporter)
+            if (arg_index+1) < len(args):
+                if args[arg_index] == '-statsd':
+                    _settings = _settings._replace(statsd_address=args[arg_index+1])
+                else:
+                    _settings = _settings._replace(metrics_textfile=args[arg_index+1])
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix()
+                                 + 'missing argument for the metrics ('
+                                 + args[arg_index] + ')')
+        elif args[arg_index] == '-sim_cache':
+            # folder of simulations reused by later runs
+            if (arg_index+1) < len(args):
+                simulation_cache_folder = args[arg_index+1]
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix()
+                                 + 'missing argument for the simulation '
+                                 'cache folder (' + args[arg_index] + ')')
+        elif args[arg_index] in ('-detect_adv_date', '-change_point'):
+            # use the detected change point as the advertising start date
+            detect_adv_date = True
+        elif args[arg_index] == '-float32':
+            # half the memory for the projected sales and profits
+            float32 = True
+        elif args[arg_index] == '-streaming':
+            # summary statistics of the projections instead of arrays
+            streaming = True
+        elif args[arg_index] == '-engine':
+            if (arg_index+1) < len(args) and args[arg_index+1] in ENGINES:
+                engine = args[arg_index+1]
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix()
+                                 + 'missing or unknown engine for '
+                                 + args[arg_index] + ' (one of '
+                                 + ', '.join(ENGINES) + ')')
+        elif args[arg_index] == '-engine_check':
+            if (arg_index+1) < len(args):
+                engine_check = int(args[arg_index+1])
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix()
+                                 + 'missing number of simulated years for '
+                                 + args[arg_index])
+        elif args[arg_index] == '-placebo':
+            # fake advertising start dates in the period with no advertising
+            placebo = True
+        elif args[arg_index] == '-campaigns':
+            if (arg_index+1) < len(args):
+                campaign_spec = args[arg_index+1]
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix()
+                                 + 'missing argument for the campaign '
+                                 'schedule (' + args[arg_index] + ')')
+        elif args[arg_index] == '-segment_by':
+            if (arg_index+1) < len(args):
+                segment_column = args[arg_index+1]
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix()
+                                 + 'missing argument for the segment '
+                                 'column (' + args[arg_index] + ')')
+        elif args[arg_index] == '-panel':
+            if (arg_index+1) < len(args):
+                panel_spec = args[arg_index+1]
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix()
+                                 + 'missing argument for the panel '
+                                 'of stores (' + args[arg_index] + ')')
+        elif args[arg_index] == '-store_column':
+            if (arg_index+1) < len(args):
+                store_column = args[arg_index+1]
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix()
+                                 + 'missing argument for the store '
+                                 'column (' + args[arg_index] + ')')
+        elif args[arg_index] == '-adv_date_range':
+            # candidate start dates: start end step_days
+            if (arg_index+3) < len(args):
+                adv_date_range = (args[arg_index+1],
+                                  args[arg_index+2],
+                                  int(args[arg_index+3]))
+                arg_index += 3
+            else:
+                raise ValueError(debug_prefix()
+                                 + 'missing arguments for the advertising '
+                                 'start date range (' + args[arg_index]
+                                 + ' start end step_days)')
+        elif args[arg_index] == '-scenario_grid':
+            if (arg_index+1) < len(args):
+                scenario_grid_str = args[arg_index+1]
+                arg_index += 1
+            else:
+                raise ValueError(debug_prefix()
+                                 + 'missing argument for the scenario grid ('
+                                 + args[arg_index] + ')')
+        elif args[arg_index] == '-no_sim_cache':
+            simulation_cache = False
+        elif args[arg_index] == '-profile':
+            # wall time, CPU time, and peak memory of each stage
+            profile = True
+        elif args[arg_index] == '-cprofile':
+            # -profile and <file_stem>_profile_<stage>.prof files
+            profile = True
+            cprofile = True
+        elif args[arg_index] in ('-reset', '-reset_settings'):
+            reset()  # reset settings
+            save_settings() # save settings to shelf files
+
+        elif args[arg_index] in ('-glossary', '-gloss', '-g'):
+            # print glossary of technical terms
+            glossary_text = glossary()
+            glossary_text += startup_notice(os.path.basename(args[0]))
+            print(glossary_text)
+            sys.exit(0)
+
+        elif args[arg_index] in ('-license', '-copyright'):
+            # print license
+            license_text = gpl_v3_license()
+            print(license_text)
+            sys.exit(0)
+
+        elif args[arg_index] in ('-startup_notice',
+                                 '-short_notice',
+                                 '_notice',
+                                 '-short',
+                                 '-notice'):
+            # print short startup notice
+            print(startup_notice(os.path.basename(args[0])))
+            sys.exit(0)
+
+        elif args[arg_index] in ('-disclaimer', '--disclaimer'):
+            # the legal disclaimer
+            disclaimer_text = disclaimer()
+            disclaimer_text += startup_notice(os.path.basename(args[0]))
+            print(disclaimer_text)
+            sys.exit(0)
+
+        elif args[arg_index] in ('-v', '-version', '--version'):
+            print("Version:", PROJECT_VERSION)
+            sys.exit(0)
+        elif args[arg_index] in ('-h', '-help', '--help', '-?'):
+            # the usage/help message
+            usage_text = usage(os.path.basename(args[0]))
+            help_text = usage_text + ad_help()
+            print(help_text)
+            sys.exit(0)
+        else:
+            if arg_index == 1 and not args[arg_index][0] == "-":
+                # handle eval_adv.py sales.csv
+                if os.path.exists(args[arg_index]):
+                    input_file = args[arg_index]
+                    print("input_file->", input_file)
+                else:
+                    raise ValueError(debug_prefix()
+                                     + "input file "
+                                     + args[arg_index]
+                                     + " does not exist.  \nThis programs "
+                                     "requires a comma separated values (CSV) "
+                                     "format file \nwith sales data with "
+                                     "the date and amount of each sales "
+                                     "transaction.  \nMost spreadsheets, "
+                                     "databases, and accounting programs can "
+                                     "export data \nin the CSV format.\n")
+            else:
+                # raise Exception for unknown command line argument
+                if arg_index > 0:
+                    raise ValueError(debug_prefix()
+                                     + "unknown command line option ", args[arg_index])
+
+        arg_index += 1  # loop over command line arguments
+
+    # one evaluation mode at a time
+    modes = [flag for flag, given in (('-serve', serve_mode),
+                                      ('-batch', not batch_spec is None),
+                                      ('-campaigns', not campaign_spec is None),
+                                      ('-panel', not panel_spec is None),
+                                      ('-segment_by', not segment_column is None),
+                                      ('-adv_date_range', not adv_date_range is None))
+             if given]
+    if len(modes) > 1:
+        raise ValueError(debug_prefix() + "only one of " + ", ".join(modes)
+                         + " at a time")
+
+    # interactive copyright/license startup notice
+    print(startup_notice(os.path.basename(sys.argv[0])))
+
+    scenario_grid = None
+    if not scenario_grid_str is None:
+        scenario_grid = parse_scenario_grid(scenario_grid_str, unit_cost)
+
+    config = EvaluationConfig(annual_adv_expense=annual_adv_expense,
+                              unit_price=unit_price,
+                              unit_cost=unit_cost,
+                              number_sims=number_sims,
+                              adv_date=adv_date_str,
+                              date_tag=_settings.date_tag,
+                              amount_tag=_settings.amount_tag,
+                              sales_type_tag=_settings.sales_type_tag,
+                              sales_type_value=_settings.sales_type_value,
+                              bins=_settings.bins,
+                              seed_val=seed_val,
+                              ma_period_days=ma_period_days,
+                              detail_level=_settings.detail_level,
+                              make_plots=True,
+                              block=_settings.block,
+                              layers=_settings.layers,
+                              plot_duration_secs=plot_duration_secs,
+                              output_folder=output_folder,
+                              results_formats=tuple(results_formats),
+                              verbose=True,
+                              profile=profile,
+                              cprofile=cprofile,
+                              simulation_cache=simulation_cache,
+                              simulation_cache_folder=simulation_cache_folder,
+                              scenario_grid=scenario_grid,
+                              detect_adv_date=detect_adv_date,
+                              placebo=placebo,
+                              float32=float32,
+                              streaming=streaming,
+                              engine=engine,
+                              engine_check=engine_check)
+
+    metrics = settings_metrics(_settings)
+
+    if serve_mode:
+        serve(SERVE_HOST, serve_port, workers, metrics, simulation_cache_folder)
+        return None
+
+    if not batch_spec is None:
+        rows = run_batch(batch_spec, config, workers, metrics)
+        save_settings()
+        return rows
+
+    def run_mode(mode, evaluate, report, write_table, plot, file_stem):
+        """
+        run a -campaigns, -panel, -segment_by or -adv_date_range
+        evaluation, write its table, plots and -json/-csv results to
+        <file_stem>_<mode>*, and record its metrics
+        """
+        t_start = time.time()
+        try:
+            results = evaluate()
+            print(report(results))
+            if not os.path.exists(output_folder):
+                os.makedirs(output_folder)
+            file_path = output_folder + os.sep + file_stem + "_" + mode
+            write_table(results, file_path + ".csv")
+            for results_format in results_formats:
+                write_results(results, file_path + "_results." + results_format,
+                              results_format)
+            plot(results, file_stem, output_folder, plot_duration_secs,
+                 _settings.block)
+        except Exception:
+            if not metrics is None:
+                metrics.record({'elapsed_secs' : time.time() - t_start},
+                               status='error')
+            raise
+        if not metrics is None:
+            metrics.record({'number_sims' : number_sims,
+                            'elapsed_secs' : time.time() - t_start})
+        save_settings()
+        return results
+
+    if not campaign_spec is None:
+        return run_mode('campaigns',
+                        lambda: evaluate_campaigns(input_file, config,
+                                                   parse_campaigns(campaign_spec),
+                                                   number_sims),
+                        campaigns_report, write_campaigns, plot_campaigns,
+                        os.path.basename(input_file).split('.')[0])
+
+    if not panel_spec is None:
+        file_stem = os.path.basename(panel_spec.rstrip(os.sep)).split('.')[0]
+        if glob.has_magic(file_stem):
+            file_stem = 'panel'
+        return run_mode('panel',
+                        lambda: evaluate_panel(panel_spec, config, store_column,
+                                               number_sims, workers),
+                        panel_report, write_panel, plot_panel, file_stem)
+
+    if not segment_column is None:
+        return run_mode('segments',
+                        lambda: evaluate_segments(input_file, config,
+                                                  segment_column, number_sims),
+                        segments_report, write_segments, plot_segments,
+                        os.path.basename(input_file).split('.')[0])
+
+    if not adv_date_range is None:
+        return run_mode('adv_date_sweep',
+                        lambda: sweep_adv_dates(input_file, config,
+                                                *adv_date_range,
+                                                number_sims=number_sims),
+                        sweep_report, write_sweep, plot_sweep,
+                        os.path.basename(input_file).split('.')[0])
+
+    if streaming and not workers is None:
+        # only the single evaluation runs the projections in workers
+        config = config._replace(workers=workers)
+
+    try:
+        result = run_evaluation(input_file, config)
+    except Exception:
+        if not metrics is None:
+            metrics.record(status='error')
+        raise
+    if not metrics is None:
+        metrics.record(evaluation_metrics(result))
+    print(result.report)
 
     save_settings()
+    return result
 #  end of evaluate_advertising()
 
 def exit(event=None):
@@ -4520,6 +11294,7 @@ if __name__ == "__main__":
     locale.setlocale(locale.LC_ALL, 'en_US.utf-8')
     if '-gui' in sys.argv[1:]:
         # run GUI
+        from tkinter import Tk, Menu, PhotoImage, Canvas
         root = Tk()
         root.title("AdEvaluator\u2122")
         #
@@ -0,0 +1,247 @@
+"""
+make simulated sales reports for testing AdEvaluator(tm) at scale
+
+Writes a CSV sales report in the layout eval_adv.py reads (the same
+layout as the sample sales_*.csv files):
+
+"DATE","CUST ID","NAME","AMOUNT","ORDER NUMBER"[,"Type"]
+
+one row per sale.  The number of sales each day is Poisson distributed
+with a baseline rate, multiplied by the advertising lift on and after
+the advertising start date, an annual and a weekly seasonality, and
+zero on randomly chosen zero sales days (e.g. holidays).  The rows are
+written one day at a time so reports with hundreds of millions of rows
+never need to fit in memory.  The same seed gives the same report.
+
+Usage: python make_sales_report.py [-o sales_big.csv] [-rows 1000000]
+           [-rate daily_sales] [-start 10/01/2017] [-end 09/30/2018]
+           [-adv_date 03/31/2018] [-lift 0.1]
+           [-prices 90] [-prices 90:0.8,120:0.2]
+           [-seasonality 0.2] [-weekly 0.1] [-zero_days 0.02]
+           [-types Payment:0.5,Invoice:0.5]
+           [-date_tag DATE] [-amount_tag AMOUNT] [-customers 100]
+           [-seed 113]
+
+-rows sets the baseline rate so the report has about that many rows
+(it overrides -rate).  -o - writes to standard output, and an output
+file ending in .gz is gzip compressed.
+
+Example: python make_sales_report.py -o sales_1e7.csv -rows 10000000
+         python eval_adv.py -i sales_1e7.csv
+"""
+
+import sys
+import time
+import gzip
+import datetime
+
+import numpy as np
+
+RATE_DEFAULT = 3.0  # sales per day, like sales_seed_113.csv
+START_DATE_DEFAULT = '10/01/2017'
+END_DATE_DEFAULT = '09/30/2018'
+ADV_DATE_DEFAULT = '03/31/2018'  # eval_adv.py ADV_START_DATE
+LIFT_DEFAULT = 0.1  # ten percent more sales with advertising
+PRICES_DEFAULT = '90'
+CUSTOMERS_DEFAULT = 100
+SEED_DEFAULT = 113
+ORDER_NUMBER_START = 1000
+DATE_FORMAT = '%m/%d/%Y'
+DAYS_PER_YEAR = 365.25
+DAYS_PER_WEEK = 7
+
+FIRST_NAMES = ('Linda', 'Ryan', 'Doris', 'Wayne', 'Brian', 'Jason',
+               'Harold', 'Mary', 'James', 'Patricia', 'Robert', 'Jennifer',
+               'Michael', 'Elizabeth', 'William', 'Susan', 'David', 'Karen',
+               'Richard', 'Nancy')
+LAST_NAMES = ('Espinoza', 'Morrison', 'Freeman', 'Melendez', 'Hinton',
+              'Anderson', 'Myers', 'Smith', 'Johnson', 'Williams', 'Brown',
+              'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+              'Wilson', 'Taylor', 'Moore', 'Jackson', 'Lee')
+
+def parse_mix(mix_str, value_type=str):
+    """
+    parse a mix of values with weights such as 90:0.8,120:0.2
+    (a value without a weight has weight 1)
+
+    RETURNS: list of values, numpy array of probabilities
+    """
+    values = []
+    weights = []
+    for item in mix_str.split(','):
+        value, _sep, weight = item.partition(':')
+        values.append(value_type(value))
+        weights.append(float(weight) if weight else 1.0)
+    weights = np.array(weights)
+    if len(values) == 0 or np.any(weights < 0) or weights.sum() <= 0:
+        raise ValueError("bad mix " + mix_str)
+    return values, weights/weights.sum()
+
+def daily_rates(days, adv_day, rate, lift, seasonality, weekly):
+    """
+    expected sales on each day (before zero sales days)
+
+    ARGUMENTS:
+    days -- numpy array of days since the start date
+    adv_day -- first day with advertising
+    rate -- baseline sales per day
+    lift -- fractional change in sales with advertising (0.1 is +10%)
+    seasonality -- amplitude of the annual seasonality (0.2 is +/-20%)
+    weekly -- amplitude of the weekly seasonality
+
+    RETURNS: numpy array of expected sales per day
+    """
+    rates = rate*np.ones(len(days))
+    rates[days >= adv_day] *= 1.0 + lift
+    rates *= 1.0 + seasonality*np.sin(2.0*np.pi*days/DAYS_PER_YEAR)
+    rates *= 1.0 + weekly*np.sin(2.0*np.pi*days/DAYS_PER_WEEK)
+    return np.maximum(rates, 0.0)
+
+def make_sales_report(out_file, rows=None, rate=RATE_DEFAULT,
+                      start_date=START_DATE_DEFAULT,
+                      end_date=END_DATE_DEFAULT,
+                      adv_date=ADV_DATE_DEFAULT, lift=LIFT_DEFAULT,
+                      prices=PRICES_DEFAULT, seasonality=0.0, weekly=0.0,
+                      zero_days=0.0, types=None, date_tag='DATE',
+                      amount_tag='AMOUNT', customers=CUSTOMERS_DEFAULT,
+                      seed=SEED_DEFAULT):
+    """
+    write a simulated sales report to an open text file
+
+    ARGUMENTS:
+    out_file -- open text file
+    rows -- approximate number of rows (sets rate if not None)
+    prices -- price points with weights, e.g. '90:0.8,120:0.2'
+    zero_days -- fraction of days with no sales
+    types -- sales types with weights, e.g. 'Payment:0.5,Invoice:0.5'
+             (None for no Type column)
+    (see daily_rates(...) for the others)
+
+    RETURNS: number of rows written
+    """
+    if rows is not None and rows <= 0:
+        raise ValueError("rows must be positive")
+    if rate < 0 or customers <= 0 or not 0.0 <= zero_days < 1.0:
+        raise ValueError("bad rate, customers, or zero_days")
+
+    rng = np.random.RandomState(seed)
+    first_date = datetime.datetime.strptime(start_date, DATE_FORMAT)
+    last_date = datetime.datetime.strptime(end_date, DATE_FORMAT)
+    number_days = (last_date - first_date).days + 1
+    if number_days <= 0:
+        raise ValueError("end date before start date")
+    adv_day = (datetime.datetime.strptime(adv_date, DATE_FORMAT)
+               - first_date).days
+
+    days = np.arange(number_days)
+    rates = daily_rates(days, adv_day, 1.0 if rows else rate, lift,
+                        seasonality, weekly)
+    rates[rng.uniform(size=number_days) < zero_days] = 0.0
+    if rows:
+        if rates.sum() <= 0:
+            raise ValueError("no sales days")
+        rates *= rows/rates.sum()
+    sales_per_day = rng.poisson(rates)
+
+    price_values, price_probs = parse_mix(prices, float)
+    # "AMOUNT","ORDER NUMBER" column starts by price point
+    amount_strs = np.array(['"%s","' % str(price) for price in price_values],
+                           dtype=object)
+    # "CUST ID","NAME" columns by customer
+    customer_strs = np.array(['"%d","%s %s",' % (customer,
+                                                 FIRST_NAMES[customer % len(FIRST_NAMES)],
+                                                 LAST_NAMES[customer % len(LAST_NAMES)])
+                              for customer in range(customers)], dtype=object)
+    header = '"%s","CUST ID","NAME","%s","ORDER NUMBER"' % (date_tag,
+                                                            amount_tag)
+    type_strs = None
+    if types is not None:
+        type_values, type_probs = parse_mix(types)
+        type_strs = np.array(['","%s"\n' % type_value
+                              for type_value in type_values], dtype=object)
+        header += ',"Type"'
+    out_file.write(header + '\n')
+
+    order_number = ORDER_NUMBER_START
+    for day, number_sales in enumerate(sales_per_day):
+        if number_sales == 0:
+            continue
+        date_str = '"%s",' % (first_date
+                              + datetime.timedelta(days=day)).strftime(DATE_FORMAT)
+        rows_np = date_str + customer_strs[rng.randint(customers,
+                                                       size=number_sales)]
+        if len(price_values) == 1:
+            rows_np += amount_strs[0]
+        else:
+            rows_np += amount_strs[rng.choice(len(price_values),
+                                              size=number_sales,
+                                              p=price_probs)]
+        rows_np += np.arange(order_number,
+                             order_number + number_sales).astype(str).astype(object)
+        if type_strs is None:
+            rows_np += '"\n'
+        else:
+            rows_np += type_strs[rng.choice(len(type_strs),
+                                            size=number_sales, p=type_probs)]
+        out_file.write(''.join(rows_np))
+        order_number += number_sales
+
+    return int(sales_per_day.sum())
+    # end make_sales_report(...)
+
+def main(*args):
+    """
+    make a simulated sales report (see usage at top of file)
+    """
+    output_file = 'sales_simulated.csv'
+    options = {}
+    float_options = {'-rate' : 'rate', '-lift' : 'lift',
+                     '-seasonality' : 'seasonality', '-weekly' : 'weekly',
+                     '-zero_days' : 'zero_days'}
+    int_options = {'-rows' : 'rows', '-customers' : 'customers',
+                   '-seed' : 'seed'}
+    str_options = {'-start' : 'start_date', '-end' : 'end_date',
+                   '-adv_date' : 'adv_date', '-prices' : 'prices',
+                   '-types' : 'types', '-date_tag' : 'date_tag',
+                   '-amount_tag' : 'amount_tag'}
+
+    arg_index = 0
+    while arg_index < len(args):
+        option = args[arg_index]
+        if option in ('-h', '-help', '--help'):
+            print(__doc__)
+            return 0
+        if arg_index + 1 >= len(args):
+            raise ValueError("missing argument for " + option)
+        value = args[arg_index+1]
+        if option == '-o':
+            output_file = value
+        elif option in float_options:
+            options[float_options[option]] = float(value)
+        elif option in int_options:
+            # accept 1e7 as well as 10000000
+            options[int_options[option]] = int(float(value))
+        elif option in str_options:
+            options[str_options[option]] = value
+        else:
+            raise ValueError("unknown option " + option)
+        arg_index += 2
+
+    t_start = time.time()
+    if output_file == '-':
+        rows = make_sales_report(sys.stdout, **options)
+    else:
+        if output_file.endswith('.gz'):
+            out_file = gzip.open(output_file, 'wt', newline='')
+        else:
+            out_file = open(output_file, 'w', newline='',
+                            buffering=1024*1024)
+        with out_file:
+            rows = make_sales_report(out_file, **options)
+    print("wrote %d rows to %s in %.1f seconds"
+          % (rows, output_file, time.time() - t_start), file=sys.stderr)
+    return 0
+    # end main(...)
+
+if __name__ == "__main__":
+    sys.exit(main(*sys.argv[1:]))
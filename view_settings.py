@@ -17,7 +17,13 @@ AdEvaluatorSettings = namedtuple('AdEvaluatorSettings',
                                  'sales_type_tag '
                                  'sales_type_value '
                                  'unit_cost '
-                                 'block'
+                                 'block '
+                                 'layers '
+                                 'bins '
+                                 'metrics_textfile '
+                                 'statsd_address',
+                                 # older settings files lack the later fields
+                                 defaults=(False, 20, '', '')
 )
 
 shelf_tag = sys.argv[1]